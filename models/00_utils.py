@@ -178,11 +178,13 @@ def s3_rest_controller(prefix=None, resourcename=None, **attr):
                                redirect(URL(args="create",
                                             vars={"from_record":r.id})))
     set_handler("deduplicate", s3base.S3Merge)
+    set_handler("export", s3base.S3ExportJob)
     set_handler("filter", s3base.S3Filter)
     set_handler("hierarchy", s3base.S3HierarchyCRUD)
     set_handler("import", s3base.S3Importer)
     set_handler("xform", s3base.S3XForms)
     set_handler("map", s3base.S3Map)
+    set_handler("tiles", s3base.S3FeatureTiles)
     set_handler("profile", s3base.S3Profile)
     set_handler("report", s3base.S3Report)
     set_handler("report", s3base.S3Report, transform=True)
@@ -197,20 +197,25 @@ def gis_download_kml(record_id, filename, session_id_name, session_id,
 tasks["gis_download_kml"] = gis_download_kml
 
 # -----------------------------------------------------------------------------
-def gis_update_location_tree(feature, user_id=None):
+def gis_update_location_tree(feature=None, user_id=None):
     """
-        Update the Location Tree for a feature
+        Update the Location Tree (and the precomputed simplifications)
+        for a feature
             - will normally be done Asynchronously if there is a worker alive
 
-        @param feature: the feature (in JSON format)
+        @param feature: the feature (in JSON format), or None to update
+                        the whole tree (in bulk mode)
         @param user_id: calling request's auth.user.id or None
     """
     if user_id:
         # Authenticate
         auth.s3_impersonate(user_id)
     # Run the Task & return the result
-    feature = json.loads(feature)
-    path = gis.update_location_tree(feature)
+    if feature:
+        feature = json.loads(feature)
+        path = gis.update_location_tree(feature, simplify=True)
+    else:
+        path = gis.update_location_tree_bulk()
     db.commit()
     return path
 
@@ -231,6 +236,60 @@ def org_facility_geojson(user_id=None):
 
 tasks["org_facility_geojson"] = org_facility_geojson
 
+# -----------------------------------------------------------------------------
+def pr_person_name_index_rebuild(user_id=None):
+    """
+        Rebuild the person name index (pr_person_name_index)
+            - required once after enabling settings.pr.name_index
+
+        @param user_id: calling request's auth.user.id or None
+    """
+    if user_id:
+        # Authenticate
+        auth.s3_impersonate(user_id)
+    # Run the Task & return the result
+    result = s3db.pr_PersonNameIndex.rebuild()
+    db.commit()
+    return result
+
+tasks["pr_person_name_index_rebuild"] = pr_person_name_index_rebuild
+
+# -----------------------------------------------------------------------------
+def pr_ou_closure_rebuild(user_id=None):
+    """
+        Rebuild the closure table of the OU hierarchy (pr_ou_closure)
+            - required once after enabling settings.pr.ou_closure
+
+        @param user_id: calling request's auth.user.id or None
+    """
+    if user_id:
+        # Authenticate
+        auth.s3_impersonate(user_id)
+    # Run the Task & return the result
+    result = s3db.pr_rebuild_closure()
+    db.commit()
+    return result
+
+tasks["pr_ou_closure_rebuild"] = pr_ou_closure_rebuild
+
+# -----------------------------------------------------------------------------
+def s3_export_job(job_id, user_id=None):
+    """
+        Run an asynchronous export job (see S3ExportJob)
+
+        @param job_id: the s3_export_job record ID
+        @param user_id: calling request's auth.user.id or None
+    """
+    if user_id:
+        # Authenticate
+        auth.s3_impersonate(user_id)
+    # Run the Task & return the result
+    result = s3base.S3ExportJob.run(job_id)
+    db.commit()
+    return result
+
+tasks["s3_export_job"] = s3_export_job
+
 # -----------------------------------------------------------------------------
 if settings.has_module("msg"):
 
@@ -349,6 +408,24 @@ if settings.has_module("msg"):
 
     tasks["notify_notify"] = notify_notify
 
+    # -------------------------------------------------------------------------
+    def notify_notify_batch(resource_ids, user_id=None):
+        """
+            Asynchronous task to notify multiple subscribers about
+            resource updates in-process. This task is created by
+            notify_check_subscriptions if settings.msg.notify_batch
+            is enabled.
+
+            @param resource_ids: list of pr_subscription_resource IDs
+                                 as JSON string
+        """
+        if user_id:
+            auth.s3_impersonate(user_id)
+        notify = s3base.S3Notifications
+        return notify.notify_batch(resource_ids)
+
+    tasks["notify_notify_batch"] = notify_notify_batch
+
 # -----------------------------------------------------------------------------
 if settings.has_module("req"):
 
@@ -654,6 +731,27 @@ if settings.has_module("disease"):
 
     tasks["disease_stats_update_location_aggregates"] = disease_stats_update_location_aggregates
 
+# -----------------------------------------------------------------------------
+if settings.has_module("survey"):
+
+    def survey_answer_matrix_rebuild(series_id=None, user_id=None):
+        """
+            Rebuild the answer matrix (survey_answer_matrix)
+                - fills the matrix for responses entered before it existed
+
+            @param series_id: the series record ID (None for all series)
+            @param user_id: calling request's auth.user.id or None
+        """
+        if user_id:
+            # Authenticate
+            auth.s3_impersonate(user_id)
+        # Run the Task & return the result
+        result = s3db.survey_AnswerMatrix.rebuild(series_id)
+        db.commit()
+        return result
+
+    tasks["survey_answer_matrix_rebuild"] = survey_answer_matrix_rebuild
+
 # -----------------------------------------------------------------------------
 if settings.has_module("sync"):
 
@@ -683,16 +781,50 @@ if settings.has_module("sync"):
                                message=message)
                 db.commit()
                 return sync.log.ERROR
-            sync.set_status(running=True, manual=manual)
+            sync.set_status(running=True, manual=manual, pending=0)
             try:
                 sync.synchronize(repository)
             finally:
-                sync.set_status(running=False, manual=False)
+                if not sync.get_status().pending:
+                    # Not waiting for any dispatched task groups
+                    sync.set_status(running=False, manual=False)
         db.commit()
         return s3base.S3SyncLog.SUCCESS
 
     tasks["sync_synchronize"] = sync_synchronize
 
+    # -------------------------------------------------------------------------
+    def sync_synchronize_tasks(repository_id, task_ids, user_id=None):
+        """
+            Run a group of tasks for a repository, scheduled by
+            sync_synchronize if settings.sync.concurrent_tasks is enabled
+
+            @param repository_id: the repository ID
+            @param task_ids: JSON list of sync task IDs
+        """
+
+        auth.s3_impersonate(user_id)
+
+        rtable = s3db.sync_repository
+        query = (rtable.deleted != True) & \
+                (rtable.id == repository_id)
+        repository = db(query).select(limitby=(0, 1)).first()
+        sync = s3base.S3Sync()
+        try:
+            if repository:
+                sync.synchronize(repository, task_ids=json.loads(task_ids))
+            db.commit()
+        except:
+            db.rollback()
+            raise
+        finally:
+            # Count down the pending groups, even if this one failed
+            sync.task_group_done()
+            db.commit()
+        return s3base.S3SyncLog.SUCCESS
+
+    tasks["sync_synchronize_tasks"] = sync_synchronize_tasks
+
 # -----------------------------------------------------------------------------
 # Instantiate Scheduler instance with the list of tasks
 s3.tasks = tasks
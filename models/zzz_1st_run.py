@@ -223,47 +223,15 @@ if len(pop_list) > 0:
     # PrePopulate import (from CSV)
     #
 
-    # Create the bulk Importer object
-    bi = s3base.S3BulkImporter()
-
-    # Register handlers
-    s3.import_font = bi.import_font
-    s3.import_image = bi.import_image
-    s3.import_remote_csv = bi.import_remote_csv
-    s3.import_role = bi.import_role
-    s3.import_script = bi.import_script
-    s3.import_user = bi.import_user
-    s3.import_xml = bi.import_xml
-
-    # Relax strict email-matching rule for import updates of person records
-    email_required = settings.get_pr_import_update_requires_email()
-    settings.pr.import_update_requires_email = False
-
-    # Additional settings for user table imports:
-    s3db.configure("auth_user",
-                   onaccept = lambda form: auth.s3_approve_user(form.vars))
-    s3db.add_components("auth_user", auth_membership="user_id")
-
-    # Flag that Assets are being imported, not synced
-    s3.asset_import = True
-
-    # Allow population via shell scripts
-    if not request.env.request_method:
-        request.env.request_method = "GET"
-
-    grandTotalStart = datetime.datetime.now()
+    # Template folders
+    pop_paths = []
     for pop_setting in pop_list:
-        start = datetime.datetime.now()
-        # Clear Tasklist
-        bi.tasks = []
-        # Import data specific to the prepopulate setting
         if pop_setting == 1:
             # Populate with the default data
             path = path_join(request_folder,
                              "modules",
                              "templates",
                              "default")
-            bi.perform_tasks(path)
         else:
             path = path_join(request_folder,
                              "modules",
@@ -278,110 +246,185 @@ if len(pop_list) > 0:
                 if not os.path.exists(path):
                     print >> sys.stderr, "Unable to install data %s no valid directory found" % pop_setting
                     continue
+        pop_paths.append(path)
+
+    # Restore a snapshot of a previous prepopulate with the same inputs?
+    snapshot = None
+    restored = False
+    if settings.get_base_prepopulate_snapshots():
+        snapshot = s3base.S3BulkImportSnapshot(pop_paths)
+        restored = snapshot.restore()
+
+    if restored:
+        print >> sys.stdout, "Pre-populate restored from snapshot %s" % snapshot.filename
+
+        # Restore Auth
+        auth.override = False
+        # Enable location tree updates
+        gis.disable_update_location_tree = False
+
+    else:
+
+        # Create the bulk Importer object
+        bi = s3base.S3BulkImporter()
+
+        # Register handlers
+        s3.import_font = bi.import_font
+        s3.import_image = bi.import_image
+        s3.import_remote_csv = bi.import_remote_csv
+        s3.import_role = bi.import_role
+        s3.import_script = bi.import_script
+        s3.import_user = bi.import_user
+        s3.import_xml = bi.import_xml
+
+        # Relax strict email-matching rule for import updates of person records
+        email_required = settings.get_pr_import_update_requires_email()
+        settings.pr.import_update_requires_email = False
+
+        # Additional settings for user table imports:
+        s3db.configure("auth_user",
+                       onaccept = lambda form: auth.s3_approve_user(form.vars))
+        s3db.add_components("auth_user", auth_membership="user_id")
+
+        # Flag that Assets are being imported, not synced
+        s3.asset_import = True
+
+        # Allow population via shell scripts
+        if not request.env.request_method:
+            request.env.request_method = "GET"
+
+        grandTotalStart = datetime.datetime.now()
+        for path in pop_paths:
+            start = datetime.datetime.now()
+            # Clear Tasklist
+            bi.tasks = []
+            # Import data specific to the prepopulate setting
             bi.perform_tasks(path)
 
+            grandTotalEnd = datetime.datetime.now()
+            duration = grandTotalEnd - grandTotalStart
+            try:
+                # Python 2.7
+                duration = '{:.2f}'.format(duration.total_seconds()/60)
+                print >> sys.stdout, "Pre-populate task completed in %s mins" % duration
+            except AttributeError:
+                # older Python
+                print >> sys.stdout, "Pre-populate task completed in %s" % duration
+            bi.resultList = []
+        for errorLine in bi.errorList:
+            try:
+                print >> sys.stderr, errorLine
+            except:
+                s3_unicode = s3base.s3_unicode
+                _errorLine = ""
+                for i in range(0, len(errorLine)):
+                    try:
+                        _errorLine += s3_unicode(errorline[i])
+                    except:
+                        pass
+                print >> sys.stderr, _errorLine
+
+        # Restore setting for strict email-matching
+        settings.pr.import_update_requires_email = email_required
+
+        # Restore Auth
+        auth.override = False
+        # Enable location tree updates
+        gis.disable_update_location_tree = False
+
+        # Update Location Tree (disabled during prepop)
+        start = datetime.datetime.now()
+        gis.update_location_tree_bulk()
+        end = datetime.datetime.now()
+        print >> sys.stdout, "Location Tree update completed in %s" % (end - start)
+
+        # Countries are only editable by MapAdmin
+        db(db.gis_location.level == "L0").update(owned_by_group=map_admin)
+
+        if has_module("disease"):
+            # Populate disease_stats_aggregate (disabled during prepop)
+            # - needs to be done after locations
+            start = datetime.datetime.now()
+            s3db.disease_stats_rebuild_all_aggregates()
+            end = datetime.datetime.now()
+            print >> sys.stdout, "Disease Statistics data aggregation completed in %s" % (end - start)
+
+        if has_module("stats"):
+            # Populate stats_demographic_aggregate (disabled during prepop)
+            # - needs to be done after locations
+            start = datetime.datetime.now()
+            s3db.stats_demographic_rebuild_all_aggregates()
+            end = datetime.datetime.now()
+            print >> sys.stdout, "Demographic data aggregation completed in %s" % (end - start)
+
+        if has_module("vulnerability"):
+            # Populate vulnerability_aggregate (disabled during prepop)
+            # - needs to be done after locations
+            start = datetime.datetime.now()
+            s3db.vulnerability_rebuild_all_aggregates()
+            end = datetime.datetime.now()
+            print >> sys.stdout, "Vulnerability data aggregation completed in %s" % (end - start)
+
         grandTotalEnd = datetime.datetime.now()
         duration = grandTotalEnd - grandTotalStart
         try:
             # Python 2.7
             duration = '{:.2f}'.format(duration.total_seconds()/60)
-            print >> sys.stdout, "Pre-populate task completed in %s mins" % duration
+            print >> sys.stdout, "Pre-populate completed in %s mins" % duration
         except AttributeError:
             # older Python
-            print >> sys.stdout, "Pre-populate task completed in %s" % duration
-        bi.resultList = []
-    for errorLine in bi.errorList:
-        try:
-            print >> sys.stderr, errorLine
-        except:
-            s3_unicode = s3base.s3_unicode
-            _errorLine = ""
-            for i in range(0, len(errorLine)):
-                try:
-                    _errorLine += s3_unicode(errorline[i])
-                except:
-                    pass
-            print >> sys.stderr, _errorLine
-
-    # Restore setting for strict email-matching
-    settings.pr.import_update_requires_email = email_required
-
-    # Restore Auth
-    auth.override = False
-    # Enable location tree updates
-    gis.disable_update_location_tree = False
-
-    # Update Location Tree (disabled during prepop)
-    start = datetime.datetime.now()
-    gis.update_location_tree()
-    end = datetime.datetime.now()
-    print >> sys.stdout, "Location Tree update completed in %s" % (end - start)
-
-    # Countries are only editable by MapAdmin
-    db(db.gis_location.level == "L0").update(owned_by_group=map_admin)
-
-    if has_module("disease"):
-        # Populate disease_stats_aggregate (disabled during prepop)
-        # - needs to be done after locations
-        start = datetime.datetime.now()
-        s3db.disease_stats_rebuild_all_aggregates()
-        end = datetime.datetime.now()
-        print >> sys.stdout, "Disease Statistics data aggregation completed in %s" % (end - start)
-
-    if has_module("stats"):
-        # Populate stats_demographic_aggregate (disabled during prepop)
-        # - needs to be done after locations
-        start = datetime.datetime.now()
-        s3db.stats_demographic_rebuild_all_aggregates()
-        end = datetime.datetime.now()
-        print >> sys.stdout, "Demographic data aggregation completed in %s" % (end - start)
-
-    if has_module("vulnerability"):
-        # Populate vulnerability_aggregate (disabled during prepop)
-        # - needs to be done after locations
-        start = datetime.datetime.now()
-        s3db.vulnerability_rebuild_all_aggregates()
-        end = datetime.datetime.now()
-        print >> sys.stdout, "Vulnerability data aggregation completed in %s" % (end - start)
-
-    grandTotalEnd = datetime.datetime.now()
-    duration = grandTotalEnd - grandTotalStart
-    try:
-        # Python 2.7
-        duration = '{:.2f}'.format(duration.total_seconds()/60)
-        print >> sys.stdout, "Pre-populate completed in %s mins" % duration
-    except AttributeError:
-        # older Python
-        print >> sys.stdout, "Pre-populate completed in %s" % duration
-
-    # =========================================================================
-    # Indexes
-    #
-
-    # Person Registry
-    tablename = "pr_person"
-    # Add extra indexes on search fields
-    # Should work for our 3 supported databases: sqlite, MySQL & PostgreSQL
-    field = "first_name"
-    db.executesql("CREATE INDEX %s__idx on %s(%s);" % (field, tablename, field))
-    field = "middle_name"
-    db.executesql("CREATE INDEX %s__idx on %s(%s);" % (field, tablename, field))
-    field = "last_name"
-    db.executesql("CREATE INDEX %s__idx on %s(%s);" % (field, tablename, field))
-
-    # GIS
-    # Add extra index on search field
-    # Should work for our 3 supported databases: sqlite, MySQL & PostgreSQL
-    tablename = "gis_location"
-    field = "name"
-    db.executesql("CREATE INDEX %s__idx on %s(%s);" % (field, tablename, field))
-    if settings.get_gis_spatialdb():
-        # Add Spatial Index (PostgreSQL-only currently)
-        db.executesql("CREATE INDEX gis_location_gist on %s USING GIST (the_geom);" % tablename)
-        # Ensure the Planner takes this into consideration
-        # Vacuum cannot run in a transaction block
-        # autovacuum should be on anyway so will run ANALYZE after 50 rows inserted/updated/deleted
-        #db.executesql("VACUUM ANALYZE;")
+            print >> sys.stdout, "Pre-populate completed in %s" % duration
+
+        # =========================================================================
+        # Indexes
+        #
+
+        # Person Registry
+        tablename = "pr_person"
+        # Add extra indexes on search fields
+        # Should work for our 3 supported databases: sqlite, MySQL & PostgreSQL
+        field = "first_name"
+        db.executesql("CREATE INDEX %s__idx on %s(%s);" % (field, tablename, field))
+        field = "middle_name"
+        db.executesql("CREATE INDEX %s__idx on %s(%s);" % (field, tablename, field))
+        field = "last_name"
+        db.executesql("CREATE INDEX %s__idx on %s(%s);" % (field, tablename, field))
+
+        # Person Name Index
+        s3db.pr_PersonNameIndex.create_indexes()
+
+        # OU Closure
+        tablename = "pr_ou_closure"
+        field = "ancestor_id"
+        db.executesql("CREATE INDEX %s__idx on %s(%s);" % (field, tablename, field))
+        field = "descendant_id"
+        db.executesql("CREATE INDEX %s__idx on %s(%s);" % (field, tablename, field))
+
+        # GIS
+        # Add extra index on search field
+        # Should work for our 3 supported databases: sqlite, MySQL & PostgreSQL
+        tablename = "gis_location"
+        field = "name"
+        db.executesql("CREATE INDEX %s__idx on %s(%s);" % (field, tablename, field))
+        if settings.get_gis_spatialdb():
+            # Add Spatial Index (PostgreSQL-only currently)
+            db.executesql("CREATE INDEX gis_location_gist on %s USING GIST (the_geom);" % tablename)
+            # Ensure the Planner takes this into consideration
+            # Vacuum cannot run in a transaction block
+            # autovacuum should be on anyway so will run ANALYZE after 50 rows inserted/updated/deleted
+            #db.executesql("VACUUM ANALYZE;")
+        # Precomputed simplifications
+        db.executesql("CREATE INDEX gis_location_simplified_location_id__idx on gis_location_simplified(location_id);")
+
+        # Asynchronous Export Jobs
+        db.executesql("CREATE INDEX s3_export_job_job_key__idx on s3_export_job(job_key);")
+
+        # Table Versions
+        db.executesql("CREATE INDEX s3_table_version_tablename__idx on s3_table_version(tablename);")
+
+        # Save a snapshot for subsequent runs
+        if snapshot:
+            snapshot.save()
 
     # Restore view
     response.view = "default/index.html"
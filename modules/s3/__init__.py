@@ -88,6 +88,9 @@ from s3rest import *
 from s3crud import *
 from s3forms import *
 
+# Asynchronous Exports
+from s3export import *
+
 # Filtering
 from s3filter import *
 
@@ -38,6 +38,7 @@ __all__ = ("AuthS3",
            )
 
 import datetime
+import hashlib
 #import re
 from uuid import uuid4
 
@@ -1361,6 +1362,7 @@ Thank you"""
             return record.id
         else:
             id = membership.insert(group_id=group_id, user_id=user_id, pe_id=entity)
+        self.permission.expire_acl_cache()
         self.update_groups()
         self.log_event(self.messages.add_membership_log,
                        dict(user_id=user_id, group_id=group_id))
@@ -3534,6 +3536,7 @@ $.filterOptionsS3({
             db(pquery).update(deleted=True)
             # Remove the role
             db(gquery).update(role=None, deleted=True)
+            self.permission.expire_acl_cache()
 
     # -------------------------------------------------------------------------
     def s3_assign_role(self, user_id, group_id, for_pe=None):
@@ -3604,6 +3607,9 @@ $.filterOptionsS3({
                     membership["pe_id"] = for_pe
                 membership_id = mtable.insert(**membership)
 
+        # Expire cached ACL decisions
+        self.permission.expire_acl_cache()
+
         # Update roles for current user if required
         if self.user and str(user_id) == str(self.user.id):
             self.s3_set_roles()
@@ -3675,6 +3681,9 @@ $.filterOptionsS3({
                             user_id=None,
                             group_id=None)
 
+        # Expire cached ACL decisions
+        self.permission.expire_acl_cache()
+
         # Update roles for current user if required
         if self.user and str(user_id) == str(self.user.id):
             self.s3_set_roles()
@@ -5196,6 +5205,17 @@ class S3Permission(object):
         self.record_approval = settings.get_auth_record_approval()
         self.strict_ownership = settings.get_security_strict_ownership()
 
+        # Cache for ACL decisions shared between requests
+        self.acl_cache_type = settings.get_security_acl_cache()
+        self.acl_cache_expire = settings.get_security_acl_cache_expire()
+
+        # Permission check counters (per request)
+        self.counters = Storage(has_permission = 0,
+                                accessible_query = 0,
+                                acl_lookups = 0,
+                                acl_queries = 0,
+                                )
+
         # Clear cache
         self.clear_cache()
 
@@ -5219,6 +5239,73 @@ class S3Permission(object):
 
         self.permission_cache = {}
         self.query_cache = {}
+        self.acl_cache = {}
+        self.acl_version = None
+        self.realms_key = None
+
+    # -------------------------------------------------------------------------
+    def shared_acl_cache(self):
+        """
+            Get the cache to share ACL decisions between requests
+
+            @return: the cache model (cache.ram or cache.disk),
+                     or None if not configured
+        """
+
+        cache_type = self.acl_cache_type
+        if cache_type in ("ram", "disk"):
+            return getattr(current.cache, cache_type)
+        return None
+
+    # -------------------------------------------------------------------------
+    def get_acl_version(self):
+        """
+            Get the current version stamp of the shared ACL decisions
+
+            @return: the version stamp (a UUID)
+
+            @note: the version stamp is always kept in cache.disk (even if
+                   the decisions are kept in cache.ram), so that expiry
+                   takes effect in all processes
+        """
+
+        version = self.acl_version
+        if version is None:
+            version = current.cache.disk("s3_acl_version",
+                                         web2py_uuid,
+                                         time_expire = None,
+                                         )
+            self.acl_version = version
+        return version
+
+    # -------------------------------------------------------------------------
+    def expire_acl_cache(self):
+        """
+            Expire all ACL decisions shared between requests, to be called
+            whenever ACLs or role assignments change
+        """
+
+        self.acl_cache = {}
+        self.acl_version = None
+
+        if self.shared_acl_cache() is not None:
+            # Changing the version invalidates all keys
+            current.cache.disk("s3_acl_version", None)
+
+    # -------------------------------------------------------------------------
+    def log_counters(self):
+        """
+            Log the permission check counters of the current request
+            (at debug level)
+        """
+
+        counters = self.counters
+        current.log.debug("S3Permission %s/%s" % (self.controller,
+                                                  self.function),
+                          "%(has_permission)s permission checks, "
+                          "%(accessible_query)s accessible queries, "
+                          "%(acl_lookups)s ACL lookups, "
+                          "%(acl_queries)s ACL queries" % counters)
 
     # -------------------------------------------------------------------------
     def check_settings(self):
@@ -5384,6 +5471,9 @@ class S3Permission(object):
                     acl["group_id"] = group_id
                     success = table.insert(**acl)
 
+        if success:
+            self.expire_acl_cache()
+
         return success
 
     # -------------------------------------------------------------------------
@@ -5882,6 +5972,7 @@ class S3Permission(object):
 
         if record == 0:
             record = None
+        self.counters.has_permission += 1
         #_debug("\nhas_permission('%s', c=%s, f=%s, t=%s, record=%s)" % \
         #       ("|".join(method),
         #        c or current.request.controller,
@@ -6073,6 +6164,7 @@ class S3Permission(object):
         if not isinstance(method, (list, tuple)):
             method = [method]
 
+        self.counters.accessible_query += 1
         #_debug("\naccessible_query(%s, '%s')" % (table, ",".join(method)))
 
         # Defaults
@@ -6353,7 +6445,8 @@ class S3Permission(object):
                         entity=[]):
         """
             Find all applicable ACLs for the specified situation for
-            the specified realms and delegations
+            the specified realms and delegations, using the cached
+            decision if available
 
             @param racl: the required ACL
             @param realms: the realms
@@ -6366,13 +6459,101 @@ class S3Permission(object):
             @return: None for no ACLs defined (allow),
                       [] for no ACLs applicable (deny),
                       or list of applicable ACLs
+
+            @note: decisions are cached per request, and - if configured
+                   in settings.security.acl_cache - shared between requests
+                   unless they are for a particular realm entity (=record)
         """
 
         if not self.use_cacls:
             # We do not use ACLs at all (allow all)
             return None
+
+        counters = self.counters
+        counters.acl_lookups += 1
+
+        c = c or self.controller
+        f = f or self.function
+        tablename = getattr(t, "_tablename", t)
+
+        key = "%s/%s/%s/%s/%s/%s" % (self.get_realms_key(realms, delegations),
+                                     racl,
+                                     c,
+                                     f,
+                                     tablename,
+                                     entity or None,
+                                     )
+        acl_cache = self.acl_cache
+        if key in acl_cache:
+            return acl_cache[key]
+
+        def lookup():
+            counters.acl_queries += 1
+            return self._applicable_acls(racl,
+                                         realms = realms,
+                                         delegations = delegations,
+                                         c = c,
+                                         f = f,
+                                         t = tablename,
+                                         entity = entity,
+                                         )
+
+        cache = self.shared_acl_cache() if not entity else None
+        if cache is not None:
+            shared_key = "s3_acl_%s_%s" % (self.get_acl_version(),
+                                           hashlib.md5(key).hexdigest())
+            acls = cache(shared_key, lookup, time_expire=self.acl_cache_expire)
         else:
-            acls = {}
+            acls = lookup()
+
+        acl_cache[key] = acls
+        return acls
+
+    # -------------------------------------------------------------------------
+    def get_realms_key(self, realms, delegations):
+        """
+            Get a key for the combination of roles, realms and delegations
+            of the user (for caching of ACL decisions)
+
+            @param realms: the realms
+            @param delegations: the delegations
+        """
+
+        realms_key = self.realms_key
+        if realms_key is not None and \
+           realms_key[0] is realms and realms_key[1] is delegations:
+            return realms_key[2]
+
+        data = json.dumps([realms, delegations], sort_keys=True)
+        key = hashlib.md5(data).hexdigest()
+        self.realms_key = (realms, delegations, key)
+        return key
+
+    # -------------------------------------------------------------------------
+    def _applicable_acls(self, racl,
+                         realms=None,
+                         delegations=None,
+                         c=None,
+                         f=None,
+                         t=None,
+                         entity=[]):
+        """
+            Find all applicable ACLs for the specified situation for
+            the specified realms and delegations (uncached)
+
+            @param racl: the required ACL
+            @param realms: the realms
+            @param delegations: the delegations
+            @param c: the controller name, falls back to current request
+            @param f: the function name, falls back to current request
+            @param t: the tablename
+            @param entity: the realm entity
+
+            @return: [] for no ACLs applicable (deny),
+                     or list of applicable ACLs
+        """
+
+        acls = {}
 
         db = current.db
         table = self.table
@@ -7772,6 +7953,7 @@ class S3RoleManager(S3Method):
                             db(query).update(**acl)
                         elif acl.oacl or acl.uacl:
                             _id = acl_table.insert(**acl)
+                    auth.permission.expire_acl_cache()
 
                 redirect(URL(f="role", vars=request.get_vars))
 
@@ -7834,6 +8016,7 @@ class S3RoleManager(S3Method):
                             (self.table.id == role_id)
                     db(query).update(role=None,
                                      deleted=True)
+                    auth.permission.expire_acl_cache()
                     # Confirmation:
                     session.confirmation = '%s "%s" %s' % (T("Role"),
                                                            role_name,
@@ -62,6 +62,7 @@ class S3Codec(object):
         from s3codecs import S3SHP
         from s3codecs import S3SVG
         from s3codecs import S3XLS
+        from s3codecs import S3XLSX
         from s3codecs import S3RL_PDF
 
         # Register the codec classes
@@ -70,6 +71,7 @@ class S3Codec(object):
             shp = S3SHP,
             svg = S3SVG,
             xls = S3XLS,
+            xlsx = S3XLSX,
         )
 
         if format in CODECS:
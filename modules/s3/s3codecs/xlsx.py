@@ -0,0 +1,461 @@
+# -*- coding: utf-8 -*-
+
+"""
+    S3 Microsoft Excel 2007+ (XLSX) codec
+
+    @copyright: 2011-15 (c) Sahana Software Foundation
+    @license: MIT
+
+    Permission is hereby granted, free of charge, to any person
+    obtaining a copy of this software and associated documentation
+    files (the "Software"), to deal in the Software without
+    restriction, including without limitation the rights to use,
+    copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following
+    conditions:
+
+    The above copyright notice and this permission notice shall be
+    included in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+    EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+    OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+    NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+    HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+    WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+    OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+__all__ = ("S3XLSX",
+           )
+
+import datetime
+import tempfile
+
+from gluon import *
+from gluon.contenttype import contenttype
+from gluon.storage import Storage
+from gluon.streamer import DEFAULT_CHUNK_SIZE
+
+from ..s3codec import S3Codec
+from ..s3datetime import S3DateTime
+from ..s3utils import s3_unicode, s3_strip_markup
+from xls import S3XLS
+
+# =============================================================================
+class S3XLSX(S3Codec):
+    """
+        Streaming Microsoft Excel 2007+ format codec
+        - extracts the resource page by page and writes the spreadsheet
+          row by row (xlsxwriter in constant memory mode), so that the
+          memory use does not depend on the number of rows
+        - writes dates, times and numbers as typed cells
+        - continues on additional sheets when the row limit of a sheet
+          is reached
+    """
+
+    # Maximum number of rows per sheet (including the header rows)
+    MAX_ROWS = 1048576
+
+    # Maximum number of characters in a cell
+    MAX_CELL_SIZE = 32767
+
+    # Maximum column width (in characters)
+    MAX_COL_WIDTH = 60
+
+    # Number of records per page
+    PAGE_SIZE = 1000
+
+    # Colours
+    LARGE_HEADER_COLOUR = "#CCFFFF" # pale_blue
+    HEADER_COLOUR = "#CCFFFF" # pale_blue
+    SUB_HEADER_COLOUR = "#9999FF" # periwinkle
+    ROW_ALTERNATING_COLOURS = ["#CCFFCC", # light_green
+                               "#FFFF99", # light_yellow
+                               ]
+
+    ERROR = Storage(
+        XLSXWRITER_ERROR = "XLSX export requires python-xlsxwriter module to be installed on server",
+    )
+
+    # -------------------------------------------------------------------------
+    def extract(self, resource, list_fields, groupby=None):
+        """
+            Prepare the extraction of the rows from the resource
+
+            @param resource: the resource
+            @param list_fields: fields to include in list views
+            @param groupby: selector of the field to group the rows by
+
+            @return: tuple (title, columns, rows), where columns is a
+                     list of tuples (colname, label, type), and rows is
+                     a generator yielding the rows page by page
+        """
+
+        title = self.crud_string(resource.tablename, "title_list")
+
+        get_vars = dict(current.request.vars)
+        get_vars["iColumns"] = len(list_fields)
+        query, orderby, left = resource.datatable_filter(list_fields,
+                                                         get_vars,
+                                                         )
+        resource.add_filter(query)
+
+        if orderby is None:
+            orderby = resource.get_config("orderby")
+
+        fields = list(list_fields)
+        if groupby:
+            if groupby not in fields:
+                fields.append(groupby)
+            # Order by the group first (if it is a real field)
+            rfield = resource.resolve_selector(groupby)
+            field = rfield.field
+            if field is not None:
+                orderby = field | orderby if orderby else field
+
+        rfields = resource.resolve_selectors(fields)[0]
+
+        columns = []
+        for rfield in rfields:
+            if rfield.show:
+                ftype = rfield.ftype
+                if ftype == "virtual":
+                    ftype = "string"
+                columns.append((rfield.colname, rfield.label, ftype))
+
+        rows = resource.iterselect(fields,
+                                   left = left,
+                                   orderby = orderby,
+                                   represent = True,
+                                   show_links = False,
+                                   raw_data = True,
+                                   chunk_size = self.PAGE_SIZE,
+                                   )
+
+        return (title, columns, rows)
+
+    # -------------------------------------------------------------------------
+    def encode(self, data_source, **attr):
+        """
+            Export data as a Microsoft Excel 2007+ spreadsheet
+
+            @param data_source: the source of the data that is to be encoded
+                                as a spreadsheet, can be either of:
+                                1) an S3Resource
+                                2) a dict like:
+                                   {columns: [key, ...],
+                                    headers: {key: label},
+                                    types: {key: type},
+                                    rows: [{key:value}] (or a generator),
+                                    }
+            @param attr: keyword parameters
+
+            @keyword title: the main title of the report
+            @keyword list_fields: fields to include in list views
+            @keyword report_groupby: used to create a grouping of the result:
+                                     either a Field object of the resource
+                                     or a field selector
+            @keyword use_colour: True to add colour to the cells, default False
+            @keyword evenodd: render different background colours
+                              for even/odd rows ("stripes")
+
+            @return: the spreadsheet (as stream)
+        """
+
+        # Do not redirect from here!
+        # ...but raise proper status code, which can be caught by caller
+        try:
+            import xlsxwriter
+        except ImportError:
+            error = self.ERROR.XLSXWRITER_ERROR
+            current.log.error(error)
+            raise HTTP(503, body=error)
+
+        MAX_ROWS = self.MAX_ROWS
+        MAX_CELL_SIZE = self.MAX_CELL_SIZE
+
+        # Get the attributes
+        title = attr.get("title")
+        list_fields = attr.get("list_fields")
+        report_groupby = attr.get("report_groupby")
+        use_colour = attr.get("use_colour", False)
+        evenodd = attr.get("evenodd", True)
+
+        if isinstance(report_groupby, Field):
+            report_groupby = report_groupby.name
+
+        # Extract the data from the data_source
+        if isinstance(data_source, dict):
+            headers = data_source.get("headers", {})
+            lfields = data_source.get("columns", list_fields)
+            types = data_source.get("types")
+            columns = [(col, headers.get(col, col), types[col])
+                       for col in lfields]
+            rows = data_source.get("rows")
+            groupby = report_groupby
+        else:
+            if not list_fields:
+                list_fields = data_source.list_fields()
+            title_list, columns, rows = self.extract(data_source,
+                                                     list_fields,
+                                                     groupby = report_groupby,
+                                                     )
+            if not title:
+                title = title_list
+            groupby = None
+            if report_groupby:
+                rfield = data_source.resolve_selector(report_groupby)
+                groupby = rfield.colname
+        if not title:
+            title = current.T("Export")
+        title = s3_unicode(title)
+
+        # Columns to write: skip the group, the ID and sort columns
+        columns = [(colname, s3_unicode(label), ftype)
+                   for colname, label, ftype in columns
+                   if colname != groupby and \
+                      label not in ("Id", "Sort") and \
+                      ftype != "sort"]
+        numcols = len(columns)
+
+        # Use raw values for typed cells?
+        settings = current.deployment_settings
+        gregorian = current.calendar.name == "Gregorian"
+        utc_offset = S3DateTime.get_offset_value(current.session.s3.utc_offset)
+        if utc_offset:
+            utc_offset = datetime.timedelta(seconds=utc_offset)
+        thousands_separator = settings.get_L10n_thousands_separator()
+        decimal_separator = settings.get_L10n_decimal_separator()
+
+        # Create the workbook in a temporary file
+        output = tempfile.TemporaryFile()
+        book = xlsxwriter.Workbook(output, {"constant_memory": True,
+                                            "strings_to_numbers": False,
+                                            "strings_to_formulas": False,
+                                            "strings_to_urls": False,
+                                            })
+        styles = self._styles(book,
+                              use_colour = use_colour,
+                              evenodd = evenodd,
+                              )
+
+        title_row = settings.get_xls_title_row()
+
+        # Sheet name must be unique, max 31 chars and without []:*?/\
+        sheet_name = title
+        for c in "[]:*?/\\":
+            sheet_name = sheet_name.replace(c, " ")
+        sheet_name = sheet_name[:27]
+
+        # Column widths (in characters)
+        widths = [max(len(label), 10) for colname, label, ftype in columns]
+
+        sheets = []
+        def add_sheet():
+            """ Add a new sheet and write the header rows """
+
+            sheet = book.add_worksheet("%s-%s" % (sheet_name, len(sheets) + 1))
+            sheets.append(sheet)
+
+            row_index = 0
+            if title_row:
+                # Title (standard = "title_list" CRUD string)
+                if numcols > 1:
+                    sheet.merge_range(0, 0, 0, numcols - 1, title,
+                                      styles["large_header"])
+                else:
+                    sheet.write_string(0, 0, title, styles["large_header"])
+                sheet.set_row(0, 25)
+                # Export date/time
+                sheet.write_string(1, 0, "%s:" % current.T("Date Exported"),
+                                   styles["notes"])
+                sheet.write_datetime(1, 1, current.request.now,
+                                     styles["notes_datetime"])
+                row_index = 2
+
+            header_style = styles["header"]
+            for col_index, (colname, label, ftype) in enumerate(columns):
+                sheet.write_string(row_index, col_index, label, header_style)
+            sheet.freeze_panes(row_index + 1, 0)
+
+            return sheet, row_index + 1
+
+        sheet, row_index = add_sheet()
+
+        # Write the rows
+        subheading = None
+        numrows = 0
+        for row in rows:
+
+            # Group headers
+            if groupby:
+                represent = s3_strip_markup(s3_unicode(row.get(groupby, "")))
+                if subheading != represent:
+                    subheading = represent
+                    if row_index >= MAX_ROWS - 1:
+                        sheet, row_index = add_sheet()
+                    if numcols > 1:
+                        sheet.merge_range(row_index, 0, row_index, numcols - 1,
+                                          subheading, styles["subheader"])
+                    else:
+                        sheet.write_string(row_index, 0, subheading,
+                                           styles["subheader"])
+                    row_index += 1
+
+            if row_index >= MAX_ROWS:
+                sheet, row_index = add_sheet()
+
+            if evenodd and numrows % 2:
+                row_styles = styles["even"]
+            else:
+                row_styles = styles["odd"]
+            numrows += 1
+
+            raw = row.get("_row") or {}
+            for col_index, (colname, label, ftype) in enumerate(columns):
+
+                represent = row.get(colname)
+                if represent is None:
+                    represent = ""
+                else:
+                    represent = s3_strip_markup(s3_unicode(represent))
+                if len(represent) > MAX_CELL_SIZE:
+                    represent = represent[:MAX_CELL_SIZE]
+
+                value = raw.get(colname)
+                written = False
+                if value is not None and not isinstance(value, list):
+                    if ftype in ("date", "datetime", "time"):
+                        if gregorian and \
+                           isinstance(value, (datetime.date, datetime.time)):
+                            if utc_offset and \
+                               isinstance(value, datetime.datetime):
+                                value = value + utc_offset
+                            sheet.write_datetime(row_index, col_index,
+                                                 value, row_styles[ftype])
+                            written = True
+                    elif ftype in ("integer", "double") or \
+                         ftype[:7] == "decimal":
+                        # Only write as number if the representation
+                        # is a number (i.e. not an option label)
+                        number = represent.replace(thousands_separator, "") \
+                                          .replace(decimal_separator, ".")
+                        try:
+                            number = float(number)
+                        except ValueError:
+                            pass
+                        else:
+                            if ftype == "integer":
+                                numeric = number == value
+                            else:
+                                value = float(value)
+                                numeric = True
+                            if numeric:
+                                style = row_styles["integer"] \
+                                        if ftype == "integer" \
+                                        else row_styles["double"]
+                                sheet.write_number(row_index, col_index,
+                                                   value, style)
+                                written = True
+                if not written:
+                    sheet.write_string(row_index, col_index,
+                                       represent, row_styles["string"])
+
+                width = len(represent)
+                if width > widths[col_index]:
+                    widths[col_index] = width
+
+            row_index += 1
+
+        # Column widths
+        MAX_COL_WIDTH = self.MAX_COL_WIDTH
+        for sheet in sheets:
+            for col_index, width in enumerate(widths):
+                sheet.set_column(col_index, col_index,
+                                 min(width + 2, MAX_COL_WIDTH))
+
+        book.close()
+        output.seek(0)
+
+        # Response headers
+        request = current.request
+        filename = "%s_%s.xlsx" % (request.env.server_name,
+                                   title.encode("utf-8"))
+        disposition = "attachment; filename=\"%s\"" % filename
+        response = current.response
+        response.headers["Content-Type"] = contenttype(".xlsx")
+        response.headers["Content-disposition"] = disposition
+
+        return response.stream(output, chunk_size=DEFAULT_CHUNK_SIZE,
+                               request=request)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def _styles(cls, book, use_colour=False, evenodd=True):
+        """
+            XLSX encoder standard cell styles
+
+            @param book: the xlsxwriter Workbook
+            @param use_colour: use background colour in cells
+            @param evenodd: render different background colours
+                            for even/odd rows ("stripes")
+
+            @return: dict of styles, the "odd" and "even" styles are
+                     dicts {type: style}
+        """
+
+        settings = current.deployment_settings
+        dt_format_translate = S3XLS.dt_format_translate
+        date_format = dt_format_translate(settings.get_L10n_date_format())
+        time_format = dt_format_translate(settings.get_L10n_time_format())
+        datetime_format = dt_format_translate(settings.get_L10n_datetime_format())
+
+        add_format = book.add_format
+
+        large_header = {"bold": True, "font_size": 20}
+        header = {"bold": True}
+        subheader = {"bold": True}
+        if use_colour:
+            large_header.update(align = "center",
+                                bg_color = cls.LARGE_HEADER_COLOUR,
+                                )
+            header["bg_color"] = cls.HEADER_COLOUR
+            subheader["bg_color"] = cls.SUB_HEADER_COLOUR
+
+        notes = {"italic": True, "font_size": 8}
+
+        styles = {"large_header": add_format(large_header),
+                  "header": add_format(header),
+                  "subheader": add_format(subheader),
+                  "notes": add_format(notes),
+                  "notes_datetime": add_format(dict(notes,
+                                                    num_format = datetime_format,
+                                                    )),
+                  }
+
+        # Row styles per column type
+        num_formats = {"date": date_format,
+                       "datetime": datetime_format,
+                       "time": time_format,
+                       "integer": "0",
+                       "double": "0.00",
+                       "string": None,
+                       }
+        colours = cls.ROW_ALTERNATING_COLOURS
+        for index, name in enumerate(("odd", "even")):
+            row_styles = {}
+            for ftype, num_format in num_formats.items():
+                style = {}
+                if num_format:
+                    style["num_format"] = num_format
+                if use_colour and evenodd:
+                    style["bg_color"] = colours[index]
+                row_styles[ftype] = add_format(style)
+            styles[name] = row_styles
+
+        return styles
+
+# END =========================================================================
@@ -56,6 +56,7 @@ from gluon.tools import callback
 
 from s3datetime import S3DateTime
 from s3export import S3Exporter
+from s3fields import S3RepresentCache
 from s3forms import S3SQLDefaultForm
 from s3rest import S3Method
 from s3utils import s3_unicode, s3_validate, s3_represent_value, s3_set_extension
@@ -759,6 +760,11 @@ class S3CRUD(S3Method):
             exporter = S3Exporter().xls
             output = exporter(resource, list_fields=list_fields)
 
+        elif representation == "xlsx":
+            list_fields = resource.list_fields()
+            exporter = S3Exporter().xlsx
+            output = exporter(resource, list_fields=list_fields)
+
         elif representation == "json":
             exporter = S3Exporter().json
 
@@ -1319,6 +1325,14 @@ class S3CRUD(S3Method):
                             report_groupby=report_groupby,
                             **attr)
 
+        elif representation == "xlsx":
+            report_groupby = get_config("report_groupby", None)
+            exporter = S3Exporter().xlsx
+            return exporter(resource,
+                            list_fields=list_fields,
+                            report_groupby=report_groupby,
+                            **attr)
+
         elif representation == "msg":
             if r.http == "POST":
                 from s3notify import S3Notifications
@@ -2866,6 +2880,8 @@ class S3CRUD(S3Method):
                     if update_realm:
                         current.auth.set_realm_entity(table, selected,
                                                       force_update=True)
+                    # Forget cached representations
+                    S3RepresentCache.expire_records(component, [selected])
                     # Onaccept
                     onaccept = get_config("update_onaccept") or \
                                get_config("onaccept")
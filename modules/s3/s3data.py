@@ -112,6 +112,9 @@ class S3DataTable(object):
         self.end = end
         self.filterString = filterString
 
+        # Whether the number of records is an estimate
+        self.estimated = False
+
         if orderby:
 
             # Resolve orderby expression into column names
@@ -285,6 +288,7 @@ class S3DataTable(object):
                    '''i18n.info="%s"''' % T("Showing _START_ to _END_ of _TOTAL_ entries"),
                    '''i18n.infoEmpty="%s"''' % T("Showing 0 to 0 of 0 entries"),
                    '''i18n.infoFiltered="%s"''' % T("(filtered from _MAX_ total entries)"),
+                   '''i18n.infoEstimated="%s"''' % T("Showing _START_ to _END_ of about _TOTAL_ entries"),
                    '''i18n.infoThousands="%s"''' % current.deployment_settings.get_L10n_thousands_separator(),
                    '''i18n.lengthMenu="%s"''' % (T("Show %(number)s entries") % {"number": "_MENU_"}),
                    '''i18n.loadingRecords="%s"''' % T("Loading"),
@@ -479,9 +483,12 @@ class S3DataTable(object):
                 if any(rfield.fname in kml_fields for rfield in rfields):
                     formats["kml"] = default_url
 
-            default_formats = ("xml", "rss", "xls", "pdf")
+            default_formats = ("xml", "rss", "xls", "xlsx", "pdf")
             EXPORT = T("Export in %(format)s format")
 
+            export_async = settings.get_ui_export_async()
+            async_formats = settings.get_ui_export_async_formats()
+
             append_icon = icons.append
             for fmt in export_formats:
 
@@ -493,6 +500,10 @@ class S3DataTable(object):
                 if not url:
                     continue
 
+                # Run as asynchronous export job?
+                if export_async and fmt in async_formats:
+                    url = "%s%sasync=1" % (url, "&" if "?" in url else "?")
+
                 # Onhover title for the icon
                 if fmt == "map":
                     title = T("Show on Map")
@@ -917,6 +928,8 @@ class S3DataTable(object):
         structure["data"] = aadata
         structure["recordsTotal"] = totalrows
         structure["recordsFiltered"] = displayrows
+        if self.estimated:
+            structure["recordsEstimated"] = True
         structure["draw"] = draw
         if stringify:
             from gluon.serializers import json as jsons
@@ -258,6 +258,12 @@ class S3Calendar(object):
 
     FIRST_DOW = 1 # Monday
 
+    # Per-process caches (shared by all calendars):
+    # - parsers {(calendar, format, language): S3DateTimeParser}
+    PARSERS = {}
+    # - date conversions {(calendar, target, y, m, d): (y, m, d)}
+    CONVERSIONS = {}
+
     # -------------------------------------------------------------------------
     # Methods to be implemented by subclasses
     # -------------------------------------------------------------------------
@@ -465,6 +471,40 @@ class S3Calendar(object):
 
         return self.calendar._format(dt, dtfmt)
 
+    # -------------------------------------------------------------------------
+    def parse_dates(self, values, dtfmt=None, local=False, time=False):
+        """
+            Parse a list of date strings according to this calendar,
+            parsing each distinct string only once
+
+            @param values: the date strings (iterable)
+            @param dtfmt: the date format, overrides default
+            @param local: whether the default format is local (=deployment
+                          setting) or ISO
+            @param time: parse date+time rather than just dates
+            @return: list of dates (or datetimes), in order of values
+        """
+
+        method = self.parse_datetime if time else self.parse_date
+        return self._batch(method, values, dtfmt, local)
+
+    # -------------------------------------------------------------------------
+    def format_dates(self, values, dtfmt=None, local=False, time=False):
+        """
+            Format a list of dates according to this calendar,
+            formatting each distinct date only once
+
+            @param values: the dates (iterable)
+            @param dtfmt: the date format, overrides default
+            @param local: whether the default format is local (=deployment
+                          setting) or ISO
+            @param time: format date+time rather than just dates
+            @return: list of strings, in order of values
+        """
+
+        method = self.format_datetime if time else self.format_date
+        return self._batch(method, values, dtfmt, local)
+
     # -------------------------------------------------------------------------
     # Base class methods (must not be implemented by subclasses):
     # -------------------------------------------------------------------------
@@ -523,19 +563,60 @@ class S3Calendar(object):
 
         return calendar
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _batch(method, values, dtfmt, local):
+        """
+            Apply a parse/format method to a list of values, calling
+            it only once per distinct value
+
+            @param method: the method
+            @param values: the values (iterable)
+            @param dtfmt: the date/time format
+            @param local: whether the default format is local or ISO
+
+            @return: list of results, in order of values
+        """
+
+        results = {}
+        output = []
+        append = output.append
+        for value in values:
+            try:
+                result = results[value]
+            except KeyError:
+                result = results[value] = method(value, dtfmt=dtfmt, local=local)
+            except TypeError:
+                # Unhashable value
+                result = method(value, dtfmt=dtfmt, local=local)
+            append(result)
+        return output
+
     # -------------------------------------------------------------------------
     def _get_parser(self, dtfmt):
+        """
+            Get a parser for a date/time format, parsers are cached per
+            process for each combination of calendar, format and language
+            (month names and AM/PM are translated)
+
+            @param dtfmt: the date/time format
+            @return: the S3DateTimeParser, or None for the Gregorian
+                     calendar (which uses strptime)
+        """
 
         # Gregorian calendar does not use a parser
-        if self.name == "Gregorian":
+        name = self.name
+        if name == "Gregorian":
             return None
 
-        # Configure the parser
-        parser = self._parser
+        parsers = S3Calendar.PARSERS
+        key = (name, dtfmt, current.T.accepted_language)
+        parser = parsers.get(key)
         if parser is None:
             parser = S3DateTimeParser(self, dtfmt)
-        else:
-            parser.set_format(dtfmt)
+            if len(parsers) >= 1000:
+                parsers.clear()
+            parsers[key] = parser
         self._parser = parser
 
         return parser
@@ -547,7 +628,12 @@ class S3Calendar(object):
         parser = self._get_parser(dtfmt)
 
         if not parser:
-            # Gregorian calendar - use strptime
+            # Gregorian calendar - try the compiled format first
+            timetuple = S3GregorianFormat.get(dtfmt).parse(dtstr)
+            if timetuple is not None:
+                return timetuple
+
+            # Fall back to strptime
             try:
                 timetuple = time.strptime(dtstr, dtfmt)
             except ValueError, e:
@@ -576,7 +662,11 @@ class S3Calendar(object):
         """
 
         if self.name == "Gregorian":
-            # Gregorian Calendar uses strftime
+            # Gregorian Calendar uses the compiled format, or strftime
+            dtstr = S3GregorianFormat.get(dtfmt).format(dt)
+            if dtstr is not None:
+                return dtstr
+
             fmt = str(dtfmt)
             try:
                 dtstr = dt.strftime(fmt)
@@ -620,8 +710,7 @@ class S3Calendar(object):
             return timetuple
 
         y, m, d, hh, mm, ss = timetuple
-        jd = self._gregorian_to_jd(y, m, d)
-        y, m, d = self.from_jd(jd)
+        y, m, d = self._convert(y, m, d, self.CALENDAR)
 
         return (y, m, d, hh, mm, ss)
 
@@ -639,11 +728,38 @@ class S3Calendar(object):
             return timetuple
 
         y, m, d, hh, mm, ss = timetuple
-        jd = self.to_jd(y, m, d)
-        y, m, d = self._jd_to_gregorian(jd)
+        y, m, d = self._convert(y, m, d, "Gregorian")
 
         return (y, m, d, hh, mm, ss)
 
+    # -------------------------------------------------------------------------
+    def _convert(self, year, month, day, target):
+        """
+            Convert a date between the Gregorian calendar and this
+            calendar via Julian day number, conversions are memoized
+            per process (dates in a data set usually repeat a lot)
+
+            @param year: the year number
+            @param month: the month number
+            @param day: the day-of-month number
+            @param target: the target calendar, CALENDAR or "Gregorian"
+
+            @return: tuple (year, month, day)
+        """
+
+        conversions = S3Calendar.CONVERSIONS
+        key = (self.CALENDAR, target, year, month, day)
+        result = conversions.get(key)
+        if result is None:
+            if target == "Gregorian":
+                result = self._jd_to_gregorian(self.to_jd(year, month, day))
+            else:
+                result = self.from_jd(self._gregorian_to_jd(year, month, day))
+            if len(conversions) >= 100000:
+                conversions.clear()
+            conversions[key] = result
+        return result
+
     # -------------------------------------------------------------------------
     @staticmethod
     def _gregorian_to_jd(year, month, day):
@@ -1487,6 +1603,169 @@ class S3DateTimeFormatter(object):
 
         return "".join(result)
 
+# =============================================================================
+class S3GregorianFormat(object):
+    """
+        Compiled date/time format for the Gregorian calendar
+
+        - parses with a precompiled regular expression (same patterns
+          as strptime), for formats with numeric directives only
+          (%Y %y %m %d %H %M %S and %%)
+        - formats with isoformat for the ISO formats
+        - other formats/values fall back to strptime/strftime
+    """
+
+    # Patterns as used by strptime
+    PATTERNS = {"Y": r"(?P<Y>\d\d\d\d)",
+                "y": r"(?P<y>\d\d)",
+                "m": r"(?P<m>1[0-2]|0[1-9]|[1-9])",
+                "d": r"(?P<d>3[01]|[12]\d|0[1-9]|[1-9]| [1-9])",
+                "H": r"(?P<H>2[0-3]|[0-1]\d|\d)",
+                "M": r"(?P<M>[0-5]\d|\d)",
+                "S": r"(?P<S>6[0-1]|[0-5]\d|\d)",
+                }
+
+    # Compiled formats {format: S3GregorianFormat}
+    FORMATS = {}
+
+    def __init__(self, dtfmt):
+        """
+            Constructor
+
+            @param dtfmt: the date/time format
+        """
+
+        self.regex = None
+        self.iso = None
+
+        if not isinstance(dtfmt, basestring):
+            # Not supported
+            return
+
+        if dtfmt == "%Y-%m-%d":
+            self.iso = "date"
+        elif dtfmt == ISOFORMAT:
+            self.iso = "datetime"
+
+        PATTERNS = self.PATTERNS
+
+        pattern = []
+        directives = set()
+
+        rule = False
+        for c in dtfmt:
+            if rule:
+                rule = False
+                if c == "%":
+                    pattern.append("%")
+                elif c in PATTERNS and c not in directives:
+                    directives.add(c)
+                    pattern.append(PATTERNS[c])
+                else:
+                    # Not supported
+                    return
+            elif c == "%":
+                rule = True
+            elif c.isspace():
+                if not pattern or pattern[-1] != r"\s+":
+                    pattern.append(r"\s+")
+            else:
+                pattern.append(re.escape(c))
+
+        if not rule:
+            self.regex = re.compile("".join(pattern), re.IGNORECASE)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def get(cls, dtfmt):
+        """
+            Get the compiled format (cached per process)
+
+            @param dtfmt: the date/time format
+            @return: the S3GregorianFormat
+        """
+
+        if not isinstance(dtfmt, basestring):
+            return cls(None)
+
+        formats = cls.FORMATS
+        compiled = formats.get(dtfmt)
+        if compiled is None:
+            compiled = cls(dtfmt)
+            if len(formats) >= 1000:
+                formats.clear()
+            formats[dtfmt] = compiled
+        return compiled
+
+    # -------------------------------------------------------------------------
+    def parse(self, dtstr):
+        """
+            Parse a date/time string
+
+            @param dtstr: the date/time string
+            @return: a timetuple (y, m, d, hh, mm, ss), or None if the
+                     format is not supported or the string doesn't match
+                     (=fall back to strptime)
+
+            @raises ValueError: for invalid dates
+            @raises TypeError: for invalid argument types
+        """
+
+        regex = self.regex
+        if regex is None:
+            return None
+
+        match = regex.match(dtstr)
+        if not match or match.end() != len(dtstr):
+            return None
+
+        values = match.groupdict()
+
+        year = values.get("Y")
+        if year is not None:
+            year = int(year)
+        else:
+            year = values.get("y")
+            if year is not None:
+                # Same as strptime (POSIX)
+                year = int(year)
+                year += 1900 if year >= 69 else 2000
+            else:
+                year = 1900
+        month = int(values.get("m") or 1)
+        day = int(values.get("d") or 1)
+
+        # Validate the date
+        datetime.date(year, month, day)
+
+        return (year,
+                month,
+                day,
+                int(values.get("H") or 0),
+                int(values.get("M") or 0),
+                int(values.get("S") or 0),
+                )
+
+    # -------------------------------------------------------------------------
+    def format(self, dt):
+        """
+            Format a date/time
+
+            @param dt: the date (datetime.date or datetime.datetime)
+            @return: the date/time string, or None if not an ISO format
+                     (=fall back to strftime)
+        """
+
+        iso = self.iso
+        if iso == "date":
+            if isinstance(dt, datetime.date):
+                return dt.isoformat()[:10]
+        elif iso == "datetime":
+            if isinstance(dt, datetime.datetime) and \
+               not dt.microsecond and dt.tzinfo is None:
+                return dt.isoformat()
+        return None
+
 # =============================================================================
 # Date/Time Parser and Formatter (@todo: integrate with S3Calendar)
 #
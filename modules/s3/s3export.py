@@ -31,12 +31,31 @@
     OTHER DEALINGS IN THE SOFTWARE.
 """
 
-__all__ = ("S3Exporter",)
-
-from gluon import current
+__all__ = ("S3ExportJob",
+           "S3Exporter",
+           )
+
+import datetime
+import hashlib
+import os
+import re
+
+try:
+    import json # try stdlib (Python 2.6)
+except ImportError:
+    try:
+        import simplejson as json # try external module
+    except:
+        import gluon.contrib.simplejson as json # fallback to pure-Python module
+
+from gluon import current, redirect, A, DIV, HTTP, P, URL
+from gluon.contenttype import contenttype
 from gluon.storage import Storage
 
 from s3codec import S3Codec
+from s3query import S3Joins, S3URLQuery
+from s3rest import S3Method, S3Request
+from s3utils import s3_get_foreign_key, s3_table_version, s3_unicode
 
 # =============================================================================
 class S3Exporter(object):
@@ -234,4 +253,615 @@ class S3Exporter(object):
         codec = S3Codec.get_codec("xls").encode
         return codec(*args, **kwargs)
 
+    # -------------------------------------------------------------------------
+    def xlsx(self, *args, **kwargs):
+
+        codec = S3Codec.get_codec("xlsx").encode
+        return codec(*args, **kwargs)
+
+# =============================================================================
+class S3ExportJob(S3Method):
+    """
+        Asynchronous exports
+
+        - an export request (any format in settings.ui.export_async_formats)
+          is queued as export job, instead of being run inside the web
+          request, by adding async=1 to its URL, e.g.:
+            org/organisation.xls?async=1&organisation.name__like=A*
+        - the job is run by the s3_export_job task, which writes the file
+          to the export folder (settings.ui.export_async_folder)
+        - identical exports (same URL, filters and user realms) are
+          de-duplicated, i.e. they are only queued once, and the file is
+          re-used for as long as the data in the table remain unchanged
+        - files expire by age (settings.ui.export_async_expire) and by
+          the total disk quota of the export folder (settings.ui.
+          export_async_quota)
+
+        The job status and the download are available via the export
+        method of the resource:
+
+            GET <c>/<f>/export?job=<id>           ...status page/download link
+            GET <c>/<f>/export.json?job=<id>      ...status as JSON
+            GET <c>/<f>/export?job=<id>&download=1 ...download the file
+    """
+
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+
+    # -------------------------------------------------------------------------
+    def apply_method(self, r, **attr):
+        """
+            Entry point for REST interface
+
+            @param r: the S3Request
+            @param attr: additional controller parameters
+        """
+
+        if r.http != "GET":
+            r.error(405, current.ERROR.BAD_METHOD)
+
+        job = self.get_job(r, r.get_vars.get("job"))
+        if not job or job.tablename != r.tablename:
+            r.error(404, current.ERROR.BAD_RECORD)
+
+        if r.representation == "json":
+            current.response.headers["Content-Type"] = "application/json"
+            return json.dumps(self.status(r, job))
+
+        elif r.representation == "html":
+            if r.get_vars.get("download"):
+                return self.download(job)
+            else:
+                return self.status_page(r, job)
+
+        else:
+            r.error(415, current.ERROR.BAD_FORMAT)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def queue(cls, r, **attr):
+        """
+            Queue an export job for a request, or find an existing job
+            for an identical export, and redirect to its status
+
+            @param r: the S3Request
+            @param attr: controller parameters
+        """
+
+        db = current.db
+        s3db = current.s3db
+        table = s3db.s3_export_job
+
+        get_vars = dict((k, v) for k, v in r.get_vars.items()
+                        if k != "async")
+
+        # The export configuration after prep
+        config = {}
+        get_config = r.resource.get_config
+        for key in ("list_fields", "report_groupby"):
+            value = get_config(key)
+            if value is None:
+                continue
+            try:
+                json.dumps(value)
+            except (TypeError, ValueError):
+                # Can not be passed to the task (e.g. lazyT labels)
+                continue
+            config[key] = value
+
+        # The filters after prep (i.e. including response.s3.filter and
+        # any filters added by the controller), to re-apply in the task
+        query, vfilter = cls.filters(r.resource)
+
+        request = {"prefix": r.prefix,
+                   "name": r.name,
+                   "c": r.controller,
+                   "f": r.function,
+                   "args": r.args,
+                   "vars": get_vars,
+                   "extension": r.representation,
+                   "language": current.session.s3.language,
+                   "config": config,
+                   "query": query,
+                   "vfilter": vfilter,
+                   }
+
+        job_key = hashlib.md5(json.dumps([request["c"],
+                                          request["f"],
+                                          request["args"],
+                                          request["extension"],
+                                          sorted(get_vars.items()),
+                                          request["language"],
+                                          query,
+                                          sorted(vfilter.items()) if vfilter else None,
+                                          ])).hexdigest()
+        realm_key = cls.realm_key(r)
+        version = cls.version(r.resource)
+
+        # Find an identical export job
+        query = (table.job_key == job_key) & \
+                (table.realm_key == realm_key) & \
+                (table.version == version) & \
+                (table.status.belongs((cls.QUEUED,
+                                       cls.RUNNING,
+                                       cls.COMPLETED,
+                                       )))
+        job = db(query).select(table.id,
+                               table.status,
+                               table.file,
+                               limitby = (0, 1),
+                               orderby = ~table.id,
+                               ).first()
+        if job and job.status == cls.COMPLETED and \
+           not os.path.exists(os.path.join(cls.folder(), job.file or "")):
+            # File has been removed
+            job = None
+
+        if job:
+            job_id = job.id
+        else:
+            auth = current.auth
+            job_id = table.insert(job_key = job_key,
+                                  realm_key = realm_key,
+                                  version = version,
+                                  user_id = auth.user.id if auth.user else None,
+                                  tablename = r.tablename,
+                                  format = r.representation,
+                                  request = request,
+                                  status = cls.QUEUED,
+                                  )
+            # Commit before the worker can pick up the task
+            db.commit()
+            if current.s3task.async("s3_export_job", args=[job_id]) is False:
+                # Task not available => run the export right away
+                cls.run(job_id)
+
+        url = URL(c = r.controller,
+                  f = r.function,
+                  args = ["export"],
+                  vars = {"job": job_id},
+                  )
+        if r.get_vars.get("async") == "json":
+            # Return the status URL for scripts
+            current.response.headers["Content-Type"] = "application/json"
+            return json.dumps({"job": job_id,
+                               "status": url,
+                               })
+        else:
+            # Show the status page
+            redirect(url)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def run(cls, job_id):
+        """
+            Run an export job
+            - run inside the s3_export_job task
+
+            @param job_id: the s3_export_job record ID
+
+            @return: the job status
+        """
+
+        db = current.db
+        table = current.s3db.s3_export_job
+
+        job = db(table.id == job_id).select(table.id,
+                                            table.status,
+                                            table.request,
+                                            limitby = (0, 1),
+                                            ).first()
+        if not job or job.status != cls.QUEUED:
+            return None
+
+        job.update_record(status = cls.RUNNING)
+        db.commit()
+
+        folder = cls.folder()
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+        filename = "%s.%s" % (job.id, job.request["extension"])
+        path = os.path.join(folder, filename)
+        try:
+            output, total = cls.export(job)
+            with open(path, "wb") as f:
+                if isinstance(output, basestring):
+                    f.write(output)
+                elif hasattr(output, "read"):
+                    chunk = output.read(65536)
+                    while chunk:
+                        f.write(chunk)
+                        chunk = output.read(65536)
+                else:
+                    # Streamer
+                    for chunk in output:
+                        f.write(chunk)
+        except Exception, e:
+            db.rollback()
+            if isinstance(e, HTTP):
+                error = "%s %s" % (e.status, e.body)
+            else:
+                error = s3_unicode(e)
+            current.log.error("Export job %s failed: %s" % (job_id, error))
+            if os.path.exists(path):
+                os.remove(path)
+            job.update_record(status = cls.FAILED,
+                              error = error,
+                              )
+        else:
+            headers = current.response.headers
+            match = re.search(r'filename="?([^";]+)"?',
+                              headers.get("Content-disposition") or "")
+            if match:
+                download = match.group(1)
+            else:
+                download = filename
+            job.update_record(status = cls.COMPLETED,
+                              done = total,
+                              file = filename,
+                              filename = download,
+                              content_type = headers.get("Content-Type"),
+                              size = os.path.getsize(path),
+                              )
+        db.commit()
+
+        # Remove expired files
+        cls.cleanup()
+
+        return job.status
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def filters(resource):
+        """
+            Get the effective filters of a resource, in a form that can
+            be passed to the export task
+
+            @param resource: the S3Resource (after prep)
+
+            @return: tuple (query, vfilter), where query is a subquery
+                     (SQL string) for the IDs of the matching records, and
+                     vfilter the virtual field filter as URL vars (or None)
+        """
+
+        table = resource.table
+        tablename = resource.tablename
+
+        rfilter = resource.rfilter
+        if rfilter is None:
+            resource.build_query()
+            rfilter = resource.rfilter
+
+        query = rfilter.get_query()
+        ijoins = S3Joins(tablename, rfilter.get_joins(left=False))
+        ljoins = S3Joins(tablename, rfilter.get_joins(left=True))
+        subquery = current.db(query)._select(table._id,
+                                             join = ijoins.as_list(prefer=ljoins),
+                                             left = ljoins.as_list(),
+                                             distinct = True,
+                                             )
+
+        vfilter = rfilter.get_filter()
+        if vfilter is not None:
+            vfilter = dict(vfilter.serialize_url(resource))
+        else:
+            vfilter = None
+
+        return subquery, vfilter
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def version(resource):
+        """
+            Get a version stamp of the data to export, i.e. of the table
+            of the resource, the tables of its list fields, and the tables
+            referenced by them (for representation)
+
+            @param resource: the S3Resource (after prep)
+
+            @return: the version stamp (hash of the table version counters,
+                     see s3_table_version)
+        """
+
+        tablenames = set([resource.tablename])
+
+        rfields = resource.resolve_selectors(resource.list_fields())[0]
+        for rfield in rfields:
+            tablenames.add(rfield.tname)
+            field = rfield.field
+            if field is not None:
+                ktablename = s3_get_foreign_key(field, m2m=False)[0]
+                if ktablename:
+                    tablenames.add(ktablename)
+
+        versions = ["%s:%s" % (tablename, s3_table_version(tablename))
+                    for tablename in sorted(tablenames)]
+        return hashlib.md5("|".join(versions)).hexdigest()
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def export(cls, job):
+        """
+            Run the export request of a job
+
+            @param job: the s3_export_job Row
+
+            @return: tuple (output, total), where output is the export
+                     data (string, file or streamer), and total the number
+                     of records exported
+
+            @note: the controller (and its prep) does not run here, instead
+                   the filters stored by queue() get applied to the resource
+        """
+
+        db = current.db
+
+        request = Storage(job.request)
+        if request.language:
+            current.T.force(request.language)
+            current.session.s3.language = request.language
+
+        r = S3Request(request.prefix,
+                      request.name,
+                      c = request.c,
+                      f = request.f,
+                      args = request.args,
+                      get_vars = Storage(request.vars),
+                      extension = request.extension,
+                      http = "GET",
+                      )
+        r.customise_resource()
+
+        resource = r.resource
+        if request.config:
+            resource.configure(**request.config)
+
+        # Re-apply the filters of the original request
+        if request.query:
+            resource.add_filter(resource.table._id.belongs(request.query))
+        if request.vfilter:
+            queries = S3URLQuery.parse(resource, request.vfilter)
+            for alias in queries:
+                for q in queries[alias]:
+                    resource.add_filter(q)
+
+        total = resource.count()
+        job.update_record(total = total)
+        db.commit()
+
+        # Report progress from paged extractions (see S3Resource.iterselect)
+        progress = Storage(done=0,
+                           updated=datetime.datetime.utcnow(),
+                           )
+        def update_progress(count):
+            progress.done += count
+            now = datetime.datetime.utcnow()
+            if (now - progress.updated).seconds >= 2:
+                job.update_record(done = progress.done)
+                db.commit()
+                progress.updated = now
+        current.response.s3.select_progress = update_progress
+
+        try:
+            output = r()
+        finally:
+            current.response.s3.select_progress = None
+
+        if isinstance(output, dict):
+            # Not an export
+            raise HTTP(400, current.ERROR.BAD_REQUEST)
+
+        return output, total
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def cleanup(cls):
+        """
+            Remove export files which have expired, and the oldest
+            export files in excess of the disk quota
+        """
+
+        db = current.db
+        table = current.s3db.s3_export_job
+        settings = current.deployment_settings
+
+        folder = cls.folder()
+
+        # Expired jobs
+        expire = settings.get_ui_export_async_expire()
+        earliest = current.request.utcnow - datetime.timedelta(seconds=expire)
+        query = (table.created_on < earliest) & \
+                (table.status != cls.RUNNING)
+        rows = db(query).select(table.id, table.file)
+        remove = [row.id for row in rows]
+        files = [row.file for row in rows]
+
+        # Jobs in excess of the quota (most recent first)
+        quota = settings.get_ui_export_async_quota()
+        if quota:
+            quota = quota * 1048576
+            query = (table.created_on >= earliest) & \
+                    (table.status == cls.COMPLETED)
+            rows = db(query).select(table.id,
+                                    table.file,
+                                    table.size,
+                                    orderby = ~table.created_on,
+                                    )
+            total = 0
+            for row in rows:
+                total += row.size or 0
+                if total > quota:
+                    remove.append(row.id)
+                    files.append(row.file)
+
+        for filename in files:
+            if not filename:
+                continue
+            path = os.path.join(folder, filename)
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    current.log.error("Could not remove %s" % path)
+        if remove:
+            db(table.id.belongs(remove)).delete()
+            db.commit()
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def get_job(cls, r, job_id):
+        """
+            Get an export job, if accessible for the current user
+
+            @param r: the S3Request
+            @param job_id: the s3_export_job record ID
+
+            @return: the s3_export_job Row, or None
+        """
+
+        try:
+            job_id = int(job_id)
+        except (TypeError, ValueError):
+            return None
+
+        table = current.s3db.s3_export_job
+        query = (table.id == job_id) & \
+                (table.realm_key == cls.realm_key(r))
+        return current.db(query).select(table.ALL,
+                                        limitby = (0, 1),
+                                        ).first()
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def status(cls, r, job):
+        """
+            Get the status of an export job
+
+            @param r: the S3Request
+            @param job: the s3_export_job Row
+
+            @return: the status as dict
+        """
+
+        status = {"job": job.id,
+                  "status": job.status,
+                  "done": job.done,
+                  "total": job.total,
+                  }
+        if job.status == cls.COMPLETED:
+            status["size"] = job.size
+            status["download"] = URL(c = r.controller,
+                                     f = r.function,
+                                     args = ["export"],
+                                     vars = {"job": job.id,
+                                             "download": 1,
+                                             },
+                                     )
+        elif job.status == cls.FAILED:
+            status["error"] = job.error
+        return status
+
+    # -------------------------------------------------------------------------
+    def status_page(self, r, job):
+        """
+            Render the status page of an export job
+
+            @param r: the S3Request
+            @param job: the s3_export_job Row
+        """
+
+        T = current.T
+        response = current.response
+
+        status = self.status(r, job)
+
+        if job.status == self.COMPLETED:
+            item = DIV(P(T("The export is complete.")),
+                       A(T("Download"),
+                         _href = status["download"],
+                         _class = "action-btn",
+                         ),
+                       )
+        elif job.status == self.FAILED:
+            item = DIV(P(T("The export has failed.")),
+                       _class = "error",
+                       )
+        else:
+            if job.status == self.RUNNING and job.total:
+                message = T("Exporting: %(done)s of %(total)s records") % \
+                            {"done": job.done, "total": job.total}
+            else:
+                message = T("The export is queued.")
+            item = DIV(P(message), P(T("This page will refresh automatically.")))
+            response.headers["Refresh"] = "5"
+
+        response.view = self._view(r, "display.html")
+        return {"title": T("Export"),
+                "item": item,
+                }
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def download(cls, job):
+        """
+            Stream the file of a completed export job
+
+            @param job: the s3_export_job Row
+        """
+
+        response = current.response
+
+        path = os.path.join(cls.folder(), job.file or "")
+        if job.status != cls.COMPLETED or not os.path.exists(path):
+            raise HTTP(404, current.ERROR.BAD_RECORD)
+
+        response.headers["Content-Type"] = job.content_type or \
+                                           contenttype(".%s" % job.format)
+        response.headers["Content-disposition"] = \
+                                "attachment; filename=\"%s\"" % job.filename
+        return response.stream(open(path, "rb"),
+                               request = current.request,
+                               )
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def folder():
+        """ The export folder """
+
+        folder = current.deployment_settings.get_ui_export_async_folder()
+        if not folder:
+            folder = os.path.join(current.request.folder, "uploads", "exports")
+        return folder
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def realm_key(r=None):
+        """
+            Get a key for the realms of the current user, so that jobs
+            can be shared between users with the same permissions
+
+            @param r: the S3Request - if the user may need to own records
+                      in its table in order to access them, then the key
+                      is specific for the user
+        """
+
+        auth = current.auth
+        user = auth.user
+        if user:
+            realms = dict((str(k), sorted(v) if v else v)
+                          for k, v in (user.realms or {}).items())
+            if r is not None and \
+               auth.permission.ownership_required("read",
+                                                  r.resource.table,
+                                                  c = r.controller,
+                                                  f = r.function,
+                                                  ):
+                realms = {"user": user.id, "realms": realms}
+        else:
+            realms = None
+        return hashlib.md5(json.dumps(realms, sort_keys=True)).hexdigest()
+
 # End =========================================================================
@@ -30,10 +30,20 @@
 """
 
 import datetime
+import hashlib
 import sys
+import threading
+import time
 from itertools import chain
 from uuid import uuid4
 
+try:
+    # Python 2.7
+    from collections import OrderedDict
+except:
+    # Python 2.6
+    from gluon.contrib.simplejson.ordered_dict import OrderedDict
+
 from gluon import *
 # Here are dependencies listed for reference:
 #from gluon import current
@@ -221,9 +231,27 @@ class S3Represent(object):
                                                     represent_row,
                                                     link
         @group Internal Methods: _setup,
-                                 _lookup
+                                 _lookup,
+                                 _cache_key
     """
 
+    # Attributes which do not belong to the configuration
+    VOLATILE = set(("theset",
+                    "rows",
+                    "queries",
+                    "lazy",
+                    "lazy_show_link",
+                    "setup",
+                    "cache",
+                    "table",
+                    "slabels",
+                    "clabels",
+                    "htemplate",
+                    "func_code",
+                    "func_defaults",
+                    "_signature",
+                    ))
+
     def __init__(self,
                  lookup=None,
                  key=None,
@@ -280,6 +308,7 @@ class S3Represent(object):
         self.setup = False
         self.theset = None
         self.queries = 0
+        self.cache = None
         self.lazy = []
         self.lazy_show_link = False
 
@@ -605,6 +634,18 @@ class S3Represent(object):
         else:
             self.htemplate = "%s > %s"
 
+        # Second-level cache (not for hierarchical representations, and
+        # not if a custom link method would need the rows)
+        if self.table is not None and \
+           self.options is None and \
+           not self.hierarchy and \
+           (not self.show_link or
+            type(self).link.im_func is S3Represent.link.im_func):
+            self.cache = S3RepresentCache.instance()
+        else:
+            self.cache = None
+        self._signature = None
+
         self.setup = True
         return
 
@@ -685,6 +726,17 @@ class S3Represent(object):
                 if pop(k, None):
                     items[keys.get(k, k)] = theset[k]
 
+        # Try the second-level cache
+        cache = self.cache
+        if lookup and cache is not None:
+            cache_key = self._cache_key()
+            get = cache.get
+            for k in lookup.keys():
+                label = get(cache_key, k)
+                if label is not None:
+                    del lookup[k]
+                    items[keys.get(k, k)] = theset[k] = label
+
         # Retrieve additional rows as needed
         if lookup:
             if not self.custom_lookup:
@@ -713,6 +765,10 @@ class S3Represent(object):
                 for k, row in rows.items():
                     lookup.pop(k, None)
                     items[keys.get(k, k)] = theset[k] = represent_row(row)
+                if cache is not None:
+                    put = cache.put
+                    for k in rows:
+                        put(cache_key, k, theset[k])
 
         if lookup:
             for k in lookup:
@@ -755,6 +811,247 @@ class S3Represent(object):
         theset[value] = result
         return result
 
+    # -------------------------------------------------------------------------
+    def _cache_key(self):
+        """
+            Get the prefix for second-level cache keys for this instance,
+            i.e. (tablename, signature, language, key field)
+
+            The signature is a hash over the class and all configuration
+            parameters of this instance, so that instances with different
+            settings for the same lookup table do not share cache entries.
+        """
+
+        signature = self._signature
+        if signature is None:
+            cls = type(self)
+            config = ["%s.%s" % (cls.__module__, cls.__name__)]
+            for name, value in sorted(self.__dict__.items()):
+                if name in self.VOLATILE:
+                    continue
+                if value is None or \
+                   isinstance(value, (basestring, bool, int, long, float)):
+                    config.append((name, value))
+                elif isinstance(value, (list, tuple, lazyT)):
+                    config.append((name, repr(value)))
+                elif callable(value):
+                    code = getattr(value, "func_code", None)
+                    if code is not None:
+                        config.append((name, code.co_filename,
+                                             code.co_firstlineno))
+                    else:
+                        config.append((name, repr(type(value))))
+            signature = hashlib.md5(repr(config)).hexdigest()
+            self._signature = signature
+
+        return (self.tablename,
+                signature,
+                current.T.accepted_language,
+                self.key,
+                )
+
+# =============================================================================
+class S3RepresentCache(object):
+    """
+        Second-level cache for S3Represent lookups, shared by all
+        requests of the process (stored in cache.ram): a size-bounded
+        LRU dict {(tablename, signature, language, key field, value):
+        (expires, label)}
+
+        Entries for a record are removed when the record is updated
+        or deleted via S3 methods (=where the onaccept/ondelete hooks
+        of the table are called), and otherwise expire after a time.
+        Other processes will see changes only after expiry.
+    """
+
+    def __init__(self, size=10000, expire=300):
+        """
+            Constructor
+
+            @param size: the maximum number of entries
+            @param expire: the time in seconds after which an entry expires
+        """
+
+        self.size = size
+        self.expire = expire
+
+        self.entries = OrderedDict()
+
+        # Index of entries by lookup table and key value
+        self.index = {}
+
+        self.lock = threading.Lock()
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def instance(cls):
+        """
+            Get the cache instance for this process
+
+            @return: the S3RepresentCache, or None if disabled
+        """
+
+        settings = current.deployment_settings
+        if not settings.get_ui_represent_cache():
+            return None
+
+        size = settings.get_ui_represent_cache_size()
+        expire = settings.get_ui_represent_cache_expire()
+        return current.cache.ram("s3_represent_cache",
+                                 lambda: cls(size=size, expire=expire),
+                                 time_expire=None,
+                                 )
+
+    # -------------------------------------------------------------------------
+    def get(self, prefix, value):
+        """
+            Get a cached representation
+
+            @param prefix: the cache key prefix (see S3Represent._cache_key)
+            @param value: the value
+
+            @return: the representation, or None if not cached
+        """
+
+        key = prefix + (value,)
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                if entry[0] > time.time():
+                    # Hit => mark as most recently used
+                    self.entries[key] = entry
+                    self.hits += 1
+                    return entry[1]
+                self._drop(key)
+            self.misses += 1
+        return None
+
+    # -------------------------------------------------------------------------
+    def put(self, prefix, value, label):
+        """
+            Add a representation to the cache (only strings are cached,
+            lazyT are resolved in the current language)
+
+            @param prefix: the cache key prefix (see S3Represent._cache_key)
+            @param value: the value
+            @param label: the representation
+        """
+
+        if isinstance(label, lazyT):
+            label = s3_unicode(label)
+        elif not isinstance(label, basestring):
+            return
+
+        key = prefix + (value,)
+        tablename = prefix[0]
+
+        with self.lock:
+            entries = self.entries
+            entries.pop(key, None)
+            entries[key] = (time.time() + self.expire, label)
+
+            index = self.index.get(tablename)
+            if index is None:
+                index = self.index[tablename] = {}
+            if value in index:
+                index[value].add(key)
+            else:
+                index[value] = set([key])
+
+            # Evict the least recently used entries
+            while len(entries) > self.size:
+                self._drop(entries.iterkeys().next())
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def expire_records(cls, tablename, record_ids=None):
+        """
+            Remove the cached representations of records
+
+            @param tablename: the table name
+            @param record_ids: list of record IDs, None for all records
+        """
+
+        cache = cls.instance()
+        if cache is None:
+            return
+
+        table = current.s3db.table(tablename)
+        pkey = table._id.name if table is not None else "id"
+
+        with cache.lock:
+            index = cache.index.get(tablename)
+            if not index:
+                return
+            drop = cache._drop
+            if record_ids is None:
+                keys = [k for v in index.values() for k in v]
+            else:
+                # Entries by other key fields can not be identified
+                # from the record IDs => remove them as well
+                keys = [k for v in index.values() for k in v
+                        if k[3] != pkey]
+                for record_id in record_ids:
+                    try:
+                        record_id = long(record_id)
+                    except (ValueError, TypeError):
+                        pass
+                    keys.extend(index.get(record_id, ()))
+            for key in keys:
+                drop(key)
+
+    # -------------------------------------------------------------------------
+    def stats(self):
+        """
+            Get the cache statistics
+
+            @return: dict {size, hits, misses}
+        """
+
+        return {"size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                }
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def log_stats(cls):
+        """
+            Log the cache statistics of this process (at debug level),
+            called at the end of each request
+        """
+
+        cache = cls.instance()
+        if cache is None:
+            return
+
+        stats = cache.stats()
+        current.log.debug("S3RepresentCache",
+                          "%(size)s entries, %(hits)s hits, %(misses)s misses" % stats)
+
+    # -------------------------------------------------------------------------
+    def _drop(self, key):
+        """
+            Remove an entry (must be called with the lock acquired)
+
+            @param key: the entry key
+        """
+
+        self.entries.pop(key, None)
+
+        tablename, value = key[0], key[-1]
+        index = self.index.get(tablename)
+        if index is not None:
+            keys = index.get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[value]
+
 # =============================================================================
 class S3RepresentLazy(object):
     """
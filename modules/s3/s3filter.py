@@ -43,7 +43,9 @@ __all__ = ("S3DateFilter",
            "s3_get_filter_opts",
            )
 
+import copy
 import datetime
+import hashlib
 import re
 
 try:
@@ -68,7 +70,7 @@ from gluon.tools import callback
 from s3datetime import s3_decode_iso_datetime, S3DateTime
 from s3query import S3ResourceField, S3ResourceQuery, S3URLQuery
 from s3rest import S3Method
-from s3utils import s3_get_foreign_key, s3_unicode, S3TypeConverter
+from s3utils import s3_get_foreign_key, s3_table_version, s3_unicode, S3TypeConverter
 from s3validators import *
 from s3widgets import ICON, \
                       S3CalendarWidget, \
@@ -1182,6 +1184,7 @@ class S3LocationFilter(S3FilterWidget):
             fields = ["id"] + [l for l in levels]
             if translate:
                 fields.append("path")
+            rfield = None
             joined = False
 
         elif selector:
@@ -1202,6 +1205,87 @@ class S3LocationFilter(S3FilterWidget):
             # Neither fixed options nor resource to look them up
             return default
 
+        # Find the options
+        if values:
+            # Selected options must be added => not cacheable
+            options = self._lookup(resource, fields, rfield, joined,
+                                   levels, inject_hierarchy, values)
+        else:
+            # Cache the options per lookup query, which includes the
+            # realms the user is permitted to access
+            tablenames = [resource.tablename, "gis_location"]
+            if translate:
+                tablenames.append("gis_location_name")
+            key = [str(fields),
+                   str(resource.get_query()),
+                   str(bool(inject_hierarchy)),
+                   str(translate),
+                   ]
+            lookup = lambda: self._lookup(resource, fields, rfield, joined,
+                                          levels, inject_hierarchy)
+            options = S3FilterOptionsCache.get(key, tablenames, lookup)
+            if options:
+                # Copy the options lists, so they can be modified
+                levels, hierarchy, name_l10n = options
+                levels = OrderedDict((level, {"label": levels[level]["label"],
+                                              "options": copy.copy(levels[level]["options"]),
+                                              })
+                                     for level in levels)
+                options = (levels, hierarchy, name_l10n)
+        if not options:
+            # No options
+            return default
+
+        levels, hierarchy, name_l10n = options
+
+        # Pass to data_element
+        self.levels = levels
+
+        if inject_hierarchy:
+            # Inject the Location Hierarchy
+            hierarchy = "S3.location_filter_hierarchy=%s" % \
+                json.dumps(hierarchy, separators=SEPARATORS)
+            js_global = current.response.s3.js_global
+            js_global.append(hierarchy)
+            if translate:
+                # Inject lookup list
+                name_l10n = "S3.location_name_l10n=%s" % \
+                    json.dumps(name_l10n, separators=SEPARATORS)
+                js_global.append(name_l10n)
+
+        return (ftype, levels, None)
+
+    # -------------------------------------------------------------------------
+    def _lookup(self,
+                resource,
+                fields,
+                rfield,
+                joined,
+                levels,
+                inject_hierarchy=True,
+                values=None):
+        """
+            Helper method to look up the options for this filter widget
+
+            @param resource: the S3Resource to look up the options from
+            @param fields: the fields to extract
+            @param rfield: the S3ResourceField for the location reference
+                           in the resource (if joined)
+            @param joined: whether the resource is not gis_location
+            @param levels: the levels (OrderedDict {level: label})
+            @param inject_hierarchy: whether to build the location hierarchy
+            @param values: the currently selected values (to make sure
+                           these are included in the options)
+
+            @return: tuple (levels, hierarchy, name_l10n), or None if
+                     there are no options
+        """
+
+        s3db = current.s3db
+        gtable = s3db.gis_location
+
+        translate = self.translate
+
         # Find the options
         rows = resource.select(fields=fields,
                                limit=None,
@@ -1240,7 +1324,7 @@ class S3LocationFilter(S3FilterWidget):
 
             if not rows:
                 # No options
-                return default
+                return None
 
         elif values:
             # Make sure the selected options are in the available options
@@ -1270,6 +1354,7 @@ class S3LocationFilter(S3FilterWidget):
                     rows2 = _rows
 
         # Initialise Options Storage & Hierarchy
+        levels = OrderedDict(levels)
         hierarchy = {}
         first = True
         for level in levels:
@@ -1345,19 +1430,7 @@ class S3LocationFilter(S3FilterWidget):
             for level in levels:
                 levels[level]["options"].sort()
 
-        if inject_hierarchy:
-            # Inject the Location Hierarchy
-            hierarchy = "S3.location_filter_hierarchy=%s" % \
-                json.dumps(hierarchy, separators=SEPARATORS)
-            js_global = current.response.s3.js_global
-            js_global.append(hierarchy)
-            if translate:
-                # Inject lookup list
-                name_l10n = "S3.location_name_l10n=%s" % \
-                    json.dumps(name_l10n, separators=SEPARATORS)
-                js_global.append(name_l10n)
-
-        return (ftype, levels, None)
+        return (levels, hierarchy, name_l10n)
 
     # -------------------------------------------------------------------------
     def _selector(self, resource, fields):
@@ -1607,7 +1680,6 @@ class S3OptionsFilter(S3FilterWidget):
 
         T = current.T
         NOOPT = T("No options available")
-        EMPTY = T("None")
 
         #attr = self.attr
         opts = self.opts
@@ -1633,6 +1705,7 @@ class S3OptionsFilter(S3FilterWidget):
 
         # Find the options
         opt_keys = []
+        opt_list = None
 
         multiple = ftype[:5] == "list:"
         if opts.options is not None:
@@ -1658,7 +1731,7 @@ class S3OptionsFilter(S3FilterWidget):
                 # a reverse lookup of primary IDs in the lookup table which
                 # are linked to at least one record in the resource => better
                 # scalability.
-                rows = None
+                query = None
                 if field:
                     ktablename, key, m = s3_get_foreign_key(field, m2m=False)
                     if ktablename:
@@ -1718,37 +1791,65 @@ class S3OptionsFilter(S3FilterWidget):
                             #else:
                             #    query &= (ktable.organisation_id == None)
 
+                def lookup():
+                    """ Look up and represent the option keys """
+
+                    if query is not None:
                         rows = current.db(query).select(key_field,
                                                         resource._id.min(),
                                                         groupby=key_field,
                                                         left=left)
+                    else:
+                        # If we can not perform a reverse lookup, then we need
+                        # to do a forward lookup of all unique values of the
+                        # search field from all records in the table :/ still ok,
+                        # but not endlessly scalable:
+                        rows = resource.select([selector],
+                                               limit=None,
+                                               orderby=field,
+                                               groupby=groupby,
+                                               virtual=virtual,
+                                               as_rows=True)
+
+                    opt_keys = [] # Can't use set => would make orderby pointless
+                    if rows:
+                        kappend = opt_keys.append
+                        kextend = opt_keys.extend
+                        for row in rows:
+                            val = row[colname]
+                            if virtual and callable(val):
+                                val = val()
+                            if (multiple or \
+                                virtual) and isinstance(val, (list, tuple, set)):
+                                kextend([v for v in val
+                                           if v not in opt_keys])
+                            elif val not in opt_keys:
+                                kappend(val)
+
+                    return (opt_keys,
+                            self._represent(opt_keys, None, field, ftype, multiple),
+                            )
 
-                # If we can not perform a reverse lookup, then we need
-                # to do a forward lookup of all unique values of the
-                # search field from all records in the table :/ still ok,
-                # but not endlessly scalable:
-                if rows is None:
-                    rows = resource.select([selector],
-                                           limit=None,
-                                           orderby=field,
-                                           groupby=groupby,
-                                           virtual=virtual,
-                                           as_rows=True)
-
-                opt_keys = [] # Can't use set => would make orderby pointless
-                if rows:
-                    kappend = opt_keys.append
-                    kextend = opt_keys.extend
-                    for row in rows:
-                        val = row[colname]
-                        if virtual and callable(val):
-                            val = val()
-                        if (multiple or \
-                            virtual) and isinstance(val, (list, tuple, set)):
-                            kextend([v for v in val
-                                       if v not in opt_keys])
-                        elif val not in opt_keys:
-                            kappend(val)
+                # Cache the options per lookup query, which includes the
+                # realms the user is permitted to access
+                tablenames = [resource.tablename, rfield.tname]
+                tablenames.extend(rfield.join.keys())
+                if query is not None:
+                    tablenames.append(ktablename)
+                    key = [selector, str(query)]
+                else:
+                    key = [selector, str(resource.get_query()), str(virtual)]
+                # ...and per representation of the options
+                key.extend((S3FilterOptionsCache.represent_key(opts.represent),
+                            str(opts.get("translate")),
+                            str(opts.get("sort", True)),
+                            str(opts.get("none")),
+                            ))
+                opt_keys, opt_list = S3FilterOptionsCache.get(key,
+                                                              tablenames,
+                                                              lookup,
+                                                              )
+                opt_keys = list(opt_keys)
 
         # Make sure the selected options are in the available options
         # (not possible if we have a fixed options dict)
@@ -1767,12 +1868,66 @@ class S3OptionsFilter(S3FilterWidget):
                 if val not in opt_keys and \
                    (not isinstance(val, (int, long)) or not str(val) in opt_keys):
                     opt_keys.append(val)
+                    # Must re-represent the options
+                    opt_list = None
 
         # No options?
         if len(opt_keys) < 1 or len(opt_keys) == 1 and not opt_keys[0]:
             return (ftype, None, opts.get("no_opts", NOOPT))
 
         # Represent the options
+        if opt_list is None:
+            opt_list = self._represent(opt_keys, options, field, ftype, multiple)
+
+        options = []
+        empty = False
+        none = opts["none"]
+        for k, v in opt_list:
+            if k is None:
+                if none:
+                    empty = True
+                    if none is True:
+                        # Use the represent
+                        options.append((k, v))
+                    else:
+                        # Must be a string to use as the represent:
+                        options.append((k, none))
+            else:
+                options.append((k, v))
+        if none and not empty:
+            # Add the value anyway (e.g. not found via the reverse lookup)
+            if none is True:
+                none = current.messages["NONE"]
+            options.append((None, none))
+
+        if not opts.get("multiple", True) and not self.values:
+            # Browsers automatically select the first option in single-selects,
+            # but that doesn't filter the data, so the first option must be
+            # empty if we don't have a default:
+            options.insert(0, ("", "")) # XML("&nbsp;") better?
+
+        # Sort the options
+        return (ftype, options, None)
+
+    # -------------------------------------------------------------------------
+    def _represent(self, opt_keys, options, field, ftype, multiple):
+        """
+            Helper function to represent the options for this filter widget
+
+            @param opt_keys: the option keys
+            @param options: custom dict of options {value: label}, or None
+            @param field: the Field (or None for virtual fields)
+            @param ftype: the field type
+            @param multiple: whether the field is a list type
+
+            @return: list of tuples (key, label), sorted by label
+                     unless disabled by the sort option
+        """
+
+        EMPTY = current.T("None")
+
+        opts = self.opts
+
         opt_list = [] # list of tuples (key, value)
 
         # Custom represent? (otherwise fall back to field.represent)
@@ -1852,35 +2007,8 @@ class S3OptionsFilter(S3FilterWidget):
                 opt_list.sort(key=lambda item: item[1])
             except:
                 opt_list.sort(key=lambda item: s3_unicode(item[1]))
-        options = []
-        empty = False
-        none = opts["none"]
-        for k, v in opt_list:
-            if k is None:
-                if none:
-                    empty = True
-                    if none is True:
-                        # Use the represent
-                        options.append((k, v))
-                    else:
-                        # Must be a string to use as the represent:
-                        options.append((k, none))
-            else:
-                options.append((k, v))
-        if none and not empty:
-            # Add the value anyway (e.g. not found via the reverse lookup)
-            if none is True:
-                none = current.messages["NONE"]
-            options.append((None, none))
 
-        if not opts.get("multiple", True) and not self.values:
-            # Browsers automatically select the first option in single-selects,
-            # but that doesn't filter the data, so the first option must be
-            # empty if we don't have a default:
-            options.insert(0, ("", "")) # XML("&nbsp;") better?
-
-        # Sort the options
-        return (ftype, options, None)
+        return opt_list
 
     # -------------------------------------------------------------------------
     @staticmethod
@@ -2031,6 +2159,89 @@ class S3HierarchyFilter(S3FilterWidget):
 
         return variable
 
+# =============================================================================
+class S3FilterOptionsCache(object):
+    """
+        Cache for the options of filter widgets
+
+        - options are cached per lookup, i.e. per field selector, lookup
+          query (which includes the realms the user is permitted to access),
+          representation options and language
+        - cached options are invalidated whenever any of the tables involved
+          in the lookup is modified (=its version counter is incremented,
+          see s3_table_version), and otherwise expire after
+          settings.search.filter_options_cache seconds
+        - the table version stamps are looked up only once per request and
+          shared by all widgets
+    """
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def get(cls, key, tablenames, lookup):
+        """
+            Get the options for a lookup from the cache, or perform the
+            lookup and cache its result
+
+            @param key: the lookup key (list of strings)
+            @param tablenames: the names of the tables involved in the lookup
+            @param lookup: the lookup function (without parameters)
+
+            @return: the result of the lookup function
+        """
+
+        expire = current.deployment_settings.get_search_filter_options_cache()
+        if not expire:
+            return lookup()
+
+        key = list(key)
+        for tablename in sorted(set(tablenames)):
+            key.append("%s:%s" % (tablename, s3_table_version(tablename)))
+        key.append(current.session.s3.language or "")
+        key = "|".join(s3_unicode(k) for k in key).encode("utf-8")
+
+        return current.cache.ram("filter_options_%s" % hashlib.md5(key).hexdigest(),
+                                 lookup,
+                                 time_expire = expire,
+                                 )
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def represent_key(represent):
+        """
+            Get a cache key for a represent of filter options; renderers
+            are often instantiated anew in every request, so the key is
+            derived from their options rather than their identity
+
+            @param represent: the represent (string, function, S3Represent
+                              or None)
+        """
+
+        if represent is None or isinstance(represent, basestring):
+            return str(represent)
+
+        if hasattr(represent, "bulk") and hasattr(represent, "tablename"):
+            # S3Represent
+            labels = represent.labels
+            if callable(labels):
+                labels = getattr(labels, "__name__", type(labels).__name__)
+            options = represent.options
+            if options is not None:
+                options = sorted(options.items())
+            return s3_unicode((type(represent).__name__,
+                               represent.tablename,
+                               represent.key,
+                               represent.fields,
+                               labels,
+                               options,
+                               represent.translate,
+                               represent.none,
+                               ))
+
+        # Function or other callable
+        name = getattr(represent, "__name__", None) or \
+               type(represent).__name__
+        return "%s.%s" % (getattr(represent, "__module__", None), name)
+
 # =============================================================================
 class S3FilterForm(object):
     """ Helper class to construct and render a filter form for a resource """
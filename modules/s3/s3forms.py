@@ -686,6 +686,14 @@ class S3SQLDefaultForm(S3SQLForm):
                 self.resource.lastid = str(form_vars.id)
                 s3_store_last_record_id(tablename, form_vars.id)
 
+                # Update the hierarchy
+                from s3hierarchy import S3Hierarchy
+                S3Hierarchy.dirty(tablename, record_ids=[form_vars.id])
+
+                # Forget cached representations
+                from s3fields import S3RepresentCache
+                S3RepresentCache.expire_records(tablename, [form_vars.id])
+
             # Execute onaccept
             try:
                 callback(onaccept, form, tablename=tablename)
@@ -1401,6 +1409,14 @@ class S3SQLCustomForm(S3SQLForm):
             component.lastid = str(accept_id)
             s3_store_last_record_id(tablename, accept_id)
 
+            # Update the hierarchy
+            from s3hierarchy import S3Hierarchy
+            S3Hierarchy.dirty(tablename, record_ids=[accept_id])
+
+            # Forget cached representations
+            from s3fields import S3RepresentCache
+            S3RepresentCache.expire_records(tablename, [accept_id])
+
             # Execute onaccept
             try:
                 callback(onaccept, form, tablename=tablename)
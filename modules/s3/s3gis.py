@@ -31,6 +31,7 @@
 
 __all__ = ("GIS",
            "S3Map",
+           "S3FeatureTiles",
            "S3ExportPOI",
            "S3ImportPOI",
            )
@@ -84,7 +85,7 @@ from s3datetime import s3_format_datetime, s3_parse_datetime
 from s3fields import s3_all_meta_field_names
 from s3rest import S3Method
 from s3track import S3Trackable
-from s3utils import s3_include_ext, s3_unicode
+from s3utils import s3_include_ext, s3_table_version, s3_unicode
 
 DEBUG = False
 if DEBUG:
@@ -2273,11 +2274,35 @@ class GIS(object):
         tablename = table._tablename
         gtable = current.s3db.gis_location
         settings = current.deployment_settings
-        tolerance = settings.get_gis_simplify_tolerance()
+        tolerance = GIS.get_simplify_tolerance()
 
         output = {}
 
-        if settings.get_gis_spatialdb():
+        if geojson and tolerance in settings.get_gis_simplify_levels():
+            # Use the precomputed simplifications
+            if join:
+                rows = db(query).select(table.id, gtable.id)
+                locations = [(row[tablename].id, row["gis_location"].id)
+                             for row in rows]
+            else:
+                # gis_location: always single
+                rows = db(query).select(table.id)
+                locations = [(row.id, row.id) for row in rows]
+            geojsons = GIS.get_simplified_geojson([l[1] for l in locations],
+                                                  tolerance = tolerance,
+                                                  )
+            for key, location_id in locations:
+                g = geojsons.get(location_id)
+                if not g:
+                    continue
+                if not join:
+                    output[key] = g
+                elif key in output:
+                    output[key].append(g)
+                else:
+                    output[key] = [g]
+
+        elif settings.get_gis_spatialdb():
             if geojson:
                 # Do the Simplify & GeoJSON direct from the DB
                 web2py_installed_version = parse_version(current.request.global_settings.web2py_version)
@@ -3093,24 +3118,47 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
         #        geojsons[row["gis_theme_data.id"]] = row.geojson
         #else:
         rows = current.db(query).select(table.id,
-                                        gtable.level,
-                                        gtable.wkt)
-        simplify = GIS.simplify
-        tolerance = {"L0": 0.01,
-                     "L1": 0.005,
-                     "L2": 0.00125,
-                     "L3": 0.000625,
-                     "L4": 0.0003125,
-                     "L5": 0.00015625,
-                     }
+                                        gtable.id,
+                                        gtable.level)
+        get_vars = current.request.get_vars
+        if "z" in get_vars or "zoom" in get_vars or "bbox" in get_vars:
+            # Simplify for the requested map resolution
+            tolerance = GIS.get_simplify_tolerance()
+            tolerances = dict((level, tolerance)
+                              for level in ("L0", "L1", "L2", "L3", "L4", "L5"))
+        else:
+            tolerances = {"L0": 0.01,
+                          "L1": 0.005,
+                          "L2": 0.00125,
+                          "L3": 0.000625,
+                          "L4": 0.0003125,
+                          "L5": 0.00015625,
+                          }
+            # Snap to the nearest finer precomputed level
+            levels = sorted(current.deployment_settings.get_gis_simplify_levels(),
+                            reverse=True)
+            for level, tolerance in tolerances.items():
+                for l in levels:
+                    if l <= tolerance:
+                        tolerances[level] = l
+                        break
+        # Group by tolerance to look up the simplified polygons in bulk
+        locations = {}
         for row in rows:
             grow = row.gis_location
+            tolerance = tolerances.get(grow.level, 0.01)
+            locations.setdefault(tolerance, []).append((row["gis_theme_data.id"],
+                                                        grow.id))
+        get_simplified_geojson = GIS.get_simplified_geojson
+        for tolerance, items in locations.items():
             # Simplify the polygon to reduce download size
-            geojson = simplify(grow.wkt,
-                               tolerance=tolerance[grow.level],
-                               output="geojson")
-            if geojson:
-                geojsons[row["gis_theme_data.id"]] = geojson
+            simplified = get_simplified_geojson([item[1] for item in items],
+                                                tolerance = tolerance,
+                                                )
+            for theme_data_id, location_id in items:
+                geojson = simplified.get(location_id)
+                if geojson:
+                    geojsons[theme_data_id] = geojson
 
         _geojsons = {}
         _geojsons[tablename] = geojsons
@@ -3617,6 +3665,8 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
                               defaults to all countries
            @param levels - Which levels of the hierarchy to import.
                            defaults to all 3 supported levels
+
+           Updates the Location Tree in bulk mode after all levels are imported
         """
 
         if source == "gadmv1":
@@ -3629,9 +3679,9 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
             if "L0" in levels:
                 self.import_gadm1_L0(ogr, countries=countries)
             if "L1" in levels:
-                self.import_gadm1(ogr, "L1", countries=countries)
+                self.import_gadm1(ogr, "L1", countries=countries, update_tree=False)
             if "L2" in levels:
-                self.import_gadm1(ogr, "L2", countries=countries)
+                self.import_gadm1(ogr, "L2", countries=countries, update_tree=False)
 
             current.log.debug("All done!")
 
@@ -3655,6 +3705,11 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
             current.log.warning("Only GADM is currently supported")
             return
 
+        # Update the Location Tree for all imported levels at once
+        current.log.debug("Updating Location Tree...")
+        self.update_location_tree_bulk()
+        current.db.commit()
+
         return
 
     # -------------------------------------------------------------------------
@@ -3807,7 +3862,7 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
         return
 
     # -------------------------------------------------------------------------
-    def import_gadm1(self, ogr, level="L1", countries=[]):
+    def import_gadm1(self, ogr, level="L1", countries=[], update_tree=True):
         """
             Import L1 Admin Boundaries into the Locations table from GADMv1
             - designed to be called from import_admin_areas()
@@ -3817,6 +3872,9 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
             @param level - "L1" or "L2"
             @param countries - List of ISO2 countrycodes to download data for
                                defaults to all countries
+            @param update_tree - update the Location Tree after the import
+                                 (can be skipped if the caller does this in
+                                 bulk after importing all levels)
         """
 
         if level == "L1":
@@ -4159,15 +4217,15 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
 
         db.commit()
 
-        current.log.debug("Updating Location Tree...")
-        try:
-            self.update_location_tree()
-        except MemoryError:
-            # If doing all L2s, it can break memory limits
-            # @ToDo: Check now that we're doing by level
-            current.log.critical("Memory error when trying to update_location_tree()!")
+        if update_tree:
+            current.log.debug("Updating Location Tree...")
+            try:
+                self.update_location_tree_bulk()
+            except MemoryError:
+                # If doing all L2s, it can break memory limits
+                current.log.critical("Memory error when trying to update_location_tree()!")
 
-        db.commit()
+            db.commit()
 
         # Revert back to the working directory as before.
         os.chdir(cwd)
@@ -4330,6 +4388,10 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
 
         db.commit()
 
+        # Precompute the simplified polygons
+        GIS.update_simplified()
+        db.commit()
+
         # Revert back to the working directory as before.
         os.chdir(old_working_directory)
 
@@ -4601,7 +4663,10 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
 
     # -------------------------------------------------------------------------
     @staticmethod
-    def update_location_tree(feature=None, all_locations=False, propagating=False):
+    def update_location_tree(feature=None,
+                             all_locations=False,
+                             propagating=False,
+                             simplify=False):
         """
             Update GIS Locations' Materialized path, Lx locations, Lat/Lon & the_geom
 
@@ -4615,6 +4680,8 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
             is a propagation update. Used to avoid repeated attempts to
             update hierarchy locations with missing data (e.g. lacking some
             ancestor level).
+            @param simplify: also update the precomputed simplifications
+            of the feature's geometry (the whole tree always does this)
 
             returns the path of the feature
 
@@ -4735,6 +4802,8 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
                             # Polygons aren't inherited
                             feature["inherited"] = False
                         update_location_tree(feature)  # all_locations is False here
+            # Update the precomputed simplifications
+            GIS.update_simplified()
             # All Done!
             return
 
@@ -4745,6 +4814,10 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
             # Nothing we can do
             raise ValueError
 
+        if simplify:
+            # Update the precomputed simplifications
+            GIS.update_simplified(int(id))
+
         # L0
         level = feature.get("level", False)
         name = feature.get("name", False)
@@ -5743,6 +5816,277 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
 
         return _path
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def update_location_tree_bulk(chunk_size=5000):
+        """
+            Bulk mode of update_location_tree: update Materialized path,
+            Lx locations, Lat/Lon & the_geom of all locations level by level
+
+            - computes the new values for a whole level (in chunks) in memory,
+              using the already-processed parents, and writes back only what
+              has changed, grouping identical updates into one query, and
+              writing the materialized paths in batches
+            - to be used after large imports (e.g. import_admin_areas), where
+              the per-feature update would take hours
+            - also updates the precomputed simplifications of all polygons
+
+            @param chunk_size: number of locations to read at a time
+        """
+
+        if GIS.disable_update_location_tree:
+            return
+
+        db = current.db
+        try:
+            table = db.gis_location
+        except:
+            table = current.s3db.gis_location
+        wkt_centroid = GIS.wkt_centroid
+        table_fields = table.fields
+
+        LEVELS = ("L0", "L1", "L2", "L3", "L4", "L5")
+
+        fields = [table.id,
+                  table.name,
+                  table.level,
+                  table.parent,
+                  table.path,
+                  table.inherited,
+                  table.gis_feature_type,
+                  table.lat,
+                  table.lon,
+                  table.wkt,
+                  table.lat_min,
+                  table.lon_min,
+                  table.lat_max,
+                  table.lon_max,
+                  ] + [table[level] for level in LEVELS]
+
+        # Specific locations which are parents of other specific locations
+        # (all others need not be kept in memory)
+        query = (table.level == None) & \
+                (table.parent != None) & \
+                (table.deleted == False)
+        parents = db(query)._select(table.parent, distinct=True)
+        query = (table.level == None) & \
+                (table.id.belongs(parents))
+        rows = db(query).select(table.id)
+        specific_parents = set(row.id for row in rows)
+
+        # Processed locations {id: (path, (L0, L1, L2, L3, L4, L5), lat, lon)}
+        nodes = {}
+
+        # Pending updates [(id, {fieldname: value})]
+        updates = []
+
+        # ---------------------------------------------------------------------
+        def process(row, parent):
+            """
+                Compute the new values for a location
+
+                @param row: the gis_location Row
+                @param parent: the processed parent node (or None)
+            """
+
+            record_id = row.id
+            level = row.level
+
+            # Materialized path and Lx names
+            if parent:
+                path = "%s/%s" % (parent[0], record_id)
+                names = list(parent[1])
+                parent_lat, parent_lon = parent[2], parent[3]
+            else:
+                path = str(record_id)
+                names = [None] * 6
+                parent_lat = parent_lon = None
+            if level in LEVELS:
+                index = LEVELS.index(level)
+                names[index] = row.name
+                for i in xrange(index + 1, 6):
+                    names[i] = None
+
+            # Lat/Lon
+            lat = row.lat
+            lon = row.lon
+            wkt = row.wkt
+            geometry = None
+            if wkt and not wkt.startswith("POI"):
+                # Polygons aren't inherited
+                inherited = False
+                if lat is None or lon is None:
+                    # Calculate the centroid
+                    geometry = Storage(wkt=wkt)
+            elif level == "L0":
+                inherited = False
+                if lat is not None and lon is not None and not wkt:
+                    # Calculate the WKT, keeping any Bounds
+                    geometry = Storage(gis_feature_type="1",
+                                       lat=lat,
+                                       lon=lon,
+                                       lat_min=row.lat_min,
+                                       lon_min=row.lon_min,
+                                       lat_max=row.lat_max,
+                                       lon_max=row.lon_max,
+                                       )
+            elif row.inherited or lat is None or lon is None:
+                inherited = True
+                lat = parent_lat
+                lon = parent_lon
+                if lat is None or lon is None:
+                    wkt = None
+                elif lat != row.lat or lon != row.lon or not wkt:
+                    # Calculate WKT and Bounds for the new point
+                    geometry = Storage(gis_feature_type="1",
+                                       lat=lat,
+                                       lon=lon,
+                                       )
+            else:
+                inherited = False
+                if not wkt:
+                    geometry = Storage(gis_feature_type="1",
+                                       lat=lat,
+                                       lon=lon,
+                                       lat_min=row.lat_min,
+                                       lon_min=row.lon_min,
+                                       lat_max=row.lat_max,
+                                       lon_max=row.lon_max,
+                                       )
+
+            values = dict(path = path,
+                          inherited = inherited,
+                          lat = lat,
+                          lon = lon,
+                          wkt = wkt,
+                          )
+            for index, fieldname in enumerate(LEVELS):
+                values[fieldname] = names[index]
+
+            if geometry:
+                form = Storage(vars=geometry, errors=Storage())
+                wkt_centroid(form)
+                if form.errors:
+                    current.log.error("S3GIS: %s" % form.errors)
+                else:
+                    for fieldname, value in geometry.items():
+                        if fieldname in table_fields:
+                            values[fieldname] = value
+                    lat = values["lat"]
+                    lon = values["lon"]
+
+            update = dict((k, v) for k, v in values.items()
+                          if k not in row or row[k] != v)
+            if update:
+                updates.append((record_id, update))
+
+            if level or record_id in specific_parents:
+                nodes[record_id] = (path, tuple(names), lat, lon)
+
+        # ---------------------------------------------------------------------
+        def write():
+            """
+                Write the pending updates to the database
+
+                @return: the number of updated locations
+            """
+
+            # Group identical updates (e.g. inherited Lat/Lon & Lx)
+            groups = {}
+            paths = []
+            for record_id, update in updates:
+                if "path" in update:
+                    # Paths are unique => written separately
+                    update = dict(update)
+                    paths.append((record_id, update.pop("path")))
+                    if not update:
+                        continue
+                key = tuple(sorted(update.items()))
+                if key in groups:
+                    groups[key].append(record_id)
+                else:
+                    groups[key] = [record_id]
+            for key, record_ids in groups.items():
+                if len(record_ids) == 1:
+                    query = (table.id == record_ids[0])
+                else:
+                    query = (table.id.belongs(record_ids))
+                db(query).update(**dict(key))
+
+            # Write the paths in batches, one query per batch, i.e.
+            # UPDATE ... SET path=CASE WHEN id=1 THEN '1' ELSE ... END
+            # (nested, so batches must be small enough for the SQL parser)
+            batch_size = 100
+            for i in xrange(0, len(paths), batch_size):
+                batch = paths[i:i + batch_size]
+                path = table.path
+                for record_id, value in batch:
+                    path = (table.id == record_id).case(value, path)
+                record_ids = [record_id for record_id, value in batch]
+                db(table.id.belongs(record_ids)).update(path=path)
+
+            numrows = len(updates)
+            del updates[:]
+            return numrows
+
+        # ---------------------------------------------------------------------
+        numrows = 0
+        for level in LEVELS + (None,):
+
+            deferred = []
+            last_id = 0
+            while True:
+                query = (table.level == level) & \
+                        (table.deleted == False) & \
+                        (table.id > last_id)
+                try:
+                    rows = db(query).select(orderby = table.id,
+                                            limitby = (0, chunk_size),
+                                            *fields)
+                except MemoryError:
+                    current.log.error("S3GIS: Unable to update Location Tree for level %s: MemoryError" % level)
+                    break
+                if not rows:
+                    break
+                last_id = rows.last().id
+
+                for row in rows:
+                    parent_id = row.parent
+                    if parent_id and level != "L0":
+                        parent = nodes.get(parent_id)
+                        if parent is None:
+                            # Parent not processed yet
+                            deferred.append(row)
+                            continue
+                    else:
+                        parent = None
+                    process(row, parent)
+                numrows += write()
+
+            # Locations with a parent further down in the same level
+            while deferred:
+                remaining = []
+                for row in deferred:
+                    parent = nodes.get(row.parent)
+                    if parent is None:
+                        remaining.append(row)
+                    else:
+                        process(row, parent)
+                if len(remaining) == len(deferred):
+                    # Parent missing, deleted, or of a lower level
+                    for row in remaining:
+                        current.log.error("S3GIS: Cannot update Location Tree for location ID %s: invalid parent %s" % \
+                                          (row.id, row.parent))
+                    break
+                deferred = remaining
+            numrows += write()
+
+        current.log.debug("S3GIS: Location Tree updated, %s locations changed" % numrows)
+
+        # Update the precomputed simplifications
+        numrows = GIS.update_simplified()
+        current.log.debug("S3GIS: %s simplified geometries updated" % numrows)
+
     # -------------------------------------------------------------------------
     @staticmethod
     def wkt_centroid(form):
@@ -6003,6 +6347,200 @@ page.render('%(filename)s', {format: 'jpeg', quality: '100'});''' % \
                              lon_max=table.lon,
                              lat_max=table.lat)
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def get_simplify_tolerance(zoom=None, bbox=None):
+        """
+            Get the tolerance to simplify Polygons with, so that the
+            simplification is just below the resolution of the map
+
+            @param zoom: the zoom level of the map
+            @param bbox: the bounding box of the map, as tuple
+                         (lon_min, lat_min, lon_max, lat_max)
+
+            - if neither zoom nor bbox are given, they are read from the
+              get_vars of the request (z/zoom, bbox)
+            - snaps to the nearest coarser precomputed level where possible
+            - falls back to settings.gis.simplify_tolerance if no zoom level
+              or bbox has been requested
+        """
+
+        settings = current.deployment_settings
+
+        if zoom is None and bbox is None:
+            get_vars = current.request.get_vars
+            zoom = get_vars.get("z") or get_vars.get("zoom")
+            for k in get_vars:
+                if k[:4] == "bbox":
+                    bbox = get_vars[k]
+                    if type(bbox) is list:
+                        bbox = bbox[-1]
+                    break
+
+        # Degrees per pixel
+        resolution = None
+        if zoom is not None:
+            try:
+                resolution = 360.0 / (256 * 2 ** int(zoom))
+            except (ValueError, TypeError):
+                pass
+        if resolution is None and bbox:
+            try:
+                if not isinstance(bbox, (tuple, list)):
+                    bbox = [float(v) for v in bbox.split(",")]
+                # Assume a map about 1000 pixels wide
+                resolution = abs(float(bbox[2]) - float(bbox[0])) / 1000
+            except (ValueError, TypeError, IndexError):
+                pass
+
+        if not resolution:
+            return settings.get_gis_simplify_tolerance()
+
+        for tolerance in sorted(settings.get_gis_simplify_levels(), reverse=True):
+            if tolerance <= resolution:
+                return tolerance
+        return resolution
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def get_simplified_geojson(location_ids, tolerance=None):
+        """
+            Get the simplified geometries of locations as GeoJSON, using
+            the precomputed simplification levels where possible
+
+            @param location_ids: the gis_location record IDs
+            @param tolerance: the tolerance (defaults to the result of
+                              get_simplify_tolerance)
+
+            @return: dict {location_id: geojson}
+        """
+
+        db = current.db
+        s3db = current.s3db
+
+        if tolerance is None:
+            tolerance = GIS.get_simplify_tolerance()
+
+        output = {}
+
+        location_ids = set(location_ids)
+        if tolerance in current.deployment_settings.get_gis_simplify_levels():
+            stable = s3db.gis_location_simplified
+            query = (stable.location_id.belongs(location_ids)) & \
+                    (stable.tolerance == tolerance)
+            rows = db(query).select(stable.location_id,
+                                    stable.geojson,
+                                    )
+            for row in rows:
+                output[row.location_id] = row.geojson
+            location_ids.difference_update(output)
+
+        if location_ids:
+            # Simplify on-the-fly
+            # - points, or not yet precomputed
+            gtable = s3db.gis_location
+            rows = db(gtable.id.belongs(location_ids)).select(gtable.id,
+                                                              gtable.wkt,
+                                                              )
+            simplify = GIS.simplify
+            for row in rows:
+                geojson = simplify(row.wkt,
+                                   tolerance=tolerance,
+                                   output="geojson")
+                if geojson:
+                    output[row.id] = geojson
+
+        return output
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def update_simplified(location_ids=None, chunk_size=200):
+        """
+            Precompute the simplified geometries of (non-point) locations
+            for all tolerances in settings.gis.simplify_levels
+            - skips locations whose geometry hasn't changed since the last
+              run, so safe to call repeatedly
+
+            @param location_ids: the gis_location record IDs (default: all)
+            @param chunk_size: number of locations to process at a time
+
+            @return: the number of locations updated
+        """
+
+        levels = current.deployment_settings.get_gis_simplify_levels()
+        if not levels:
+            return 0
+
+        import hashlib
+
+        db = current.db
+        s3db = current.s3db
+        gtable = s3db.gis_location
+        stable = s3db.gis_location_simplified
+
+        query = (gtable.deleted == False) & \
+                (gtable.gis_feature_type > 1) & \
+                (gtable.wkt != None)
+        if location_ids is not None:
+            if not isinstance(location_ids, (list, tuple, set)):
+                location_ids = [location_ids]
+            query &= (gtable.id.belongs(location_ids))
+        ids = [row.id for row in db(query).select(gtable.id)]
+
+        if location_ids is not None:
+            # Remove simplifications of locations which are now points
+            obsolete = set(location_ids).difference(ids)
+            if obsolete:
+                db(stable.location_id.belongs(obsolete)).delete()
+
+        simplify = GIS.simplify
+        updated = 0
+        for i in xrange(0, len(ids), chunk_size):
+            chunk = ids[i:i + chunk_size]
+
+            # Checksums of the current simplifications
+            checksums = {}
+            rows = db(stable.location_id.belongs(chunk)).select(stable.location_id,
+                                                                stable.tolerance,
+                                                                stable.checksum,
+                                                                )
+            for row in rows:
+                checksums.setdefault(row.location_id, {})[row.tolerance] = row.checksum
+
+            rows = db(gtable.id.belongs(chunk)).select(gtable.id,
+                                                       gtable.wkt,
+                                                       )
+            changed = []
+            items = []
+            for row in rows:
+                wkt = row.wkt
+                if isinstance(wkt, unicode):
+                    wkt = wkt.encode("utf-8")
+                checksum = hashlib.md5(wkt).hexdigest()
+                existing = checksums.get(row.id, {})
+                if len(existing) == len(levels) and \
+                   all(existing.get(tolerance) == checksum for tolerance in levels):
+                    # Unchanged
+                    continue
+                changed.append(row.id)
+                for tolerance in levels:
+                    geojson = simplify(wkt,
+                                       tolerance=tolerance,
+                                       output="geojson")
+                    if geojson:
+                        items.append({"location_id": row.id,
+                                      "tolerance": tolerance,
+                                      "checksum": checksum,
+                                      "geojson": geojson,
+                                      })
+            if changed:
+                db(stable.location_id.belongs(changed)).delete()
+                updated += len(changed)
+            if items:
+                stable.bulk_insert(items)
+
+        return updated
+
     # -------------------------------------------------------------------------
     @staticmethod
     def simplify(wkt,
@@ -7300,7 +7838,9 @@ def addFeatureResources(feature_resources):
     stable = db.gis_style
     config = GIS.get_config()
     config_id = config.id
-    postgres = current.deployment_settings.get_database_type() == "postgres"
+    settings = current.deployment_settings
+    postgres = settings.get_database_type() == "postgres"
+    tiles = settings.get_gis_tiles()
 
     layers_feature_resource = []
     append = layers_feature_resource.append
@@ -7310,6 +7850,7 @@ def addFeatureResources(feature_resources):
         _id = str(layer["id"])
         _id = re.sub("\W", "_", _id)
         _layer["id"] = _id
+        tiled = False
 
         # Are we loading a Catalogue Layer or a simple URL?
         layer_id = layer.get("layer_id", None)
@@ -7403,8 +7944,14 @@ def addFeatureResources(feature_resources):
                 url_format = "%s/{id}.plain" % URL(c="gis", f="location")
             else:
                 _url = URL(c=row.controller, f=row.function)
+                if tiles and not row.trackable:
+                    # Server-side clustered tiles
+                    tiled = True
+                    url = URL(c=row.controller, f=row.function, args="tiles")
+                else:
+                    url = _url
                 url = "%s.geojson?layer=%i&components=None&show_ids=true&maxdepth=%s" % \
-                    (_url,
+                    (url,
                      row.layer_id,
                      maxdepth)
                 #if not url_format:
@@ -7454,6 +8001,14 @@ def addFeatureResources(feature_resources):
                 # @ToDo: Use Context
                 continue
             options = "components=None&maxdepth=%s&show_ids=true" % maxdepth
+            if tiles and "track=" not in url:
+                # Server-side clustered tiles
+                path = url.split("?", 1)
+                if path[0].endswith(".geojson") and \
+                   not path[0].endswith("/tiles.geojson"):
+                    tiled = True
+                    path[0] = "%s/tiles.geojson" % path[0][:-8]
+                    url = "?".join(path)
             if "?" in url:
                 url = "%s&%s" % (url, options)
             else:
@@ -7504,6 +8059,8 @@ def addFeatureResources(feature_resources):
             _layer["cluster_threshold"] = cluster_threshold
         if _dir:
             _layer["dir"] = _dir
+        if tiled:
+            _layer["tiled"] = 1
 
         if style:
             _layer["style"] = style
@@ -7910,6 +8467,8 @@ class LayerFeature(Layer):
                 maxdepth = 1
             else:
                 maxdepth = 0
+            tiled = not self.aggregate and not self.trackable and \
+                    current.deployment_settings.get_gis_tiles()
             if self.aggregate:
                 # id is used for url_format
                 url = "%s.geojson?layer=%i&show_ids=true" % \
@@ -7919,9 +8478,14 @@ class LayerFeature(Layer):
                 url_format = "%s/{id}.plain" % URL(c="gis", f="location")
             else:
                 _url = URL(self.controller, self.function)
+                if tiled:
+                    # Server-side clustered tiles
+                    url = URL(self.controller, self.function, args="tiles")
+                else:
+                    url = _url
                 # id is used for url_format
                 url = "%s.geojson?layer=%i&components=None&maxdepth=%s&show_ids=true" % \
-                    (_url,
+                    (url,
                      self.layer_id,
                      maxdepth)
                 url_format = "%s/{id}.plain" % _url
@@ -7973,6 +8537,8 @@ class LayerFeature(Layer):
                 # Enable the Cluster Strategy, so that it can be enabled/disabled
                 # depending on the zoom level & hence Points or Polygons
                 output["cluster"] = 1
+            if tiled:
+                output["tiled"] = 1
             if not popup_format:
                 # Need this to differentiate from e.g. FeatureQueries
                 output["no_popups"] = 1
@@ -9207,6 +9773,355 @@ class S3Map(S3Method):
                            )
         return map
 
+# =============================================================================
+class S3FeatureTiles(S3Method):
+    """
+        Tiled GeoJSON export of Feature Layers
+            - grid-clusters the features of a tile at low zoom levels, and
+              returns individual features (with attributes and markers like
+              the normal GeoJSON export) at high zoom levels
+            - caches tiles per layer, filter, zoom level and tile, until any
+              record in the layer's table gets modified
+
+        URL options:
+            - z=<zoom>&x=<x>&y=<y>      a single tile (XYZ tiling scheme)
+            - z=<zoom>&bbox=<lon_min>,<lat_min>,<lon_max>,<lat_max>
+                                        all tiles covering the bounding box
+                                        (as sent by OpenLayers' BBOX strategy)
+            - layer=<layer_id>          the Feature Layer (for attributes
+                                        and markers of individual features)
+            - any other URL filters
+
+        @note: locations which get moved without a change to the record
+               itself will only be updated when the cache expires
+    """
+
+    # Number of grid cells per tile and axis
+    GRID = 8
+
+    # Maximum number of tiles per request
+    MAX_TILES = 64
+
+    # Maximum zoom level
+    MAX_ZOOM = 22
+
+    # URL variables which do not change the contents of a tile
+    TILE_VARS = ("x", "y", "z", "_")
+
+    # -------------------------------------------------------------------------
+    def apply_method(self, r, **attr):
+        """
+            Entry point for REST interface
+
+            @param r: the S3Request
+            @param attr: controller attributes
+        """
+
+        if r.http != "GET":
+            r.error(405, current.ERROR.BAD_METHOD)
+        if r.representation != "geojson":
+            r.error(415, current.ERROR.BAD_FORMAT)
+        if r.component:
+            r.error(400, current.ERROR.BAD_REQUEST)
+
+        get_vars = Storage(r.get_vars)
+
+        # Parse the tile coordinates
+        try:
+            zoom = min(max(int(get_vars.get("z", 0)), 0), self.MAX_ZOOM)
+            if "x" in get_vars and "y" in get_vars:
+                tiles = [(int(get_vars["x"]), int(get_vars["y"]))]
+            else:
+                tiles = None
+        except (ValueError, TypeError):
+            r.error(400, current.ERROR.BAD_REQUEST)
+
+        bbox = None
+        for k in get_vars.keys():
+            if k[:4] == "bbox":
+                bbox = get_vars.pop(k)
+        if tiles is None:
+            if not bbox:
+                r.error(400, current.ERROR.BAD_REQUEST)
+            if type(bbox) is list:
+                bbox = bbox[-1]
+            try:
+                bbox = [float(v) for v in bbox.split(",")]
+                lon_min, lat_min, lon_max, lat_max = bbox
+            except ValueError:
+                r.error(400, current.ERROR.BAD_REQUEST)
+            zoom, tiles = self.bbox_tiles(lon_min, lat_min, lon_max, lat_max, zoom)
+
+        # Show IDs (required for the popup URL)
+        if str(get_vars.get("show_ids")).lower() == "true":
+            current.xml.show_ids = True
+
+        # The resource, without the bbox filter (tiles filter themselves)
+        resource = current.s3db.resource(r.tablename,
+                                         filter = current.response.s3.filter,
+                                         vars = get_vars,
+                                         context = True,
+                                         )
+        self.resource = resource
+        if not self.location_selectors(resource):
+            r.error(400, "Cannot display this resource on a map")
+
+        # Cache keys: layer (with all its options), filter (incl. the
+        # realms of the user), zoom level and version of the table data
+        import hashlib
+        options = sorted((k, v) for k, v in get_vars.items()
+                         if k not in self.TILE_VARS)
+        rfilter = resource.rfilter
+        key = "%s|%s|%s" % (options,
+                            resource.get_query(),
+                            rfilter.get_filter() if rfilter else None,
+                            )
+        prefix = "gis_tile/%s/%s/%s/%s" % (resource.tablename,
+                                           hashlib.md5(s3_unicode(key).encode("utf-8")).hexdigest(),
+                                           s3_table_version(resource.tablename),
+                                           zoom,
+                                           )
+
+        cache = current.cache.ram
+        expire = current.deployment_settings.get_gis_tiles_cache_expire()
+        stylesheet = r.stylesheet()
+
+        features = []
+        extend = features.extend
+        for x, y in tiles:
+            extend(cache("%s/%s/%s" % (prefix, x, y),
+                         lambda: self.tile(zoom, x, y, stylesheet, get_vars),
+                         time_expire = expire,
+                         ))
+
+        current.response.headers["Content-Type"] = "application/json"
+        return json.dumps({"type": "FeatureCollection",
+                           "features": features,
+                           }, separators=SEPARATORS)
+
+    # -------------------------------------------------------------------------
+    def tile(self, zoom, x, y, stylesheet, get_vars):
+        """
+            Produce the features of a tile
+
+            @param zoom: the zoom level
+            @param x: the tile column
+            @param y: the tile row
+            @param stylesheet: the GeoJSON export stylesheet
+            @param get_vars: the URL vars
+
+            @return: list of GeoJSON features (dicts)
+        """
+
+        lon_min, lat_min, lon_max, lat_max = self.tile_bounds(zoom, x, y)
+
+        resource = self.resource
+        tablename = resource.tablename
+        lat, lon = self.location_selectors(resource)
+
+        # Select the locations within the tile
+        from s3query import FS
+        tresource = current.s3db.resource(tablename,
+                                          filter = current.response.s3.filter,
+                                          vars = get_vars,
+                                          context = True,
+                                          )
+        tresource.add_filter((FS(lat) >= lat_min) & (FS(lat) < lat_max) & \
+                             (FS(lon) >= lon_min) & (FS(lon) < lon_max))
+        pkey = tresource._id.name
+        data = tresource.select([pkey, lat, lon],
+                                limit = None,
+                                raw_data = True,
+                                represent = False,
+                                )
+        rows = data["rows"]
+        rfields = dict((rfield.selector, rfield.colname)
+                       for rfield in data["rfields"])
+        id_col = "%s.%s" % (tablename, pkey)
+        lat_col = rfields.get(lat, "gis_location.lat")
+        lon_col = rfields.get(lon, "gis_location.lon")
+
+        # Return individual features if there are only few of them in
+        # the tile, or above the cluster zoom level unless there are
+        # more than max_features (then fall back to clustering)
+        settings = current.deployment_settings
+        number = len(rows)
+        if number <= settings.get_gis_tiles_cluster_threshold() or \
+           zoom > settings.get_gis_tiles_cluster_zoom() and \
+           number <= settings.get_gis_max_features():
+            # Individual features
+            record_ids = list(set(row[id_col] for row in rows))
+            if not record_ids:
+                return []
+            return self.features(record_ids, stylesheet, get_vars)
+
+        # Grid clusters
+        grid = self.GRID
+        size_lon = (lon_max - lon_min) / grid
+        size_lat = (lat_max - lat_min) / grid
+        cells = {}
+        for row in rows:
+            row_lat = row[lat_col]
+            row_lon = row[lon_col]
+            if row_lat is None or row_lon is None:
+                continue
+            cell = (min(int((row_lon - lon_min) / size_lon), grid - 1),
+                    min(int((row_lat - lat_min) / size_lat), grid - 1),
+                    )
+            if cell in cells:
+                item = cells[cell]
+                item[0] += 1
+                item[1] += row_lon
+                item[2] += row_lat
+            else:
+                cells[cell] = [1, row_lon, row_lat]
+
+        features = []
+        append = features.append
+        for count, sum_lon, sum_lat in cells.itervalues():
+            append({"type": "Feature",
+                    "geometry": {"type": "Point",
+                                 "coordinates": [round(sum_lon / count, 6),
+                                                 round(sum_lat / count, 6),
+                                                 ],
+                                 },
+                    "properties": {"cluster": 1,
+                                   "count": count,
+                                   },
+                    })
+        return features
+
+    # -------------------------------------------------------------------------
+    def features(self, record_ids, stylesheet, get_vars):
+        """
+            Export individual features, in the same format as the normal
+            GeoJSON export of the layer
+
+            @param record_ids: the record IDs
+            @param stylesheet: the GeoJSON export stylesheet
+            @param get_vars: the URL vars
+
+            @return: list of GeoJSON features (dicts)
+        """
+
+        args = {}
+        if "maxdepth" in get_vars:
+            try:
+                args["maxdepth"] = int(get_vars["maxdepth"])
+            except ValueError:
+                pass
+
+        resource = current.s3db.resource(self.resource.tablename,
+                                         id = record_ids,
+                                         )
+        output = resource.export_xml(dereference = True,
+                                     mcomponents = None,
+                                     stylesheet = stylesheet,
+                                     as_json = True,
+                                     **args)
+        if not output:
+            return []
+        try:
+            return json.loads(output).get("features") or []
+        except ValueError:
+            return []
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def location_selectors(resource):
+        """
+            Get the field selectors for lat/lon of a resource
+
+            @param resource: the S3Resource
+            @return: tuple (lat, lon), or None if the resource has
+                     no location reference
+        """
+
+        table = resource.table
+        if resource.tablename == "gis_location":
+            return ("lat", "lon")
+        context = resource.get_config("context")
+        if context and "location" in context:
+            return ("(location)$lat", "(location)$lon")
+        elif "location_id" in table.fields:
+            return ("location_id$lat", "location_id$lon")
+        elif "site_id" in table.fields:
+            return ("site_id$location_id$lat", "site_id$location_id$lon")
+        return None
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def tile_bounds(zoom, x, y):
+        """
+            Get the bounds of a tile (XYZ tiling scheme, as used by OSM)
+
+            @param zoom: the zoom level
+            @param x: the tile column
+            @param y: the tile row
+
+            @return: tuple (lon_min, lat_min, lon_max, lat_max)
+        """
+
+        import math
+
+        n = 2.0 ** zoom
+        lat = lambda y: math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+        return (x / n * 360.0 - 180.0,
+                lat(y + 1),
+                (x + 1) / n * 360.0 - 180.0,
+                lat(y),
+                )
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def tile_xy(zoom, lon, lat):
+        """
+            Get the tile containing a point
+
+            @param zoom: the zoom level
+            @param lon: the longitude
+            @param lat: the latitude
+
+            @return: tuple (x, y)
+        """
+
+        import math
+
+        n = 2 ** zoom
+        lon = min(max(lon, -180.0), 180.0)
+        lat = math.radians(min(max(lat, -85.0511), 85.0511))
+        x = int((lon + 180.0) / 360.0 * n)
+        y = int((1.0 - math.log(math.tan(lat) + 1 / math.cos(lat)) / math.pi) / 2.0 * n)
+        return (min(max(x, 0), n - 1), min(max(y, 0), n - 1))
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def bbox_tiles(cls, lon_min, lat_min, lon_max, lat_max, zoom):
+        """
+            Get all tiles covering a bounding box, at the given zoom level
+            or, if that would be too many, at a lower zoom level
+
+            @param lon_min: the western boundary
+            @param lat_min: the southern boundary
+            @param lon_max: the eastern boundary
+            @param lat_max: the northern boundary
+            @param zoom: the zoom level
+
+            @return: tuple (zoom, [(x, y), ...])
+        """
+
+        while True:
+            x_min, y_min = cls.tile_xy(zoom, lon_min, lat_max)
+            x_max, y_max = cls.tile_xy(zoom, lon_max, lat_min)
+            number = (x_max - x_min + 1) * (y_max - y_min + 1)
+            if number <= cls.MAX_TILES or zoom == 0:
+                break
+            zoom -= 1
+        tiles = [(x, y) for x in xrange(x_min, x_max + 1)
+                        for y in xrange(y_min, y_max + 1)]
+        return zoom, tiles
+
 # =============================================================================
 class S3ExportPOI(S3Method):
     """ Export point-of-interest resources for a location """
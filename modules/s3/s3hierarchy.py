@@ -468,6 +468,7 @@ class S3Hierarchy(object):
             self.__connect()
         if self.__status("dirty"):
             self.read()
+            self.save()
         return self.__theset
 
     # -------------------------------------------------------------------------
@@ -626,20 +627,36 @@ class S3Hierarchy(object):
             self.__status(dirty=True)
             return
 
-        htable = current.s3db.s3_hierarchy
+        db = current.db
+        s3db = current.s3db
+
+        htable = s3db.s3_hierarchy
         query = (htable.tablename == tablename)
-        row = current.db(query).select(htable.dirty,
-                                       htable.hierarchy,
-                                       limitby=(0, 1)).first()
+        row = db(query).select(htable.dirty,
+                               htable.hierarchy,
+                               limitby=(0, 1)).first()
         if row and not row.dirty:
-            data = row.hierarchy
-            theset = self.__theset
-            theset.clear()
-            for node_id, item in data["nodes"].items():
-                theset[long(node_id)] = {"p": item["p"],
-                                         "c": item["c"],
-                                         "s": set(item["s"]) \
-                                              if item["s"] else set()}
+            ntable = s3db.s3_hierarchy_node
+            query = (ntable.tablename == tablename)
+            rows = db(query).select(ntable.node_id,
+                                    ntable.parent_id,
+                                    ntable.category,
+                                    )
+            if not rows and row.hierarchy:
+                # Stored in the legacy format (JSON, no node rows)
+                # => rebuild, so that the node rows get written
+                self.__status(dirty=True,
+                              dbupdate=None,
+                              dbstatus=False)
+                return
+
+            self.__theset.clear()
+            add = self.add
+            for row in rows:
+                add(row.node_id,
+                    parent_id = row.parent_id,
+                    category = row.category,
+                    )
             self.__status(dirty=False,
                           dbupdate=None,
                           dbstatus=True)
@@ -662,25 +679,29 @@ class S3Hierarchy(object):
         if not self.__status("dbupdate"):
             return
 
-        # Serialize the theset
-        nodes_dict = dict()
-        for node_id, node in theset.items():
-            nodes_dict[node_id] = {"p": node["p"],
-                                   "c": node["c"],
-                                   "s": list(node["s"]) \
-                                        if node["s"] else []}
+        db = current.db
+        s3db = current.s3db
+
+        # Replace all stored nodes
+        ntable = s3db.s3_hierarchy_node
+        db(ntable.tablename == tablename).delete()
+        ntable.bulk_insert([{"tablename": tablename,
+                             "node_id": node_id,
+                             "parent_id": node["p"],
+                             "category": node["c"],
+                             } for node_id, node in theset.items()])
 
         # Generate record
         data = {"tablename": tablename,
                 "dirty": False,
-                "hierarchy": {"nodes": nodes_dict}
+                "hierarchy": None,
                 }
 
         # Get current entry
-        htable = current.s3db.s3_hierarchy
+        htable = s3db.s3_hierarchy
         query = (htable.tablename == tablename)
-        row = current.db(query).select(htable.id,
-                                       limitby=(0, 1)).first()
+        row = db(query).select(htable.id,
+                               limitby=(0, 1)).first()
 
         if row:
             # Update record
@@ -695,12 +716,16 @@ class S3Hierarchy(object):
 
     # -------------------------------------------------------------------------
     @classmethod
-    def dirty(cls, tablename):
+    def dirty(cls, tablename, record_ids=None):
         """
             Mark this hierarchy as dirty. To be called when the target
             table gets updated (can be called repeatedly).
 
             @param tablename: the tablename
+            @param record_ids: the IDs of the records which have been
+                               created, updated or deleted - to apply
+                               the changes to the nodes in place rather
+                               than rebuilding the whole hierarchy
         """
 
         s3db = current.s3db
@@ -711,6 +736,12 @@ class S3Hierarchy(object):
         if not config:
             return
 
+        if record_ids:
+            if not isinstance(record_ids, (list, tuple, set)):
+                record_ids = [record_ids]
+            if cls(tablename).update_nodes(record_ids):
+                return
+
         hierarchies = current.model.hierarchies
         if tablename in hierarchies:
             hierarchy = hierarchies[tablename]
@@ -782,6 +813,206 @@ class S3Hierarchy(object):
 
         return
 
+    # -------------------------------------------------------------------------
+    def update_nodes(self, record_ids):
+        """
+            Apply changes in the target table to the hierarchy nodes in
+            place (both in memory and in the DB), rather than rebuilding
+            the whole hierarchy
+
+            @param record_ids: the IDs of the records which have been
+                               created, updated or deleted
+
+            @return: True if successful, False if the hierarchy needs to
+                     be rebuilt (e.g. because it has been found to be
+                     inconsistent)
+        """
+
+        tablename = self.tablename
+        if not tablename or not self.config:
+            return False
+
+        db = current.db
+        s3db = current.s3db
+
+        # In-memory hierarchy (if already loaded in this request)
+        hierarchies = current.model.hierarchies
+        if tablename in hierarchies:
+            self.__connect()
+            if self.__status("dirty"):
+                # Will be rebuilt anyway
+                return False
+            theset = self.__theset
+        else:
+            theset = None
+
+        # Stored hierarchy (unless marked dirty)
+        htable = s3db.s3_hierarchy
+        query = (htable.tablename == tablename)
+        row = db(query).select(htable.dirty,
+                               limitby=(0, 1)).first()
+        stored = row and not row.dirty
+        if not stored and theset is None:
+            # Nothing to update
+            return True
+
+        table = s3db[tablename]
+        pkey = self.pkey
+        fkey = self.fkey
+        ckey = self.ckey
+        cfield = table[ckey] if ckey else None
+
+        fields = [table._id, pkey, fkey]
+        if cfield:
+            fields.append(cfield)
+        DELETED = current.xml.DELETED
+        if DELETED in table.fields:
+            dfield = table[DELETED]
+            fields.append(dfield)
+        else:
+            dfield = None
+
+        ntable = s3db.s3_hierarchy_node
+        nquery = (ntable.tablename == tablename)
+
+        updated = {}
+        removed = set()
+
+        # Read the changed records, then any orphaned child nodes
+        query = table._id.belongs(set(record_ids))
+        expected = None
+        while query is not None:
+            rows = db(query).select(left = self.left, *fields)
+
+            found_ids = set()
+            found_nodes = set()
+            deleted = set()
+            for row in rows:
+                found_ids.add(row[table._id])
+                node_id = row[pkey]
+                is_deleted = dfield is not None and row[dfield]
+                if not node_id:
+                    if is_deleted:
+                        # Super-key unlinked => can not determine node ID
+                        return False
+                    continue
+                found_nodes.add(node_id)
+                if is_deleted:
+                    deleted.add(node_id)
+                else:
+                    category = row[cfield] if cfield else None
+                    updated[node_id] = (row[fkey], category)
+
+            if expected is None:
+                # Hard-deleted records
+                missing = set(record_ids) - found_ids
+                if missing:
+                    if pkey.name != table._id.name:
+                        # Can not determine the node IDs
+                        return False
+                    deleted |= missing
+            else:
+                deleted |= expected - found_nodes
+
+            deleted -= removed
+            if not deleted:
+                break
+            removed |= deleted
+            for node_id in deleted:
+                updated.pop(node_id, None)
+
+            # Children of removed nodes must be re-read
+            orphans = set()
+            if theset is not None:
+                for node_id in deleted:
+                    if node_id in theset:
+                        orphans |= theset[node_id]["s"]
+            if stored:
+                rows = db(nquery & ntable.parent_id.belongs(deleted)).select(ntable.node_id)
+                orphans |= set(row.node_id for row in rows)
+            orphans -= removed
+            if orphans:
+                query = pkey.belongs(orphans)
+                expected = orphans
+            else:
+                query = None
+
+        # Verify that all parent nodes exist and that there are no cycles
+        parents = {}
+        for node_id, (parent_id, category) in updated.items():
+            parents[node_id] = parent_id
+        if stored:
+            lookup = set(p for p in parents.values() if p and p not in parents)
+            while lookup:
+                rows = db(nquery & ntable.node_id.belongs(lookup)).select(ntable.node_id,
+                                                                          ntable.parent_id,
+                                                                          )
+                if len(rows) != len(lookup):
+                    # Parent node not found
+                    return False
+                lookup = set()
+                for row in rows:
+                    parent_id = row.parent_id
+                    parents[row.node_id] = parent_id
+                    if parent_id and parent_id not in parents:
+                        lookup.add(parent_id)
+        elif theset is not None:
+            for node_id, node in theset.items():
+                if node_id not in parents:
+                    parents[node_id] = node["p"]
+        for node_id in updated:
+            seen = set()
+            parent_id = parents[node_id]
+            while parent_id:
+                if parent_id in seen or parent_id == node_id or \
+                   parent_id in removed or parent_id not in parents:
+                    return False
+                seen.add(parent_id)
+                parent_id = parents[parent_id]
+
+        # Update the stored nodes
+        if stored:
+            if removed:
+                db(nquery & ntable.node_id.belongs(removed)).delete()
+            for node_id, (parent_id, category) in updated.items():
+                query = nquery & (ntable.node_id == node_id)
+                success = db(query).update(parent_id = parent_id,
+                                           category = category,
+                                           )
+                if not success:
+                    ntable.insert(tablename = tablename,
+                                  node_id = node_id,
+                                  parent_id = parent_id,
+                                  category = category,
+                                  )
+
+        # Update the nodes in memory
+        if theset is not None:
+            remove = self.remove
+            for node_id in removed:
+                node = theset.get(node_id)
+                if node:
+                    for child_id in node["s"]:
+                        if child_id in theset:
+                            theset[child_id]["p"] = None
+                    node["s"] = set()
+                    remove(node_id)
+            add = self.add
+            for node_id, (parent_id, category) in updated.items():
+                node = theset.get(node_id)
+                if node:
+                    previous = node["p"]
+                    if previous != parent_id and previous in theset:
+                        theset[previous]["s"].discard(node_id)
+                add(node_id, parent_id=parent_id, category=None)
+                theset[node_id]["c"] = category
+
+            # Remove subset
+            self.__roots = None
+            self.__nodes = None
+
+        return True
+
     # -------------------------------------------------------------------------
     def __keys(self):
         """ Introspect the key fields in the hierarchical table """
@@ -989,9 +1220,7 @@ class S3Hierarchy(object):
                     current.db.rollback()
                 return None
 
-        if not cascade and total:
-            self.dirty(tablename)
-
+        # Stored nodes have been updated by resource.delete
         return total
 
     # -------------------------------------------------------------------------
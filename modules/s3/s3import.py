@@ -33,6 +33,7 @@ __all__ = ("S3Importer",
            "S3ImportItem",
            "S3Duplicate",
            "S3BulkImporter",
+           "S3BulkImportSnapshot",
            )
 
 import cPickle
@@ -66,6 +67,8 @@ from gluon.storage import Storage, Messages
 from gluon.tools import callback, fetch
 
 from s3datetime import s3_utc
+from s3fields import S3RepresentCache, s3_all_meta_field_names
+from s3hierarchy import S3Hierarchy
 from s3rest import S3Method, S3Request
 from s3resource import S3Resource
 from s3utils import s3_mark_required, s3_has_foreign_key, s3_get_foreign_key, s3_unicode
@@ -1755,6 +1758,9 @@ class S3ImportItem(object):
         self.parent = None
         self.skip = False
 
+        # Result of the batch deduplication (see S3Duplicate.bulk)
+        self.prematch = None
+
         # Conflict handling
         self.mci = 2
         self.mtime = datetime.utcnow()
@@ -2555,6 +2561,14 @@ class S3ImportItem(object):
             if onaccept:
                 callback(onaccept, form, tablename=tablename)
 
+            # Update the hierarchy
+            if self.id:
+                S3Hierarchy.dirty(tablename, record_ids=[self.id])
+
+            # Forget cached representations
+            if self.id and method == UPDATE:
+                S3RepresentCache.expire_records(tablename, [self.id])
+
             # Restore modified_on.update
             if modified_on_update is not None:
                 modified_on.update = modified_on_update
@@ -2915,6 +2929,10 @@ class S3ImportJob():
         self.files = files
         self.directory = Storage()
 
+        # Element index and UID->ID map for reference resolution
+        self.element_index = None
+        self.uid_map = {}
+
         # Mandatory fields
         self.mandatory_fields = Storage()
 
@@ -3199,7 +3217,6 @@ class S3ImportJob():
                               (will be filled in by this function)
         """
 
-        db = current.db
         s3db = current.s3db
         xml = current.xml
         import_uid = xml.import_uid
@@ -3215,6 +3232,13 @@ class S3ImportJob():
             else:
                 root = tree.getroot()
 
+        # Index the tree (once per job)
+        index = None
+        if root is not None:
+            if self.element_index is None or self.element_index[0] is not root:
+                self.build_index(root)
+            index = self.element_index[1]
+
         if lookup:
             references = [lookup]
         else:
@@ -3278,11 +3302,7 @@ class S3ImportJob():
             # Create a UID<->ID map
             id_map = Storage()
             if attr == UID and uids:
-                _uids = map(import_uid, uids)
-                query = ktable[UID].belongs(_uids)
-                records = db(query).select(ktable.id,
-                                           ktable[UID])
-                id_map = dict((r[UID], r.id) for r in records)
+                id_map = self.lookup_ids(ktable, map(import_uid, uids))
 
             if not uids:
                 # Anonymous reference: <resource> inside the element
@@ -3302,15 +3322,10 @@ class S3ImportJob():
                     if directory is not None:
                         entry = directory.get((tablename, attr, uid), None)
                     if not entry:
-                        expr = './/%s[@%s="%s" and @%s=$uid]' % (
-                                    TAG.resource,
-                                    ATTRIBUTE.name,
-                                    tablename,
-                                    attr)
-                        e = root.xpath(expr, uid=uid)
-                        if e:
+                        e = index.get((tablename, attr, uid))
+                        if e is not None:
                             # Element in the source => append to relements
-                            relements.append(e[0])
+                            relements.append(e)
                         else:
                             # No element found, see if original record exists
                             _uid = import_uid(uid)
@@ -3355,6 +3370,125 @@ class S3ImportJob():
 
         return reference_list
 
+    # -------------------------------------------------------------------------
+    def build_index(self, root):
+        """
+            Index all resource elements in the tree by (tablename,
+            attribute, uid), and resolve all external UIDs referenced
+            in the tree with one query per referenced table
+
+            @param root: the root element of the import tree
+        """
+
+        s3db = current.s3db
+        xml = current.xml
+
+        import_uid = xml.import_uid
+        ATTRIBUTE = xml.ATTRIBUTE
+        UID = xml.UID
+
+        NAME = ATTRIBUTE.name
+        FIELD = ATTRIBUTE.field
+        RESOURCE = ATTRIBUTE.resource
+        TUID = ATTRIBUTE.tuid
+
+        index = {}
+        uids = {}
+        ktables = {}
+
+        for element in root.iter(xml.TAG.resource):
+
+            tablename = element.get(NAME)
+            if not tablename:
+                continue
+
+            # Index the element (first occurrence wins, like the lookup)
+            for attr in (UID, TUID):
+                uid = element.get(attr)
+                if uid:
+                    key = (tablename, attr, uid)
+                    if key not in index:
+                        index[key] = element
+
+            # Collect the UIDs of all references from this element
+            for reference in element.findall("reference"):
+                value = reference.get(UID)
+                if not value:
+                    continue
+                field = reference.get(FIELD)
+                if not field:
+                    continue
+
+                # Find the key table (once per field)
+                fkey = (tablename, field)
+                if fkey in ktables:
+                    ktablename, multiple = ktables[fkey]
+                else:
+                    ktablename = multiple = None
+                    table = s3db.table(tablename)
+                    if table is not None and field in table.fields:
+                        ktablename, key, multiple = \
+                                    s3_get_foreign_key(table[field])
+                    ktables[fkey] = (ktablename, multiple)
+                if not ktablename:
+                    continue
+
+                if multiple:
+                    try:
+                        values = json.loads(value)
+                    except ValueError:
+                        continue
+                else:
+                    values = [value]
+                kuids = uids.get(ktablename)
+                if kuids is None:
+                    kuids = uids[ktablename] = set()
+                kuids.update(import_uid(v) for v in values if v)
+
+        self.element_index = (root, index)
+
+        # Resolve all UIDs in bulk
+        self.uid_map = {}
+        for ktablename, kuids in uids.items():
+            ktable = s3db.table(ktablename)
+            if ktable is None or UID not in ktable.fields:
+                continue
+            self.lookup_ids(ktable, kuids)
+
+    # -------------------------------------------------------------------------
+    def lookup_ids(self, ktable, uids):
+        """
+            Look up the record IDs for UIDs in a table, caching the
+            results in the job (so that each UID is only looked up once)
+
+            @param ktable: the table
+            @param uids: iterable of UIDs (already converted by import_uid)
+
+            @return: dict {uid: record_id} of the UIDs found in the table
+        """
+
+        UID = current.xml.UID
+
+        uid_map = self.uid_map.get(ktable._tablename)
+        if uid_map is None:
+            uid_map = self.uid_map[ktable._tablename] = {}
+
+        missing = [uid for uid in set(uids) if uid and uid not in uid_map]
+        if missing:
+            db = current.db
+            field = ktable[UID]
+            chunk_size = 10000
+            for i in xrange(0, len(missing), chunk_size):
+                chunk = missing[i:i + chunk_size]
+                for uid in chunk:
+                    uid_map[uid] = None
+                rows = db(field.belongs(chunk)).select(ktable.id, field)
+                for row in rows:
+                    uid_map[row[UID]] = row.id
+
+        return dict((uid, uid_map[uid])
+                    for uid in uids if uid and uid_map.get(uid) is not None)
+
     # -------------------------------------------------------------------------
     def load_item(self, row):
         """
@@ -3416,6 +3550,10 @@ class S3ImportJob():
             self.resolve(item_id, import_list)
             if item_id not in import_list:
                 import_list.append(item_id)
+
+        # Batch deduplication
+        self.deduplicate()
+
         # Commit the items
         items = self.items
         count = 0
@@ -3476,6 +3614,33 @@ class S3ImportJob():
         self.deleted = deleted
         return True
 
+    # -------------------------------------------------------------------------
+    def deduplicate(self):
+        """
+            Batch deduplication: pass all items of a table to the bulk
+            method of the table's deduplicator (if it has one), so that
+            duplicates can be detected with a few set queries rather than
+            one query per item; deduplicators without a bulk method are
+            still called per item (by S3ImportItem.deduplicate)
+        """
+
+        tables = {}
+        for item in self.items.values():
+            tablename = item.tablename
+            if not tablename or item.table is None:
+                continue
+            if tablename in tables:
+                tables[tablename].append(item)
+            else:
+                tables[tablename] = [item]
+
+        get_config = current.s3db.get_config
+        for tablename, items in tables.items():
+            resolve = get_config(tablename, "deduplicate")
+            bulk = getattr(resolve, "bulk", None)
+            if callable(bulk):
+                bulk(items)
+
     # -------------------------------------------------------------------------
     def __define_tables(self):
         """
@@ -3663,6 +3828,9 @@ class S3ImportJob():
 class S3Duplicate(object):
     """ Standard deduplicator method """
 
+    # Placeholder for values which can not be determined before commit
+    UNKNOWN = object()
+
     def __init__(self, primary=None, secondary=None, ignore_case=True):
         """
             Constructor
@@ -3732,9 +3900,14 @@ class S3Duplicate(object):
             if value:
                 query &= self.match(field, value)
 
-        # Find a match
-        duplicate = current.db(query).select(table._id,
-                                             limitby = (0, 1)).first()
+        # Find a match (use the result of the batch deduplication
+        # if the item data have not changed since)
+        prematch = item.prematch
+        if prematch is not None and prematch[0] == self.key(table, data):
+            duplicate = prematch[1]
+        else:
+            duplicate = current.db(query).select(table._id,
+                                                 limitby = (0, 1)).first()
 
         # Update import item if match found:
         if duplicate:
@@ -3745,6 +3918,201 @@ class S3Duplicate(object):
         # For uses outside of imports:
         return duplicate
 
+    # -------------------------------------------------------------------------
+    def bulk(self, items):
+        """
+            Batch deduplication (called by the import job before commit):
+            match all items of a table against the database with a few
+            set queries, and store the results in the items for __call__
+
+            @param items: the import items (all of the same table)
+
+            @raise SyntaxError: if any of the query fields doesn't exist
+                                in the item table
+        """
+
+        table = None
+        for item in items:
+            if item.table is not None:
+                table = item.table
+                break
+        if table is None:
+            return
+
+        error = "Invalid field for duplicate detection: %s (%s)"
+        for fname in self.primary | self.secondary:
+            if fname not in table.fields:
+                raise SyntaxError(error % (fname, table))
+
+        UNKNOWN = self.UNKNOWN
+        UID = current.xml.UID
+        synchronise_uuids = current.response.s3.synchronise_uuids
+
+        # Compute the match keys, and count the primary keys of all
+        # items (even those which are not deduplicated here), because
+        # any record created by this job could be a match for another
+        # item with the same primary key
+        candidates = []
+        counts = {}
+        partial = {}
+        for item in items:
+            data = item.data
+            if not data or item.table is None:
+                continue
+
+            key = self.key(table, data, references=item.references)
+            pkey, skey = key
+
+            if UNKNOWN in pkey:
+                # Match only the known values
+                pattern = tuple(i for i, v in enumerate(pkey)
+                                if v is not UNKNOWN)
+                values = tuple(pkey[i] for i in pattern)
+                if pattern in partial:
+                    partial[pattern].add(values)
+                else:
+                    partial[pattern] = set([values])
+                continue
+            counts[pkey] = counts.get(pkey, 0) + 1
+
+            if item.id or \
+               item.original is not None or \
+               item.accepted is False or \
+               UID in data and not synchronise_uuids or \
+               None in pkey or \
+               any(v is UNKNOWN for fname, v in skey):
+                # Not deduplicated by this method, or not in bulk
+                continue
+            candidates.append((item, key))
+
+        # Skip items which could match records created by this job
+        candidates = [(item, key) for item, key in candidates
+                      if counts[key[0]] == 1 and
+                      not any(tuple(key[0][i] for i in pattern) in values
+                              for pattern, values in partial.items())]
+        if not candidates:
+            return
+
+        db = current.db
+        ignore_case = self.ignore_case
+        primary = sorted(self.primary)
+        fields = [table._id] + [table[fname] for fname in
+                                sorted(self.primary | self.secondary)]
+
+        chunk_size = 500
+        for i in xrange(0, len(candidates), chunk_size):
+            chunk = candidates[i:i + chunk_size]
+
+            # Look up all records matching the primary fields
+            query = None
+            for index, fname in enumerate(primary):
+                field = table[fname]
+                values = list(set(key[0][index] for item, key in chunk))
+                if ignore_case and str(field.type) in ("string", "text"):
+                    q = field.lower().belongs(values)
+                else:
+                    q = field.belongs(values)
+                query = q if query is None else query & q
+            rows = db(query).select(orderby=table._id, *fields)
+
+            found = {}
+            for row in rows:
+                pkey = self.key(table, row)[0]
+                if pkey in found:
+                    found[pkey].append(row)
+                else:
+                    found[pkey] = [row]
+
+            # Match the secondary fields
+            for item, key in chunk:
+                duplicate = None
+                pkey, skey = key
+                for row in found.get(pkey, ()):
+                    for fname, value in skey:
+                        if self.normalize(table[fname], row[fname]) != value:
+                            break
+                    else:
+                        duplicate = row
+                        break
+                item.prematch = (key, duplicate)
+
+    # -------------------------------------------------------------------------
+    def key(self, table, data, references=None):
+        """
+            Helper function to compute the match key of an import item
+
+            @param table: the Table
+            @param data: the item data (or a Row)
+            @param references: the item references, to determine which
+                               foreign keys are not resolved yet (only
+                               needed before commit)
+
+            @return: tuple (primary, secondary), with primary being a
+                     tuple of normalized values of the primary fields,
+                     and secondary a tuple of (fieldname, value) for
+                     all secondary fields with a value
+        """
+
+        UNKNOWN = self.UNKNOWN
+        normalize = self.normalize
+
+        # Foreign keys which are set only when the item gets committed
+        resolved = {}
+        pending = set()
+        if references:
+            for reference in references:
+                entry = reference.entry
+                if not entry:
+                    continue
+                field = reference.field
+                if isinstance(field, (list, tuple)):
+                    pkey, fkey = field
+                else:
+                    pkey, fkey = ("id", field)
+                if pkey == "id" and entry.id and not entry.item_id and \
+                   fkey in table.fields and \
+                   not str(table[fkey].type).startswith("list:"):
+                    resolved[fkey] = entry.id
+                else:
+                    pending.add(fkey)
+
+        def value(fname):
+            if fname in pending:
+                return UNKNOWN
+            elif fname in resolved:
+                v = resolved[fname]
+            else:
+                v = data.get(fname)
+            return normalize(table[fname], v)
+
+        primary = tuple(value(fname) for fname in sorted(self.primary))
+
+        secondary = []
+        for fname in sorted(self.secondary):
+            v = value(fname)
+            if v:
+                secondary.append((fname, v))
+
+        return primary, tuple(secondary)
+
+    # -------------------------------------------------------------------------
+    def normalize(self, field, value):
+        """
+            Helper function to normalize a value for matching in Python,
+            in the same way as match() does in the database
+
+            @param field: the Field
+            @param value: the value
+        """
+
+        if self.ignore_case and str(field.type) in ("string", "text"):
+            if hasattr(value, "lower"):
+                value = s3_unicode(value).lower()
+            elif value is not None:
+                # Matched case-sensitive by match(), can't batch this
+                value = self.UNKNOWN
+        return value
+
     # -------------------------------------------------------------------------
     def match(self, field, value):
         """
@@ -3799,6 +4167,12 @@ class S3BulkImporter(object):
         self.errorList = []
         self.resultList = []
 
+    # Depth of foreign key references to follow for the footprint of tasks
+    FOOTPRINT_DEPTH = 2
+
+    # Prefix of the output lines of prepopulate workers
+    WORKER_PREFIX = "S3PREPOP "
+
     # -------------------------------------------------------------------------
     def load_descriptor(self, path):
         """
@@ -4535,13 +4909,768 @@ class S3BulkImporter(object):
         """
             Load and then execute the import jobs that are listed in the
             descriptor file (tasks.cfg)
+
+            - with settings.base.prepopulate_workers > 1, import jobs
+              which do not depend on each other are executed concurrently
+              in worker processes (not for SQLite, which allows only one
+              writer at a time)
         """
 
         self.load_descriptor(path)
-        for task in self.tasks:
-            if task[0] == 1:
-                self.execute_import_task(task)
-            elif task[0] == 2:
-                self.execute_special_task(task)
+
+        workers = current.deployment_settings.get_base_prepopulate_workers()
+        if workers > 1 and \
+           len(self.tasks) > 1 and \
+           current.db._dbname != "sqlite":
+            self.perform_tasks_parallel(path, workers)
+        else:
+            for task in self.tasks:
+                self.execute_task(task)
+
+    # -------------------------------------------------------------------------
+    def execute_task(self, task):
+        """
+            Execute an import task
+
+            @param task: the task
+        """
+
+        if task[0] == 1:
+            self.execute_import_task(task)
+        elif task[0] == 2:
+            self.execute_special_task(task)
+
+    # -------------------------------------------------------------------------
+    def perform_tasks_parallel(self, path, workers):
+        """
+            Execute the import jobs of a descriptor file concurrently
+            in worker processes, as far as their dependencies allow
+
+            @param path: the path of the descriptor file (tasks.cfg)
+            @param workers: the maximum number of worker processes
+
+            @note: special tasks (e.g. import_role) are executed in this
+                   process, once all previous tasks are complete and before
+                   any subsequent task is started
+            @note: if all workers fail, the remaining tasks are executed
+                   serially in this process
+        """
+
+        import subprocess
+        import threading
+        import Queue
+        from gluon.settings import global_settings
+
+        db = current.db
+        request = current.request
+
+        tasks = self.tasks
+        dependencies = self.task_dependencies(tasks)
+
+        # Workers must see all data written so far
+        db.commit()
+
+        # Worker command
+        command = [sys.executable,
+                   os.path.join(global_settings.gluon_parent, "web2py.py"),
+                   "-S", request.application,
+                   "-M",
+                   "-R", os.path.join(request.folder,
+                                      "static", "scripts", "tools",
+                                      "prepopulate_worker.py"),
+                   ]
+
+        messages = Queue.Queue()
+        prefix = self.WORKER_PREFIX
+
+        def read(worker):
+            # Forward the results of the worker to the message queue
+            for line in iter(worker.stdout.readline, ""):
+                if line.startswith(prefix):
+                    try:
+                        message = json.loads(line[len(prefix):])
+                    except ValueError:
+                        continue
+                    messages.put((worker, message))
+            # Worker has ended
+            messages.put((worker, None))
+
+        # Start the workers
+        pool = []
+        for i in xrange(min(workers, len(tasks))):
+            try:
+                worker = subprocess.Popen(command,
+                                          cwd = global_settings.gluon_parent,
+                                          stdin = subprocess.PIPE,
+                                          stdout = subprocess.PIPE,
+                                          )
+            except OSError, e:
+                self.errorList.append("WARNING: could not start prepopulate worker: %s" % e)
+                break
+            reader = threading.Thread(target=read, args=(worker,))
+            reader.daemon = True
+            reader.start()
+            pool.append(worker)
+
+        pending = range(len(tasks))
+        done = set()
+        running = {}
+        idle = list(pool)
+
+        while pending and pool:
+
+            # Dispatch all tasks which are ready to run
+            for index in list(pending):
+                if not dependencies[index] <= done:
+                    continue
+                task = tasks[index]
+                if task[0] != 1:
+                    # Special task (all previous tasks are complete)
+                    db.commit()
+                    self.execute_task(task)
+                    db.commit()
+                    done.add(index)
+                    pending.remove(index)
+                    continue
+                if not idle:
+                    break
+                worker = idle.pop(0)
+                try:
+                    worker.stdin.write("%s\t%s\n" % (path, index))
+                    worker.stdin.flush()
+                except IOError:
+                    # Worker has ended
+                    pool.remove(worker)
+                    continue
+                running[worker] = index
+                pending.remove(index)
+
+            if not running:
+                # No workers left
+                break
+
+            # Wait for a worker to report
+            worker, message = messages.get()
+            index = running.pop(worker, None)
+            if message is None:
+                # Worker has ended
+                if worker in pool:
+                    pool.remove(worker)
+                if worker in idle:
+                    idle.remove(worker)
+                if index is not None:
+                    task = tasks[index]
+                    self.errorList.append("prepopulate error: worker failed on %s" % task[3])
+                    done.add(index)
+            else:
+                self.errorList.extend(message.get("errors", []))
+                self.resultList.extend(message.get("results", []))
+                if index is not None:
+                    done.add(index)
+                idle.append(worker)
+
+        # Wait for the remaining running tasks (e.g. if the loop was
+        # left because all other workers failed)
+        while running:
+            worker, message = messages.get()
+            index = running.pop(worker, None)
+            if message:
+                self.errorList.extend(message.get("errors", []))
+                self.resultList.extend(message.get("results", []))
+            elif index is not None:
+                self.errorList.append("prepopulate error: worker failed on %s" % tasks[index][3])
+
+        # Stop the workers
+        for worker in pool:
+            try:
+                worker.stdin.close()
+            except IOError:
+                pass
+            worker.wait()
+
+        # Execute any remaining tasks serially
+        db.commit()
+        for index in pending:
+            self.execute_task(tasks[index])
+
+    # -------------------------------------------------------------------------
+    def task_dependencies(self, tasks):
+        """
+            Infer the dependencies between import tasks: a task depends
+            on every previous task which writes to any of the tables it
+            writes to or references, special tasks depend on all previous
+            tasks and all subsequent tasks depend on them
+
+            @param tasks: the list of tasks
+
+            @return: a list with a set of the indexes of the tasks each
+                     task depends on
+        """
+
+        footprints = [self.task_footprint(task) for task in tasks]
+
+        dependencies = []
+        for index, footprint in enumerate(footprints):
+            depends = set()
+            for i in xrange(index):
+                other = footprints[i]
+                if footprint is None or other is None or footprint & other:
+                    depends.add(i)
+            dependencies.append(depends)
+
+        return dependencies
+
+    # -------------------------------------------------------------------------
+    def task_footprint(self, task):
+        """
+            Determine the tables an import task can write to or read from:
+            its target table, the super-entities and components of it, and
+            the tables referenced by foreign keys (XSLTs frequently create
+            referenced records, e.g. organisations or locations)
+
+            @param task: the task
+
+            @return: a set of table names, or None for special tasks
+                     (which could access any table)
+        """
+
+        if task[0] != 1:
+            return None
+
+        s3db = current.s3db
+
+        tablename = "%s_%s" % (task[1], task[2])
+        details = self.alternateTables.get(tablename)
+        if details and "tablename" in details:
+            tablename = details["tablename"]
+
+        meta_fields = set(s3_all_meta_field_names())
+
+        footprint = set()
+        queue = [(tablename, 0)]
+        while queue:
+            tablename, depth = queue.pop(0)
+            if tablename in footprint:
+                continue
+            footprint.add(tablename)
+            if depth >= self.FOOTPRINT_DEPTH:
+                continue
+            table = s3db.table(tablename)
+            if table is None:
+                continue
+
+            references = []
+
+            # Foreign keys
+            for field in table:
+                if field.name in meta_fields:
+                    continue
+                ktablename = s3_get_foreign_key(field)[0]
+                if ktablename:
+                    references.append(ktablename)
+
+            # Super-entities
+            supertables = s3db.get_config(tablename, "super_entity")
+            if supertables:
+                if not isinstance(supertables, (list, tuple)):
+                    supertables = [supertables]
+                for supertable in supertables:
+                    references.append(str(supertable))
+
+            # Components of the target table
+            if depth == 0:
+                components = s3db.get_components(table)
+                if components:
+                    for component in components.values():
+                        references.append(component.tablename)
+
+            queue.extend((t, depth + 1) for t in references)
+
+        return footprint
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def worker(cls):
+        """
+            Worker process for parallel prepopulate (started by
+            perform_tasks_parallel): reads "path<TAB>index" lines from
+            stdin, executes the respective import task and writes the
+            errors and results as JSON to stdout
+        """
+
+        auth = current.auth
+        s3db = current.s3db
+        request = current.request
+        s3 = current.response.s3
+
+        # Same environment as in models/zzz_1st_run.py
+        auth.override = True
+        current.gis.disable_update_location_tree = True
+        current.deployment_settings.pr.import_update_requires_email = False
+        s3db.configure("auth_user",
+                       onaccept = lambda form: auth.s3_approve_user(form.vars))
+        s3db.add_components("auth_user", auth_membership="user_id")
+        s3.asset_import = True
+        if not request.env.request_method:
+            request.env.request_method = "GET"
+
+        s3db.load_all_models()
+
+        importer = cls()
+        descriptors = {}
+
+        stdin = sys.stdin
+        stdout = sys.stdout
+        for line in iter(stdin.readline, ""):
+            try:
+                path, index = line.rstrip("\n").split("\t")
+                index = int(index)
+            except ValueError:
+                continue
+
+            # Load the descriptor
+            if path not in descriptors:
+                importer.tasks = []
+                importer.load_descriptor(path)
+                descriptors[path] = importer.tasks
+            tasks = descriptors[path]
+
+            importer.errorList = []
+            importer.resultList = []
+            if index < len(tasks):
+                task = tasks[index]
+                try:
+                    importer.execute_task(task)
+                except Exception, e:
+                    current.db.rollback()
+                    auth.rollback = False
+                    importer.errorList.append("prepopulate error: %s (file: %s)" %
+                                              (e, task[3]))
+            else:
+                importer.errorList.append("prepopulate error: invalid task %s" % index)
+
+            message = {"errors": [s3_unicode(e) for e in importer.errorList],
+                       "results": [s3_unicode(r) for r in importer.resultList],
+                       }
+            stdout.write("%s%s\n" % (cls.WORKER_PREFIX, json.dumps(message)))
+            stdout.flush()
+
+# =============================================================================
+class S3BulkImportSnapshot(object):
+    """
+        Database snapshot of a prepopulate, to restore instead of
+        re-importing the templates when none of the import files
+        (tasks.cfg, CSV, XSLT incl. included stylesheets, template
+        config) and the database schema have changed
+
+        - PostgreSQL and MySQL use their native dump/restore tools,
+          SQLite copies the database file and restores it by attaching
+        - files written to the uploads folder during the prepopulate
+          are saved in a ZIP archive next to the dump, and extracted
+          again when restoring
+    """
+
+    def __init__(self, paths):
+        """
+            Constructor, to be called before the prepopulate
+
+            @param paths: the paths of the templates to prepopulate
+        """
+
+        self.paths = paths
+        self.db_type = current.deployment_settings.get_database_type()
+
+        self._key = None
+
+        # Files in the uploads folder before the prepopulate
+        self.uploads = self.scan_uploads()
+
+    # -------------------------------------------------------------------------
+    @property
+    def key(self):
+        """
+            The snapshot key, a hash of all prepopulate inputs
+        """
+
+        key = self._key
+        if key is None:
+            key = self._key = self.hash_inputs()
+        return key
+
+    # -------------------------------------------------------------------------
+    @property
+    def filename(self):
+        """
+            The file name of the snapshot
+        """
+
+        folder = current.deployment_settings.get_base_prepopulate_snapshots()
+        if not isinstance(folder, basestring):
+            folder = os.path.join(current.request.folder,
+                                  "databases",
+                                  "snapshots",
+                                  )
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+        extension = "sqlite" if self.db_type == "sqlite" else "dump"
+        return os.path.join(folder,
+                            "prepopulate_%s.%s" % (self.key, extension))
+
+    # -------------------------------------------------------------------------
+    @property
+    def uploads_filename(self):
+        """
+            The file name of the uploads archive of the snapshot
+        """
+
+        return "%s.uploads.zip" % os.path.splitext(self.filename)[0]
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def scan_uploads():
+        """
+            Get all files in the uploads folder
+
+            @return: set of file names, relative to the uploads folder
+        """
+
+        folder = os.path.join(current.request.folder, "uploads")
+
+        files = set()
+        for root, dirnames, filenames in os.walk(folder):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                files.add(os.path.relpath(path, folder))
+        return files
+
+    # -------------------------------------------------------------------------
+    def hash_inputs(self):
+        """
+            Compute a hash of all prepopulate inputs
+
+            @return: the hash as hex string
+        """
+
+        import hashlib
+
+        db = current.db
+        sha = hashlib.sha1()
+        update = sha.update
+
+        # Database type and schema
+        update(self.db_type)
+        for tablename in sorted(db.tables):
+            table = db[tablename]
+            update("%s(%s)" % (tablename,
+                               ",".join("%s:%s" % (f.name, f.type)
+                                        for f in table)))
+
+        def update_file(filename):
+            update(filename or "")
+            if filename and filename[:7] != "http://" and \
+               os.path.isfile(filename):
+                with open(filename, "rb") as f:
+                    for chunk in iter(lambda: f.read(65536), ""):
+                        update(chunk)
+
+        importer = S3BulkImporter()
+        for path in self.paths:
+            # Template config and descriptor
+            update_file(os.path.join(path, "config.py"))
+            update_file(os.path.join(path, "tasks.cfg"))
+
+            # Import files
+            importer.tasks = []
+            importer.load_descriptor(path)
+            for task in importer.tasks:
+                if task[0] == 1:
+                    update_file(task[3])
+                    # Stylesheet including all stylesheets it includes
+                    for stylesheet in self.stylesheets(task[4]):
+                        update_file(stylesheet)
+                    update(s3_unicode(task[5]).encode("utf-8"))
+                else:
+                    update(task[1])
+                    update_file(task[2])
+                    update(s3_unicode(task[3]).encode("utf-8"))
+
+        return sha.hexdigest()
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def stylesheets(cls, filename, seen=None):
+        """
+            Get a stylesheet and all stylesheets it includes or imports
+            (recursively)
+
+            @param filename: the stylesheet file name
+            @param seen: set of the (absolute) file names already found
+                         (for recursion)
+
+            @return: list of file names
+        """
+
+        if not filename or "://" in filename:
+            return [filename]
+        if seen is None:
+            seen = set()
+
+        path = os.path.abspath(filename)
+        if path in seen:
+            return []
+        seen.add(path)
+
+        stylesheets = [filename]
+        if not os.path.isfile(filename):
+            return stylesheets
+        try:
+            tree = etree.parse(filename)
+        except etree.XMLSyntaxError:
+            return stylesheets
+
+        XSL = "{http://www.w3.org/1999/XSL/Transform}"
+        folder = os.path.dirname(filename)
+        for node in tree.getroot():
+            if node.tag in (XSL + "include", XSL + "import"):
+                href = node.get("href")
+                if href and "://" not in href:
+                    stylesheets.extend(cls.stylesheets(os.path.join(folder, href),
+                                                       seen = seen,
+                                                       ))
+        return stylesheets
+
+    # -------------------------------------------------------------------------
+    def restore(self):
+        """
+            Restore the snapshot, if one exists
+
+            @return: True if successful, otherwise False
+        """
+
+        filename = self.filename
+        if not os.path.exists(filename) or \
+           not os.path.exists(self.uploads_filename):
+            # No snapshot, or not including the uploads
+            return False
+
+        db = current.db
+        db.commit()
+
+        db_type = self.db_type
+        try:
+            if db_type == "sqlite":
+                self._restore_sqlite(filename)
+            else:
+                self._run(self._command("restore", filename), filename)
+            self._restore_uploads(self.uploads_filename)
+        except Exception, e:
+            current.log.error("Could not restore prepopulate snapshot %s: %s" %
+                              (filename, e))
+            return False
+
+        return True
+
+    # -------------------------------------------------------------------------
+    def save(self):
+        """
+            Save a snapshot of the database
+        """
+
+        db = current.db
+        db.commit()
+
+        filename = self.filename
+        db_type = self.db_type
+        try:
+            if db_type == "sqlite":
+                import shutil
+                database = os.path.join(current.request.folder,
+                                        "databases",
+                                        "storage.db",
+                                        )
+                shutil.copyfile(database, filename)
+            else:
+                self._run(self._command("save", filename), filename)
+            self._save_uploads(self.uploads_filename)
+        except Exception, e:
+            current.log.error("Could not save prepopulate snapshot %s: %s" %
+                              (filename, e))
+            for name in (filename, self.uploads_filename):
+                if os.path.exists(name):
+                    os.remove(name)
+
+    # -------------------------------------------------------------------------
+    def _save_uploads(self, filename):
+        """
+            Save the files written to the uploads folder during the
+            prepopulate in a ZIP archive (written even if there are no
+            such files, to mark the snapshot as complete)
+
+            @param filename: the archive file name
+        """
+
+        import zipfile
+
+        folder = os.path.join(current.request.folder, "uploads")
+        files = self.scan_uploads() - self.uploads
+
+        archive = zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED)
+        try:
+            for name in sorted(files):
+                archive.write(os.path.join(folder, name), name)
+        finally:
+            archive.close()
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _restore_uploads(filename):
+        """
+            Extract the uploads archive of a snapshot into the uploads folder
+
+            @param filename: the archive file name
+        """
+
+        import zipfile
+
+        folder = os.path.abspath(os.path.join(current.request.folder,
+                                              "uploads"))
+
+        archive = zipfile.ZipFile(filename, "r")
+        try:
+            for name in archive.namelist():
+                path = os.path.abspath(os.path.join(folder, name))
+                if not path.startswith(folder + os.sep):
+                    raise ValueError("Invalid file name in archive: %s" % name)
+            archive.extractall(folder)
+        finally:
+            archive.close()
+
+    # -------------------------------------------------------------------------
+    def _command(self, action, filename):
+        """
+            Get the dump/restore command for the database
+
+            @param action: "save" or "restore"
+            @param filename: the snapshot file name
+
+            @return: tuple (command, environment, stdin filename)
+        """
+
+        get = current.deployment_settings.database.get
+
+        host = get("host", "localhost")
+        username = get("username", "sahana")
+        password = get("password", "password")
+        database = get("database", "sahana")
+        environment = dict(os.environ)
+
+        if self.db_type == "postgres":
+            environment["PGPASSWORD"] = password
+            options = ["-h", host,
+                       "-p", str(get("port") or "5432"),
+                       "-U", username,
+                       "--no-owner",
+                       ]
+            if action == "save":
+                command = ["pg_dump", "-Fc", "-f", filename] + options + [database]
+            else:
+                command = ["pg_restore", "--clean", "--if-exists", "-d", database] + \
+                          options + [filename]
+            stdin = None
+
+        elif self.db_type == "mysql":
+            environment["MYSQL_PWD"] = password
+            options = ["-h", host,
+                       "-P", str(get("port") or "3306"),
+                       "-u", username,
+                       ]
+            if action == "save":
+                command = ["mysqldump", "--single-transaction",
+                           "--result-file=%s" % filename] + options + [database]
+                stdin = None
+            else:
+                command = ["mysql"] + options + [database]
+                stdin = filename
+
+        else:
+            raise ValueError("Snapshots not supported for %s" % self.db_type)
+
+        return command, environment, stdin
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _run(command, filename):
+        """
+            Run a dump/restore command
+
+            @param command: tuple (command, environment, stdin filename)
+            @param filename: the snapshot file name (for error messages)
+        """
+
+        import subprocess
+
+        command, environment, stdin = command
+        if stdin:
+            stdin = open(stdin, "rb")
+        try:
+            process = subprocess.Popen(command,
+                                       env = environment,
+                                       stdin = stdin,
+                                       stderr = subprocess.PIPE,
+                                       )
+            output = process.communicate()[1]
+        finally:
+            if stdin:
+                stdin.close()
+        if process.returncode:
+            raise RuntimeError("%s failed (%s): %s" % (command[0],
+                                                       filename,
+                                                       output))
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _restore_sqlite(filename):
+        """
+            Restore an SQLite snapshot: copy all rows from the snapshot
+            database (attached), and recreate its extra indexes
+
+            @param filename: the snapshot file name
+        """
+
+        db = current.db
+        executesql = db.executesql
+
+        executesql("PRAGMA foreign_keys=OFF;")
+        executesql("ATTACH DATABASE '%s' AS snapshot;" % filename.replace("'", "''"))
+        try:
+            rows = executesql("SELECT name FROM snapshot.sqlite_master WHERE type='table';")
+            available = set(row[0] for row in rows)
+            for tablename in db.tables:
+                if tablename not in available:
+                    continue
+                fields = ",".join('"%s"' % fn for fn in db[tablename].fields)
+                executesql('DELETE FROM "%s";' % tablename)
+                executesql('INSERT INTO "%s" (%s) SELECT %s FROM snapshot."%s";' %
+                           (tablename, fields, fields, tablename))
+            if "sqlite_sequence" in available:
+                executesql("DELETE FROM main.sqlite_sequence;")
+                executesql("INSERT INTO main.sqlite_sequence SELECT * FROM snapshot.sqlite_sequence;")
+
+            # Extra indexes (e.g. from 1st_run)
+            rows = executesql("SELECT sql FROM snapshot.sqlite_master WHERE type='index' AND sql IS NOT NULL;")
+            for row in rows:
+                try:
+                    executesql(row[0])
+                except Exception:
+                    # Index exists
+                    pass
+            db.commit()
+        except:
+            db.rollback()
+            raise
+        finally:
+            executesql("DETACH DATABASE snapshot;")
+            executesql("PRAGMA foreign_keys=ON;")
 
 # END =========================================================================
@@ -29,6 +29,8 @@
 
 __all__ = ("S3Model",)
 
+import time
+
 from gluon import *
 # Here are dependencies listed for reference:
 #from gluon import current
@@ -40,6 +42,7 @@ from gluon.tools import callback
 from s3dal import Table
 from s3navigation import S3ScriptItem
 from s3resource import S3Resource
+from s3utils import s3_update_table_version
 from s3validators import IS_ONE_OF
 
 DEFAULT = lambda: None
@@ -63,8 +66,12 @@ class S3Model(object):
 
     LOCK = "s3_model_lock"
     LOAD = "s3_model_load"
+    TIMINGS = "s3_model_timings"
     DELETED = "deleted"
 
+    # Per-process index of model modules, {prefix: Storage}, see index()
+    INDEX = {}
+
     def __init__(self, module=None):
         """ Constructor """
 
@@ -98,11 +105,17 @@ class S3Model(object):
             if self.__loaded():
                 return
             self.__lock()
+            settings = current.deployment_settings
+            timings = settings.get_log_model_timings()
+            if timings:
+                start = time.time()
             if module in mandatory_models or \
-               current.deployment_settings.has_module(module):
+               settings.has_module(module):
                 env = self.model()
             else:
                 env = self.defaults()
+            if timings:
+                self.__timing(module, time.time() - start)
             if isinstance(env, (Storage, dict)):
                 response.s3.update(env)
             self.__loaded(True)
@@ -151,6 +164,35 @@ class S3Model(object):
                 del response[LOCK]
         return
 
+    # -------------------------------------------------------------------------
+    def __timing(self, module, duration):
+        """
+            Record and log the time it took to load this model,
+            activated by settings.log.model_timings
+
+            @param module: the module prefix
+            @param duration: the loading time (seconds, including
+                             the time to load other models this one
+                             depends on)
+        """
+
+        response = current.response
+        TIMINGS = self.TIMINGS
+        if TIMINGS not in response:
+            response[TIMINGS] = []
+        name = self.__class__.__name__
+        response[TIMINGS].append((name, duration))
+
+        request = current.request
+        current.log.info("S3Model",
+                         "%s/%s: %s.%s loaded in %.2fms" % \
+                         (request.controller,
+                          request.function,
+                          module,
+                          name,
+                          duration * 1000))
+        return
+
     # -------------------------------------------------------------------------
     def __getattr__(self, name):
         """ Model auto-loader """
@@ -210,30 +252,17 @@ class S3Model(object):
             return ogetattr(db, tablename)
         else:
             prefix, name = tablename.split("_", 1)
-            if hasattr(models, prefix):
-                module = models.__dict__[prefix]
-                loaded = False
-                generic = []
-                for n in module.__all__:
-                    model = module.__dict__[n]
-                    if hasattr(model, "_s3model"):
-                        if loaded:
-                            continue
-                        if hasattr(model, "names"):
-                            if tablename in model.names:
-                                model(prefix)
-                                loaded = True
-                            else:
-                                continue
-                        else:
-                            generic.append(n)
-                    else:
-                        if n == tablename:
-                            s3db.classes[tablename] = (prefix, n)
-                            found = model
-                            loaded = True
-                if not loaded:
-                    [module.__dict__[n](prefix) for n in generic]
+            index = cls.index(prefix)
+            if index is not None:
+                objects = index.objects
+                if tablename in index.names:
+                    objects[index.names[tablename]](prefix)
+                elif tablename in objects and \
+                     not hasattr(objects[tablename], "_s3model"):
+                    s3db.classes[tablename] = (prefix, tablename)
+                    found = objects[tablename]
+                else:
+                    [objects[n](prefix) for n in index.generic]
         if found:
             return found
         if not db_only and tablename in s3:
@@ -263,28 +292,14 @@ class S3Model(object):
             return s3[name]
         elif "_" in name:
             prefix = name.split("_", 1)[0]
-            models = current.models
-            if hasattr(models, prefix):
-                module = models.__dict__[prefix]
-                loaded = False
-                generic = []
-                for n in module.__all__:
-                    model = module.__dict__[n]
-                    if type(model).__name__ == "type":
-                        if loaded:
-                            continue
-                        if hasattr(model, "names"):
-                            if name in model.names:
-                                model(prefix)
-                                loaded = True
-                                generic = []
-                            else:
-                                continue
-                        else:
-                            generic.append(n)
-                    elif n.startswith("%s_" % prefix):
-                        s3[n] = model
-                [module.__dict__[n](prefix) for n in generic]
+            index = cls.index(prefix)
+            if index is not None:
+                objects = index.objects
+                s3.update(index.globals)
+                if name in index.types:
+                    objects[index.types[name]](prefix)
+                else:
+                    [objects[n](prefix) for n in index.untyped]
         if name in s3:
             return s3[name]
         elif isinstance(default, Exception):
@@ -292,6 +307,79 @@ class S3Model(object):
         else:
             return default
 
+    # -------------------------------------------------------------------------
+    @classmethod
+    def index(cls, prefix):
+        """
+            Get the index of a model module, to find the model class
+            defining a table or global by a single lookup rather than
+            by scanning the module. The index is built once per process
+            (and rebuilt if the module gets reloaded).
+
+            @param prefix: the module prefix
+            @return: a Storage with:
+                        objects: the module objects {name: object}
+                        names: {tablename: name} of the S3Model
+                               classes declaring their names
+                        generic: names of S3Model classes without
+                                 declared names
+                        types: {name: name} of all classes declaring
+                               their names
+                        untyped: names of all classes without declared
+                                 names
+                        globals: {name: object} of all non-class objects
+                                 prefixed with the module prefix
+                     or None if there is no such module
+        """
+
+        models = current.models
+        if models is None or not hasattr(models, prefix):
+            return None
+        module = models.__dict__[prefix]
+
+        INDEX = cls.INDEX
+        index = INDEX.get(prefix)
+        if index is not None and index.module is module:
+            return index
+
+        objects = {}
+        names = {}
+        generic = []
+        types = {}
+        untyped = []
+        globals_ = {}
+
+        mprefix = "%s_" % prefix
+        for n in module.__all__:
+            model = module.__dict__[n]
+            objects[n] = model
+            if type(model).__name__ == "type":
+                if hasattr(model, "names"):
+                    is_model = hasattr(model, "_s3model")
+                    for tablename in model.names:
+                        # First definition wins
+                        if is_model and tablename not in names:
+                            names[tablename] = n
+                        if tablename not in types:
+                            types[tablename] = n
+                else:
+                    untyped.append(n)
+                    if hasattr(model, "_s3model"):
+                        generic.append(n)
+            elif n.startswith(mprefix):
+                globals_[n] = model
+
+        index = Storage(module = module,
+                        objects = objects,
+                        names = names,
+                        generic = generic,
+                        types = types,
+                        untyped = untyped,
+                        globals = globals_,
+                        )
+        INDEX[prefix] = index
+        return index
+
     # -------------------------------------------------------------------------
     @classmethod
     def load(cls, name):
@@ -360,6 +448,13 @@ class S3Model(object):
             table = ogetattr(db, tablename)
         else:
             table = db.define_table(tablename, *fields, **args)
+            if "modified_on" in table.fields:
+                # Update the version counter of the table with every write
+                # (see s3_table_version)
+                update = lambda *args: s3_update_table_version(tablename)
+                table._after_insert.append(update)
+                table._after_update.append(update)
+                table._after_delete.append(update)
         return table
 
     # -------------------------------------------------------------------------
@@ -450,6 +545,12 @@ class S3Model(object):
                    cls.get_config(tablename, "onaccept"))
         if "vars" not in record:
             record = Storage(vars=Storage(record), errors=Storage())
+        if method == "update":
+            # Forget cached representations
+            record_id = record["vars"].get("id")
+            if record_id:
+                from s3fields import S3RepresentCache
+                S3RepresentCache.expire_records(tablename, [record_id])
         if onaccept:
             callback(onaccept, record, tablename=tablename)
         return
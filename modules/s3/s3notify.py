@@ -84,10 +84,24 @@ class S3Notifications(object):
         subscriptions = cls._subscriptions(now)
         if subscriptions:
             async = current.s3task.async
-            for row in subscriptions:
-                # Create asynchronous notification task.
-                row.update_record(locked=True)
-                async("notify_notify", args=[row.id])
+            if current.deployment_settings.get_msg_notify_batch():
+                # Create one asynchronous notification task per resource
+                batches = {}
+                for row in subscriptions:
+                    row.update_record(locked=True)
+                    tablename = row.resource
+                    if tablename in batches:
+                        batches[tablename].append(row.id)
+                    else:
+                        batches[tablename] = [row.id]
+                for resource_ids in batches.values():
+                    async("notify_notify_batch",
+                          args=[json.dumps(resource_ids)])
+            else:
+                for row in subscriptions:
+                    # Create asynchronous notification task.
+                    row.update_record(locked=True)
+                    async("notify_notify", args=[row.id])
             message = "%s notifications scheduled." % len(subscriptions)
             current.db.commit()
         else:
@@ -159,32 +173,15 @@ class S3Notifications(object):
         # Break up the URL into its components
         purl = list(urlparse.urlparse(lookup_url))
 
-        # Subscription parameters
+        # Subscription parameters and filters
         last_check_time = s3_encode_iso_datetime(r.last_check_time)
-        query = {"subscription": auth_token, "format": "msg"}
-        if "upd" in s.notify_on:
-            query["~.modified_on__ge"] = last_check_time
-        else:
-            query["~.created_on__ge"] = last_check_time
-
-        # Filters
-        if f.query:
-            from s3filter import S3FilterString
-            resource = s3db.resource(r.resource)
-            fstring = S3FilterString(resource, f.query)
-            for k, v in fstring.get_vars.iteritems():
-                if v is not None:
-                    if k in query:
-                        value = query[k]
-                        if type(value) is list:
-                            value.append(v)
-                        else:
-                            query[k] = [value, v]
-                    else:
-                        query[k] = v
-            query_nice = s3_unicode(fstring.represent())
-        else:
-            query_nice = None
+        query, query_nice = cls._filter_vars(r.resource,
+                                             s.notify_on,
+                                             last_check_time,
+                                             f.query,
+                                             )
+        query["subscription"] = auth_token
+        query["format"] = "msg"
 
         # Add subscription parameters and filters to the URL query, and
         # put the URL back together
@@ -246,6 +243,367 @@ class S3Notifications(object):
         # Done
         return message
 
+    # -------------------------------------------------------------------------
+    @classmethod
+    def notify_batch(cls, resource_ids):
+        """
+            Asynchronous task to notify multiple subscribers about updates
+            in-process (rather than per loopback request), activated by
+            settings.msg.notify_batch.
+
+            Subscriptions are grouped by resource, URL, filter, notify_on
+            and last_check_time; the data for each group are extracted only
+            once per distinct (permission-dependent) resource query, and the
+            messages are rendered once per format and fanned out to all
+            recipients. Groups which can not be processed in-process fall
+            back to notify() for all subscriptions which have not yet been
+            notified.
+
+            @param resource_ids: list of pr_subscription_resource record IDs
+                                 (or a JSON string representing it)
+        """
+
+        _debug("S3Notifications.notify_batch(resource_ids=%s)" % resource_ids)
+
+        if isinstance(resource_ids, basestring):
+            resource_ids = json.loads(resource_ids)
+
+        if not resource_ids:
+            return "No subscriptions to notify."
+
+        db = current.db
+        s3db = current.s3db
+
+        stable = s3db.pr_subscription
+        rtable = db.pr_subscription_resource
+        ftable = s3db.pr_filter
+        utable = s3db.pr_person_user
+
+        # Extract the subscription data
+        join = stable.on(rtable.subscription_id == stable.id)
+        left = [ftable.on(ftable.id == stable.filter_id),
+                utable.on(utable.pe_id == stable.pe_id),
+                ]
+        rows = db(rtable.id.belongs(resource_ids)).select(stable.id,
+                                                          stable.pe_id,
+                                                          stable.frequency,
+                                                          stable.notify_on,
+                                                          stable.method,
+                                                          stable.email_format,
+                                                          rtable.id,
+                                                          rtable.resource,
+                                                          rtable.url,
+                                                          rtable.last_check_time,
+                                                          ftable.query,
+                                                          utable.user_id,
+                                                          join=join,
+                                                          left=left)
+
+        # Group the subscriptions
+        groups = {}
+        seen = set()
+        for row in rows:
+            r = row.pr_subscription_resource
+            if r.id in seen:
+                continue
+            seen.add(r.id)
+            s = row.pr_subscription
+            notify_on = tuple(sorted(s.notify_on)) if s.notify_on else ()
+            key = (r.resource,
+                   r.url,
+                   row.pr_filter.query,
+                   notify_on,
+                   r.last_check_time,
+                   )
+            if key in groups:
+                groups[key].append(row)
+            else:
+                groups[key] = [row]
+
+        auth = current.auth
+        user_id = auth.user.id if auth.user else None
+
+        notified = 0
+        for group in groups.values():
+            # IDs of the subscriptions which have been notified (and
+            # updated) even if the group fails to complete
+            delivered = set()
+            try:
+                done, failed = cls._notify_group(group, delivered)
+            except:
+                exc_info = sys.exc_info()[:2]
+                _debug("In-process notification failed (%s: %s), "
+                       "falling back to notify()" % (exc_info[0].__name__,
+                                                     exc_info[1]))
+                db.rollback()
+                auth.s3_impersonate(user_id)
+                notified += len(delivered)
+                for row in group:
+                    record_id = row.pr_subscription_resource.id
+                    if record_id not in delivered:
+                        cls.notify(record_id)
+                        notified += 1
+                continue
+
+            # Update time stamps and unlock
+            cls._update_subscriptions(done, failed)
+            db.commit()
+            notified += len(done) + len(delivered)
+
+        auth.s3_impersonate(user_id)
+
+        message = "%s subscriptions notified." % notified
+        _debug(message)
+        return message
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def _notify_group(cls, rows, delivered):
+        """
+            Helper for notify_batch() to notify a group of subscribers
+            with identical subscription parameters
+
+            @param rows: the subscription Rows (see notify_batch)
+            @param delivered: set to add the IDs of notified subscriptions
+                              to - these get updated (and committed) right
+                              after the message has been sent, and are not
+                              included in the return value
+
+            @return: tuple (done, failed) of lists of
+                     (subscription Row, check time)
+        """
+
+        from s3rest import S3Request
+
+        auth = current.auth
+        settings = current.deployment_settings
+
+        first = rows[0]
+        r = first.pr_subscription_resource
+        s = first.pr_subscription
+
+        # Parse the subscription URL
+        url = r.url.lstrip("/")
+        purl = urlparse.urlparse(url)
+        path = purl[2].split("/")
+        if len(path) < 2:
+            raise ValueError("Invalid subscription URL: %s" % r.url)
+        c, f, args = path[0], path[1], path[2:]
+        get_vars = Storage()
+        for k, v in urlparse.parse_qs(purl[4]).items():
+            get_vars[k] = v if len(v) > 1 else v[0]
+
+        # Subscription parameters and filters
+        last_check_time = s3_encode_iso_datetime(r.last_check_time)
+        query, query_nice = cls._filter_vars(r.resource,
+                                             s.notify_on,
+                                             last_check_time,
+                                             first.pr_filter.query,
+                                             )
+        get_vars.update(query)
+
+        lookup_url = "%s/%s/%s" % (settings.get_base_public_url(),
+                                   current.request.application,
+                                   url)
+
+        # Check time for all subscriptions in this group (taken before
+        # extracting the data, so that no updates can be missed)
+        now = datetime.datetime.utcnow()
+
+        done = []
+        failed = []
+
+        # Extract the data, once per distinct resource query
+        datasets = {}
+        for row in rows:
+            s = row.pr_subscription
+
+            if not s.notify_on or not s.method:
+                # Nothing to notify
+                done.append((row, now))
+                continue
+
+            subscriber = row.pr_person_user.user_id
+            if not subscriber:
+                # Subscriber must be a user
+                failed.append((row, now))
+                continue
+            auth.s3_impersonate(subscriber)
+
+            try:
+                req = S3Request(c = c,
+                                f = f,
+                                args = args,
+                                extension = "msg",
+                                get_vars = Storage(get_vars),
+                                )
+            except HTTP:
+                # Subscriber not permitted to access the controller
+                failed.append((row, now))
+                continue
+            req.customise_resource()
+            resource = req.resource
+
+            rfilter = resource.rfilter
+            if rfilter is None:
+                resource.build_query()
+                rfilter = resource.rfilter
+            dkey = (str(rfilter.get_query()),
+                    tuple(str(j) for j in rfilter.get_joins(left=True)),
+                    )
+            if dkey in datasets:
+                dataset = datasets[dkey]
+            else:
+                fields = resource.list_fields(key="notify_fields")
+                if "created_on" not in fields:
+                    fields.append("created_on")
+                data = resource.select(fields,
+                                       represent=True,
+                                       raw_data=True)
+                dataset = datasets[dkey] = (resource, data, {})
+            dataset[2][row.pr_subscription_resource.id] = row
+
+        # Render once per dataset and format, then send to all recipients
+        for resource, data, recipients in datasets.values():
+
+            if not recipients:
+                continue
+            if not data["rows"]:
+                # No records found
+                done.extend((row, now) for row in recipients.values())
+                continue
+
+            # Group the recipients by email format and method
+            formats = {}
+            for row in recipients.values():
+                s = row.pr_subscription
+                email_format = s.email_format
+                if not email_format:
+                    email_format = settings.get_msg_notify_email_format()
+                methods = formats.get(email_format)
+                if methods is None:
+                    methods = formats[email_format] = {}
+                for method in s.method:
+                    if method in methods:
+                        methods[method].append(row)
+                    else:
+                        methods[method] = [row]
+
+            for email_format, methods in formats.items():
+                subscription = {"notify_on": first.pr_subscription.notify_on,
+                                "method": methods.keys(),
+                                "email_format": email_format,
+                                "last_check_time": last_check_time,
+                                "filter_query": query_nice,
+                                "page_url": lookup_url,
+                                }
+                subject, messages, errors = cls._compose(resource,
+                                                         data,
+                                                         subscription)
+                for error in errors:
+                    _debug(error)
+                for method, message in messages:
+                    method_rows = methods[method]
+                    pe_ids = [row.pr_subscription.pe_id for row in method_rows]
+                    sent, errors = cls._deliver(pe_ids,
+                                                subject,
+                                                [(method, message)])
+                    if sent:
+                        # Successful if at least one notification went out
+                        # => record this right away, so the subscriber will
+                        # not be notified again if the group fails later
+                        notified = [row for row in method_rows
+                                    if row.pr_subscription_resource.id not in delivered]
+                        cls._update_subscriptions([(row, now) for row in notified], [])
+                        current.db.commit()
+                        delivered.update(row.pr_subscription_resource.id
+                                         for row in notified)
+                    for error in errors:
+                        _debug(error)
+
+            for record_id, row in recipients.items():
+                if record_id not in delivered:
+                    failed.append((row, now))
+
+        return done, failed
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _update_subscriptions(done, failed):
+        """
+            Helper for notify_batch() to update the time stamps of
+            notified subscriptions, and unlock them
+
+            @param done: list of (Row, check time) of successfully
+                         notified subscriptions
+            @param failed: list of (Row, check time) of failed
+                           notifications
+        """
+
+        db = current.db
+        s3db = current.s3db
+
+        rtable = db.pr_subscription_resource
+        intervals = s3db.pr_subscription_check_intervals
+
+        for row, last_check_time in done:
+            s = row.pr_subscription
+            interval = datetime.timedelta(minutes=intervals.get(s.frequency, 0))
+            query = (rtable.id == row.pr_subscription_resource.id)
+            db(query).update(auth_token=None,
+                             locked=False,
+                             last_check_time=last_check_time,
+                             next_check_time=last_check_time + interval)
+        if failed:
+            ids = [row.pr_subscription_resource.id for row, t in failed]
+            db(rtable.id.belongs(ids)).update(auth_token=None,
+                                              locked=False)
+        return
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _filter_vars(tablename, notify_on, last_check_time, filter_query):
+        """
+            Helper to construct the URL query variables to extract the
+            updates for a subscription
+
+            @param tablename: the subscribed resource
+            @param notify_on: the subscribed events
+            @param last_check_time: the last check time (ISO format)
+            @param filter_query: the subscription filter (pr_filter.query)
+
+            @return: tuple (vars, query_nice), vars being a dict of
+                     URL query variables, query_nice being a human-readable
+                     representation of the filter (or None)
+        """
+
+        query = {}
+        if "upd" in notify_on:
+            query["~.modified_on__ge"] = last_check_time
+        else:
+            query["~.created_on__ge"] = last_check_time
+
+        # Filters
+        if filter_query:
+            from s3filter import S3FilterString
+            resource = current.s3db.resource(tablename)
+            fstring = S3FilterString(resource, filter_query)
+            for k, v in fstring.get_vars.iteritems():
+                if v is not None:
+                    if k in query:
+                        value = query[k]
+                        if type(value) is list:
+                            value.append(v)
+                        else:
+                            query[k] = [value, v]
+                    else:
+                        query[k] = v
+            query_nice = s3_unicode(fstring.represent())
+        else:
+            query_nice = None
+
+        return query, query_nice
+
     # -------------------------------------------------------------------------
     @classmethod
     def send(cls, r, resource):
@@ -306,6 +664,41 @@ class S3Notifications(object):
 
         #_debug("%s rows:" % numrows)
 
+        # Render the message(s)
+        subject, messages, errors = cls._compose(resource, data, subscription)
+
+        # Send the message(s)
+        success, send_errors = cls._deliver(pe_id, subject, messages)
+        errors.extend(send_errors)
+
+        # Done
+        if errors:
+            message = ", ".join(errors)
+        else:
+            message = "Success"
+        return json_message(success=success,
+                            statuscode=200 if success else 403,
+                            message=message)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def _compose(cls, resource, data, subscription):
+        """
+            Render the notification message(s) for a subscription
+
+            @param resource: the S3Resource
+            @param data: the data returned from S3Resource.select
+            @param subscription: the subscription parameters (dict)
+
+            @return: tuple (subject, messages, errors), messages being
+                     a list of tuples (method, message)
+        """
+
+        notify_on = subscription["notify_on"]
+        methods = subscription["method"]
+
+        numrows = len(data["rows"])
+
         # Prepare meta-data
         get_config = resource.get_config
         settings = current.deployment_settings
@@ -378,15 +771,11 @@ class S3Notifications(object):
         themes = settings.get_template()
         prefix = resource.get_config("notify_template", "notify")
 
-        send = current.msg.send_by_pe_id
-
-        success = False
+        messages = []
         errors = []
 
         for method in methods:
 
-            error = None
-
             # Get the message template
             template = None
             filenames = ["%s_%s.html" % (prefix, method.lower())]
@@ -422,6 +811,32 @@ class S3Notifications(object):
                 errors.append(error)
                 continue
 
+            messages.append((method, message))
+
+        return subject, messages, errors
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _deliver(pe_id, subject, messages):
+        """
+            Send notification messages
+
+            @param pe_id: the recipient pe_id (or a list of pe_ids)
+            @param subject: the subject line
+            @param messages: list of tuples (method, message)
+
+            @return: tuple (success, errors)
+        """
+
+        send = current.msg.send_by_pe_id
+
+        success = False
+        errors = []
+
+        for method, message in messages:
+
+            error = None
+
             # Send the message
             #_debug("Sending message per %s" % method)
             #_debug(message)
@@ -447,14 +862,7 @@ class S3Notifications(object):
                 if error:
                     errors.append(error)
 
-        # Done
-        if errors:
-            message = ", ".join(errors)
-        else:
-            message = "Success"
-        return json_message(success=success,
-                            statuscode=200 if success else 403,
-                            message=message)
+        return success, errors
 
     # -------------------------------------------------------------------------
     @classmethod
@@ -464,7 +872,8 @@ class S3Notifications(object):
             notified now.
 
             @param now: current datetime (UTC)
-            @return: joined Rows pr_subscription/pr_subscription_resource,
+            @return: joined Rows pr_subscription/pr_subscription_resource
+                     (pr_subscription_resource.id and .resource),
                      or None if no due subscriptions could be found
 
             @todo: take notify_on into account when checking
@@ -531,7 +940,9 @@ class S3Notifications(object):
                     ((rtable.next_check_time == None) | \
                      (rtable.next_check_time <= now)) & \
                     query
-            return db(query).select(rtable.id, join=join)
+            return db(query).select(rtable.id,
+                                    rtable.resource,
+                                    join=join)
         else:
             return None
 
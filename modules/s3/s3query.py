@@ -39,6 +39,14 @@ __all__ = ("FS",
 import datetime
 import re
 import sys
+import threading
+
+from copy import deepcopy
+
+try:
+    from collections import OrderedDict
+except:
+    from gluon.contrib.simplejson.ordered_dict import OrderedDict
 
 from gluon import current, IS_EMPTY_OR, IS_IN_SET
 from gluon.storage import Storage
@@ -305,15 +313,36 @@ class S3FieldPath(object):
             If a context name can not be resolved, resolve() will
             still succeed - but the S3FieldPath returned will have
             colname=None and ftype="context" (=unresolvable context).
+
+            Field paths which do not depend on the particular resource
+            instance (i.e. without component, link or context expressions)
+            are cached for the duration of the request.
         """
 
         if not selector:
             raise SyntaxError("Invalid selector: %s" % selector)
+
+        cache = None
+        if resource is not None and not tail:
+            cache = S3FilterCache.field_paths()
+            if cache is not None:
+                key = (resource.tablename,
+                       resource.table._tablename,
+                       resource.alias,
+                       selector,
+                       )
+                parser = cache.get(key)
+                if parser is not None:
+                    return parser.copy()
+
         tokens = re.split("(\.|\$)", selector)
         if tail:
             tokens.extend(tail)
         parser = cls(resource, None, tokens)
         parser.original = selector
+
+        if cache is not None and not parser.bound:
+            cache.put(key, parser.copy())
         return parser
 
     # -------------------------------------------------------------------------
@@ -345,6 +374,9 @@ class S3FieldPath(object):
         self.distinct = False
         self.multiple = True
 
+        # Whether this path depends on the resource instance (=not cacheable)
+        self.bound = False
+
         head = tokens.pop(0)
         tail = None
 
@@ -354,6 +386,7 @@ class S3FieldPath(object):
             head = head.strip("()")
             self.fname = head
             self.ftype = "context"
+            self.bound = True
 
             if not resource:
                 resource = s3db.resource(table, components=[])
@@ -375,6 +408,8 @@ class S3FieldPath(object):
                     # a field expression in the component/linked table
                     if not resource:
                         resource = s3db.resource(table, components=[])
+                    elif head not in ("~", resource.alias):
+                        self.bound = True
                     ktable, join, m, d = self._resolve_alias(resource, head)
                     self.multiple = m
                     self.distinct = d
@@ -418,9 +453,23 @@ class S3FieldPath(object):
 
             self.distinct |= tail.distinct
             self.multiple |= tail.multiple
+            self.bound |= tail.bound
 
             self.joins.update(tail.joins)
 
+    # -------------------------------------------------------------------------
+    def copy(self):
+        """
+            Get a copy of this field path (with its own joins dict)
+
+            @return: the S3FieldPath
+        """
+
+        path = object.__new__(self.__class__)
+        path.__dict__.update(self.__dict__)
+        path.joins = dict(self.joins)
+        return path
+
     # -------------------------------------------------------------------------
     @staticmethod
     def _resolve_field(table, fieldname):
@@ -2467,10 +2516,115 @@ class S3AIRegex(object):
 #
 combine = lambda x, y: x & y if x is not None else y
 
+# =============================================================================
+class S3FilterCache(object):
+    """
+        Size-bounded LRU dict, used for parsed URL filter expressions
+        (shared by all requests of the process) and for resolved field
+        paths (per request, as these refer to the Tables of the request)
+    """
+
+    def __init__(self, size):
+        """
+            Constructor
+
+            @param size: the maximum number of entries
+        """
+
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def expressions(cls):
+        """
+            Get the cache for parsed filter expressions of this process
+
+            @return: the S3FilterCache, or None if disabled
+        """
+
+        size = current.deployment_settings.get_search_filter_cache_size()
+        if not size:
+            return None
+        return current.cache.ram("s3_filter_cache",
+                                 lambda: cls(size),
+                                 time_expire=None,
+                                 )
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def field_paths(cls):
+        """
+            Get the cache for resolved field paths of this request
+
+            @return: the S3FilterCache, or None if disabled
+        """
+
+        s3 = current.response.s3
+        cache = s3.field_path_cache
+        if cache is None:
+            size = current.deployment_settings.get_search_filter_cache_size()
+            if not size:
+                return None
+            cache = s3.field_path_cache = cls(size)
+        return cache
+
+    # -------------------------------------------------------------------------
+    def get(self, key):
+        """
+            Get a cached entry
+
+            @param key: the key
+            @return: the cached value, or None if not cached
+        """
+
+        with self.lock:
+            value = self.entries.pop(key, None)
+            if value is not None:
+                # Hit => mark as most recently used
+                self.entries[key] = value
+                self.hits += 1
+            else:
+                self.misses += 1
+        return value
+
+    # -------------------------------------------------------------------------
+    def put(self, key, value):
+        """
+            Add an entry to the cache, dropping the least recently
+            used entries if the cache is full
+
+            @param key: the key
+            @param value: the value
+        """
+
+        with self.lock:
+            entries = self.entries
+            entries.pop(key, None)
+            entries[key] = value
+            while len(entries) > self.size:
+                entries.popitem(last=False)
+
+    # -------------------------------------------------------------------------
+    def clear(self):
+        """ Remove all entries """
+
+        with self.lock:
+            self.entries.clear()
+
 # =============================================================================
 class S3URLQueryParser(object):
     """ New-style URL Filter Parser """
 
+    # The grammar (built once per process)
+    GRAMMAR = None
+    LOCK = threading.Lock()
+
     def __init__(self):
         """ Constructor """
 
@@ -2482,7 +2636,30 @@ class S3URLQueryParser(object):
 
     # -------------------------------------------------------------------------
     def _parser(self):
-        """ Import PyParsing and define the syntax for filter expressions """
+        """ Get the grammar for filter expressions """
+
+        grammar = S3URLQueryParser.GRAMMAR
+        if grammar is None:
+            with S3URLQueryParser.LOCK:
+                grammar = S3URLQueryParser.GRAMMAR
+                if grammar is None:
+                    grammar = S3URLQueryParser.GRAMMAR = self._grammar()
+        if not grammar:
+            return False
+
+        self.parser, self.ParseResults, self.ParseException = grammar
+
+        return True
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _grammar():
+        """
+            Import PyParsing and define the syntax for filter expressions
+
+            @return: tuple (parser, ParseResults, ParseException), or
+                     False if PyParsing is not available
+        """
 
         # PyParsing available?
         try:
@@ -2523,11 +2700,7 @@ class S3URLQueryParser(object):
                                             ("or", 2, pp.opAssoc.LEFT, ),
                                             ])
 
-        self.parser = parser
-        self.ParseResults = pp.ParseResults
-        self.ParseException = pp.ParseException
-
-        return True
+        return (parser, pp.ParseResults, pp.ParseException)
 
     # -------------------------------------------------------------------------
     def parse(self, expression):
@@ -2537,6 +2710,9 @@ class S3URLQueryParser(object):
 
             @parameter expression: the filter expression as string
             @return: a dict of {component_alias: filter_query}
+
+            @note: parsed expressions are cached per process (LRU), and
+                   a copy of the cached filters returned
         """
 
         query = {}
@@ -2545,6 +2721,12 @@ class S3URLQueryParser(object):
         if not expression or parser is None:
             return query
 
+        cache = S3FilterCache.expressions()
+        if cache is not None:
+            cached = cache.get(expression)
+            if cached is not None:
+                return deepcopy(cached)
+
         try:
             parsed = parser.parseString(expression)
         except self.ParseException:
@@ -2553,6 +2735,8 @@ class S3URLQueryParser(object):
         else:
             if parsed:
                 query = self.convert_expression(parsed[0])
+                if cache is not None and query is not None:
+                    cache.put(expression, deepcopy(query))
         return query
 
     # -------------------------------------------------------------------------
@@ -50,9 +50,9 @@ from gluon.languages import regex_translate
 from gluon.sqlhtml import OptionsWidget
 from gluon.validators import IS_IN_SET, IS_EMPTY_OR
 
-from s3query import FS
+from s3query import FS, S3Joins
 from s3rest import S3Method
-from s3utils import s3_flatlist, s3_has_foreign_key, s3_unicode, S3MarkupStripper, s3_represent_value
+from s3utils import s3_flatlist, s3_get_foreign_key, s3_has_foreign_key, s3_unicode, S3MarkupStripper, s3_represent_value
 from s3xml import S3XMLFormat
 from s3validators import IS_NUMBER
 
@@ -1320,6 +1320,9 @@ class S3PivotTableFact(object):
 class S3PivotTable(object):
     """ Class representing a pivot table of a resource """
 
+    #: Aggregation methods which can be computed in the database
+    AGGREGATES = ("count", "sum", "avg", "min", "max")
+
     def __init__(self, resource, rows, cols, facts, strict=True):
         """
             Constructor - extracts all unique records, generates a
@@ -1398,6 +1401,9 @@ class S3PivotTable(object):
 
         self.values = {}
 
+        # Number of records if aggregated in the database
+        self._length = None
+
         # Get the fields ------------------------------------------------------
         #
         tablename = resource.tablename
@@ -1412,6 +1418,14 @@ class S3PivotTable(object):
         rows = self.rows
         cols = self.cols
 
+        # Compute the pivot table ---------------------------------------------
+        #
+        if self._can_aggregate():
+            # All dimensions and facts are single-valued real fields
+            # => aggregate in the database
+            self._aggregate()
+            return
+
         # Retrieve the records ------------------------------------------------
         #
         data = resource.select(self.rfields.keys(), limit=None)
@@ -1495,7 +1509,8 @@ class S3PivotTable(object):
 
         items = self.records
         if items is None:
-            return 0
+            length = self._length
+            return length if length is not None else 0
         else:
             return len(self.records)
 
@@ -1552,7 +1567,11 @@ class S3PivotTable(object):
                 if is_numeric is None:
                     is_numeric = numeric(total)
                 if not is_numeric:
-                    total = len(irow.records)
+                    if self.records is None:
+                        # Aggregated in the database
+                        total = irow.length or 0
+                    else:
+                        total = len(irow.records)
                 header = Storage(value = irow.value,
                                  text = irow.text if "text" in irow
                                                   else row_repr(irow.value))
@@ -1752,6 +1771,7 @@ class S3PivotTable(object):
                                     ocell = orow[ci] = {"values": [],
                                                         "items": [],
                                                         "records": [],
+                                                        "fvalues": {},
                                                         }
                                 else:
                                     ocell = orow[ci]
@@ -1760,6 +1780,16 @@ class S3PivotTable(object):
                                 if layer_index == 0:
                                     # Extend the list of records
                                     ocell["records"].extend(cell_records)
+                                    # Extend the fact values (if aggregated
+                                    # in the database)
+                                    fvalues = cell.get("fvalues")
+                                    if fvalues:
+                                        ovalues = ocell["fvalues"]
+                                        for colname in fvalues:
+                                            if colname in ovalues:
+                                                ovalues[colname].extend(fvalues[colname])
+                                            else:
+                                                ovalues[colname] = list(fvalues[colname])
 
                                 value_array = ocell["values"]
                                 items_array = ocell["items"]
@@ -1840,12 +1870,7 @@ class S3PivotTable(object):
                         # Build a lookup table for field values if counting
                         if method in ("count", "list"):
                             keys = []
-                            for record_id in cell["records"]:
-                                record = self.records[record_id]
-                                try:
-                                    fvalue = record[rfield.colname]
-                                except AttributeError:
-                                    continue
+                            for fvalue in self._cell_values(cell, rfield):
                                 if fvalue is None:
                                     continue
                                 if type(fvalue) is not list:
@@ -2084,6 +2109,371 @@ class S3PivotTable(object):
 
     # -------------------------------------------------------------------------
     # Internal methods
+    # -------------------------------------------------------------------------
+    def _can_aggregate(self):
+        """
+            Check whether the pivot table can be computed by aggregation
+            queries in the database, rather than extracting all records
+            and pivoting them in Python
+
+            @return: True|False
+        """
+
+        if not current.deployment_settings.get_ui_report_db_aggregation():
+            return False
+
+        resource = self.resource
+        rfilter = resource.rfilter
+        if rfilter is None:
+            rfilter = resource.build_query()
+        if rfilter.get_filter() is not None:
+            # Virtual filter => must extract the records
+            return False
+
+        rfields = self.rfields
+        single_valued = self._single_valued
+
+        # Dimensions must be single-valued real fields
+        for selector in (self.rows, self.cols):
+            if selector and \
+               (selector not in rfields or not single_valued(rfields[selector])):
+                return False
+
+        # Facts must be single-valued real fields with an SQL aggregate
+        for fact in self.facts:
+            method = fact.method
+            if method not in self.AGGREGATES:
+                return False
+            rfield = rfields.get(fact.selector)
+            if not rfield or not single_valued(rfield):
+                return False
+            if method in ("sum", "avg") and \
+               rfield.ftype not in ("integer", "double"):
+                return False
+
+        return True
+
+    # -------------------------------------------------------------------------
+    def _single_valued(self, rfield, selector=None):
+        """
+            Check whether a field has exactly one value per master record,
+            i.e. is a real, non-list field in the master table, or in a
+            table referenced by a chain of foreign keys
+
+            @param rfield: the S3ResourceField
+            @param selector: the selector to check (defaults to
+                             rfield.selector, used for context resolution)
+        """
+
+        if rfield.field is None or rfield.ftype[:5] == "list:":
+            return False
+
+        resource = self.resource
+        alias = resource.alias
+
+        if selector is None:
+            selector = rfield.selector
+        if "." not in selector.split("$", 1)[0]:
+            selector = "%s.%s" % (alias, selector)
+        prefix, path = selector.split(".", 1)
+        if prefix not in ("~", alias):
+            # Component, link table or free join
+            return False
+
+        keys = path.split("$")
+
+        head = keys[0]
+        if head[:1] == "(" and head[-1:] == ")":
+            # Context expression
+            context = resource.get_config("context")
+            expression = context.get(head[1:-1]) if context else None
+            if not expression or not isinstance(expression, basestring):
+                return False
+            return self._single_valued(rfield,
+                                       "$".join([expression] + keys[1:]))
+
+        s3db = current.s3db
+        table = resource.table
+        for key in keys[:-1]:
+            if key not in table.fields:
+                return False
+            ktablename = s3_get_foreign_key(table[key], m2m=False)[0]
+            if not ktablename:
+                return False
+            table = s3db.table(ktablename)
+            if table is None:
+                return False
+        return True
+
+    # -------------------------------------------------------------------------
+    def _aggregate(self):
+        """
+            Compute the pivot table with GROUP BY queries in the database,
+            updates:
+
+                - self.cell: the aggregated values per cell
+                - self.row: the totals per row
+                - self.col: the totals per column
+                - self.totals: the overall totals per layer
+
+            Instead of record IDs, the cells hold the unique values of
+            each count-fact ("fvalues") as needed to render the cell
+            items in json().
+        """
+
+        db = current.db
+
+        resource = self.resource
+        table = resource.table
+        tablename = resource.tablename
+
+        rfields = self.rfields
+        facts = self.facts
+
+        rows_colname = rfields[self.rows].colname if self.rows else None
+        cols_colname = rfields[self.cols].colname if self.cols else None
+
+        # Resolve the filter
+        rfilter = resource.rfilter
+        query = rfilter.get_query()
+        ijoins = rfilter.get_joins(left=False)
+        ljoins = rfilter.get_joins(left=True)
+        if ijoins or ljoins:
+            # Filter joins could multiply the master records, so resolve
+            # the filter in a subquery
+            ijoins = S3Joins(tablename, ijoins)
+            ljoins = S3Joins(tablename, ljoins)
+            subquery = db(query)._select(table._id,
+                                         join = ijoins.as_list(prefer=ljoins),
+                                         left = ljoins.as_list(),
+                                         distinct = True,
+                                         )
+            query = table._id.belongs(subquery)
+
+        # Left joins and grouping fields for dimensions and facts
+        joins = S3Joins(tablename)
+        groupby = []
+        colnames = set()
+        for selector in (self.rows, self.cols):
+            if selector:
+                rfield = rfields[selector]
+                joins.extend(rfield.left)
+                if rfield.colname not in colnames:
+                    colnames.add(rfield.colname)
+                    groupby.append(rfield.field)
+        for fact in facts:
+            joins.extend(rfields[fact.selector].left)
+        left = joins.as_list()
+
+        # Number of records, and totals/minimum/maximum per cell
+        cnt = table._id.count()
+        aggregates = {}
+        expressions = [cnt]
+        for fact in facts:
+            if fact.method == "count":
+                continue
+            rfield = rfields[fact.selector]
+            colname = rfield.colname
+            if colname in aggregates:
+                continue
+            field = rfield.field
+            aggregate = (field.sum(), field.count(), field.min(), field.max())
+            aggregates[colname] = aggregate
+            expressions.extend(aggregate)
+
+        fields = groupby + expressions
+        rows = db(query).select(left = left,
+                                groupby = groupby,
+                                *fields)
+        if not rows:
+            self.empty = True
+            return
+
+        rindex, cindex = {}, {}
+        rnames, cnames = [], []
+        def index(values, names, value):
+            if value not in values:
+                values[value] = len(names)
+                names.append(value)
+            return values[value]
+
+        cells = {}
+        length = 0
+        rlength = {}
+        for row in rows:
+            r = index(rindex, rnames, row[rows_colname] if rows_colname else None)
+            c = index(cindex, cnames, row[cols_colname] if cols_colname else None)
+            length += row[cnt]
+            rlength[r] = rlength.get(r, 0) + row[cnt]
+            cells[(r, c)] = dict((colname, tuple(row[e] for e in aggregate))
+                                 for colname, aggregate in aggregates.items())
+
+        # Unique values of count-facts per cell
+        fvalues = {}
+        for fact in facts:
+            if fact.method != "count":
+                continue
+            rfield = rfields[fact.selector]
+            colname = rfield.colname
+            if colname in fvalues:
+                continue
+            values = fvalues[colname] = {}
+            fields = list(groupby)
+            if colname not in colnames:
+                fields.append(rfield.field)
+            rows = db(query).select(left = left,
+                                    groupby = fields,
+                                    *fields)
+            for row in rows:
+                value = row[colname]
+                if value is None:
+                    continue
+                r = rindex[row[rows_colname] if rows_colname else None]
+                c = cindex[row[cols_colname] if cols_colname else None]
+                if (r, c) in values:
+                    values[(r, c)].append(value)
+                else:
+                    values[(r, c)] = [value]
+
+        self._length = length
+
+        # Initialize columns, rows and cells
+        self.col = [Storage({"value": v, "records": []}) for v in cnames]
+        self.numcols = numcols = len(cnames)
+        self.row = [Storage({"value": v,
+                             "records": [],
+                             "length": rlength.get(r, 0),
+                             })
+                    for r, v in enumerate(rnames)]
+        self.numrows = numrows = len(rnames)
+
+        self.cell = [[Storage({"records": [],
+                               "fvalues": dict((colname, values.get((r, c), []))
+                                               for colname, values in fvalues.items()),
+                               })
+                      for c in xrange(numcols)]
+                     for r in xrange(numrows)]
+
+        # Add the layers
+        aggregate_value = self._aggregate_value
+        merge = self._merge_aggregates
+        for fact in facts:
+
+            layer = fact.layer
+            method = fact.method
+            colname = rfields[fact.selector].colname
+
+            matrix = []
+            for r in xrange(numrows):
+                cells_r = []
+                for c in xrange(numcols):
+                    if method == "count":
+                        cell_values = self.cell[r][c]["fvalues"][colname]
+                        aggregate = (None, len(cell_values), None, None)
+                    else:
+                        cell_data = cells.get((r, c))
+                        if cell_data:
+                            aggregate = cell_data[colname]
+                        else:
+                            aggregate = (None, 0, None, None)
+                    self.cell[r][c][layer] = aggregate_value(method, aggregate)
+                    cells_r.append(aggregate)
+                matrix.append(cells_r)
+
+            for r in xrange(numrows):
+                row_aggregate = merge(matrix[r])
+                self.row[r][layer] = aggregate_value(method, row_aggregate)
+            for c in xrange(numcols):
+                col_aggregate = merge([matrix[r][c] for r in xrange(numrows)])
+                self.col[c][layer] = aggregate_value(method, col_aggregate)
+            total = merge([item for cells_r in matrix for item in cells_r])
+            self.totals[layer] = aggregate_value(method, total)
+
+            if method == "count":
+                self.values[layer] = [v for values in fvalues[colname].values()
+                                        for v in values]
+            else:
+                self.values[layer] = []
+        return
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _merge_aggregates(aggregates):
+        """
+            Merge partial aggregates (e.g. of cells into row totals)
+
+            @param aggregates: iterable of tuples (sum, number, min, max)
+
+            @return: the merged tuple (sum, number, min, max)
+        """
+
+        total, number, minimum, maximum = None, 0, None, None
+        for s, n, mn, mx in aggregates:
+            if s is not None:
+                total = s if total is None else total + s
+            if n:
+                number += n
+            if mn is not None and (minimum is None or mn < minimum):
+                minimum = mn
+            if mx is not None and (maximum is None or mx > maximum):
+                maximum = mx
+        return (total, number, minimum, maximum)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _aggregate_value(method, aggregate):
+        """
+            Compute the value of a layer from a partial aggregate, same
+            results as S3PivotTableFact.compute
+
+            @param method: the aggregation method
+            @param aggregate: tuple (sum, number, min, max)
+        """
+
+        total, number, minimum, maximum = aggregate
+
+        if method == "count":
+            return number
+        elif method == "sum":
+            return total if number and total is not None else 0
+        elif method == "avg":
+            if number and total is not None:
+                return total / float(number)
+            else:
+                return 0.0
+        elif method == "min":
+            return minimum
+        elif method == "max":
+            return maximum
+        return None
+
+    # -------------------------------------------------------------------------
+    def _cell_values(self, cell, rfield):
+        """
+            Get the values of a fact field in a pivot table cell
+
+            @param cell: the cell
+            @param rfield: the fact field (S3ResourceField)
+        """
+
+        colname = rfield.colname
+
+        fvalues = cell.get("fvalues")
+        if fvalues and colname in fvalues:
+            # Aggregated in the database
+            return fvalues[colname]
+
+        records = self.records
+        values = []
+        append = values.append
+        for record_id in cell["records"]:
+            record = records[record_id]
+            try:
+                append(record[colname])
+            except AttributeError:
+                continue
+        return values
+
     # -------------------------------------------------------------------------
     @staticmethod
     def _pivot(items, pkey_colname, rows_colname, cols_colname):
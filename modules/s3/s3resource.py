@@ -37,6 +37,7 @@ __all__ = ("S3AxisFilter",
            )
 
 import datetime
+import hashlib
 import sys
 
 from itertools import chain
@@ -70,7 +71,7 @@ from gluon.tools import callback
 from s3dal import Expression, Field, Row, Rows, Table
 from s3data import S3DataTable, S3DataList
 from s3datetime import s3_format_datetime
-from s3fields import S3Represent, s3_all_meta_field_names
+from s3fields import S3Represent, S3RepresentCache, s3_all_meta_field_names
 from s3query import FS, S3ResourceField, S3ResourceQuery, S3Joins, S3URLQuery
 from s3utils import s3_has_foreign_key, s3_get_foreign_key, s3_unicode, s3_get_last_record_id, s3_remove_last_record_id
 from s3validators import IS_ONE_OF
@@ -518,6 +519,14 @@ class S3Resource(object):
                                               distinct=distinct)
         return self._length
 
+    # -------------------------------------------------------------------------
+    @property
+    def count_estimated(self):
+        """ Whether the last count() was an estimate """
+
+        rfilter = self.rfilter
+        return rfilter.estimated if rfilter is not None else False
+
     # -------------------------------------------------------------------------
     def select(self,
                fields,
@@ -533,7 +542,9 @@ class S3Resource(object):
                as_rows=False,
                represent=False,
                show_links=True,
-               raw_data=False):
+               raw_data=False,
+               keyset=False,
+               after=None):
         """
             Extract data from this resource
 
@@ -550,6 +561,10 @@ class S3Resource(object):
             @param as_rows: return the rows (don't extract)
             @param represent: render field value representations
             @param raw_data: include raw data in the result
+            @param keyset: use keyset pagination (see S3ResourceData)
+            @param after: the key of the last record of the previous
+                          page (from S3ResourceData.next_key), for
+                          keyset pagination
         """
 
         data = S3ResourceData(self,
@@ -566,12 +581,78 @@ class S3Resource(object):
                               as_rows=as_rows,
                               represent=represent,
                               show_links=show_links,
-                              raw_data=raw_data)
+                              raw_data=raw_data,
+                              keyset=keyset,
+                              after=after)
         if as_rows:
             return data.rows
         else:
             return data
 
+    # -------------------------------------------------------------------------
+    def iterselect(self,
+                   fields,
+                   left=None,
+                   orderby=None,
+                   distinct=False,
+                   virtual=True,
+                   represent=False,
+                   show_links=True,
+                   raw_data=False,
+                   chunk_size=500):
+        """
+            Iterate over the data of this resource, extracting them
+            page by page with keyset pagination, so that the complete
+            result never needs to be held in memory (e.g. for exports
+            of large numbers of records)
+
+            @param fields: the fields to extract (selector strings)
+            @param left: additional left joins required for filters
+            @param orderby: orderby-expression for DAL
+            @param distinct: select distinct rows
+            @param virtual: include mandatory virtual fields
+            @param represent: render field value representations
+            @param show_links: render links in representations
+            @param raw_data: include raw data in the result
+            @param chunk_size: the number of records per page
+
+            @return: a generator yielding the rows (as Storage, same
+                     as S3ResourceData.rows)
+
+            @note: if response.s3.select_progress is set, it is called
+                   with the number of rows after every page (used to
+                   report the progress of asynchronous exports)
+        """
+
+        progress = current.response.s3.select_progress
+
+        after = None
+        start = 0
+        while True:
+            data = self.select(fields,
+                               start=start,
+                               limit=chunk_size,
+                               left=left,
+                               orderby=orderby,
+                               distinct=distinct,
+                               virtual=virtual,
+                               represent=represent,
+                               show_links=show_links,
+                               raw_data=raw_data,
+                               keyset=True,
+                               after=after)
+            rows = data.rows
+            for row in rows:
+                yield row
+            if progress:
+                progress(len(rows))
+            if len(rows) < chunk_size:
+                break
+            after = data.next_key
+            if after is None:
+                # Keyset pagination not possible with this orderby
+                start += chunk_size
+
     # -------------------------------------------------------------------------
     def insert(self, **fields):
         """
@@ -654,6 +735,7 @@ class S3Resource(object):
             return 0
 
         numrows = 0
+        deleted = []
 
         db = current.db
         has_permission = current.auth.s3_has_permission
@@ -837,6 +919,7 @@ class S3Resource(object):
                     # Update the row, finally
                     db(table._id == record_id).update(**fields)
                     numrows += 1
+                    deleted.append(record_id)
                     # Clear session
                     if s3_get_last_record_id(tablename) == record_id:
                         s3_remove_last_record_id(tablename)
@@ -877,6 +960,7 @@ class S3Resource(object):
                 else:
                     # Successfully deleted
                     numrows += 1
+                    deleted.append(record_id)
                     # Clear session
                     if s3_get_last_record_id(tablename) == record_id:
                         s3_remove_last_record_id(tablename)
@@ -892,6 +976,15 @@ class S3Resource(object):
                     if not cascade:
                         db.commit()
 
+        if deleted and get_config("hierarchy"):
+            # Update the hierarchy
+            from s3hierarchy import S3Hierarchy
+            S3Hierarchy.dirty(tablename, record_ids=deleted)
+
+        if deleted:
+            # Forget cached representations
+            S3RepresentCache.expire_records(tablename, deleted)
+
         if numrows == 0:
             if not deletable:
                 # No deletable rows found
@@ -1163,6 +1256,14 @@ class S3Resource(object):
         id_repr = table._id.represent
         table._id.represent = None
 
+        # Keyset pagination: look up the key of the last record
+        # of the previous page
+        keyset = not getids and limit and \
+                 current.deployment_settings.get_ui_datatables_keyset()
+        after = None
+        if keyset and start:
+            after = self._page_key(selectors, orderby, left, start)
+
         # Extract the data
         data = self.select(selectors,
                            start=start,
@@ -1172,10 +1273,17 @@ class S3Resource(object):
                            distinct=distinct,
                            count=True,
                            getids=getids,
-                           represent=True)
+                           represent=True,
+                           keyset=keyset,
+                           after=after)
 
         rows = data["rows"]
 
+        # Remember the key of the last record for the next page
+        if keyset and data.next_key and len(rows) == limit:
+            self._page_key(selectors, orderby, left, (start or 0) + limit,
+                           key=data.next_key)
+
         # Restore ID representation
         table._id.represent = id_repr
 
@@ -1194,9 +1302,48 @@ class S3Resource(object):
         # Generate the data table
         rfields = data["rfields"]
         dt = S3DataTable(rfields, rows, orderby=orderby, empty=empty)
+        dt.estimated = data.estimated
 
         return dt, data["numrows"], data["ids"]
 
+    # -------------------------------------------------------------------------
+    def _page_key(self, fields, orderby, left, start, key=None):
+        """
+            Look up (or store) the key of the last record before a
+            certain start index (for keyset pagination in data tables)
+
+            @param fields: the fields
+            @param orderby: the orderby expression
+            @param left: the left joins
+            @param start: the start index of the page
+            @param key: the key to store
+
+            @return: the key, or None if not found
+        """
+
+        if orderby is not None and type(orderby) in (list, tuple):
+            orderby = ", ".join(str(item) for item in orderby)
+        signature = repr((self.tablename,
+                          str(self.get_query()),
+                          list(fields),
+                          str(orderby),
+                          str(left),
+                          start,
+                          ))
+        cache_key = "s3_page_key_%s" % hashlib.md5(signature).hexdigest()
+
+        cache = current.cache.ram
+        expire = current.deployment_settings.get_ui_datatables_keyset_expire()
+        if key is None:
+            key = cache(cache_key, lambda: None, time_expire=expire)
+            if key is None:
+                # Remove the placeholder
+                cache(cache_key, None)
+        else:
+            cache(cache_key, None)
+            cache(cache_key, lambda: key, time_expire=expire)
+        return key
+
     # -------------------------------------------------------------------------
     def datalist(self,
                  fields=None,
@@ -1699,6 +1846,7 @@ class S3Resource(object):
                    location_data=None,
                    map_data=None,
                    target=None,
+                   stream=False,
                    **args):
         """
             Export this resource as S3XML
@@ -1729,11 +1877,29 @@ class S3Resource(object):
                                   looked-up in bulk ready for xml.gis_encode()
             @param map_data: dictionary of options which can be read by the map
             @param target: alias of component targetted (or None to target master resource)
+            @param stream: export incrementally (see export_stream), only
+                           possible without XSLT and component target
             @param args: dict of arguments to pass to the XSLT stylesheet
         """
 
         xml = current.xml
 
+        if stream and not stylesheet and not as_tree and not target:
+            return self.export_stream(start=start,
+                                      limit=limit,
+                                      msince=msince,
+                                      fields=fields,
+                                      dereference=dereference,
+                                      maxdepth=maxdepth,
+                                      mcomponents=mcomponents,
+                                      rcomponents=rcomponents,
+                                      references=references,
+                                      filters=filters,
+                                      maxbounds=maxbounds,
+                                      as_json=as_json,
+                                      pretty_print=pretty_print,
+                                      )
+
         output = None
         args = Storage(args)
 
@@ -1805,6 +1971,162 @@ class S3Resource(object):
 
         return output
 
+    # -------------------------------------------------------------------------
+    def export_stream(self,
+                      start=None,
+                      limit=None,
+                      msince=None,
+                      fields=None,
+                      dereference=True,
+                      maxdepth=MAXDEPTH,
+                      mcomponents=[],
+                      rcomponents=None,
+                      references=None,
+                      filters=None,
+                      maxbounds=False,
+                      as_json=False,
+                      pretty_print=False,
+                      chunk_size=1000):
+        """
+            Export this resource as S3XML (or JSON) incrementally, i.e.
+            the master records in chunks, each followed by the records
+            they reference, so that never more than one chunk is held
+            in memory
+
+            - records which have already been exported in a previous
+              chunk are skipped (=the output is the same as export_xml,
+              but in a different order)
+            - master and component records are always exported in full,
+              even if a previous chunk has already exported them as
+              referenced records (=they can appear twice in the output)
+            - XSLT transformation requires the whole tree, so this can
+              only produce native S3XML/JSON
+
+            @param start: index of the first record to export (slicing)
+            @param limit: maximum number of records to export (slicing)
+            @param msince: export only records which have been modified
+                            after this datetime
+            @param fields: data fields to include (default: all)
+            @param dereference: include referenced resources
+            @param maxdepth: maximum depth for reference resolution
+            @param mcomponents: components of the master resource to
+                                include (list of tablenames), empty list
+                                for all
+            @param rcomponents: components of referenced resources to
+                                include (list of tablenames), empty list
+                                for all
+            @param references: foreign keys to include (default: all)
+            @param filters: additional URL filters (Sync), as dict
+                            {tablename: {url_var: string}}
+            @param maxbounds: include lat/lon boundaries in the top
+                              level element (off by default)
+            @param as_json: represent the XML tree as JSON
+            @param pretty_print: insert newlines/indentation in the output
+            @param chunk_size: number of master records per chunk
+
+            @return: a generator of strings, which can be returned from
+                     the controller to stream the response
+        """
+
+        xml = current.xml
+        s3db = current.s3db
+
+        table = self.table
+        tablename = self.tablename
+
+        # Filter for MCI >= 0 (setting)
+        if xml.filter_mci and "mci" in table.fields:
+            mci_filter = (table.mci >= 0)
+            self.add_filter(mci_filter)
+
+        # Sync filters
+        if filters and tablename in filters:
+            queries = S3URLQuery.parse(self, filters[tablename])
+            [self.add_filter(q) for a in queries for q in queries[a]]
+
+        # Get the IDs of all master records
+        pkey = table._id
+        if msince is not None and "modified_on" in table.fields:
+            orderby = table["modified_on"]
+        else:
+            orderby = pkey
+        rows = self.select([pkey.name],
+                           start=start,
+                           limit=limit,
+                           orderby=orderby,
+                           virtual=False,
+                           as_rows=True)
+        record_ids = []
+        seen = set()
+        for row in rows:
+            record_id = row[pkey]
+            if record_id not in seen:
+                seen.add(record_id)
+                record_ids.append(record_id)
+        del rows, seen
+
+        # Root element
+        results = len(record_ids)
+        base_url = current.response.s3.base_url if xml.show_urls else None
+        root = xml.tree(None,
+                        domain=xml.domain,
+                        url=base_url,
+                        results=results,
+                        start=start,
+                        limit=limit,
+                        maxbounds=maxbounds).getroot()
+        root.set(xml.ATTRIBUTE.success, json.dumps(results > 0))
+
+        components = self.components.keys()
+
+        def elements():
+            """ Generator for the <resource> elements, chunk by chunk """
+
+            # Records exported in previous chunks (master and component
+            # records separately from referenced records, so that master
+            # records referenced from a previous chunk are not skipped)
+            export_map = Storage()
+            ref_map = Storage()
+
+            for index in xrange(0, results, chunk_size):
+                chunk = s3db.resource(tablename,
+                                      id = record_ids[index:index + chunk_size],
+                                      components = components,
+                                      include_deleted = self.include_deleted,
+                                      approved = self._approved,
+                                      unapproved = self._unapproved,
+                                      )
+                tree = chunk.export_tree(msince=msince,
+                                         fields=fields,
+                                         references=references,
+                                         dereference=dereference,
+                                         maxdepth=maxdepth,
+                                         mcomponents=mcomponents,
+                                         rcomponents=rcomponents,
+                                         filters=filters,
+                                         export_map=export_map,
+                                         ref_map=ref_map,
+                                         )
+                if chunk.muntil and \
+                   (not self.muntil or chunk.muntil > self.muntil):
+                    self.muntil = chunk.muntil
+                for element in tree.getroot():
+                    yield element
+
+        self.muntil = None
+        self.results = results
+
+        if as_json:
+            return xml.tree2json_stream(root,
+                                        elements(),
+                                        pretty_print=pretty_print,
+                                        )
+        else:
+            return xml.tostream(root,
+                                elements(),
+                                pretty_print=pretty_print,
+                                )
+
     # -------------------------------------------------------------------------
     def export_tree(self,
                     start=0,
@@ -1822,6 +2144,8 @@ class S3Resource(object):
                     location_data=None,
                     map_data=None,
                     target=None,
+                    export_map=None,
+                    ref_map=None,
                     ):
         """
             Export the resource as element tree
@@ -1848,6 +2172,12 @@ class S3Resource(object):
                                   looked-up in bulk ready for xml.gis_encode()
             @param target: alias of component targetted (or None to target master resource)
             @param map_data: dictionary of options which can be read by the map
+            @param export_map: the export map of a previous export (to skip
+                               records which have already been exported),
+                               will be updated with the exported records
+            @param ref_map: separate export map for referenced records
+                            (default: export_map); master and component
+                            records in this map will not be skipped
         """
 
         xml = current.xml
@@ -1915,7 +2245,10 @@ class S3Resource(object):
             #                           ensure_ascii=False))
             root.set("map", json.dumps(map_data))
 
-        export_map = Storage()
+        if export_map is None:
+            export_map = Storage()
+        if ref_map is None:
+            ref_map = export_map
         all_references = []
 
         prefix = self.prefix
@@ -1976,6 +2309,7 @@ class S3Resource(object):
             depth -= 1
             load_map = dict()
             get_exported = export_map.get
+            get_referenced = ref_map.get
             for ref in reference_map:
                 if "table" in ref and "id" in ref:
                     # Get tablename and IDs
@@ -1985,8 +2319,10 @@ class S3Resource(object):
                         ids = [ids]
 
                     # Exclude records which are already in the tree
-                    exported = get_exported(tname, [])
-                    ids = [x for x in ids if x not in exported]
+                    exported = get_exported(tname, ())
+                    referenced = get_referenced(tname, ())
+                    ids = [x for x in ids
+                           if x not in exported and x not in referenced]
                     if not ids:
                         continue
 
@@ -2042,7 +2378,7 @@ class S3Resource(object):
                                               parent=root,
                                               base_url=url,
                                               reference_map=reference_map,
-                                              export_map=export_map,
+                                              export_map=ref_map,
                                               components=rcomponents,
                                               lazy=lazy,
                                               filters=filters,
@@ -2397,9 +2733,9 @@ class S3Resource(object):
         if rmap:
             reference_map.extend(rmap)
         if tablename in export_map:
-            export_map[tablename].append(record_id)
+            export_map[tablename].add(record_id)
         else:
-            export_map[tablename] = [record_id]
+            export_map[tablename] = set([record_id])
         return
 
     # -------------------------------------------------------------------------
@@ -4124,6 +4460,9 @@ class S3ResourceFilter(object):
         self.multiple = True
         self.distinct = False
 
+        # Whether the last count() was an estimate
+        self.estimated = False
+
         # Joins
         self.ijoins = {}
         self.ljoins = {}
@@ -4570,7 +4909,112 @@ class S3ResourceFilter(object):
     # -------------------------------------------------------------------------
     def count(self, left=None, distinct=False):
         """
-            Get the total number of matching records
+            Get the total number of matching records, using the count
+            strategy configured in settings.database.count_strategy:
+                - "exact": count all matching records
+                - "cached": cache the exact count for a time (keyed by
+                            the filter)
+                - "estimate": use the query planner estimate (PostgreSQL
+                              only) if it is above a threshold, otherwise
+                              an exact count; sets self.estimated
+
+            @param left: left outer joins
+            @param distinct: count only distinct rows
+        """
+
+        self.estimated = False
+
+        settings = current.deployment_settings
+        strategy = settings.get_database_count_strategy()
+
+        if strategy == "cached":
+            resource = self.resource
+            if resource is None:
+                return 0
+            url_vars = self.serialize_url()
+            signature = repr((resource.tablename,
+                              sorted(url_vars.items()),
+                              str(self.get_query()),
+                              str(left),
+                              distinct,
+                              ))
+            key = "s3_count_%s" % hashlib.md5(signature).hexdigest()
+            expire = settings.get_database_count_cache_expire()
+            return current.cache.ram(key,
+                                     lambda: self._count(left=left,
+                                                         distinct=distinct),
+                                     time_expire=expire,
+                                     )
+
+        elif strategy == "estimate":
+            estimate = self.estimate(left=left, distinct=distinct)
+            if estimate is not None:
+                self.estimated = True
+                return estimate
+
+        return self._count(left=left, distinct=distinct)
+
+    # -------------------------------------------------------------------------
+    def estimate(self, left=None, distinct=False):
+        """
+            Estimate the number of matching records from the statistics
+            of the query planner (PostgreSQL only): if the table has no
+            more than the threshold number of rows (pg_class.reltuples),
+            no estimate is needed; otherwise use the number of rows the
+            query planner expects for the count query (EXPLAIN)
+
+            @param left: left outer joins
+            @param distinct: count only distinct rows
+
+            @return: the estimated number of records, or None if the
+                     number can not be estimated or is below the
+                     threshold (=an exact count is required)
+        """
+
+        resource = self.resource
+        if resource is None or distinct or self.distinct or \
+           self.get_filter() is not None:
+            return None
+
+        settings = current.deployment_settings
+        if settings.get_database_type() != "postgres":
+            return None
+        threshold = settings.get_database_count_estimate_threshold()
+
+        db = current.db
+        table = resource.table
+        tablename = table._tablename
+
+        # Total number of rows in the table
+        rows = db.executesql("SELECT reltuples FROM pg_class "
+                             "WHERE relname='%s';" % tablename)
+        if not rows or rows[0][0] is None or rows[0][0] < threshold:
+            return None
+
+        # Estimated number of matching rows
+        ijoins = S3Joins(tablename, self.get_joins(left=False))
+        ljoins = S3Joins(tablename, self.get_joins(left=True))
+        ljoins.add(left)
+        sql = db(self.get_query())._select(table._id,
+                                           join=ijoins.as_list(prefer=ljoins),
+                                           left=ljoins.as_list(),
+                                           )
+        try:
+            rows = db.executesql("EXPLAIN (FORMAT JSON) %s" % sql)
+            plan = rows[0][0]
+            if isinstance(plan, basestring):
+                plan = json.loads(plan)
+            estimate = int(plan[0]["Plan"]["Plan Rows"])
+        except Exception:
+            current.log.error("Count estimate failed: %s" % sys.exc_info()[1])
+            return None
+
+        return estimate if estimate >= threshold else None
+
+    # -------------------------------------------------------------------------
+    def _count(self, left=None, distinct=False):
+        """
+            Count the matching records (exact count)
 
             @param left: left outer joins
             @param distinct: count only distinct rows
@@ -4689,7 +5133,9 @@ class S3ResourceData(object):
                  as_rows=False,
                  represent=False,
                  show_links=True,
-                 raw_data=False):
+                 raw_data=False,
+                 keyset=False,
+                 after=None):
         """
             Constructor, extracts (and represents) data from a resource
 
@@ -4707,6 +5153,12 @@ class S3ResourceData(object):
             @param as_rows: return the rows (don't extract/represent)
             @param represent: render field value representations
             @param raw_data: include raw data in the result
+            @param keyset: use keyset pagination, i.e. order by orderby
+                           plus record ID, and provide the key of the
+                           last record of the page in next_key
+            @param after: the key of the last record of the previous
+                          page (next_key of the previous page), to select
+                          the records after it rather than using start
 
             @note: as_rows / groupby prevent automatic splitting of
                    large multi-table joins, so use with care!
@@ -4780,6 +5232,28 @@ class S3ResourceData(object):
             # filter by virtual fields, then apply page limits
             limitby = None
 
+        # Count strategy: count separately unless exact
+        self.estimated = False
+        precount = None
+        if count and not getids and not groupby and vfltr is None and \
+           current.deployment_settings.get_database_count_strategy() != "exact":
+            precount = rfilter.count(left=left, distinct=distinct)
+            self.estimated = rfilter.estimated
+            count = False
+
+        # Keyset pagination
+        self.next_key = None
+        if keyset and not groupby and not getids and vfltr is None:
+            keyset = self.keyset(orderby, orderby_fields, after=after)
+        else:
+            keyset = None
+        if keyset:
+            orderby = orderby_aggr = keyset[0]
+            seek_query = keyset[1]
+            if seek_query is not None and limit:
+                # Seek rather than skip
+                limitby = (0, limitby[1] - limitby[0])
+
         # Filter Query:
         # If we need to determine the number and/or ids of all matching
         # records, but not to extract all records, then we run a
@@ -4793,7 +5267,32 @@ class S3ResourceData(object):
                                        aqueries=aqueries)
 
         ids = page = totalrows = None
-        if getids or count or ljoins or ijoins:
+        if keyset:
+
+            # Count all matching records
+            if count:
+                totalrows = self.filter_query(query,
+                                              join=filter_ijoins,
+                                              left=filter_ljoins)[0]
+
+            # Extract the record IDs for the page
+            if seek_query is not None:
+                query &= seek_query
+            ids = self.filter_query(query,
+                                    join=filter_ijoins,
+                                    left=filter_ljoins,
+                                    getids=True,
+                                    orderby=orderby_aggr,
+                                    limitby=limitby)[1]
+            page = ids
+            master_query = table._id.belongs(page)
+            limitby = None
+            if not as_rows or distinct:
+                # Order is determined by the page (with DISTINCT, the
+                # ORDERBY expressions would have to appear in SELECT)
+                orderby = None
+
+        elif getids or count or ljoins or ijoins:
 
             if not groupby and \
                not vfltr and \
@@ -4860,6 +5359,13 @@ class S3ResourceData(object):
                 qfields[pkey] = resource._id
             has_id = True
 
+            # Keyset pagination needs the orderby fields in SELECT
+            if keyset:
+                for orderby_field in keyset[2]:
+                    fn = str(orderby_field)
+                    if fn not in qfields:
+                        qfields[fn] = orderby_field
+
         # Joins for master query
         master_ijoins = ijoins.as_list(tablenames=master_tables,
                                        aqueries=aqueries,
@@ -4910,6 +5416,21 @@ class S3ResourceData(object):
                 ids = self.getids(rows, pkey)
                 totalrows = len(ids)
 
+        # Key of the last record (for keyset pagination)
+        if keyset and rows and page:
+            last = page[-1]
+            for row in rows:
+                if row[pkey] == last:
+                    self.next_key = [row[str(f)] for f in keyset[2]] + [last]
+                    break
+
+        # Use the separate count unless we have an exact number anyway
+        if precount is not None:
+            if totalrows is None:
+                totalrows = precount
+            else:
+                self.estimated = False
+
         # Build the result
         self.rfields = dfields
         self.numrows = 0 if totalrows is None else totalrows
@@ -5141,12 +5662,90 @@ class S3ResourceData(object):
 
         return expr, aggr, fields, tables
 
+    # -------------------------------------------------------------------------
+    def keyset(self, orderby, fields, after=None):
+        """
+            Prepare keyset (seek) pagination: order by the orderby fields
+            (with NULLs last, in all databases) plus the record ID, and
+            build the query for the records after the last record of the
+            previous page (which is more efficient than OFFSET for deep
+            pagination)
+
+            @param orderby: the resolved orderby expression
+            @param fields: the fields in the orderby expression
+            @param after: the key of the last record of the previous page
+                          (list of the values of the orderby fields plus
+                          the record ID), None for the first page
+
+            @return: tuple (orderby, query, fields), or None if keyset
+                     pagination is not possible for the orderby (only
+                     master table fields are supported)
+        """
+
+        table = self.table
+        tablename = table._tablename
+
+        INVERT = current.db._adapter.INVERT
+
+        keys = []
+        if orderby:
+            for expression, field in zip(orderby, fields):
+                if isinstance(expression, Field):
+                    desc = False
+                elif type(expression) is Expression and \
+                     expression.op == INVERT:
+                    desc = True
+                else:
+                    return None
+                ftype = str(field.type)
+                if field.tablename != tablename or \
+                   ftype[:5] == "list:" or ftype == "json":
+                    return None
+                if str(field) == str(table._id):
+                    break
+                keys.append((field, desc))
+
+        # ORDERBY
+        expr = []
+        for field, desc in keys:
+            if not field.notnull:
+                expr.append((field == None).case(1, 0))
+            expr.append(~field if desc else field)
+        expr.append(table._id)
+
+        # Query for the records after the key
+        query = None
+        if after is not None:
+            if len(after) != len(keys) + 1:
+                return None
+            equal = None
+            for (field, desc), value in zip(keys, after[:-1]):
+                if value is None:
+                    # NULLs are last
+                    later = None
+                    same = (field == None)
+                else:
+                    later = (field < value) if desc else (field > value)
+                    if not field.notnull:
+                        later |= (field == None)
+                    same = (field == value)
+                if later is not None:
+                    q = later if equal is None else equal & later
+                    query = q if query is None else query | q
+                equal = same if equal is None else equal & same
+            q = (table._id > after[-1])
+            q = q if equal is None else equal & q
+            query = q if query is None else query | q
+
+        return expr, query, [field for field, desc in keys]
+
     # -------------------------------------------------------------------------
     def filter_query(self, query,
                      join=None,
                      left=None,
                      getids=False,
-                     orderby=None):
+                     orderby=None,
+                     limitby=None):
         """
             Execute a query to determine the number/record IDs of all
             matching rows
@@ -5156,6 +5755,7 @@ class S3ResourceData(object):
             @param left: the left joins for this query
             @param getids: also extract the IDs if all matching records
             @param orderby: ORDERBY expression for this query
+            @param limitby: limits for this query
 
             @return: tuple of (TotalNumberOfRecords, RecordIDs)
         """
@@ -5184,6 +5784,7 @@ class S3ResourceData(object):
                                 distinct=distinct,
                                 orderby=orderby,
                                 groupby=groupby,
+                                limitby=limitby if getids else None,
                                 cacheable=True)
 
         # Restore the virtual fields
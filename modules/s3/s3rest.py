@@ -59,6 +59,7 @@ from gluon import *
 from gluon.storage import Storage
 
 from s3datetime import s3_parse_datetime
+from s3fields import S3RepresentCache
 from s3resource import S3Resource
 from s3utils import s3_get_extension, s3_remove_last_record_id, s3_store_last_record_id
 
@@ -599,6 +600,21 @@ class S3Request(object):
             @param attr: Parameters for the method handler
         """
 
+        try:
+            return self.__execute(**attr)
+        finally:
+            # Request statistics
+            current.auth.permission.log_counters()
+            S3RepresentCache.log_stats()
+
+    # -------------------------------------------------------------------------
+    def __execute(self, **attr):
+        """
+            Execute this request (internal)
+
+            @param attr: Parameters for the method handler
+        """
+
         response = current.response
         s3 = response.s3
         self.next = None
@@ -671,7 +687,13 @@ class S3Request(object):
         handler = None
         if not bypass:
             # Find the method handler
-            if self.method and self.custom_action:
+            if http == "GET" and "async" in self.get_vars and \
+               not self.method and representation in \
+               current.deployment_settings.get_ui_export_async_formats():
+                # Queue as asynchronous export job
+                from s3export import S3ExportJob
+                handler = S3ExportJob.queue
+            elif self.method and self.custom_action:
                 handler = self.custom_action
             elif http == "GET":
                 handler = self.__GET()
@@ -881,6 +903,12 @@ class S3Request(object):
         if r.representation in ("gpx", "osm"):
             maxbounds = True
 
+        # Stream the output (default: False)
+        stream = False
+        if "stream" in get_vars:
+            if get_vars["stream"].lower() == "true":
+                stream = True
+
         # Components of the master resource (tablenames)
         if "mcomponents" in get_vars:
             mcomponents = get_vars["mcomponents"]
@@ -975,6 +1003,7 @@ class S3Request(object):
                                      as_json=as_json,
                                      maxbounds=maxbounds,
                                      target= target,
+                                     stream=stream,
                                      **args)
         # Transformation error?
         if not output:
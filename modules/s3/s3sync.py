@@ -30,6 +30,14 @@
 import sys
 import datetime
 
+try:
+    import json # try stdlib (Python 2.6)
+except ImportError:
+    try:
+        import simplejson as json # try external module
+    except:
+        import gluon.contrib.simplejson as json # fallback to pure-Python module
+
 try:
     from cStringIO import StringIO # Faster, where available
 except:
@@ -42,6 +50,7 @@ from s3datetime import s3_parse_datetime, s3_utc
 from s3rest import S3Method
 from s3import import S3ImportItem
 from s3query import S3URLQuery
+from s3utils import s3_get_foreign_key
 
 DEBUG = False
 if DEBUG:
@@ -217,6 +226,18 @@ class S3Sync(S3Method):
         if msince is not None:
             msince = s3_parse_datetime(msince)
 
+        # Paged pull (continuation token, empty for the first page)
+        paging = {}
+        after = get_vars.get("after", None)
+        if after is not None:
+            paging["after"] = after
+            page_size = get_vars.get("page_size", None)
+            if page_size is not None:
+                try:
+                    paging["page_size"] = int(page_size)
+                except ValueError:
+                    pass
+
         # Sync filters from peer
         filters = {}
         for k, v in get_vars.items():
@@ -243,7 +264,7 @@ class S3Sync(S3Method):
                                     msince = msince,
                                     filters = filters,
                                     mixed = mixed,
-                                    )
+                                    **paging)
         except NotImplementedError:
             r.error(405, "Synchronization method not supported for repository")
 
@@ -346,6 +367,11 @@ class S3Sync(S3Method):
 
         # Get the source
         source = r.read_body()
+        encoding = r.env.http_content_encoding
+        if encoding and encoding.lower() == "gzip":
+            import gzip
+            source = [gzip.GzipFile(fileobj=s)
+                      if not isinstance(s, tuple) else s for s in source]
 
         # Import resource
         resource = r.resource
@@ -384,11 +410,13 @@ class S3Sync(S3Method):
     # -------------------------------------------------------------------------
     # API Methods:
     # -------------------------------------------------------------------------
-    def synchronize(self, repository):
+    def synchronize(self, repository, task_ids=None):
         """
             Synchronize with a repository, called from scheduler task
 
             @param repository: the repository Row
+            @param task_ids: the IDs of the sync tasks to run (default:
+                             all tasks of the repository)
 
             @return: True if successful, False if there was an error
         """
@@ -419,8 +447,29 @@ class S3Sync(S3Method):
         ttable = current.s3db.sync_task
         query = (ttable.repository_id == repository.id) & \
                 (ttable.deleted != True)
+        if task_ids is not None:
+            query &= (ttable.id.belongs(task_ids))
         tasks = current.db(query).select()
 
+        # Run independent groups of tasks as separate scheduler tasks
+        if task_ids is None and len(tasks) > 1 and \
+           current.deployment_settings.get_sync_concurrent_tasks():
+            groups = self.task_groups(tasks)
+            if len(groups) > 1:
+                async = current.s3task.async
+                pending = 0
+                try:
+                    for group in groups:
+                        async("sync_synchronize_tasks",
+                              args = [repository.id, json.dumps(group)],
+                              )
+                        pending += 1
+                finally:
+                    # Sync remains running until all groups have completed
+                    # (the group tasks can not start before this is committed)
+                    self.set_status(pending=pending)
+                return True
+
         connector = S3SyncRepository(repository)
         error = connector.login()
         if error:
@@ -474,6 +523,70 @@ class S3Sync(S3Method):
 
         return success
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def task_groups(tasks):
+        """
+            Group synchronization tasks so that tasks for resources
+            which reference each other are in the same group (and thus
+            run in sequence), while the groups can run concurrently
+
+            @param tasks: the sync tasks (Rows)
+
+            @return: list of lists of task IDs, in task order
+        """
+
+        s3db = current.s3db
+
+        tablenames = set(task.resource_name for task in tasks)
+
+        # Union-find over references between the task resources
+        # - references to super-entities (e.g. pe_id, site_id) can link
+        #   to any of their instance tables, so the super-entities are
+        #   included as nodes, and instance tables linked to them
+        parent = dict((tablename, tablename) for tablename in tablenames)
+        def find(tablename):
+            parent.setdefault(tablename, tablename)
+            while parent[tablename] != tablename:
+                parent[tablename] = parent[parent[tablename]]
+                tablename = parent[tablename]
+            return tablename
+        def union(tablename, ktablename):
+            parent[find(ktablename)] = find(tablename)
+
+        for tablename in tablenames:
+            table = s3db.table(tablename)
+            if not table:
+                continue
+            supertables = s3db.get_config(tablename, "super_entity")
+            if supertables:
+                if not isinstance(supertables, (list, tuple)):
+                    supertables = [supertables]
+                for supertable in supertables:
+                    union(tablename, getattr(supertable, "_tablename", supertable))
+            for fn in table.fields:
+                ktablename = s3_get_foreign_key(table[fn], m2m=False)[0]
+                if not ktablename:
+                    continue
+                if ktablename in tablenames:
+                    union(tablename, ktablename)
+                else:
+                    ktable = s3db.table(ktablename)
+                    if ktable and "instance_type" in ktable.fields:
+                        # Super-entity
+                        union(tablename, ktablename)
+
+        groups = []
+        index = {}
+        for task in tasks:
+            root = find(task.resource_name)
+            if root in index:
+                groups[index[root]].append(task.id)
+            else:
+                index[root] = len(groups)
+                groups.append([task.id])
+        return groups
+
     # -------------------------------------------------------------------------
     @classmethod
     def onconflict(cls, item, repository, resource):
@@ -568,6 +681,21 @@ class S3Sync(S3Method):
             row = Storage()
         return row
 
+    # -------------------------------------------------------------------------
+    def task_group_done(self):
+        """
+            A dispatched group of tasks has completed: count down the
+            pending groups, and reset the running status after the last
+        """
+
+        db = current.db
+        table = current.s3db.sync_status
+
+        db(table.id > 0).update(pending = table.pending - 1)
+        status = self.get_status()
+        if not status.pending or status.pending < 0:
+            self.set_status(running=False, manual=False, pending=0)
+
     # -------------------------------------------------------------------------
     def set_status(self, **attr):
         """ Update the current sync status """
@@ -37,9 +37,13 @@ __all__ = ("S3TimePlot",
 
 import datetime
 import dateutil.tz
+import math
 import re
 import sys
 
+from bisect import bisect_left, bisect_right
+from itertools import product
+
 try:
     import json # try stdlib (Python 2.6)
 except ImportError:
@@ -775,12 +779,14 @@ class S3TimeSeries(object):
 
         # Iterate over the event frame to collect aggregates
         event_frame = self.event_frame
+        facts = self.facts
+        event_frame.aggregate(facts)
         periods_data = []
         append = periods_data.append
-        #fact = self.facts[0]
         for period in event_frame:
-            # Aggregate
-            period.aggregate(self.facts)
+            # Aggregate (unless already done by the event frame)
+            if period.totals is None:
+                period.aggregate(facts)
             # Extract
             item = period.as_dict(rows = rows_keys,
                                   cols = cols_keys,
@@ -1843,9 +1849,14 @@ class S3TimeSeriesPeriod(object):
         self.start = tp_tzsafe(start)
         self.end = tp_tzsafe(end)
 
+        # Event frame and position of this period in it (set by the
+        # event frame to look up the events in this period on demand)
+        self.frame = None
+        self.index = None
+
         # Event sets
-        self.pevents = {}
-        self.cevents = {}
+        self._pevents = None
+        self._cevents = None
 
         self._reset()
 
@@ -1868,6 +1879,42 @@ class S3TimeSeriesPeriod(object):
         self.cols = None
         self.totals = None
 
+    # -------------------------------------------------------------------------
+    @property
+    def cevents(self):
+        """
+            The current events in this period, dict {event_id: event}
+        """
+
+        cevents = self._cevents
+        if cevents is None:
+            self._lookup()
+            cevents = self._cevents
+        return cevents
+
+    # -------------------------------------------------------------------------
+    @property
+    def pevents(self):
+        """
+            The previous events in this period, dict {event_id: event}
+        """
+
+        pevents = self._pevents
+        if pevents is None:
+            self._lookup()
+            pevents = self._pevents
+        return pevents
+
+    # -------------------------------------------------------------------------
+    def _lookup(self):
+        """ Look up the current and previous events from the event frame """
+
+        frame = self.frame
+        if frame is not None:
+            self._cevents, self._pevents = frame.get_events(self.index)
+        else:
+            self._cevents, self._pevents = {}, {}
+
     # -------------------------------------------------------------------------
     def add_current(self, event):
         """
@@ -1952,7 +1999,6 @@ class S3TimeSeriesPeriod(object):
         rows = {}
         cols = {}
         matrix = {}
-        from itertools import product
         for index, events in enumerate(event_sets):
             for event_id, event in events.items():
                 for key in event.rows:
@@ -2114,6 +2160,9 @@ class S3TimeSeriesPeriod(object):
 class S3TimeSeriesEventFrame(object):
     """ Class representing the whole time frame of a time plot """
 
+    #: Aggregation methods which can be computed for all periods at once
+    SWEEP_METHODS = ("count", "sum", "avg", "cumulate")
+
     def __init__(self, start, end, slots=None):
         """
             Constructor
@@ -2141,6 +2190,10 @@ class S3TimeSeriesEventFrame(object):
         self.slots = slots
         self.periods = {}
 
+        # All events in this frame, and their periods
+        self.events = []
+        self._sweep = None
+
         self.rule = self.get_rule()
 
     # -------------------------------------------------------------------------
@@ -2168,74 +2221,485 @@ class S3TimeSeriesEventFrame(object):
 
         if not events:
             return
-        empty = self.empty
-
-        # Order events by start datetime
-        events = sorted(events)
+        all_events = self.events
+        all_events.extend(events)
+        if not all_events:
+            return
 
         rule = self.rule
-        periods = self.periods
+        frame_end = self.end
 
         # No point to loop over periods before the first event:
-        start = events[0].start
+        start = min(all_events).start
         if start is None or start <= self.start:
             first = rule[0]
         else:
             first = rule.before(start, inc=True)
 
-        current_events = {}
-        previous_events = {}
-        for start in rule.between(first, self.end, inc=True):
+        # Period boundaries
+        boundaries = list(rule.between(first, frame_end, inc=True))
+        starts = [dt for dt in boundaries if dt < frame_end]
+        ends = boundaries[1:len(starts) + 1]
+        if len(ends) < len(starts):
+            ends.append(frame_end)
+        if starts:
+            self.empty = False
+
+        # Sweep the event boundaries against the period boundaries to
+        # find the first and the last period (index) in which each event
+        # is current - an event is current from the period it starts in
+        # until the period it ends in, and previous in all periods after
+        # that, or in all periods from the first if it ended before
+        num = len(starts)
+        items = []
+        append = items.append
+        for event in all_events:
+            event_start = event.start
+            event_end = event.end
+            if event_start is None:
+                index = 0
+            else:
+                index = bisect_right(ends, event_start)
+            if index == num or event_end is None:
+                last = num - 1
+            elif event_end < starts[index]:
+                # Ended before this period
+                last = index - 1
+            else:
+                last = min(bisect_left(ends, event_end, index), num - 1)
+            append((event, index, last))
+        self._sweep = (starts, ends, items)
+
+        # Create the periods
+        periods = self.periods
+        for index, dt in enumerate(starts):
+            period = periods.get(dt)
+            if period is None:
+                period = periods[dt] = S3TimeSeriesPeriod(dt, end=ends[index])
+            period.frame = self
+            period.index = index
+            period._cevents = period._pevents = None
+            period._reset()
+
+        return
+
+    # -------------------------------------------------------------------------
+    def get_events(self, index):
+        """
+            Get the current and previous events for a period
+
+            @param index: the index of the period in this frame
+
+            @return: tuple of dicts {event_id: event} (current, previous)
+        """
+
+        cevents = {}
+        pevents = {}
+
+        sweep = self._sweep
+        if sweep is not None and index is not None:
+            for event, first, last in sweep[2]:
+                if last < index:
+                    pevents[event.event_id] = event
+                elif first <= index:
+                    cevents[event.event_id] = event
+
+        return cevents, pevents
+
+    # -------------------------------------------------------------------------
+    def aggregate(self, facts):
+        """
+            Aggregate facts for all periods of this frame at once, using
+            difference arrays over the period indexes of the event sweep
+            rather than aggregating the events of every period separately
+
+            @param facts: list of facts to aggregate
+
+            @return: True if the periods have been aggregated, False if
+                     the facts require per-period aggregation (i.e.
+                     S3TimeSeriesPeriod.aggregate)
+        """
+
+        sweep = self._sweep
+        if sweep is None:
+            return False
 
-            # Compute end of this period
-            end = rule.after(start)
-            if not end:
-                if start < self.end:
-                    end = self.end
+        starts, ends, items = sweep
+        periods = [self.periods[dt] for dt in starts]
+        for period in periods:
+            period._reset()
+
+        if not isinstance(facts, (list, tuple)):
+            facts = [facts]
+        if any(fact.method not in self.SWEEP_METHODS for fact in facts):
+            return False
+
+        num = len(periods)
+        cumulative = any(fact.method == "cumulate" for fact in facts)
+
+        # Aggregation scopes of each event (None = totals)
+        scopes = []
+        for event, first, last in items:
+            rows, cols = event.rows, event.cols
+            scope = [None]
+            scope.extend((0, key) for key in rows)
+            scope.extend((1, key) for key in cols)
+            scope.extend((2, key) for key in product(rows, cols))
+            scopes.append(scope)
+
+        # Scopes which occur in each period
+        presence = {}
+        add = self._add
+        for (event, first, last), scope in zip(items, scopes):
+            end = num if cumulative else last + 1
+            if first < end:
+                add(presence, scope[1:], first, end, 1)
+
+        # Aggregate the facts
+        results = []
+        for fact in facts:
+            result = self._aggregate_fact(fact, periods, ends, items, scopes)
+            if result is None:
+                # Requires per-period aggregation
+                return False
+            results.append(result)
+
+        # Collect the results in the periods
+        totals = [values.get(None, [default] * num)
+                  for values, default in results]
+        for index, period in enumerate(periods):
+            period.rows = {}
+            period.cols = {}
+            period.matrix = {}
+            period.totals = [values[index] for values in totals]
+
+        for scope, occurrences in presence.items():
+            fact_values = [values.get(scope) for values, default in results]
+            defaults = [default for values, default in results]
+            kind, key = scope
+            for index, occurs in enumerate(self._accumulate(occurrences, num)):
+                if not occurs:
+                    continue
+                period = periods[index]
+                if kind == 0:
+                    target = period.rows
+                elif kind == 1:
+                    target = period.cols
                 else:
-                    # Period start is at the end of the event frame
-                    break
+                    target = period.matrix
+                target[key] = [values[index] if values is not None else default
+                               for values, default in zip(fact_values, defaults)]
+
+        return True
+
+    # -------------------------------------------------------------------------
+    def _aggregate_fact(self, fact, periods, ends, items, scopes):
+        """
+            Aggregate a fact for all periods
+
+            @param fact: the S3TimeSeriesFact
+            @param periods: the periods (ordered list)
+            @param ends: the period end dates (ordered list)
+            @param items: the event sweep items (event, first, last)
+            @param scopes: the aggregation scopes of the events
+
+            @return: tuple ({scope: [value per period]}, default) for
+                     scopes without events, or None if the fact values
+                     are not numeric
+
+            @note: integer values are summed exactly, float values with
+                   math.fsum per period (i.e. the differences added and
+                   removed in the sweep do not leave rounding errors)
+        """
+
+        num = len(periods)
+        method = fact.method
+        base = fact.base_column
 
-            # Find all current events
-            for index, event in enumerate(events):
-                if event.end and event.end < start:
-                    # Event ended before this period
-                    previous_events[event.event_id] = event
-                elif event.start is None or event.start < end:
-                    # Event starts before or during this period
-                    current_events[event.event_id] = event
+        add = self._add
+        add_float = self._add_float
+        accumulate = self._accumulate
+        numeric = self._numeric
+
+        counts = {}
+        sums = {}
+        floats = {}
+        fcounts = {}
+
+        if method == "cumulate":
+
+            slope = fact.slope_column
+            interval = fact.interval
+
+            for (event, first, last), scope in zip(items, scopes):
+
+                if first >= num or event.start is None:
+                    continue
+
+                base_value = event[base] if base else None
+                slope_value = event[slope] if slope else None
+
+                if base_value is None:
+                    if not slope or slope_value is None:
+                        continue
+                    else:
+                        base_value = 0
+                elif type(base_value) is list:
+                    try:
+                        base_value = sum(base_value)
+                    except (TypeError, ValueError):
+                        continue
+
+                if slope_value is None:
+                    if not base or base_value is None:
+                        continue
+                    else:
+                        slope_value = 0
+                elif type(slope_value) is list:
+                    try:
+                        slope_value = sum(slope_value)
+                    except (TypeError, ValueError):
+                        continue
+
+                if not numeric(base_value) or not numeric(slope_value):
+                    return None
+
+                # Durations (number of intervals until the end of each
+                # period, constant after the period the event ends in)
+                if slope_value and interval:
+                    if event.end is None:
+                        end = num
+                    else:
+                        end = bisect_left(ends, event.end, first)
+                    until = ends[end] if end < num else ends[-1]
+                    if event.end is not None and event.end < until:
+                        until = event.end
+                    rule = S3TimeSeriesPeriod.get_rule(event.start,
+                                                       until,
+                                                       interval)
+                    if rule:
+                        occurrences = list(rule)
+                        durations = [(index, index + 1,
+                                      bisect_right(occurrences, ends[index]))
+                                     for index in xrange(first, end)]
+                        if end < num:
+                            durations.append((end, num,
+                                              periods[end].duration(event,
+                                                                    interval)))
+                    else:
+                        durations = [(first, num, 1)]
                 else:
-                    # Event starts only after this period
-                    break
+                    durations = [(first, num, 1)]
+
+                for start, end, duration in durations:
+                    value = base_value + slope_value * duration
+                    if type(value) is float:
+                        if not numeric(value):
+                            return None
+                        add(fcounts, scope, start, end, 1)
+                        add_float(floats, scope, start, end, [value])
+                    else:
+                        add(sums, scope, start, end, value)
 
-            # Add current events to current period
-            period = periods.get(start)
-            if period is None:
-                period = periods[start] = S3TimeSeriesPeriod(start, end=end)
-            for event in current_events.values():
-                period.add_current(event)
-            for event in previous_events.values():
-                period.add_previous(event)
-
-            empty = False
-
-            # Remaining events
-            events = events[index:]
-            if not events:
-                # No more events
-                break
-
-            # Remove events which end during this period
-            remaining = {}
-            for event_id, event in current_events.items():
-                if not event.end or event.end > end:
-                    remaining[event_id] = event
+            default = 0
+
+        elif base:
+
+            for (event, first, last), scope in zip(items, scopes):
+
+                if first > last:
+                    continue
+
+                value = event[base]
+                if value is None:
+                    continue
+                elif type(value) is list:
+                    values = [v for v in value if v is not None]
                 else:
-                    previous_events[event_id] = event
-            current_events = remaining
+                    values = [value]
+                if not values:
+                    continue
 
-        self.empty = empty
-        return
+                end = last + 1
+                add(counts, scope, first, end, len(values))
+
+                if method != "count":
+                    total = 0
+                    fvalues = []
+                    for v in values:
+                        if not numeric(v):
+                            return None
+                        if type(v) is float:
+                            fvalues.append(v)
+                        else:
+                            total += v
+                    if total or not fvalues:
+                        add(sums, scope, first, end, total)
+                    if fvalues:
+                        add(fcounts, scope, first, end, len(fvalues))
+                        add_float(floats, scope, first, end, fvalues)
+
+            default = None if method == "avg" else 0
+
+        else:
+            return {}, None
+
+        # Compute the values per period
+        results = {}
+        if method == "count":
+            for scope, diff in counts.items():
+                results[scope] = accumulate(diff, num)
+        else:
+            accumulate_float = self._accumulate_float
+            no_totals = [0] * num
+            for scope in set(sums.keys()) | set(floats.keys()):
+                if scope in sums:
+                    totals = accumulate(sums[scope], num)
+                else:
+                    totals = no_totals
+                if scope in floats:
+                    values = accumulate_float(floats[scope],
+                                              num,
+                                              totals,
+                                              accumulate(fcounts[scope], num),
+                                              )
+                else:
+                    values = totals
+                if method == "avg":
+                    values = [value / float(count) if count else None
+                              for value, count in zip(values,
+                                                      accumulate(counts[scope], num))]
+                results[scope] = values
+
+        return results, default
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _add(diffs, scopes, start, end, value):
+        """
+            Add a value to the difference arrays of the given scopes for
+            the periods start...end-1
+
+            @param diffs: the difference arrays, dict {scope: {index: delta}}
+            @param scopes: the scopes
+            @param start: the index of the first period
+            @param end: the index after the last period
+            @param value: the value to add
+        """
+
+        for scope in scopes:
+            diff = diffs.get(scope)
+            if diff is None:
+                diff = diffs[scope] = {}
+            diff[start] = diff.get(start, 0) + value
+            diff[end] = diff.get(end, 0) - value
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _add_float(diffs, scopes, start, end, values):
+        """
+            Add float values to the difference arrays of the given scopes
+            for the periods start...end-1, keeping the individual terms
+            (to be summed up with _accumulate_float)
+
+            @param diffs: the difference arrays, dict {scope: {index: [terms]}}
+            @param scopes: the scopes
+            @param start: the index of the first period
+            @param end: the index after the last period
+            @param values: the values to add (list of floats)
+        """
+
+        for scope in scopes:
+            diff = diffs.get(scope)
+            if diff is None:
+                diff = diffs[scope] = {}
+            if start in diff:
+                diff[start].extend(values)
+            else:
+                diff[start] = list(values)
+            if end in diff:
+                diff[end].extend(-v for v in values)
+            else:
+                diff[end] = [-v for v in values]
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _accumulate_float(diff, num, totals, counts):
+        """
+            Compute the values per period from a difference array of
+            float terms
+
+            @param diff: the difference array, dict {index: [terms]}
+            @param num: the number of periods
+            @param totals: the integer totals per period, to add
+            @param counts: the number of float values per period
+
+            @return: list of values, one per period - floats for periods
+                     with float values, otherwise the integer totals
+
+            @note: the running sum is kept as non-overlapping partials
+                   (Shewchuk), so that every value is the correctly rounded
+                   sum of all terms (=same as math.fsum over the values of
+                   the period), without re-summing the terms per period
+        """
+
+        values = []
+        append = values.append
+
+        partials = []
+        get = diff.get
+        for index in xrange(num):
+            for x in get(index, ()):
+                i = 0
+                for y in partials:
+                    if abs(x) < abs(y):
+                        x, y = y, x
+                    hi = x + y
+                    lo = y - (hi - x)
+                    if lo:
+                        partials[i] = lo
+                        i += 1
+                    x = hi
+                partials[i:] = [x]
+            if counts[index]:
+                append(math.fsum(partials + [totals[index]]))
+            else:
+                append(totals[index])
+        return values
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _accumulate(diff, num):
+        """
+            Compute the values per period from a difference array
+
+            @param diff: the difference array, dict {index: delta}
+            @param num: the number of periods
+
+            @return: list of values, one per period
+        """
+
+        values = []
+        append = values.append
+        value = 0
+        get = diff.get
+        for index in xrange(num):
+            value += get(index, 0)
+            append(value)
+        return values
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _numeric(value):
+        """
+            Check whether a value can be aggregated exactly in the sweep
+
+            @param value: the value
+        """
+
+        if type(value) is float:
+            return not math.isinf(value) and not math.isnan(value)
+        return isinstance(value, (int, long))
 
     # -------------------------------------------------------------------------
     def __iter__(self):
@@ -153,6 +153,68 @@ def s3_remove_last_record_id(tablename=None):
             del session[RCVARS]
     return True
 
+# =============================================================================
+def s3_table_version(tablename, cached=True):
+    """
+        Get a version stamp of the table data, which changes whenever
+        a record gets created, modified or deleted - for invalidation
+        of cached data derived from the table
+
+        @param tablename: the table name
+        @param cached: re-use the stamp looked up earlier in the same
+                       request, rather than querying the table again
+
+        @return: the version stamp (string), or None if the table
+                 is not defined
+
+        @note: the stamp is a counter in s3_table_version, which gets
+               incremented with every write to the table (see
+               s3_update_table_version), and thus changes together with
+               the data, in all processes
+    """
+
+    versions = current.response.s3.table_versions
+    if versions is None:
+        versions = current.response.s3.table_versions = {}
+    elif cached and tablename in versions:
+        return versions[tablename]
+
+    if current.s3db.table(tablename) is None:
+        version = None
+    else:
+        vtable = current.s3db.s3_table_version
+        total = vtable.version.sum()
+        row = current.db(vtable.tablename == tablename).select(total).first()
+        version = str(row[total] or 0)
+
+    versions[tablename] = version
+    return version
+
+# =============================================================================
+def s3_update_table_version(tablename):
+    """
+        Increment the version counter of a table, to be called after
+        every write to the table (S3Model.define_table installs this
+        as DAL callback for all tables with meta-fields)
+
+        @param tablename: the table name
+
+        @note: concurrent first writes to a table may create more than
+               one counter row, hence all rows get incremented and the
+               version is their sum - which still changes with every
+               write, without requiring a unique constraint (=an error
+               that would abort the writing transaction)
+    """
+
+    db = current.db
+    vtable = current.s3db.s3_table_version
+
+    query = (vtable.tablename == tablename)
+    if not db(query).update(version = vtable.version + 1):
+        vtable.insert(tablename = tablename,
+                      version = 1,
+                      )
+
 # =============================================================================
 def s3_validate(table, field, value, record=None):
     """
@@ -8221,22 +8221,27 @@ def search_ac(r, **attr):
 
     resource.add_filter(query)
 
-    output = None
+    maxrows = limit
     if filter == "~":
         MAX_SEARCH_RESULTS = current.deployment_settings.get_search_max_results()
-        if (not limit or limit > MAX_SEARCH_RESULTS) and \
-           resource.count() > MAX_SEARCH_RESULTS:
-            output = [
-                dict(label=str(current.T("There are more than %(max)s results, please input more characters.") % \
-                    dict(max=MAX_SEARCH_RESULTS)))
-                ]
-
-    if output is None:
-        rows = resource.select(fields,
-                               start=0,
-                               limit=limit,
-                               orderby=field,
-                               as_rows=True)
+        if not limit or limit > MAX_SEARCH_RESULTS:
+            # Look up one more than the maximum, so we can tell when
+            # there are too many results (without counting them all)
+            limit = MAX_SEARCH_RESULTS
+            maxrows = MAX_SEARCH_RESULTS + 1
+
+    rows = resource.select(fields,
+                           start=0,
+                           limit=maxrows,
+                           orderby=field,
+                           as_rows=True)
+
+    if len(rows) > limit > 0:
+        output = [
+            dict(label=str(current.T("There are more than %(max)s results, please input more characters.") % \
+                dict(max=MAX_SEARCH_RESULTS)))
+            ]
+    else:
         output = []
         append = output.append
         for row in rows:
@@ -8244,6 +8249,11 @@ def search_ac(r, **attr):
                       fieldname: row[fieldname],
                       }
             append(record)
+        if filter == "~":
+            # Exact matches first
+            exact = s3_unicode(value)
+            output.sort(key=lambda record: \
+                        s3_unicode(record[fieldname]).lower() != exact)
 
     current.response.headers["Content-Type"] = "application/json"
     return json.dumps(output, separators=SEPARATORS)
@@ -350,6 +350,46 @@ class S3XML(S3Codec):
                               encoding="utf-8",
                               pretty_print=pretty_print)
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def tostream(root, elements, xml_declaration=True, pretty_print=False):
+        """
+            Streaming variant of tostring: serialize a root element and
+            its children one by one, without building the whole tree
+
+            @param root: the root element (children will be ignored)
+            @param elements: iterable of the child elements
+            @param xml_declaration: add an XML declaration to the output
+            @param pretty_print: provide pretty formatted output
+
+            @return: generator of XML strings
+        """
+
+        try:
+            from cStringIO import StringIO
+        except ImportError:
+            from StringIO import StringIO
+
+        output = StringIO()
+
+        def flush():
+            data = output.getvalue()
+            output.seek(0)
+            output.truncate()
+            return data
+
+        with etree.xmlfile(output, encoding="utf-8") as xf:
+            if xml_declaration:
+                xf.write_declaration()
+            with xf.element(root.tag, dict(root.attrib)):
+                if pretty_print:
+                    xf.write("\n")
+                for element in elements:
+                    xf.write(element, pretty_print=pretty_print)
+                    if output.tell() > 65536:
+                        yield flush()
+        yield flush()
+
     # -------------------------------------------------------------------------
     def tree(self, elements,
              root=None,
@@ -2211,19 +2251,112 @@ class S3XML(S3Codec):
         else:
             native = False
 
+        root_dict = cls.__root2json(root, native=native)
+
+        if pretty_print:
+            js = json.dumps(root_dict, indent=4)
+            return "\n".join([l.rstrip() for l in js.splitlines()])
+        else:
+            return json.dumps(root_dict, separators=SEPARATORS)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def __root2json(cls, root, native=False):
+        """
+            Converts the root element of a tree into a JSON-serializable
+            object, common helper for tree2json and tree2json_stream
+
+            @param root: the root element
+            @param native: use native S3XML conversion
+        """
+
         root_dict = cls.__element2json(root, native=native)
-        if "s3" in root_dict:
+        if isinstance(root_dict, dict) and "s3" in root_dict:
             # Don't double JSON-encode
             if root_dict["s3"] == {}:
                 del root_dict["s3"]
             else:
                 root_dict["s3"] = json.loads(root_dict["s3"])
+        return root_dict
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def tree2json_stream(cls, root, elements, pretty_print=False):
+        """
+            Streaming variant of tree2json for S3XML: converts the
+            <resource> elements one by one, without building the whole
+            tree (or the whole JSON object) in memory
+
+            - records of the first table are written immediately, those
+              of other tables are buffered in temporary files and appended
+              at the end (to keep them grouped by table)
+
+            @param root: the root element (without the <resource> elements)
+            @param elements: iterable of the <resource> elements
+            @param pretty_print: provide pretty formatted output
+
+            @return: generator of JSON strings, which together give the
+                     same JSON object as tree2json for the complete tree
+        """
+
+        import tempfile
 
         if pretty_print:
-            js = json.dumps(root_dict, indent=4)
-            return "\n".join([l.rstrip() for l in js.splitlines()])
+            def dumps(obj):
+                js = json.dumps(obj, indent=4)
+                return "\n".join([l.rstrip() for l in js.splitlines()])
         else:
-            return json.dumps(root_dict, separators=SEPARATORS)
+            dumps = lambda obj: json.dumps(obj, separators=SEPARATORS)
+
+        native = root.tag == cls.TAG.root
+        element2json = lambda e: cls.__element2json(e, native=native)
+
+        PREFIX = cls.PREFIX
+        NAME = cls.ATTRIBUTE.name
+
+        # Root attributes (converted the same way as in tree2json)
+        attributes = cls.__root2json(root, native=native)
+        if not isinstance(attributes, dict):
+            attributes = {}
+        items = ["%s:%s" % (json.dumps(k), dumps(v))
+                 for k, v in attributes.items()]
+        yield "{%s" % ",".join(items)
+        separator = "," if items else ""
+
+        master = None
+        buffers = {}
+        for element in elements:
+            name = element.get(NAME)
+            data = dumps(element2json(element))
+            if master is None:
+                master = name
+                key = json.dumps("%s_%s" % (PREFIX.resource, name))
+                yield "%s%s:[%s" % (separator, key, data)
+                separator = ","
+            elif name == master:
+                yield ",%s" % data
+            elif name in buffers:
+                buffers[name].write(",%s" % data)
+            else:
+                buffer = buffers[name] = tempfile.TemporaryFile()
+                buffer.write(data)
+        if master is not None:
+            yield "]"
+
+        for name, buffer in buffers.items():
+            key = json.dumps("%s_%s" % (PREFIX.resource, name))
+            yield "%s%s:[" % (separator, key)
+            separator = ","
+            buffer.seek(0)
+            while True:
+                data = buffer.read(65536)
+                if not data:
+                    break
+                yield data
+            buffer.close()
+            yield "]"
+
+        yield "}"
 
     # -------------------------------------------------------------------------
     @staticmethod
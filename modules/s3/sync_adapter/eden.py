@@ -27,10 +27,18 @@
     OTHER DEALINGS IN THE SOFTWARE.
 """
 
+import base64
+import datetime
+import gzip
 import sys
 import urllib2
 import traceback
 
+try:
+    from cStringIO import StringIO # Faster, where available
+except:
+    from StringIO import StringIO
+
 try:
     from lxml import etree
 except ImportError:
@@ -48,6 +56,7 @@ except ImportError:
 from gluon import *
 
 from ..s3datetime import s3_encode_iso_datetime
+from ..s3query import S3URLQuery
 from ..s3sync import S3SyncBaseAdapter
 
 DEBUG = False
@@ -65,6 +74,9 @@ class S3SyncAdapter(S3SyncBaseAdapter):
         Sahana Eden Synchronization Adapter (default sync adapter)
     """
 
+    # HTTP header for the continuation token in paged pull responses
+    CONTINUATION = "X-Sync-Continuation"
+
     # -------------------------------------------------------------------------
     # Methods to be implemented by subclasses:
     # -------------------------------------------------------------------------
@@ -185,45 +197,21 @@ class S3SyncAdapter(S3SyncBaseAdapter):
         return None
 
     # -------------------------------------------------------------------------
-    def pull(self, task, onconflict=None):
+    # Paged synchronization
+    # -------------------------------------------------------------------------
+    def _request(self, url, data=None):
         """
-            Fetch updates from the peer repository and import them
-            into the local database (active pull)
+            Create a request to the peer repository, and install the
+            necessary proxy and authentication handlers
 
-            @param task: the synchronization task (sync_task Row)
-            @param onconflict: callback for automatic conflict resolution
+            @param url: the URL
+            @param data: the data to send (POST)
 
-            @return: tuple (error, mtime), with error=None if successful,
-                     else error=message, and mtime=modification timestamp
-                     of the youngest record sent
+            @return: the urllib2.Request
         """
 
         repository = self.repository
-        xml = current.xml
         config = repository.config
-        resource_name = task.resource_name
-
-        current.log.debug("S3Sync: pull %s from %s" % (resource_name,
-                                                       repository.url))
-
-        # Construct the URL
-        url = "%s/sync/sync.xml?resource=%s&repository=%s" % \
-              (repository.url, resource_name, config.uuid)
-        last_pull = task.last_pull
-        if last_pull and task.update_policy not in ("THIS", "OTHER"):
-            url += "&msince=%s" % s3_encode_iso_datetime(last_pull)
-        url += "&include_deleted=True"
-
-        # Send sync filters to peer
-        filters = current.sync.get_filters(task.id)
-        filter_string = None
-        resource_name = task.resource_name
-        for tablename in filters:
-            prefix = "~" if not tablename or tablename == resource_name \
-                            else tablename
-            for k, v in filters[tablename].items():
-                urlfilter = "[%s]%s=%s" % (prefix, k, v)
-                url += "&%s" % urlfilter
 
         # Figure out the protocol from the URL
         url_split = url.split("://", 1)
@@ -233,13 +221,13 @@ class S3SyncAdapter(S3SyncBaseAdapter):
             protocol, path = "http", None
 
         # Create the request
-        req = urllib2.Request(url=url)
+        req = urllib2.Request(url=url, data=data)
         handlers = []
 
         # Proxy handling
         proxy = repository.proxy or config.proxy or None
         if proxy:
-            current.log.debug("S3Sync: pull, using proxy=%s" % proxy)
+            current.log.debug("S3Sync: using proxy=%s" % proxy)
             proxy_handler = urllib2.ProxyHandler({protocol: proxy})
             handlers.append(proxy_handler)
 
@@ -266,132 +254,326 @@ class S3SyncAdapter(S3SyncBaseAdapter):
             opener = urllib2.build_opener(*handlers)
             urllib2.install_opener(opener)
 
-        # Execute the request
-        remote = False
-        action = "fetch"
-        response = None
-        output = None
+        return req
 
-        log = repository.log
-        try:
-            f = urllib2.urlopen(req)
-        except urllib2.HTTPError, e:
-            result = log.ERROR
-            remote = True # Peer error
-            code = e.code
-            message = e.read()
-            try:
-                # Sahana-Eden would send a JSON message,
-                # try to extract the actual error message:
-                message_json = json.loads(message)
-                message = message_json.get("message", message)
-            except:
-                pass
-            # Prefix as peer error and strip XML markup from the message
-            # @todo: better method to do this?
-            message = "<message>%s</message>" % message
-            try:
-                markup = etree.XML(message)
-                message = markup.xpath(".//text()")
-                if message:
-                    message = " ".join(message)
-                else:
-                    message = ""
-            except etree.XMLSyntaxError:
-                pass
-            output = xml.json_message(False, code, message, tree=None)
-        except:
-            result = log.FATAL
-            code = 400
-            message = sys.exc_info()[1]
-            output = xml.json_message(False, code, message)
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _compress(data):
+        """
+            Gzip-compress data for transmission
+
+            @param data: the data (string)
+        """
+
+        stream = StringIO()
+        gz = gzip.GzipFile(fileobj=stream, mode="wb")
+        gz.write(data)
+        gz.close()
+        return stream.getvalue()
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _decompress(response):
+        """
+            Decompress a response from the peer repository if it is
+            gzip-encoded
+
+            @param response: the response (file-like object)
+
+            @return: a file-like object with the decompressed data
+        """
+
+        encoding = response.info().getheader("Content-Encoding")
+        if encoding and encoding.lower() == "gzip":
+            return gzip.GzipFile(fileobj=StringIO(response.read()))
         else:
-            result = log.SUCCESS
-            response = f
+            return response
 
-        # Process the response
-        mtime = None
-        if response:
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def encode_token(mtime, uid):
+        """
+            Encode a continuation token for paged synchronization
 
-            # Get import strategy and update policy
-            strategy = task.strategy
-            update_policy = task.update_policy
-            conflict_policy = task.conflict_policy
+            @param mtime: the modified_on of the last record in the page
+            @param uid: the UID of the last record in the page
 
-            success = True
-            message = ""
-            action = "import"
+            @return: the token (URL-safe string)
+        """
 
-            # Import the data
-            resource = current.s3db.resource(resource_name)
-            if onconflict:
-                onconflict_callback = lambda item: onconflict(item,
-                                                              repository,
-                                                              resource)
+        token = "%s %s" % (mtime.isoformat(), uid)
+        return base64.urlsafe_b64encode(token)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def decode_token(token):
+        """
+            Decode a continuation token for paged synchronization
+
+            @param token: the token
+
+            @return: tuple (mtime, uid), or (None, None) for an empty
+                     or invalid token
+        """
+
+        if not token:
+            return (None, None)
+        try:
+            mtime, uid = base64.urlsafe_b64decode(str(token)).split(" ", 1)
+            if "." in mtime:
+                dtfmt = "%Y-%m-%dT%H:%M:%S.%f"
             else:
-                onconflict_callback = None
-            count = 0
-            try:
-                success = resource.import_xml(
-                                response,
-                                ignore_errors=True,
-                                strategy=strategy,
-                                update_policy=update_policy,
-                                conflict_policy=conflict_policy,
-                                last_sync=last_pull,
-                                onconflict=onconflict_callback,
-                                )
-                count = resource.import_count
-            except IOError, e:
-                result = log.FATAL
-                message = "%s" % e
-                output = xml.json_message(False, 400, message)
-            except Exception, e:
-                # If we end up here, an uncaught error during import
-                # has occured which indicates a code defect! We log it
-                # and continue here, however - in order to maintain a
-                # valid sync status, so that developers can restart
-                # the process more easily after fixing the defect.
-                result = log.FATAL
-                message = "Uncaught Exception During Import: %s" % \
-                          traceback.format_exc()
-                output = xml.json_message(False, 500, sys.exc_info()[1])
+                dtfmt = "%Y-%m-%dT%H:%M:%S"
+            mtime = datetime.datetime.strptime(mtime, dtfmt)
+        except (TypeError, ValueError):
+            return (None, None)
+        return (mtime, uid)
 
-            mtime = resource.mtime
+    # -------------------------------------------------------------------------
+    def _export_page(self,
+                     resource,
+                     after,
+                     page_size,
+                     msince=None,
+                     filters=None,
+                     pretty_print=False):
+        """
+            Export a page of master records (and their references) as
+            S3XML, in (modified_on, uid) order
+
+            @param resource: the S3Resource
+            @param after: the continuation token (empty for first page)
+            @param page_size: the maximum number of master records
+                              in the page
+            @param msince: minimum modification date/time for records
+            @param filters: URL filters for record extraction
+            @param pretty_print: make the output human-readable
 
-            # Log all validation errors
-            if resource.error_tree is not None:
-                result = log.WARNING
-                message = "%s" % resource.error
-                for element in resource.error_tree.findall("resource"):
-                    for field in element.findall("data[@error]"):
-                        error_msg = field.get("error", None)
-                        if error_msg:
-                            msg = "(UID: %s) %s.%s=%s: %s" % \
-                                   (element.get("uuid", None),
-                                    element.get("name", None),
-                                    field.get("field", None),
-                                    field.get("value", field.text),
-                                    field.get("error", None))
-                            message = "%s, %s" % (message, msg)
+            @return: tuple (output, count, muntil, token), with token
+                     being the continuation token for the next page,
+                     or None for the last page
+        """
+
+        xml = current.xml
+
+        table = resource.table
+        tablename = resource.tablename
+
+        UID = xml.UID
+        MTIME = xml.MTIME
+        if MTIME not in table.fields or UID not in table.fields:
+            # Can not page this resource => export all at once
+            output = resource.export_xml(msince=msince,
+                                         filters=filters,
+                                         pretty_print=pretty_print,
+                                         )
+            return (output, resource.results or 0, resource.muntil, None)
+
+        mtime_field = table[MTIME]
+        uid_field = table[UID]
+
+        # Filter for MCI >= 0 (setting)
+        if xml.filter_mci and "mci" in table.fields:
+            resource.add_filter(table.mci >= 0)
+
+        # Sync filters
+        if filters and tablename in filters:
+            queries = S3URLQuery.parse(resource, filters[tablename])
+            [resource.add_filter(q) for a in queries for q in queries[a]]
+
+        if msince is not None:
+            resource.add_filter(mtime_field >= msince)
+
+        # Continue after the last record of the previous page
+        mtime, uid = self.decode_token(after)
+        if mtime is not None:
+            resource.add_filter((mtime_field > mtime) | \
+                                ((mtime_field == mtime) & (uid_field > uid)))
+
+        # Select the master records of this page
+        pkey = table._id
+        rows = resource.select([pkey.name, MTIME, UID],
+                               limit=page_size,
+                               orderby=mtime_field|uid_field,
+                               virtual=False,
+                               as_rows=True)
+        record_ids = []
+        seen = set()
+        for row in rows:
+            record_id = row[pkey]
+            if record_id not in seen:
+                seen.add(record_id)
+                record_ids.append(record_id)
+
+        if page_size and len(rows) >= page_size:
+            last = rows.last()
+            token = self.encode_token(last[mtime_field], last[uid_field])
+        else:
+            token = None
+
+        # Export the records
+        page = current.s3db.resource(tablename,
+                                     filter = pkey.belongs(record_ids),
+                                     components = resource.components.keys(),
+                                     include_deleted = resource.include_deleted,
+                                     approved = resource._approved,
+                                     unapproved = resource._unapproved,
+                                     )
+        output = page.export_xml(msince=msince,
+                                 filters=filters,
+                                 pretty_print=pretty_print,
+                                 )
+
+        return (output, page.results or 0, page.muntil, token)
+
+    # -------------------------------------------------------------------------
+    def pull(self, task, onconflict=None):
+        """
+            Fetch updates from the peer repository and import them
+            into the local database (active pull)
+
+            @param task: the synchronization task (sync_task Row)
+            @param onconflict: callback for automatic conflict resolution
+
+            @return: tuple (error, mtime), with error=None if successful,
+                     else error=message, and mtime=modification timestamp
+                     of the youngest record sent
+        """
 
-            # Check for failure
-            if not success:
+        repository = self.repository
+        xml = current.xml
+        config = repository.config
+        resource_name = task.resource_name
+
+        current.log.debug("S3Sync: pull %s from %s" % (resource_name,
+                                                       repository.url))
+
+        # Construct the URL
+        url = "%s/sync/sync.xml?resource=%s&repository=%s" % \
+              (repository.url, resource_name, config.uuid)
+        last_pull = task.last_pull
+        if last_pull and task.update_policy not in ("THIS", "OTHER"):
+            url += "&msince=%s" % s3_encode_iso_datetime(last_pull)
+        url += "&include_deleted=True"
+
+        # Send sync filters to peer
+        filters = current.sync.get_filters(task.id)
+        filter_string = None
+        resource_name = task.resource_name
+        for tablename in filters:
+            prefix = "~" if not tablename or tablename == resource_name \
+                            else tablename
+            for k, v in filters[tablename].items():
+                urlfilter = "[%s]%s=%s" % (prefix, k, v)
+                url += "&%s" % urlfilter
+
+        # Request the data page by page (if the peer supports it,
+        # otherwise it will send all data in the first page)
+        page_size = current.deployment_settings.get_sync_page_size()
+        token = "" if page_size else None
+
+        log = repository.log
+        result = log.SUCCESS
+        remote = False
+        action = "fetch"
+        output = None
+        mtime = None
+        messages = []
+        total = 0
+
+        while True:
+
+            if token is not None:
+                page_url = "%s&page_size=%s&after=%s" % (url, page_size, token)
+            else:
+                page_url = url
+
+            # Execute the request
+            req = self._request(page_url)
+            req.add_header("Accept-Encoding", "gzip")
+
+            response = None
+            try:
+                f = urllib2.urlopen(req)
+            except urllib2.HTTPError, e:
+                result = log.ERROR
+                remote = True # Peer error
+                code = e.code
+                message = e.read()
+                try:
+                    # Sahana-Eden would send a JSON message,
+                    # try to extract the actual error message:
+                    message_json = json.loads(message)
+                    message = message_json.get("message", message)
+                except:
+                    pass
+                # Prefix as peer error and strip XML markup from the message
+                # @todo: better method to do this?
+                message = "<message>%s</message>" % message
+                try:
+                    markup = etree.XML(message)
+                    message = markup.xpath(".//text()")
+                    if message:
+                        message = " ".join(message)
+                    else:
+                        message = ""
+                except etree.XMLSyntaxError:
+                    pass
+                output = xml.json_message(False, code, message, tree=None)
+            except:
                 result = log.FATAL
-                if not message:
-                    message = "%s" % resource.error
-                output = xml.json_message(False, 400, message)
+                code = 400
+                message = sys.exc_info()[1]
+                output = xml.json_message(False, code, message)
+            else:
+                response = self._decompress(f)
+
+            if not response:
+                if result == log.SUCCESS:
+                    # No data received from peer
+                    result = log.ERROR
+                    remote = True
+                    message = "No data received from peer"
+                messages.append("%s" % message)
                 mtime = None
+                break
 
-            # ...or report success
-            elif not message:
-                message = "Data imported successfully (%s records)" % count
+            # Continuation token (only sent by peers supporting paging)
+            if token is not None:
+                token = f.info().getheader(self.CONTINUATION) or None
 
-        elif result == log.SUCCESS:
-            # No data received from peer
-            result = log.ERROR
-            remote = True
-            message = "No data received from peer"
+            # Import the data
+            action = "import"
+            page_result, message, output, page_mtime, count = \
+                self._import(task, response, last_pull, onconflict)
+            total += count
+            if message:
+                messages.append(message)
+            if page_result != log.SUCCESS:
+                result = page_result
+            if output is not None:
+                # Import failed
+                mtime = None
+                break
+
+            if page_mtime and (not mtime or page_mtime > mtime):
+                mtime = page_mtime
+            if not token:
+                # Last page
+                break
+
+            # Commit this page, and advance last_pull to the last master
+            # record in this page (not page_mtime which can include newer
+            # referenced records), so that a failing pull can resume here
+            cursor = self.decode_token(token)[0]
+            if cursor is not None:
+                task.update_record(last_pull=cursor)
+                current.db.commit()
+
+        if result == log.SUCCESS:
+            message = "Data imported successfully (%s records)" % total
+        else:
+            message = ", ".join(messages)
 
         # Log the operation
         log.write(repository_id=repository.id,
@@ -406,6 +588,98 @@ class S3SyncAdapter(S3SyncBaseAdapter):
         current.log.debug("S3Sync: import %s: %s" % (result, message))
         return (output, mtime)
 
+    # -------------------------------------------------------------------------
+    def _import(self, task, source, last_pull, onconflict=None):
+        """
+            Import data received from the peer repository, helper
+            for pull()
+
+            @param task: the synchronization task (sync_task Row)
+            @param source: the data (file-like object)
+            @param last_pull: the time of the last pull
+            @param onconflict: callback for automatic conflict resolution
+
+            @return: tuple (result, message, output, mtime, count), with
+                     output=None if successful, else error message
+        """
+
+        repository = self.repository
+        log = repository.log
+        xml = current.xml
+
+        # Get import strategy and update policy
+        strategy = task.strategy
+        update_policy = task.update_policy
+        conflict_policy = task.conflict_policy
+
+        result = log.SUCCESS
+        success = True
+        message = ""
+        output = None
+
+        # Import the data
+        resource = current.s3db.resource(task.resource_name)
+        if onconflict:
+            onconflict_callback = lambda item: onconflict(item,
+                                                          repository,
+                                                          resource)
+        else:
+            onconflict_callback = None
+        count = 0
+        try:
+            success = resource.import_xml(
+                            source,
+                            ignore_errors=True,
+                            strategy=strategy,
+                            update_policy=update_policy,
+                            conflict_policy=conflict_policy,
+                            last_sync=last_pull,
+                            onconflict=onconflict_callback,
+                            )
+            count = resource.import_count
+        except IOError, e:
+            result = log.FATAL
+            message = "%s" % e
+            output = xml.json_message(False, 400, message)
+        except Exception, e:
+            # If we end up here, an uncaught error during import
+            # has occured which indicates a code defect! We log it
+            # and continue here, however - in order to maintain a
+            # valid sync status, so that developers can restart
+            # the process more easily after fixing the defect.
+            result = log.FATAL
+            message = "Uncaught Exception During Import: %s" % \
+                      traceback.format_exc()
+            output = xml.json_message(False, 500, sys.exc_info()[1])
+
+        mtime = resource.mtime
+
+        # Log all validation errors
+        if resource.error_tree is not None:
+            result = log.WARNING
+            message = "%s" % resource.error
+            for element in resource.error_tree.findall("resource"):
+                for field in element.findall("data[@error]"):
+                    error_msg = field.get("error", None)
+                    if error_msg:
+                        msg = "(UID: %s) %s.%s=%s: %s" % \
+                               (element.get("uuid", None),
+                                element.get("name", None),
+                                field.get("field", None),
+                                field.get("value", field.text),
+                                field.get("error", None))
+                        message = "%s, %s" % (message, msg)
+
+        # Check for failure
+        if not success:
+            result = log.FATAL
+            if not message:
+                message = "%s" % resource.error
+            output = xml.json_message(False, 400, message)
+            mtime = None
+
+        return result, message, output, mtime, count
+
     # -------------------------------------------------------------------------
     def push(self, task):
         """
@@ -445,68 +719,52 @@ class S3SyncAdapter(S3SyncBaseAdapter):
             last_push = None
         _debug("...push to URL %s" % url)
 
-        # Define the resource
-        resource = current.s3db.resource(resource_name,
-                                         include_deleted=True)
-
         # Apply sync filters for this task
         filters = current.sync.get_filters(task.id)
 
-        # Export the resource as S3XML
-        data = resource.export_xml(filters=filters,
-                                   msince=last_push)
-        count = resource.results or 0
-        mtime = resource.muntil
+        settings = current.deployment_settings
+        compress = settings.get_sync_compress_push()
+
+        # Send the data page by page
+        page_size = settings.get_sync_page_size()
+        token = "" if page_size else None
 
-        # Transmit the data via HTTP
         remote = False
         output = None
+        mtime = None
+        total = 0
         log = repository.log
-        if data and count:
 
-            # Find the protocol
-            url_split = url.split("://", 1)
-            if len(url_split) == 2:
-                protocol, path = url_split
+        while True:
+
+            # Define the resource
+            resource = current.s3db.resource(resource_name,
+                                             include_deleted=True)
+
+            # Export the resource as S3XML
+            if token is not None:
+                data, count, muntil, token = self._export_page(resource,
+                                                               token,
+                                                               page_size,
+                                                               msince=last_push,
+                                                               filters=filters,
+                                                               )
             else:
-                protocol, path = "http", None
+                data = resource.export_xml(filters=filters,
+                                           msince=last_push)
+                count = resource.results or 0
+                muntil = resource.muntil
+
+            if not data or not count:
+                break
 
             # Generate the request
-            import urllib2
-            req = urllib2.Request(url=url, data=data)
-            req.add_header('Content-Type', "text/xml")
-            handlers = []
-
-            # Proxy handling
-            proxy = repository.proxy or config.proxy or None
-            if proxy:
-                _debug("using proxy=%s" % proxy)
-                proxy_handler = urllib2.ProxyHandler({protocol: proxy})
-                handlers.append(proxy_handler)
-
-            # Authentication
-            username = repository.username
-            password = repository.password
-            if username and password:
-                # send auth credentials unsolicitedly
-                import base64
-                base64string = base64.encodestring('%s:%s' %
-                                                   (username, password))[:-1]
-                req.add_header("Authorization", "Basic %s" % base64string)
-                # Just in case the peer does not accept that
-                # => add a 401 handler:
-                passwd_manager = urllib2.HTTPPasswordMgrWithDefaultRealm()
-                passwd_manager.add_password(realm=None,
-                                            uri=url,
-                                            user=username,
-                                            passwd=password)
-                auth_handler = urllib2.HTTPBasicAuthHandler(passwd_manager)
-                handlers.append(auth_handler)
-
-            # Install all handlers
-            if handlers:
-                opener = urllib2.build_opener(*handlers)
-                urllib2.install_opener(opener)
+            if compress:
+                data = self._compress(data)
+            req = self._request(url, data=data)
+            req.add_header("Content-Type", "text/xml")
+            if compress:
+                req.add_header("Content-Encoding", "gzip")
 
             # Execute the request
             try:
@@ -524,19 +782,36 @@ class S3SyncAdapter(S3SyncBaseAdapter):
                 except:
                     pass
                 output = xml.json_message(False, code, message)
+                break
             except:
                 result = log.FATAL
                 code = 400
                 message = sys.exc_info()[1]
                 output = xml.json_message(False, code, message)
-            else:
+                break
+
+            total += count
+            if muntil and (not mtime or muntil > mtime):
+                mtime = muntil
+            if not token:
+                # Last page
+                break
+
+            # Advance last_push to the last master record sent, so
+            # that a failing push can resume here
+            cursor = self.decode_token(token)[0]
+            if cursor is not None:
+                task.update_record(last_push=cursor)
+                current.db.commit()
+
+        if output is None:
+            if total:
                 result = log.SUCCESS
-                message = "data sent successfully (%s records)" % count
-
-        else:
-            # No data to send
-            result = log.WARNING
-            message = "No data to send"
+                message = "data sent successfully (%s records)" % total
+            else:
+                # No data to send
+                result = log.WARNING
+                message = "No data to send"
 
         # Log the operation
         log.write(repository_id=repository.id,
@@ -560,7 +835,9 @@ class S3SyncAdapter(S3SyncBaseAdapter):
              msince=None,
              filters=None,
              mixed=False,
-             pretty_print=False):
+             pretty_print=False,
+             after=None,
+             page_size=None):
         """
             Respond to an incoming pull from the peer repository
 
@@ -571,6 +848,9 @@ class S3SyncAdapter(S3SyncBaseAdapter):
             @param filters: URL filters for record extraction
             @param mixed: negotiate resource with peer (disregard resource)
             @param pretty_print: make the output human-readable
+            @param after: continuation token for paged pull (empty string
+                          for the first page), None for unpaged pull
+            @param page_size: the page size for paged pull
 
             @return: a dict {status, remote, message, response}, with:
                         - status....the outcome of the operation
@@ -586,20 +866,41 @@ class S3SyncAdapter(S3SyncBaseAdapter):
                     "response": current.xml.json_message(False, 400, msg),
                     }
 
+        headers = current.response.headers
+
         # Export the data as S3XML
-        output = resource.export_xml(start=start,
-                                     limit=limit,
-                                     filters=filters,
-                                     msince=msince,
-                                     pretty_print=pretty_print,
-                                     )
-        count = resource.results
+        if after is not None:
+            output, count, muntil, token = \
+                self._export_page(resource,
+                                  after,
+                                  page_size or current.deployment_settings \
+                                                      .get_sync_page_size(),
+                                  msince=msince,
+                                  filters=filters,
+                                  pretty_print=pretty_print,
+                                  )
+            # Always send the header, so the peer knows that we
+            # support paging
+            headers[self.CONTINUATION] = token or ""
+        else:
+            output = resource.export_xml(start=start,
+                                         limit=limit,
+                                         filters=filters,
+                                         msince=msince,
+                                         pretty_print=pretty_print,
+                                         )
+            count = resource.results
         msg = "Data sent to peer (%s records)" % count
 
         # Set content type header
-        headers = current.response.headers
         headers["Content-Type"] = "text/xml"
 
+        # Compress the output if the peer accepts it
+        accept = current.request.env.http_accept_encoding
+        if output and accept and "gzip" in accept.lower():
+            output = self._compress(output)
+            headers["Content-Encoding"] = "gzip"
+
         return {"status": self.log.SUCCESS,
                 "message": msg,
                 "response": output,
@@ -695,6 +695,19 @@ class S3Config(Storage):
         return self.security.get("strict_ownership", True)
     def get_security_map(self):
         return self.security.get("map", False)
+    def get_security_acl_cache(self):
+        """
+            Share ACL decisions between requests:
+            None = only cache within the request (default)
+            "ram" = in cache.ram (per process)
+            "disk" = in cache.disk (shared between processes)
+            - the version stamp to expire the decisions is always kept
+              in cache.disk, so expiry takes effect in all processes
+        """
+        return self.security.get("acl_cache", None)
+    def get_security_acl_cache_expire(self):
+        """ Time (in seconds) to keep shared ACL decisions """
+        return self.security.get("acl_cache_expire", 300)
 
     # -------------------------------------------------------------------------
     # Base settings
@@ -746,6 +759,25 @@ class S3Config(Storage):
             # Pre-populate off (production mode), don't bother resolving
             return 0
 
+    def get_base_prepopulate_workers(self):
+        """
+            Number of worker processes to run independent prepopulate
+            import tasks concurrently (1 = run all tasks serially)
+            - SQLite always runs serially (single writer)
+        """
+        return self.base.get("prepopulate_workers", 1)
+
+    def get_base_prepopulate_snapshots(self):
+        """
+            Save a database dump (and the files written to uploads) after
+            prepopulate, and restore it instead of re-importing when the
+            template's import files (CSV, XSLT incl. included stylesheets,
+            tasks.cfg) and the database schema are unchanged
+            - True to store the dumps in databases/snapshots, or
+              the path of a folder to store them in
+        """
+        return self.base.get("prepopulate_snapshots", False)
+
     def get_base_guided_tour(self):
         """ Whether the guided tours are enabled """
         return self.base.get("guided_tour", False)
@@ -863,6 +895,14 @@ class S3Config(Storage):
         """
         return self.log.get("caller_info", False)
 
+    def get_log_model_timings(self):
+        """
+            True to log which models are loaded during a request, and
+            how long it takes to load them (at INFO level), useful to
+            analyse the model loading cost of particular controllers
+        """
+        return self.log.get("model_timings", False)
+
     # -------------------------------------------------------------------------
     # Database settings
     def get_database_type(self):
@@ -900,6 +940,31 @@ class S3Config(Storage):
             airegex = False
         return airegex
 
+    def get_database_count_strategy(self):
+        """
+            Strategy to count the matching records of a resource
+            (e.g. for the total number of records in dataTables):
+                - "exact": always count all records
+                - "cached": cache the exact count for a time
+                - "estimate": use the query planner estimate for large
+                              numbers of records (PostgreSQL only)
+        """
+        return self.database.get("count_strategy", "exact")
+
+    def get_database_count_cache_expire(self):
+        """
+            Time in seconds to cache record counts (with
+            count_strategy "cached")
+        """
+        return self.database.get("count_cache_expire", 60)
+
+    def get_database_count_estimate_threshold(self):
+        """
+            Minimum number of records to use an estimate rather than
+            an exact count (with count_strategy "estimate")
+        """
+        return self.database.get("count_estimate_threshold", 100000)
+
     def get_database_string(self):
         db_type = self.database.get("db_type", "sqlite").lower()
         pool_size = self.database.get("pool_size", 30)
@@ -1182,6 +1247,36 @@ class S3Config(Storage):
         """
         return self.gis.get("max_features", 2000)
 
+    def get_gis_tiles(self):
+        """
+            Whether Feature Layers should be loaded as tiles of
+            server-side clustered GeoJSON (recommended for large layers,
+            which would otherwise exceed max_features)
+        """
+        return self.gis.get("tiles", False)
+
+    def get_gis_tiles_cluster_zoom(self):
+        """
+            The zoom level up to which tiled Feature Layers get clustered
+            server-side, above which they return individual features
+            (unless a tile contains more than max_features)
+        """
+        return self.gis.get("tiles_cluster_zoom", 14)
+
+    def get_gis_tiles_cluster_threshold(self):
+        """
+            The number of features in a tile above which the tile gets
+            clustered server-side (below cluster_zoom)
+        """
+        return self.gis.get("tiles_cluster_threshold", 100)
+
+    def get_gis_tiles_cache_expire(self):
+        """
+            Maximum time (seconds) to cache GeoJSON tiles - tiles get
+            invalidated anyway when records in the layer's table change
+        """
+        return self.gis.get("tiles_cache_expire", 3600)
+
     def get_gis_legend(self):
         """
             Should we display a Legend on the Map?
@@ -1317,6 +1412,15 @@ class S3Config(Storage):
         """
         return self.gis.get("simplify_tolerance", 0.01)
 
+    def get_gis_simplify_levels(self):
+        """
+            Tolerances for which simplified Polygons get precomputed
+            - GeoJSON exports use the level matching the requested zoom
+              level or bbox, and simplify on-the-fly otherwise
+            - an empty list disables precomputation
+        """
+        return self.gis.get("simplify_levels", (0.01, 0.0025, 0.000625, 0.00015625))
+
     def get_gis_spatialdb(self):
         """
             Does the database have Spatial extensions?
@@ -1691,6 +1795,23 @@ class S3Config(Storage):
 
         return self.ui.get("datatables_initComplete")
 
+    def get_ui_datatables_keyset(self):
+        """
+            Use keyset pagination for dataTables (faster paging through
+            large numbers of records, but orders NULLs last in all
+            databases)
+        """
+
+        return self.ui.get("datatables_keyset", False)
+
+    def get_ui_datatables_keyset_expire(self):
+        """
+            Time in seconds to remember the last record of a dataTables
+            page (to seek the next page)
+        """
+
+        return self.ui.get("datatables_keyset_expire", 600)
+
     def get_ui_datatables_pagingType(self):
         """
             The style of Paging used by dataTables:
@@ -1764,6 +1885,43 @@ class S3Config(Storage):
         return self.ui.get("export_formats",
                            ("cap", "have", "kml", "map", "pdf", "rss", "xls", "xml"))
 
+    def get_ui_export_async(self):
+        """
+            Whether the export formats in datatables should run as
+            asynchronous export jobs (requires a scheduler worker)
+        """
+        return self.ui.get("export_async", False)
+
+    def get_ui_export_async_formats(self):
+        """
+            Export formats which can be run as asynchronous export jobs
+            (by adding async=1 to the export URL)
+        """
+        return self.ui.get("export_async_formats",
+                           ("csv", "pdf", "shp", "svg", "xls", "xlsx", "xml"))
+
+    def get_ui_export_async_folder(self):
+        """
+            Folder to store the files of asynchronous export jobs
+            - default: uploads/exports
+        """
+        return self.ui.get("export_async_folder")
+
+    def get_ui_export_async_expire(self):
+        """
+            Number of seconds after which the files of asynchronous
+            export jobs are removed
+        """
+        return self.ui.get("export_async_expire", 86400)
+
+    def get_ui_export_async_quota(self):
+        """
+            Maximum total size (in MB) of the files of asynchronous
+            export jobs, older files are removed when exceeded
+            (0 for unlimited)
+        """
+        return self.ui.get("export_async_quota", 1024)
+
     def get_ui_hide_report_filter_options(self):
         """
             Show report filter options form by default
@@ -1983,6 +2141,34 @@ class S3Config(Storage):
         """
         return self.ui.get("report_auto_submit", 800)
 
+    def get_ui_report_db_aggregation(self):
+        """
+            Compute pivot tables with aggregation queries in the database
+            where possible (i.e. if all dimensions and facts are real,
+            single-valued fields), rather than extracting all records
+        """
+        return self.ui.get("report_db_aggregation", True)
+
+    def get_ui_represent_cache(self):
+        """
+            Cache the representations of foreign keys (S3Represent)
+            across requests (in cache.ram)
+        """
+        return self.ui.get("represent_cache", False)
+
+    def get_ui_represent_cache_expire(self):
+        """
+            Time in seconds after which cached representations expire
+        """
+        return self.ui.get("represent_cache_expire", 300)
+
+    def get_ui_represent_cache_size(self):
+        """
+            Maximum number of cached representations (least recently
+            used entries get removed first)
+        """
+        return self.ui.get("represent_cache_size", 10000)
+
     def get_ui_use_button_icons(self):
         """
             Use icons on action buttons (requires corresponding CSS)
@@ -2171,6 +2357,17 @@ class S3Config(Storage):
         """
         return self.msg.get("notify_renderer")
 
+    def get_msg_notify_batch(self):
+        """
+            Render and send update notifications in-process, in batches
+            of subscriptions to the same resource (rather than by a
+            separate request per subscription)
+            - NB this does not run the controller prep, so should only
+                 be used if the subscribed controllers do not add any
+                 filters in their prep
+        """
+        return self.msg.get("notify_batch", False)
+
     # -------------------------------------------------------------------------
     # SMS
     #
@@ -2194,6 +2391,23 @@ class S3Config(Storage):
         """
         return self.search.get("max_results", 200)
 
+    def get_search_filter_options_cache(self):
+        """
+            Cache the options of S3OptionsFilter/S3LocationFilter widgets
+            for this number of seconds (0 to disable)
+            - cached options are invalidated whenever any of the tables
+              involved in the lookup gets modified
+        """
+        return self.search.get("filter_options_cache", 0)
+
+    def get_search_filter_cache_size(self):
+        """
+            Maximum number of parsed URL filter expressions to keep
+            in the per-process cache (and of resolved field selectors
+            in the per-request cache), 0 to disable caching
+        """
+        return self.search.get("filter_cache_size", 1000)
+
     # -------------------------------------------------------------------------
     # Filter Manager Widget
     def get_search_filter_manager(self):
@@ -2255,6 +2469,32 @@ class S3Config(Storage):
         """
         return self.sync.get("upload_filename", "$s $r")
 
+    def get_sync_page_size(self):
+        """
+            Maximum number of master records per page when pulling
+            from or pushing to Sahana Eden peers, None to transfer
+            all records at once
+            - each page is committed separately, so that an interrupted
+              synchronization can resume after the last completed page
+        """
+        return self.sync.get("page_size", 1000)
+
+    def get_sync_compress_push(self):
+        """
+            Gzip-compress the data pushed to Sahana Eden peers
+            - peers must support this (pulled data are compressed
+              whenever the peer supports it)
+        """
+        return self.sync.get("compress_push", False)
+
+    def get_sync_concurrent_tasks(self):
+        """
+            Run the synchronization tasks of a repository as separate,
+            concurrent scheduler tasks (tasks for resources referencing
+            each other still run in sequence)
+        """
+        return self.sync.get("concurrent_tasks", False)
+
     # =========================================================================
     # Modules
 
@@ -3520,6 +3760,27 @@ class S3Config(Storage):
         """
         return self.pr.get("search_shows_hr_details", True)
 
+    def get_pr_name_index(self):
+        """
+            Use a token/trigram index of person names for the person
+            autocomplete (ranked results, also matching misspelled names)
+            - the index must be built once after enabling this setting
+              (scheduler task pr_person_name_index_rebuild), and will then
+              be maintained automatically
+        """
+        return self.pr.get("name_index", False)
+
+    def get_pr_ou_closure(self):
+        """
+            Maintain a closure table of the OU hierarchy (pr_ou_closure),
+            so that all ancestors or descendants of an entity can be found
+            with a single query (rather than one query per level)
+            - the closure table must be built once after enabling this
+              setting (scheduler task pr_ou_closure_rebuild), and will
+              then be maintained automatically
+        """
+        return self.pr.get("ou_closure", False)
+
     def get_pr_select_existing(self):
         """
             Whether the AddPersonWidget allows selecting existing PRs
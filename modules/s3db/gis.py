@@ -32,6 +32,7 @@ from __future__ import division
 __all__ = ("S3LocationModel",
            "S3LocationNameModel",
            "S3LocationTagModel",
+           "S3LocationSimplifiedModel",
            "S3LocationGroupModel",
            "S3LocationHierarchyModel",
            "S3GISConfigModel",
@@ -1415,6 +1416,34 @@ class S3LocationTagModel(S3Model):
             item.id = duplicate.id
             item.method = item.METHOD.UPDATE
 
+# =============================================================================
+class S3LocationSimplifiedModel(S3Model):
+    """
+        Precomputed simplifications of Location geometries
+        - one record per location and tolerance (settings.gis.simplify_levels),
+          filled by GIS.update_simplified()
+        - used by GeoJSON exports to avoid simplifying large polygons
+          per request
+    """
+
+    names = ("gis_location_simplified",)
+
+    def model(self):
+
+        tablename = "gis_location_simplified"
+        self.define_table(tablename,
+                          self.gis_location_id(empty = False,
+                                               ondelete = "CASCADE",
+                                               ),
+                          Field("tolerance", "double"),
+                          # MD5 of the WKT the geometry was simplified from
+                          Field("checksum", length=32),
+                          Field("geojson", "text"),
+                          )
+
+        # Pass names back to global scope (s3.*)
+        return {}
+
 # =============================================================================
 class S3LocationGroupModel(S3Model):
     """
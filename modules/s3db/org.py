@@ -1402,6 +1402,10 @@ class S3OrganisationBranchModel(S3Model):
 
             org_update_affiliations("org_organisation_branch", link)
 
+            # Update the organisation hierarchy
+            if branch_id:
+                S3Hierarchy.dirty("org_organisation", record_ids=[branch_id])
+
             # Update the root organisation
             if link.deleted or \
                branch.root_organisation is None or \
@@ -1424,6 +1428,17 @@ class S3OrganisationBranchModel(S3Model):
         if record:
             org_update_affiliations("org_organisation_branch", record)
 
+            # Update the organisation hierarchy
+            branch_id = record.branch_id
+            if not branch_id and record.deleted_fk:
+                try:
+                    deleted_fk = json.loads(record.deleted_fk)
+                except ValueError:
+                    deleted_fk = {}
+                branch_id = deleted_fk.get("branch_id")
+            if branch_id:
+                S3Hierarchy.dirty("org_organisation", record_ids=[branch_id])
+
 # =============================================================================
 class S3OrganisationCapacityModel(S3Model):
     """
@@ -39,6 +39,7 @@ __all__ = ("S3PersonEntity",
            "S3PersonEducationModel",
            "S3PersonDetailsModel",
            "S3PersonTagModel",
+           "S3PersonNameIndexModel",
            "S3SavedFilterModel",
            "S3SubscriptionModel",
            "S3PersonPresence",
@@ -56,6 +57,8 @@ __all__ = ("S3PersonEntity",
            "pr_rheader",
            # Custom Resource Methods
            "pr_Contacts",
+           # Person Name Index
+           "pr_PersonNameIndex",
            # Hierarchy Manipulation
            "pr_update_affiliations",
            "pr_add_affiliation",
@@ -81,6 +84,10 @@ __all__ = ("S3PersonEntity",
            # Internal Path Tools
            "pr_rebuild_path",
            "pr_role_rebuild_path",
+           # OU Closure
+           "pr_update_closure",
+           "pr_role_update_closure",
+           "pr_rebuild_closure",
            # Helpers for ImageLibrary
            "pr_image_modify",
            #"pr_address_list_layout",
@@ -89,7 +96,7 @@ __all__ = ("S3PersonEntity",
            )
 
 import os
-#import re
+import re
 from urllib import urlencode
 
 try:
@@ -124,6 +131,7 @@ class S3PersonEntity(S3Model):
              "pr_role",
              "pr_role_types",
              "pr_role_id",
+             "pr_ou_closure",
              "pr_pe_label",
              "pr_pe_types",
              "pr_pentity_represent",
@@ -352,6 +360,7 @@ class S3PersonEntity(S3Model):
 
         # Resource configuration
         configure(tablename,
+                  onaccept = self.pr_role_onaccept,
                   onvalidation = self.pr_role_onvalidation,
                   )
 
@@ -405,6 +414,17 @@ class S3PersonEntity(S3Model):
                   ondelete = self.pr_affiliation_ondelete,
                   )
 
+        # ---------------------------------------------------------------------
+        # OU Closure
+        # - all (ancestor, descendant) pairs in the OU hierarchy, maintained
+        #   by pr_update_closure if settings.pr.ou_closure is enabled
+        #
+        tablename = "pr_ou_closure"
+        define_table(tablename,
+                     Field("ancestor_id", "integer"),
+                     Field("descendant_id", "integer"),
+                     )
+
         # ---------------------------------------------------------------------
         # Pass names back to global scope (s3.*)
         #
@@ -471,7 +491,26 @@ class S3PersonEntity(S3Model):
             field2 = ptable.middle_name
             field3 = ptable.last_name
 
-            if " " in value:
+            ranking = None
+            if current.deployment_settings.get_pr_name_index() and \
+               resource.get_filter() is None:
+                # Ranked search in the name index, restricted to the
+                # accessible (and filtered) entities
+                query = resource.get_query() & (ptable.pe_id == table.pe_id)
+                person_ids = pr_PersonNameIndex.search(value,
+                                    query = query,
+                                    left = resource.rfilter.get_joins(left=True),
+                                    limit = limit or None,
+                                    )
+                rows = current.db(ptable.id.belongs(person_ids)).select(
+                                                        ptable.id,
+                                                        ptable.pe_id,
+                                                        )
+                rank = dict((person_id, i)
+                            for i, person_id in enumerate(person_ids))
+                ranking = dict((row.pe_id, rank[row.id]) for row in rows)
+                query = (ptable.id.belongs(person_ids))
+            elif " " in value:
                 value1, value2 = value.split(" ", 1)
                 value2 = value2.strip()
                 query = (field.lower().like(value1 + "%")) & \
@@ -499,6 +538,8 @@ class S3PersonEntity(S3Model):
             for row in rows:
                 pappend((ids[i], row["pr_pentity.pe_id"]))
                 i += 1
+            if ranking is not None:
+                people.sort(key=lambda item: ranking.get(item[0]))
             items.extend(people)
 
         if "pr_group" in types:
@@ -608,6 +649,25 @@ class S3PersonEntity(S3Model):
                 current.s3db.pr_role_rebuild_path(role_id, clear=True)
         return
 
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def pr_role_onaccept(form):
+        """
+            Update the OU closure for the affiliates of the role (the
+            role type may have changed)
+
+            @param form: the CRUD form
+        """
+
+        if current.deployment_settings.get_pr_ou_closure():
+            try:
+                role_id = form.vars.id
+            except AttributeError:
+                return
+            if role_id:
+                pr_role_update_closure(role_id)
+        return
+
     # -------------------------------------------------------------------------
     @staticmethod
     def pr_pentity_onaccept(form):
@@ -941,6 +1001,7 @@ class S3PersonModel(S3Model):
                        main = "first_name",
                        extra = "last_name",
                        onaccept = self.pr_person_onaccept,
+                       ondelete = self.pr_person_ondelete,
                        realm_components = ("address",
                                            "contact",
                                            "presence",
@@ -1236,6 +1297,21 @@ class S3PersonModel(S3Model):
                              last_name = form_vars.last_name,
                              )
 
+        # Update the name index
+        if current.deployment_settings.get_pr_name_index():
+            pr_PersonNameIndex.update(person_id)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def pr_person_ondelete(row):
+        """
+            Ondelete callback
+            Remove the person from the name index
+        """
+
+        if current.deployment_settings.get_pr_name_index():
+            pr_PersonNameIndex.update(row.id)
+
     # -------------------------------------------------------------------------
     @staticmethod
     def person_deduplicate(item):
@@ -1450,89 +1526,118 @@ class S3PersonModel(S3Model):
         value = value.strip()
 
         settings = current.deployment_settings
-        name_format = settings.get_pr_name_format()
-        middle_name = "middle_name" in name_format
 
-        # Names could be in the wrong order
-        # Multiple Names could be in a single field
-        # Each name field could be split into words in a different order
-        # @ToDo: deployment_setting for stricter matching? (& not |)
-        query = (FS("first_name").lower().like(value + "%")) | \
-                (FS("last_name").lower().like(value + "%"))
-        if middle_name:
-            query != (FS("middle_name").lower().like(value + "%"))
-        if " " in value:
-            value1, value2 = value.split(" ", 1)
-            query |= (FS("first_name").lower().like(value1 + "%")) | \
-                     (FS("first_name").lower().like(value2 + "%")) | \
-                     (FS("last_name").lower().like(value1 + "%")) | \
-                     (FS("last_name").lower().like(value2 + "%"))
+        limit = int(_vars.limit or 0)
+        MAX_SEARCH_RESULTS = settings.get_search_max_results()
+        if not limit or limit > MAX_SEARCH_RESULTS:
+            # Look up one more than the maximum, so we can tell when
+            # there are too many results (without counting them all)
+            limit = MAX_SEARCH_RESULTS
+            maxrows = MAX_SEARCH_RESULTS + 1
+        else:
+            maxrows = limit
+
+        ranking = None
+        if settings.get_pr_name_index() and resource.get_filter() is None:
+            # Ranked search in the name index
+            person_ids = pr_PersonNameIndex.search(value,
+                                query = resource.get_query(),
+                                left = resource.rfilter.get_joins(left=True),
+                                limit = maxrows,
+                                )
+            ranking = dict((person_id, rank)
+                           for rank, person_id in enumerate(person_ids))
+            resource.add_filter(FS("id").belongs(person_ids))
+
+        else:
+            name_format = settings.get_pr_name_format()
+            middle_name = "middle_name" in name_format
+
+            # Names could be in the wrong order
+            # Multiple Names could be in a single field
+            # Each name field could be split into words in a different order
+            # @ToDo: deployment_setting for stricter matching? (& not |)
+            query = (FS("first_name").lower().like(value + "%")) | \
+                    (FS("last_name").lower().like(value + "%"))
             if middle_name:
-                query |= (FS("middle_name").lower().like(value1 + "%")) | \
-                         (FS("middle_name").lower().like(value2 + "%"))
-            if " " in value2:
-                value2, value3 = value2.split(" ", 1)
-                query |= (FS("first_name").lower().like(value2 + "%")) | \
-                         (FS("first_name").lower().like(value3 + "%")) | \
-                         (FS("last_name").lower().like(value2 + "%")) | \
-                         (FS("last_name").lower().like(value3 + "%"))
+                query != (FS("middle_name").lower().like(value + "%"))
+            if " " in value:
+                value1, value2 = value.split(" ", 1)
+                query |= (FS("first_name").lower().like(value1 + "%")) | \
+                         (FS("first_name").lower().like(value2 + "%")) | \
+                         (FS("last_name").lower().like(value1 + "%")) | \
+                         (FS("last_name").lower().like(value2 + "%"))
                 if middle_name:
-                    query |= (FS("middle_name").lower().like(value2 + "%")) | \
-                             (FS("middle_name").lower().like(value3 + "%"))
-                if " " in value3:
-                    value3, value4 = value3.split(" ", 1)
-                    query |= (FS("first_name").lower().like(value3 + "%")) | \
-                             (FS("first_name").lower().like(value4 + "%")) | \
-                             (FS("last_name").lower().like(value3 + "%")) | \
-                             (FS("last_name").lower().like(value4 + "%"))
+                    query |= (FS("middle_name").lower().like(value1 + "%")) | \
+                             (FS("middle_name").lower().like(value2 + "%"))
+                if " " in value2:
+                    value2, value3 = value2.split(" ", 1)
+                    query |= (FS("first_name").lower().like(value2 + "%")) | \
+                             (FS("first_name").lower().like(value3 + "%")) | \
+                             (FS("last_name").lower().like(value2 + "%")) | \
+                             (FS("last_name").lower().like(value3 + "%"))
                     if middle_name:
-                        query |= (FS("middle_name").lower().like(value3 + "%")) | \
-                                 (FS("middle_name").lower().like(value4 + "%"))
+                        query |= (FS("middle_name").lower().like(value2 + "%")) | \
+                                 (FS("middle_name").lower().like(value3 + "%"))
+                    if " " in value3:
+                        value3, value4 = value3.split(" ", 1)
+                        query |= (FS("first_name").lower().like(value3 + "%")) | \
+                                 (FS("first_name").lower().like(value4 + "%")) | \
+                                 (FS("last_name").lower().like(value3 + "%")) | \
+                                 (FS("last_name").lower().like(value4 + "%"))
+                        if middle_name:
+                            query |= (FS("middle_name").lower().like(value3 + "%")) | \
+                                     (FS("middle_name").lower().like(value4 + "%"))
 
-        resource.add_filter(query)
+            resource.add_filter(query)
 
-        limit = int(_vars.limit or 0)
-        MAX_SEARCH_RESULTS = settings.get_search_max_results()
-        if (not limit or limit > MAX_SEARCH_RESULTS) and resource.count() > MAX_SEARCH_RESULTS:
+        fields = ["id",
+                  "first_name",
+                  "middle_name",
+                  "last_name",
+                  ]
+
+        show_hr = settings.get_pr_search_shows_hr_details()
+        if show_hr:
+            fields.append("human_resource.job_title_id$name")
+            show_orgs = settings.get_hrm_show_organisation()
+            if show_orgs:
+                fields.append("human_resource.organisation_id$name")
+
+        name_format = settings.get_pr_name_format()
+        match = re.match("\s*?%\((?P<fname>.*?)\)s.*", name_format)
+        if match:
+            orderby = "pr_person.%s" % match.group("fname")
+        else:
+            orderby = "pr_person.first_name"
+        #test = name_format % dict(first_name=1,
+                                  #middle_name=2,
+                                  #last_name=3,
+                                  #)
+        #test = "".join(ch for ch in test if ch in ("1", "2", "3"))
+        #if test[:1] == "1":
+            #orderby = "pr_person.first_name"
+        #elif test[:1] == "2":
+            #orderby = "pr_person.middle_name"
+        #else:
+            #orderby = "pr_person.last_name"
+
+        if ranking is not None:
+            orderby = None
+        rows = resource.select(fields=fields,
+                               start=0,
+                               limit=maxrows,
+                               orderby=orderby)["rows"]
+
+        if len(rows) > limit:
             output = [
                 dict(label=str(current.T("There are more than %(max)s results, please input more characters.") % \
                     dict(max=MAX_SEARCH_RESULTS)))
                 ]
         else:
-            fields = ["id",
-                      "first_name",
-                      "middle_name",
-                      "last_name",
-                      ]
-
-            show_hr = settings.get_pr_search_shows_hr_details()
-            if show_hr:
-                fields.append("human_resource.job_title_id$name")
-                show_orgs = settings.get_hrm_show_organisation()
-                if show_orgs:
-                    fields.append("human_resource.organisation_id$name")
-
-            name_format = settings.get_pr_name_format()
-            match = re.match("\s*?%\((?P<fname>.*?)\)s.*", name_format)
-            if match:
-                orderby = "pr_person.%s" % match.group("fname")
-            else:
-                orderby = "pr_person.first_name"
-            #test = name_format % dict(first_name=1,
-                                      #middle_name=2,
-                                      #last_name=3,
-                                      #)
-            #test = "".join(ch for ch in test if ch in ("1", "2", "3"))
-            #if test[:1] == "1":
-                #orderby = "pr_person.first_name"
-            #elif test[:1] == "2":
-                #orderby = "pr_person.middle_name"
-            #else:
-                #orderby = "pr_person.last_name"
-            rows = resource.select(fields=fields,
-                                   start=0,
-                                   limit=limit,
-                                   orderby=orderby)["rows"]
+            if ranking is not None:
+                rows = sorted(rows,
+                              key=lambda row: ranking[row["pr_person.id"]])
 
             items = []
             iappend = items.append
@@ -3917,6 +4022,36 @@ class S3PersonTagModel(S3Model):
         # Pass names back to global scope (s3.*)
         return {}
 
+# =============================================================================
+class S3PersonNameIndexModel(S3Model):
+    """
+        Token/trigram index of person names, for autocomplete searches
+        (see pr_PersonNameIndex)
+    """
+
+    names = ("pr_person_name_index",
+             )
+
+    def model(self):
+
+        # ---------------------------------------------------------------------
+        # Person Name Index
+        # - one row per name token, and per trigram of these tokens
+        #
+        tablename = "pr_person_name_index"
+        self.define_table(tablename,
+                          Field("person_id", "reference pr_person",
+                                ondelete = "CASCADE",
+                                ),
+                          Field("term", length=64),
+                          Field("trigram", "boolean",
+                                default = False,
+                                ),
+                          )
+
+        # Pass names back to global scope (s3.*)
+        return {}
+
 # =============================================================================
 class S3SavedFilterModel(S3Model):
     """ Saved Filters """
@@ -5026,6 +5161,286 @@ def pr_get_entities(pe_ids=None,
         else:
             return repr_all
 
+# =============================================================================
+class pr_PersonNameIndex(object):
+    """
+        Token/trigram index of person names (pr_person_name_index), for
+        ranked person autocomplete searches which do not need to scan the
+        pr_person table
+    """
+
+    # Maximum number of search terms
+    MAX_TERMS = 4
+
+    # Minimum share of the trigrams of the search terms which a name
+    # must contain in order to match
+    TRIGRAM_THRESHOLD = 0.5
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def tokenize(value):
+        """
+            Split a name into normalized (lower-case) tokens
+
+            @param value: the name (string)
+            @return: list of tokens
+        """
+
+        if not value:
+            return []
+        value = s3_unicode(value).lower()
+        tokens = []
+        for token in re.split(r"[\W_]+", value, flags=re.UNICODE):
+            if token and token not in tokens:
+                tokens.append(token[:64])
+        return tokens
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def trigrams(token):
+        """
+            Get the trigrams of a token (padded like pg_trgm, so that
+            the beginning of the token weighs more)
+
+            @param token: the token
+            @return: set of trigrams
+        """
+
+        padded = "  %s " % token
+        return set(padded[i:i+3] for i in xrange(len(padded) - 2))
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def entries(cls, person_id, names):
+        """
+            Produce the index entries for a person
+
+            @param person_id: the person record ID
+            @param names: the names of the person
+            @return: list of dicts for bulk_insert
+        """
+
+        entries = []
+        trigrams = set()
+        tokens = []
+        for name in names:
+            for token in cls.tokenize(name):
+                if token not in tokens:
+                    tokens.append(token)
+                    trigrams |= cls.trigrams(token)
+        for token in tokens:
+            entries.append({"person_id": person_id,
+                            "term": token,
+                            "trigram": False,
+                            })
+        for trigram in trigrams:
+            entries.append({"person_id": person_id,
+                            "term": trigram,
+                            "trigram": True,
+                            })
+        return entries
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def update(cls, person_ids):
+        """
+            Update the index entries for persons, to be called onaccept
+            and ondelete of pr_person
+
+            @param person_ids: a person record ID, or a list of IDs
+        """
+
+        if type(person_ids) is not list:
+            person_ids = [person_ids]
+
+        db = current.db
+        s3db = current.s3db
+
+        itable = s3db.pr_person_name_index
+        db(itable.person_id.belongs(person_ids)).delete()
+
+        ptable = s3db.pr_person
+        query = (ptable.id.belongs(person_ids)) & \
+                (ptable.deleted != True)
+        rows = db(query).select(ptable.id,
+                                ptable.first_name,
+                                ptable.middle_name,
+                                ptable.last_name,
+                                )
+        entries = []
+        for row in rows:
+            entries.extend(cls.entries(row.id, (row.first_name,
+                                                row.middle_name,
+                                                row.last_name,
+                                                )))
+        if entries:
+            itable.bulk_insert(entries)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def create_indexes():
+        """
+            Create the database indexes for the name index table, unless
+            they exist already (called during 1st_run and before rebuild)
+        """
+
+        db = current.db
+
+        tablename = "pr_person_name_index"
+        if current.deployment_settings.get_database_type() == "postgres":
+            # Default operator class can not be used for LIKE prefix
+            # matching unless the database uses the C locale
+            term = "term varchar_pattern_ops"
+        else:
+            term = "term"
+
+        for fieldname, column in (("term", term),
+                                  ("person_id", "person_id"),
+                                  ):
+            try:
+                db.executesql("CREATE INDEX %s_%s__idx on %s(%s);" % \
+                              (tablename, fieldname, tablename, column))
+            except:
+                # Index already present
+                # (PostgreSQL aborts the transaction when this fails)
+                db.rollback()
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def rebuild(cls, chunk_size=5000):
+        """
+            Rebuild the whole index (scheduler task)
+
+            @param chunk_size: number of persons to index at a time
+            @return: the number of indexed persons
+        """
+
+        db = current.db
+        s3db = current.s3db
+
+        itable = s3db.pr_person_name_index
+
+        # Make sure the table is indexed (in case it has been
+        # created by migration rather than during 1st_run)
+        cls.create_indexes()
+
+        db(itable.id > 0).delete()
+
+        ptable = s3db.pr_person
+        base = (ptable.deleted != True)
+
+        last_id = 0
+        total = 0
+        while True:
+            query = base & (ptable.id > last_id)
+            rows = db(query).select(ptable.id,
+                                    ptable.first_name,
+                                    ptable.middle_name,
+                                    ptable.last_name,
+                                    orderby = ptable.id,
+                                    limitby = (0, chunk_size),
+                                    )
+            if not rows:
+                break
+            entries = []
+            for row in rows:
+                entries.extend(cls.entries(row.id, (row.first_name,
+                                                    row.middle_name,
+                                                    row.last_name,
+                                                    )))
+            if entries:
+                itable.bulk_insert(entries)
+            last_id = rows.last().id
+            total += len(rows)
+
+        return total
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def search(cls, value, query=None, left=None, limit=None):
+        """
+            Find persons by name, ranked by how well their names match
+            the search string:
+                - names which match more of the search terms by prefix
+                  rank first, and exact matches rank before prefix matches
+                - if prefix matching produces less than limit results,
+                  then names with sufficiently similar trigrams are
+                  appended (i.e. misspelled names can still be found)
+
+            @param value: the search string
+            @param query: a query to restrict the search (e.g. the
+                          resource query of the accessible records)
+            @param left: left joins for the query
+            @param limit: the maximum number of results
+
+            @return: list of person record IDs, ranked
+        """
+
+        terms = cls.tokenize(value)[:cls.MAX_TERMS]
+        if not terms:
+            return []
+
+        db = current.db
+        s3db = current.s3db
+
+        itable = s3db.pr_person_name_index
+        ptable = s3db.pr_person
+
+        base = (itable.person_id == ptable.id)
+        if query is not None:
+            base &= query
+        limitby = (0, limit) if limit else None
+
+        # Prefix matching
+        prefix = None
+        score = None
+        for term in terms:
+            match = itable.term.like("%s%%" % term)
+            prefix = match if prefix is None else prefix | match
+            term_score = match.case(2, 0).max() + \
+                         (itable.term == term).case(1, 0).max()
+            score = term_score if score is None else score + term_score
+
+        rows = db(base & (itable.trigram == False) & prefix).select(
+                                ptable.id,
+                                score,
+                                left = left,
+                                groupby = ptable.id,
+                                orderby = ~score|ptable.id,
+                                limitby = limitby,
+                                )
+        person_ids = [row[ptable.id] for row in rows]
+
+        # Trigram matching
+        if limit and len(person_ids) >= limit or \
+           sum(len(term) for term in terms) < 3:
+            return person_ids
+
+        trigrams = set()
+        for term in terms:
+            trigrams |= cls.trigrams(term)
+        threshold = max(1, int(len(trigrams) * cls.TRIGRAM_THRESHOLD))
+
+        query = base & \
+                (itable.trigram == True) & \
+                (itable.term.belongs(trigrams))
+        if person_ids:
+            query &= ~(ptable.id.belongs(person_ids))
+        hits = itable.term.count(distinct=True)
+        if limitby:
+            limitby = (0, limit - len(person_ids))
+        rows = db(query).select(ptable.id,
+                                hits,
+                                left = left,
+                                groupby = ptable.id,
+                                having = (hits >= threshold),
+                                orderby = ~hits|ptable.id,
+                                limitby = limitby,
+                                )
+        person_ids.extend(row[ptable.id] for row in rows)
+
+        return person_ids
+
 # =============================================================================
 class pr_RoleRepresent(S3Represent):
     """ Representations of pr_role IDs """
@@ -6677,13 +7092,16 @@ def pr_define_role(pe_id,
     else:
         duplicate = None
     if duplicate:
-        if duplicate.role_type != role_type:
+        type_changed = duplicate.role_type != role_type
+        if type_changed:
             # Clear paths if this changes the role type
             if str(role_type) != str(OU):
                 data["path"] = None
             s3db.pr_role_rebuild_path(duplicate.id, clear=True)
         duplicate.update_record(**data)
         record_id = duplicate.id
+        if type_changed and current.deployment_settings.get_pr_ou_closure():
+            pr_role_update_closure(record_id)
     else:
         record_id = rtable.insert(**data)
     return record_id
@@ -6914,6 +7332,14 @@ def pr_get_ancestors(pe_id):
     """
 
     s3db = current.s3db
+
+    if current.deployment_settings.get_pr_ou_closure():
+        # Closure lookup
+        ctable = s3db.pr_ou_closure
+        query = (ctable.descendant_id == pe_id)
+        rows = current.db(query).select(ctable.ancestor_id)
+        return list(set(row.ancestor_id for row in rows))
+
     atable = s3db.pr_affiliation
     rtable = s3db.pr_role
     query = (atable.deleted != True) & \
@@ -7042,6 +7468,21 @@ def pr_ancestors(entities):
         return Storage()
 
     s3db = current.s3db
+
+    if current.deployment_settings.get_pr_ou_closure():
+        # Closure lookup
+        ctable = s3db.pr_ou_closure
+        query = (ctable.descendant_id.belongs(entities))
+        rows = current.db(query).select(ctable.ancestor_id,
+                                        ctable.descendant_id,
+                                        )
+        ancestors = Storage([(pe_id, []) for pe_id in entities])
+        for row in rows:
+            items = ancestors[row.descendant_id]
+            if row.ancestor_id not in items:
+                items.append(row.ancestor_id)
+        return ancestors
+
     atable = s3db.pr_affiliation
     rtable = s3db.pr_role
     query = (atable.deleted != True) & \
@@ -7097,6 +7538,26 @@ def pr_descendants(pe_ids, skip=None, root=True):
 
     s3db = current.s3db
     etable = s3db.pr_pentity
+
+    if root and current.deployment_settings.get_pr_ou_closure():
+        # Closure lookup
+        ctable = s3db.pr_ou_closure
+        query = (ctable.ancestor_id.belongs(pe_ids)) & \
+                (etable.pe_id == ctable.descendant_id) & \
+                (etable.instance_type != "pr_person")
+        rows = current.db(query).select(ctable.ancestor_id,
+                                        ctable.descendant_id,
+                                        )
+        result = {}
+        for row in rows:
+            parent = row.ancestor_id
+            child = row.descendant_id
+            if parent not in result:
+                result[parent] = [child]
+            elif child not in result[parent]:
+                result[parent].append(child)
+        return result
+
     rtable = s3db.pr_role
     atable = s3db.pr_affiliation
 
@@ -7174,6 +7635,22 @@ def pr_get_descendants(pe_ids, entity_types=None, skip=None, ids=True):
     db = current.db
     s3db = current.s3db
     etable = s3db.pr_pentity
+
+    if ids and skip is None and \
+       current.deployment_settings.get_pr_ou_closure():
+        # Closure lookup
+        ctable = s3db.pr_ou_closure
+        query = (ctable.ancestor_id.belongs(pe_ids))
+        if entity_types is not None:
+            if not isinstance(entity_types, (tuple, list, set)):
+                entity_types = [entity_types]
+            query &= (etable.pe_id == ctable.descendant_id) & \
+                     (etable.instance_type.belongs(entity_types))
+        rows = db(query).select(ctable.descendant_id,
+                                distinct = True,
+                                )
+        return [row.descendant_id for row in rows]
+
     rtable = db.pr_role
     atable = db.pr_affiliation
 
@@ -7255,6 +7732,10 @@ def pr_rebuild_path(pe_id, clear=False):
     for role in roles:
         if role.path is None:
             pr_role_rebuild_path(role, clear=clear)
+
+    # Update the OU closure (only necessary for writes)
+    if clear and current.deployment_settings.get_pr_ou_closure():
+        pr_update_closure(pe_id)
     return
 
 # =============================================================================
@@ -7322,6 +7803,202 @@ def pr_role_rebuild_path(role_id, skip=[], clear=False):
 
     return path
 
+# =============================================================================
+# OU Closure
+# =============================================================================
+#
+def pr_ou_parents(pe_ids=None):
+    """
+        Get the immediate OU ancestors of person entities
+
+        @param pe_ids: list of person entity IDs, None for all entities
+
+        @return: dict {pe_id: set of parent PE-IDs}
+    """
+
+    s3db = current.s3db
+    atable = s3db.pr_affiliation
+    rtable = s3db.pr_role
+
+    query = (atable.deleted != True) & \
+            (atable.role_id == rtable.id) & \
+            (rtable.deleted != True) & \
+            (rtable.role_type == OU)
+    if pe_ids is not None:
+        query &= (atable.pe_id.belongs(pe_ids))
+    rows = current.db(query).select(atable.pe_id, rtable.pe_id)
+
+    a = atable._tablename
+    r = rtable._tablename
+
+    parents = {}
+    for row in rows:
+        child = row[a].pe_id
+        if child in parents:
+            parents[child].add(row[r].pe_id)
+        else:
+            parents[child] = set([row[r].pe_id])
+    return parents
+
+# =============================================================================
+def pr_ou_closure(nodes, parents, known=None):
+    """
+        Compute the ancestors of person entities from their immediate
+        OU ancestors (supports multiple parents and cycles)
+
+        @param nodes: the PE-IDs to compute the ancestors for
+        @param parents: dict {pe_id: set of parent PE-IDs}, must contain
+                        the parents of all nodes
+        @param known: dict {pe_id: set of ancestor PE-IDs} of all other
+                      parents (i.e. which are not in nodes)
+
+        @return: dict {pe_id: set of ancestor PE-IDs}
+    """
+
+    if known is None:
+        known = {}
+
+    ancestors = dict((node, set()) for node in nodes)
+
+    # Propagate until nothing changes any more
+    # (the number of passes is limited by the depth of the hierarchy)
+    changed = True
+    while changed:
+        changed = False
+        for node in nodes:
+            node_ancestors = ancestors[node]
+            size = len(node_ancestors)
+            for parent in parents.get(node, ()):
+                node_ancestors.add(parent)
+                if parent in ancestors:
+                    node_ancestors |= ancestors[parent]
+                elif parent in known:
+                    node_ancestors |= known[parent]
+            if len(node_ancestors) != size:
+                changed = True
+
+    # Entities in cycles are not their own ancestors
+    for node, node_ancestors in ancestors.iteritems():
+        node_ancestors.discard(node)
+
+    return ancestors
+
+# =============================================================================
+def pr_update_closure(pe_ids):
+    """
+        Update the OU closure after the OU affiliations of person entities
+        have changed - updates the ancestors of these entities and of all
+        their descendants, using a fixed number of queries regardless of
+        the depth of the hierarchy
+
+        @param pe_ids: the person entity ID, or a list of IDs
+    """
+
+    if not isinstance(pe_ids, (list, tuple, set)):
+        pe_ids = [pe_ids]
+    pe_ids = set(pe_id for pe_id in pe_ids if pe_id)
+    if not pe_ids:
+        return
+
+    db = current.db
+    ctable = current.s3db.pr_ou_closure
+
+    # Affected are the entities themselves and all their descendants
+    query = (ctable.ancestor_id.belongs(pe_ids))
+    rows = db(query).select(ctable.descendant_id)
+    affected = set(row.descendant_id for row in rows)
+    affected |= pe_ids
+
+    # Get the immediate ancestors of all affected entities
+    parents = pr_ou_parents(affected)
+
+    # The ancestors of all unaffected parents remain unchanged
+    unaffected = set()
+    for items in parents.itervalues():
+        unaffected |= items
+    unaffected -= affected
+    known = {}
+    if unaffected:
+        query = (ctable.descendant_id.belongs(unaffected))
+        rows = db(query).select(ctable.ancestor_id, ctable.descendant_id)
+        for row in rows:
+            descendant_id = row.descendant_id
+            if descendant_id in known:
+                known[descendant_id].add(row.ancestor_id)
+            else:
+                known[descendant_id] = set([row.ancestor_id])
+
+    # Compute the new ancestors of all affected entities
+    ancestors = pr_ou_closure(affected, parents, known)
+
+    # Remove obsolete closure entries, and add new ones
+    query = (ctable.descendant_id.belongs(affected))
+    rows = db(query).select(ctable.id,
+                            ctable.ancestor_id,
+                            ctable.descendant_id,
+                            )
+    existing = set()
+    obsolete = []
+    for row in rows:
+        pair = (row.ancestor_id, row.descendant_id)
+        if pair not in existing and \
+           row.ancestor_id in ancestors[row.descendant_id]:
+            existing.add(pair)
+        else:
+            obsolete.append(row.id)
+    if obsolete:
+        db(ctable.id.belongs(obsolete)).delete()
+
+    entries = [{"ancestor_id": ancestor_id, "descendant_id": descendant_id}
+               for descendant_id, items in ancestors.iteritems()
+               for ancestor_id in items
+               if (ancestor_id, descendant_id) not in existing]
+    if entries:
+        ctable.bulk_insert(entries)
+    return
+
+# =============================================================================
+def pr_role_update_closure(role_id):
+    """
+        Update the OU closure for all affiliates of a role (e.g. after
+        the role type has changed)
+
+        @param role_id: the role ID
+    """
+
+    atable = current.s3db.pr_affiliation
+    query = (atable.role_id == role_id) & \
+            (atable.deleted != True)
+    rows = current.db(query).select(atable.pe_id)
+    pr_update_closure([row.pe_id for row in rows])
+    return
+
+# =============================================================================
+def pr_rebuild_closure():
+    """
+        Rebuild the OU closure from scratch (scheduler task, required
+        once after enabling settings.pr.ou_closure)
+
+        @return: the number of closure entries
+    """
+
+    db = current.db
+    ctable = current.s3db.pr_ou_closure
+
+    db(ctable.id > 0).delete()
+
+    parents = pr_ou_parents()
+    ancestors = pr_ou_closure(parents.keys(), parents)
+
+    entries = [{"ancestor_id": ancestor_id, "descendant_id": descendant_id}
+               for descendant_id, items in ancestors.iteritems()
+               for ancestor_id in items]
+    chunk_size = 5000
+    for i in xrange(0, len(entries), chunk_size):
+        ctable.bulk_insert(entries[i:i + chunk_size])
+
+    return len(entries)
+
 # =============================================================================
 def pr_image_represent(image_name,
                        format = None,
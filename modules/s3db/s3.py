@@ -27,7 +27,10 @@
     OTHER DEALINGS IN THE SOFTWARE.
 """
 
-__all__ = ("S3HierarchyModel",)
+__all__ = ("S3HierarchyModel",
+           "S3ExportJobModel",
+           "S3TableVersionModel",
+           )
 
 from gluon import *
 from ..s3 import *
@@ -36,7 +39,9 @@ from ..s3 import *
 class S3HierarchyModel(S3Model):
     """ Model for stored object hierarchies """
 
-    names = ("s3_hierarchy",)
+    names = ("s3_hierarchy",
+             "s3_hierarchy_node",
+             )
 
     def model(self):
 
@@ -52,6 +57,73 @@ class S3HierarchyModel(S3Model):
                           Field("hierarchy", "json"),
                           *s3_timestamp())
 
+        # -------------------------------------------------------------------------
+        # Stored Hierarchy Nodes
+        # - one row per node, so that single nodes can be updated in place
+        #
+        tablename = "s3_hierarchy_node"
+        self.define_table(tablename,
+                          Field("tablename",
+                                length=64),
+                          Field("node_id", "bigint"),
+                          Field("parent_id", "bigint"),
+                          Field("category", "json"),
+                          )
+
+        # ---------------------------------------------------------------------
+        # Return global names to s3.*
+        #
+        return {}
+
+    # -------------------------------------------------------------------------
+    def defaults(self):
+        """ Safe defaults if module is disabled """
+
+        return {}
+
+# =============================================================================
+class S3ExportJobModel(S3Model):
+    """ Model for asynchronous export jobs (see S3ExportJob) """
+
+    names = ("s3_export_job",
+             )
+
+    def model(self):
+
+        # ---------------------------------------------------------------------
+        # Export Jobs
+        # - one row per queued export, de-duplicated by job_key/realm_key
+        #   and the version stamp of the exported data (S3ExportJob.version)
+        #
+        tablename = "s3_export_job"
+        self.define_table(tablename,
+                          # Hash of the request (URL, filters, format, language)
+                          Field("job_key", length=32),
+                          # Hash of the realms of the user
+                          Field("realm_key", length=32),
+                          Field("version"),
+                          Field("user_id", "integer"),
+                          Field("tablename", length=64),
+                          Field("format", length=16),
+                          # The request parameters (controller, vars etc)
+                          Field("request", "json"),
+                          Field("status", length=16,
+                                default="QUEUED"),
+                          # Progress (records done/total)
+                          Field("done", "integer",
+                                default=0),
+                          Field("total", "integer",
+                                default=0),
+                          # The file in the export folder
+                          Field("file"),
+                          # The filename for download
+                          Field("filename"),
+                          Field("content_type"),
+                          Field("size", "integer",
+                                default=0),
+                          Field("error", "text"),
+                          *s3_timestamp())
+
         # ---------------------------------------------------------------------
         # Return global names to s3.*
         #
@@ -63,5 +135,36 @@ class S3HierarchyModel(S3Model):
 
         return {}
 
+# =============================================================================
+class S3TableVersionModel(S3Model):
+    """ Model for table version counters (see s3_table_version) """
+
+    names = ("s3_table_version",
+             )
+
+    def model(self):
+
+        # ---------------------------------------------------------------------
+        # Table Versions
+        # - incremented with every write to the table, for invalidation
+        #   of cached data derived from the table
+        #
+        tablename = "s3_table_version"
+        self.define_table(tablename,
+                          Field("tablename", length=64),
+                          Field("version", "integer",
+                                default=0),
+                          )
+
+        # ---------------------------------------------------------------------
+        # Return global names to s3.*
+        #
+        return {}
+
+    # -------------------------------------------------------------------------
+    def defaults(self):
+        """ Safe defaults if module is disabled """
+
+        return {}
 
 # END =========================================================================
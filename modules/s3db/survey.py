@@ -63,6 +63,7 @@ __all__ = ("S3SurveyTemplateModel",
            "survey_save_answers_for_series",
            "survey_updateMetaData",
            "survey_getAllAnswersForQuestionInSeries",
+           "survey_AnswerMatrix",
            "survey_getQstnLayoutRules",
            "survey_getAllTranslationsForTemplate",
            "survey_getAllTranslationsForSeries",
@@ -2591,6 +2592,7 @@ class S3SurveyCompleteModel(S3Model):
     names = ("survey_complete",
              "survey_complete_id",
              "survey_answer",
+             "survey_answer_matrix",
              )
 
     def model(self):
@@ -2681,8 +2683,23 @@ class S3SurveyCompleteModel(S3Model):
         configure(tablename,
                   deduplicate = self.survey_answer_duplicate,
                   onaccept = self.answer_onaccept,
+                  ondelete_cascade = self.answer_ondelete_cascade,
                   )
 
+        # ---------------------------------------------------------------------
+        # The survey_answer_matrix table holds all answers of a response
+        #    in a single row, as {question_id: value}, so that the answers
+        #    of a series can be analysed and exported without querying the
+        #    survey_answer table question by question (see survey_AnswerMatrix)
+
+        tablename = "survey_answer_matrix"
+        define_table(tablename,
+                     Field("complete_id", "reference survey_complete",
+                           ondelete = "CASCADE",
+                           ),
+                     Field("answers", "json"),
+                     )
+
         # ---------------------------------------------------------------------
         return dict(survey_complete_id = complete_id)
 
@@ -2771,7 +2788,13 @@ class S3SurveyCompleteModel(S3Model):
             return
         # Save all the answers from answer_list in the survey_answer table
         answer_list = record.answer_list
-        S3SurveyCompleteModel.importAnswers(complete_id, answer_list)
+        s3 = current.response.s3
+        s3.survey_answer_import = True
+        try:
+            S3SurveyCompleteModel.importAnswers(complete_id, answer_list)
+        finally:
+            s3.survey_answer_import = False
+        survey_AnswerMatrix.update(complete_id)
         # Extract the default template location question and save the
         # answer in the location field
         template_record = survey_getTemplateFromSeries(series_id)
@@ -2922,6 +2945,30 @@ class S3SurveyCompleteModel(S3Model):
                 query = (atable.question_id == question_id) & \
                         (atable.complete_id == complete_id)
                 current.db(query).update(value = new_value)
+            if not current.response.s3.survey_answer_import:
+                # Update the answer matrix (when importing the answers
+                # of a response, completeOnAccept updates it at the end)
+                survey_AnswerMatrix.set_answer(complete_id,
+                                               question_id,
+                                               new_value)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def answer_ondelete_cascade(row, tablename=None):
+        """
+            Answer is about to be deleted => remove the response from the
+            answer matrix (will be rebuilt on demand)
+
+            @param row: the answer to be deleted
+            @param tablename: the tablename (ignored)
+        """
+
+        atable = current.s3db.survey_answer
+        answer = current.db(atable.id == row.id).select(atable.complete_id,
+                                                        limitby=(0, 1)
+                                                        ).first()
+        if answer and answer.complete_id:
+            survey_AnswerMatrix.invalidate(answer.complete_id)
 
     # -------------------------------------------------------------------------
     @staticmethod
@@ -3041,6 +3088,23 @@ def get_default_location(complete_id):
         the hierarchy until either one is found or none are found
     """
 
+    question_id = get_default_location_question()
+    if question_id:
+        widget_obj = survey_getWidgetFromQuestion(question_id)
+        widget_obj.loadAnswer(complete_id, question_id)
+        return widget_obj
+    else:
+        return None
+
+# =============================================================================
+def get_default_location_question():
+    """
+        Get the lowest-level standard location question which has
+        been answered
+
+        @return: the survey_question record ID, or None
+    """
+
     db = current.db
     s3db = current.s3db
 
@@ -3054,38 +3118,249 @@ def get_default_location(complete_id):
         record = db(query & (qtable.code == location_code)).select(qtable.id,
                                                                    limitby=(0, 1)).first()
         if record:
-            widget_obj = survey_getWidgetFromQuestion(record.id)
-            break
-    if record:
-        widget_obj.loadAnswer(complete_id, record.id)
-        return widget_obj
-    else:
-        return None
+            return record.id
+    return None
 
 # =============================================================================
 def survey_getAllAnswersForQuestionInSeries(question_id, series_id):
     """
         function to return all the answers for a given question
         from with a specified series
+
+        @return: list of dicts {"complete_id": ..., "value": ...}, ordered
+                 by complete_id
+        @note: the answers are read from the answer matrix, so the dicts
+               do not contain an "answer_id", and the answers of deleted
+               responses are excluded
     """
 
-    s3db = current.s3db
-    ctable = s3db.survey_complete
-    atable = s3db.survey_answer
-    query = (atable.question_id == question_id) & \
-            (atable.complete_id == ctable.id) & \
-            (ctable.series_id == series_id)
-    rows = current.db(query).select(atable.id,
-                                    atable.value,
-                                    atable.complete_id)
-    answers = []
-    for row in rows:
-        answer = {}
-        answer["answer_id"] = row.id
-        answer["value"] = row.value
-        answer["complete_id"] = row.complete_id
-        answers.append(answer)
-    return answers
+    return survey_AnswerMatrix.series(series_id).column(question_id)
+
+# =============================================================================
+class survey_AnswerMatrix(object):
+    """
+        The answers to all questions of all responses in a series, read
+        from the denormalized survey_answer_matrix (one row per response,
+        with the answers as {question_id: value}) rather than from
+        survey_answer
+
+        Matrix rows are updated when answers are saved, and built on
+        demand for responses which do not have one yet (or use the
+        survey_answer_matrix_rebuild task to build them all at once)
+    """
+
+    def __init__(self, series_id):
+        """
+            Constructor
+
+            @param series_id: the survey_series record ID
+        """
+
+        self.series_id = series_id
+        self._answers = None
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def series(cls, series_id):
+        """
+            Get the answer matrix of a series (re-used within the request)
+
+            @param series_id: the survey_series record ID
+        """
+
+        s3 = current.response.s3
+        matrices = s3.survey_answer_matrix
+        if matrices is None:
+            matrices = s3.survey_answer_matrix = {}
+        key = str(series_id)
+        matrix = matrices.get(key)
+        if matrix is None:
+            matrix = matrices[key] = cls(series_id)
+        return matrix
+
+    # -------------------------------------------------------------------------
+    @property
+    def answers(self):
+        """
+            The answers of all responses in the series, dict
+            {complete_id: {question_id: value}}
+        """
+
+        answers = self._answers
+        if answers is None:
+            answers = self._answers = self.load()
+        return answers
+
+    # -------------------------------------------------------------------------
+    def load(self):
+        """
+            Load the matrix rows of all responses in the series, building
+            any missing rows from survey_answer
+        """
+
+        s3db = current.s3db
+
+        ctable = s3db.survey_complete
+        mtable = s3db.survey_answer_matrix
+
+        left = mtable.on(mtable.complete_id == ctable.id)
+        query = (ctable.series_id == self.series_id) & \
+                (ctable.deleted != True)
+        rows = current.db(query).select(ctable.id,
+                                        mtable.answers,
+                                        left = left,
+                                        )
+        answers = {}
+        missing = []
+        for row in rows:
+            complete_id = row[ctable.id]
+            data = row[mtable.answers]
+            if data is None:
+                missing.append(complete_id)
+            else:
+                answers[complete_id] = dict((int(k), v)
+                                            for k, v in data.items())
+        if missing:
+            answers.update(self.update(missing))
+        return answers
+
+    # -------------------------------------------------------------------------
+    def column(self, question_id):
+        """
+            Get all answers to a question
+
+            @param question_id: the survey_question record ID
+
+            @return: list of dicts {"complete_id": ..., "value": ...},
+                     ordered by complete_id
+        """
+
+        question_id = int(question_id)
+
+        answers = self.answers
+        column = []
+        append = column.append
+        for complete_id in sorted(answers):
+            row = answers[complete_id]
+            if question_id in row:
+                append({"complete_id": complete_id,
+                        "value": row[question_id],
+                        })
+        return column
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def update(complete_ids):
+        """
+            Build the matrix rows of responses from survey_answer
+
+            @param complete_ids: a survey_complete record ID, or a list
+                                 of IDs
+
+            @return: the answers, dict {complete_id: {question_id: value}}
+        """
+
+        if type(complete_ids) is not list:
+            complete_ids = [complete_ids]
+
+        db = current.db
+        s3db = current.s3db
+
+        atable = s3db.survey_answer
+        query = (atable.complete_id.belongs(complete_ids)) & \
+                (atable.deleted != True)
+        rows = db(query).select(atable.complete_id,
+                                atable.question_id,
+                                atable.value,
+                                orderby = atable.id,
+                                )
+        answers = dict((complete_id, {}) for complete_id in complete_ids)
+        for row in rows:
+            answers[row.complete_id][row.question_id] = row.value
+
+        mtable = s3db.survey_answer_matrix
+        db(mtable.complete_id.belongs(complete_ids)).delete()
+        mtable.bulk_insert([{"complete_id": complete_id,
+                             "answers": dict((str(k), v)
+                                             for k, v in data.items()),
+                             } for complete_id, data in answers.items()])
+
+        current.response.s3.survey_answer_matrix = None
+        return answers
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def set_answer(cls, complete_id, question_id, value):
+        """
+            Update a single answer in the matrix row of a response
+
+            @param complete_id: the survey_complete record ID
+            @param question_id: the survey_question record ID
+            @param value: the answer value
+        """
+
+        mtable = current.s3db.survey_answer_matrix
+        query = (mtable.complete_id == complete_id)
+        row = current.db(query).select(mtable.id,
+                                       mtable.answers,
+                                       limitby = (0, 1),
+                                       ).first()
+        if row:
+            answers = row.answers or {}
+            answers[str(question_id)] = value
+            row.update_record(answers = answers)
+            current.response.s3.survey_answer_matrix = None
+        else:
+            cls.update(complete_id)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def invalidate(complete_id):
+        """
+            Remove the matrix row of a response (to be rebuilt on demand)
+
+            @param complete_id: the survey_complete record ID
+        """
+
+        mtable = current.s3db.survey_answer_matrix
+        current.db(mtable.complete_id == complete_id).delete()
+        current.response.s3.survey_answer_matrix = None
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def rebuild(cls, series_id=None, chunk_size=500):
+        """
+            Rebuild the matrix rows of all responses (scheduler task)
+
+            @param series_id: the survey_series record ID, None for
+                              all series
+            @param chunk_size: number of responses to build at a time
+
+            @return: the number of responses
+        """
+
+        db = current.db
+
+        ctable = current.s3db.survey_complete
+        base = (ctable.deleted != True)
+        if series_id:
+            base &= (ctable.series_id == series_id)
+
+        last_id = 0
+        total = 0
+        while True:
+            query = base & (ctable.id > last_id)
+            rows = db(query).select(ctable.id,
+                                    limitby = (0, chunk_size),
+                                    orderby = ctable.id,
+                                    )
+            if not rows:
+                break
+            complete_ids = [row.id for row in rows]
+            cls.update(complete_ids)
+            total += len(complete_ids)
+            last_id = complete_ids[-1]
+        return total
 
 # =============================================================================
 def buildTableFromCompletedList(data_source):
@@ -3141,36 +3416,32 @@ def buildCompletedList(series_id, question_id_list):
         @param question_id_list: The list of questions to display
     """
 
-    db = current.db
     qtable = current.s3db.survey_question
 
+    question_ids = [int(question_id) for question_id in question_id_list]
+    rows = current.db(qtable.id.belongs(question_ids)).select(qtable.id,
+                                                              qtable.name)
+    names = dict((row.id, row.name) for row in rows)
+
     headers = []
     happend = headers.append
     types = []
-    items = []
-    qstn_posn = 0
-    row_len = len(question_id_list)
-    complete_lookup = {}
-    for question_id in question_id_list:
-        answers = survey_getAllAnswersForQuestionInSeries(question_id,
-                                                          series_id)
+    widgets = []
+    for question_id in question_ids:
         widget_obj = survey_getWidgetFromQuestion(question_id)
-
-        question = db(qtable.id == question_id).select(qtable.name,
-                                                       limitby=(0, 1)).first()
-        happend(question.name)
+        happend(names.get(question_id))
         types.append(widget_obj.db_type())
+        widgets.append((question_id, widget_obj))
 
-        for answer in answers:
-            complete_id = answer["complete_id"]
-            if complete_id in complete_lookup:
-                row = complete_lookup[complete_id]
-            else:
-                row = len(complete_lookup)
-                complete_lookup[complete_id] = row
-                items.append([''] * row_len)
-            items[row][qstn_posn] = widget_obj.repr(answer["value"])
-        qstn_posn += 1
+    items = []
+    answers = survey_AnswerMatrix.series(series_id).answers
+    for complete_id in sorted(answers):
+        row = answers[complete_id]
+        if not any(question_id in row for question_id in question_ids):
+            continue
+        items.append([widget_obj.repr(row[question_id])
+                      if question_id in row else ''
+                      for question_id, widget_obj in widgets])
 
     return [headers] + [types] + items
 
@@ -3187,6 +3458,8 @@ def getLocationList(series_id):
     table = current.s3db.survey_complete
     rows = current.db(table.series_id == series_id).select(table.id,
                                                            table.answer_list)
+    loc_question_id = None
+    loc_widget = None
     for row in rows:
         lat = None
         lon = None
@@ -3236,18 +3509,25 @@ def getLocationList(series_id):
             rappend(location)
         else:
             # The lat & lon were not added to the assessment so try and get one
-            loc_widget = get_default_location(row.id)
+            if loc_widget is None:
+                # Same default location question for all responses
+                loc_question_id = get_default_location_question()
+                if loc_question_id:
+                    loc_widget = survey_getWidgetFromQuestion(loc_question_id)
+                else:
+                    loc_widget = False
             if loc_widget:
-                complete_id = loc_widget.question["complete_id"]
-                if "answer" not in loc_widget.question:
+                complete_id = row.id
+                answers = survey_AnswerMatrix.series(series_id).answers
+                if complete_id not in answers or \
+                   loc_question_id not in answers[complete_id]:
                     continue
-                answer = loc_widget.question["answer"]
-                if loc_widget != None:
-                    record = loc_widget.getLocationRecord(complete_id, answer)
-                    if len(record.records) == 1:
-                        location = record.records[0].gis_location
-                        location.complete_id = complete_id
-                        rappend(location)
+                answer = answers[complete_id][loc_question_id]
+                record = loc_widget.getLocationRecord(complete_id, answer)
+                if record and len(record.records) == 1:
+                    location = record.records[0].gis_location
+                    location.complete_id = complete_id
+                    rappend(location)
 
     return response_locations
 
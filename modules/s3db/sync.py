@@ -129,6 +129,12 @@ class SyncDataModel(S3Model):
                            readable = False,
                            writable = False,
                            ),
+                     # Number of dispatched task groups still running
+                     Field("pending", "integer",
+                           default = 0,
+                           readable = False,
+                           writable = False,
+                           ),
                      Field("timestmp", "datetime",
                            readable = False,
                            writable = False),
@@ -43,6 +43,12 @@ settings.base.template = "default"
 #settings.database.password = "password"
 # Uncomment to use a different pool size
 #settings.database.pool_size = 30
+# Uncomment to count records (e.g. for dataTables) with a different strategy:
+# "cached" = cache exact counts for a time, "estimate" = use the query planner
+# estimate for large tables (PostgreSQL only)
+#settings.database.count_strategy = "cached"
+#settings.database.count_cache_expire = 60
+#settings.database.count_estimate_threshold = 100000
 # Do we have a spatial DB available? (currently supports PostGIS. Spatialite to come.)
 #settings.gis.spatialdb = True
 
@@ -76,6 +82,8 @@ settings.base.debug = False
 #settings.log.logfile = None
 # Uncomment to get detailed caller information
 #settings.log.caller_info = True
+# Uncomment to log which models are loaded in each request, and how long they take to load
+#settings.log.model_timings = True
 
 # Uncomment to use Content Delivery Networks to speed up Internet-facing sites
 #settings.base.cdn = True
@@ -211,6 +219,10 @@ settings.frontpage.rss = [
 #settings.search.max_results = 200
 # Maximum number of features for a Map Layer
 #settings.gis.max_features = 1000
+# Load Feature Layers as tiles of server-side clustered GeoJSON (for large layers)
+#settings.gis.tiles = True
+#settings.gis.tiles_cluster_zoom = 14
+#settings.gis.tiles_cluster_threshold = 100
 
 # CAP Settings
 # Change for different authority and organisations
@@ -32,6 +32,11 @@ def config(settings):
     # Unless doing a manual DB migration, where prepopulate = 0
     # In Production, prepopulate = 0 (to save 1x DAL hit every page)
     settings.base.prepopulate.append("default")
+    # Run independent import tasks in parallel worker processes
+    # (PostgreSQL/MySQL only)
+    #settings.base.prepopulate_workers = 4
+    # Restore a database dump instead of re-importing unchanged templates
+    #settings.base.prepopulate_snapshots = True
 
     # Theme (folder to use for views/layout.html)
     #settings.base.theme = "default"
@@ -312,6 +317,8 @@ def config(settings):
     #settings.gis.search_geonames = False
     # Uncomment to modify the Simplify Tolerance
     #settings.gis.simplify_tolerance = 0.001
+    # Uncomment to modify the Tolerances for which simplified Polygons get precomputed
+    #settings.gis.simplify_levels = (0.01, 0.001)
     # Uncomment to Hide the Toolbar from the main Map
     #settings.gis.toolbar = False
     # Uncomment to show Catalogue Layers in Map Widgets (e.g. Profile & Summary pages)
@@ -333,6 +340,16 @@ def config(settings):
     #settings.msg.require_international_phone_numbers = False
     # Uncomment to make basestation codes unique
     #settings.msg.basestation_code_unique = True
+    # Uncomment to render and send subscription notifications in-process in batches
+    #settings.msg.notify_batch = True
+
+    # Synchronization Settings
+    # Maximum number of records per page when synchronizing with Sahana Eden peers (None = no paging)
+    #settings.sync.page_size = 1000
+    # Uncomment to gzip-compress pushed data (peers must support this)
+    #settings.sync.compress_push = True
+    # Uncomment to run the synchronization tasks of a repository concurrently
+    #settings.sync.concurrent_tasks = True
 
     # Use 'soft' deletes
     #settings.security.archive_not_delete = False
@@ -357,6 +374,12 @@ def config(settings):
     # False = owned by any authenticated user
     #settings.security.strict_ownership = False
 
+    # Share ACL decisions between requests ("ram" or "disk", default None)
+    # - changes of ACLs and role assignments expire the cache, but with
+    #   multiple processes, "ram" relies on the expiry time (in seconds)
+    #settings.security.acl_cache = "disk"
+    #settings.security.acl_cache_expire = 300
+
     # Audit
     # - can be a callable for custom hooks (return True to also perform normal logging, or False otherwise)
     # NB Auditing (especially Reads) slows system down & consumes diskspace
@@ -382,6 +405,13 @@ def config(settings):
     #settings.ui.autocomplete_min_chars = 2
     #settings.ui.filter_auto_submit = 800
     #settings.ui.report_auto_submit = 800
+    # Uncomment to always compute pivot tables in Python (rather than by DB aggregation)
+    #settings.ui.report_db_aggregation = False
+    # Uncomment to cache representations of foreign keys across requests
+    #settings.ui.represent_cache = True
+    # Expiry time (seconds) and maximum number of cached representations
+    #settings.ui.represent_cache_expire = 300
+    #settings.ui.represent_cache_size = 10000
     # Enable this for a UN-style deployment
     #settings.ui.cluster = True
     # Enable this to use the label 'Camp' instead of 'Shelter'
@@ -412,8 +442,17 @@ def config(settings):
     #settings.ui.datatables_initComplete = '''$('.dataTables_paginate').after($('.dt-export-options'))'''
     # Uncomment for dataTables to use a different paging style:
     #settings.ui.datatables_pagingType = "bootstrap"
+    # Uncomment to use keyset pagination for dataTables (faster for large tables, orders NULLs last)
+    #settings.ui.datatables_keyset = True
     # Uncomment to restrict the export formats available
     #settings.ui.export_formats = ("kml", "pdf", "rss", "xls", "xml")
+    # Uncomment to offer the streaming XLSX export (for large numbers of rows)
+    #settings.ui.export_formats = ("kml", "pdf", "rss", "xls", "xlsx", "xml")
+    # Uncomment to run exports from dataTables as asynchronous jobs (requires a scheduler worker)
+    #settings.ui.export_async = True
+    # Uncomment to change the expiry (seconds) and the disk quota (MB) for asynchronous exports
+    #settings.ui.export_async_expire = 3600
+    #settings.ui.export_async_quota = 200
     # Uncomment to change the label/class of FilterForm clear buttons
     #settings.ui.filter_clear = "Clear"
     # Uncomment to include an Interim Save button on CRUD forms
@@ -511,6 +550,10 @@ def config(settings):
     #settings.pr.select_existing = False
     # Uncomment to prevent showing HR details in S3PersonAutocompleteWidget results
     #settings.pr.search_shows_hr_details = False
+    # Uncomment to use a name index for the person autocomplete (run the pr_person_name_index_rebuild task after enabling)
+    #settings.pr.name_index = True
+    # Uncomment to maintain a closure table of the OU hierarchy for faster realm lookups (run the pr_ou_closure_rebuild task after enabling)
+    #settings.pr.ou_closure = True
     # Uncomment to hide Emergency Contacts in Person Contacts page
     #settings.pr.show_emergency_contacts = False
     # Uncomment to hide the Address tab in person details
@@ -875,6 +918,10 @@ def config(settings):
     # -------------------------------------------------------------------------
     # Filter Manager
     #settings.search.filter_manager = False
+    # Uncomment to cache the options of filter widgets (for 300 seconds)
+    #settings.search.filter_options_cache = 300
+    # Number of parsed URL filter expressions to cache (0 to disable)
+    #settings.search.filter_cache_size = 1000
 
     # if you want to have videos appearing in /default/video
     #settings.base.youtube_id = [dict(id = "introduction",
@@ -6,6 +6,8 @@ import time
 
 from gluon import current
 
+from s3 import S3ExportJob
+
 # =============================================================================
 class Daily():
     """ Daily Maintenance Tasks """
@@ -45,4 +47,7 @@ class Daily():
                 except:
                     pass
 
+        # Cleanup asynchronous exports
+        S3ExportJob.cleanup()
+
 # END =========================================================================
@@ -1,8 +1,10 @@
 from unit_tests.s3.s3aaa import *
 from unit_tests.s3.s3cfg import *
+from unit_tests.s3.s3codecs import *
 from unit_tests.s3.s3crud import *
 from unit_tests.s3.s3datatable import *
 from unit_tests.s3.s3datetime import *
+from unit_tests.s3.s3export import *
 from unit_tests.s3.s3fields import *
 from unit_tests.s3.s3filter import *
 from unit_tests.s3.s3forms import *
@@ -13,7 +15,9 @@ from unit_tests.s3.s3import import *
 from unit_tests.s3.s3model import *
 from unit_tests.s3.s3msg import *
 from unit_tests.s3.s3navigation import *
+from unit_tests.s3.s3notify import *
 from unit_tests.s3.s3query import *
+from unit_tests.s3.s3report import *
 from unit_tests.s3.s3resource import *
 from unit_tests.s3.s3rest import *
 from unit_tests.s3.s3sync import *
@@ -277,6 +277,230 @@ class S3PerformanceTests(unittest.TestCase):
 
         current.auth.override = False
 
+    def testS3ImportJobLookahead(self):
+        """ Reference resolution in a synthetic 50k-row import """
+
+        from lxml import etree
+        from s3.s3import import S3ImportJob
+        from s3 import s3_has_foreign_key
+
+        SubElement = etree.SubElement
+
+        # Synthetic tree: 500 organisations, 50000 offices referencing
+        # them by TUID, and a location by UUID (not in the tree)
+        root = etree.Element("s3xml")
+        for i in xrange(500):
+            org = SubElement(root, "resource",
+                             name="org_organisation",
+                             tuid="ORG%s" % i)
+            SubElement(org, "data", field="name").text = "Organisation %s" % i
+        for i in xrange(50000):
+            office = SubElement(root, "resource", name="org_office")
+            SubElement(office, "data", field="name").text = "Office %s" % i
+            SubElement(office, "reference",
+                       field="organisation_id",
+                       resource="org_organisation",
+                       tuid="ORG%s" % (i % 500))
+            SubElement(office, "reference",
+                       field="location_id",
+                       resource="gis_location",
+                       uuid="BENCHMARK-LOCATION-%s" % (i % 2000))
+        tree = etree.ElementTree(root)
+
+        current.auth.override = True
+
+        print ""
+        table = current.s3db.org_office
+        fields = filter(s3_has_foreign_key, [table[f] for f in table.fields])
+        elements = root.findall("resource[@name='org_office']")
+
+        job = S3ImportJob(table, tree)
+        lookahead = job.lookahead
+        directory = job.directory
+        def x():
+            for element in elements:
+                lookahead(element,
+                          table=table,
+                          fields=fields,
+                          tree=tree,
+                          directory=directory)
+        mlt = timeit.Timer(x).timeit(number=1) * 1000 / len(elements)
+        print "S3ImportJob.lookahead = %s ms/record (=%s rec/sec)" % (mlt, int(1000/mlt))
+        self.assertTrue(mlt<1)
+
+        current.db.rollback()
+        current.auth.override = False
+
+    def testURLFilterParse(self):
+        """ URL filter parsing throughput, with and without cache """
+
+        from s3 import S3URLQuery, S3URLQueryParser
+        from s3.s3query import S3FilterCache
+
+        settings = current.deployment_settings
+
+        resource = current.s3db.resource("org_office")
+        get_vars = {"$filter": "(~.name like \"Main*\") and "
+                               "((~.organisation_id$name eq \"Red Cross\") or "
+                               "(~.location_id$L1 belongs \"Ulaanbaatar\",\"Darkhan\"))",
+                    "~.office_type_id$name__like": "HQ*",
+                    }
+
+        def parse():
+            query = S3URLQuery.parse(resource, get_vars)
+            for alias in query:
+                for q in query[alias]:
+                    q.split(resource)
+
+        print ""
+        size = settings.search.get("filter_cache_size")
+        try:
+            # Without cache
+            settings.search.filter_cache_size = 0
+            current.response.s3.field_path_cache = None
+            mlt = timeit.Timer(parse).timeit(number=100) * 10
+            print "S3URLQuery.parse (uncached) = %s ms (=%s filters/sec)" % (mlt, int(1000/mlt))
+
+            # With cache
+            settings.search.filter_cache_size = 1000
+            parse()
+            mlt = timeit.Timer(parse).timeit(number=1000)
+            print "S3URLQuery.parse (cached) = %s ms (=%s filters/sec)" % (mlt, int(1000/mlt))
+            self.assertTrue(mlt<5)
+        finally:
+            if size is None:
+                settings.search.pop("filter_cache_size", None)
+            else:
+                settings.search.filter_cache_size = size
+            current.response.s3.field_path_cache = None
+
+    def testDateParseFormat(self):
+        """ Date parsing/formatting, compiled formats vs strptime/strftime """
+
+        import datetime
+        import time
+        from s3 import S3Calendar
+
+        print ""
+        dates = [datetime.date(2000, 1, 1) + datetime.timedelta(days=i % 3650)
+                 for i in xrange(10000)]
+        dtfmt = "%Y-%m-%d"
+        strings = [dt.strftime(dtfmt) for dt in dates]
+        n = len(dates)
+
+        # Previous path (strptime/strftime)
+        strptime = time.strptime
+        x = lambda: [strptime(s, dtfmt)[:6] for s in strings]
+        mlt = timeit.Timer(x).timeit(number=1) * 1000000 / n
+        print "strptime = %s µs/date" % mlt
+        x = lambda: [dt.strftime(dtfmt) for dt in dates]
+        mlt = timeit.Timer(x).timeit(number=1) * 1000000 / n
+        print "strftime = %s µs/date" % mlt
+
+        # Calendar
+        for name in ("Gregorian", "Persian"):
+            c = S3Calendar(name)
+            x = lambda: [c.parse_date(s) for s in strings]
+            mlt = timeit.Timer(x).timeit(number=1) * 1000000 / n
+            print "S3Calendar.parse_date (%s) = %s µs/date" % (name, mlt)
+            x = lambda: [c.format_date(dt) for dt in dates]
+            mlt = timeit.Timer(x).timeit(number=1) * 1000000 / n
+            print "S3Calendar.format_date (%s) = %s µs/date" % (name, mlt)
+            x = lambda: c.format_dates(dates)
+            mlt = timeit.Timer(x).timeit(number=1) * 1000000 / n
+            print "S3Calendar.format_dates (%s) = %s µs/date" % (name, mlt)
+
+    def testTimeSeriesAggregate(self):
+        """ Time plot aggregation, single sweep vs per period """
+
+        import datetime
+        import random
+        from s3 import S3TimeSeriesEvent, S3TimeSeriesEventFrame, S3TimeSeriesFact
+
+        print ""
+        start = datetime.datetime(2012, 1, 1)
+        events = []
+        for i in xrange(5000):
+            event_start = start + datetime.timedelta(days=random.randint(0, 1000))
+            event_end = event_start + datetime.timedelta(days=random.randint(0, 200))
+            events.append(S3TimeSeriesEvent(i,
+                                            start = event_start,
+                                            end = event_end,
+                                            values = {"value": random.randint(0, 100)},
+                                            row = random.choice(("A", "B", "C")),
+                                            ))
+        facts = [S3TimeSeriesFact("count", "value"),
+                 S3TimeSeriesFact("sum", "value"),
+                 S3TimeSeriesFact("cumulate", "value"),
+                 ]
+
+        def aggregate(sweep):
+            ef = S3TimeSeriesEventFrame(start,
+                                        start + datetime.timedelta(days=1000),
+                                        slots="weeks")
+            ef.extend(events)
+            if sweep:
+                ef.aggregate(facts)
+            for period in ef:
+                if period.totals is None:
+                    period.aggregate(facts)
+
+        for label, sweep in (("per period", False), ("sweep", True)):
+            x = lambda: aggregate(sweep)
+            mlt = timeit.Timer(x).timeit(number=1) * 1000
+            print "S3TimeSeriesEventFrame.aggregate (%s, 5000 events, 143 weeks) = %s ms" % (label, mlt)
+
+    def testPersonNameSearch(self):
+        """ Person autocomplete keystroke latency, LIKE vs name index """
+
+        from s3db.pr import pr_PersonNameIndex
+
+        db = current.db
+        s3db = current.s3db
+
+        current.auth.override = True
+
+        print ""
+        ptable = s3db.pr_person
+        first_names = ("Anna", "Bengt", "Carlos", "Dilnoza", "Erik", "Fatima")
+        last_names = ("Andersson", "Benchmarker", "Carvalho", "Dahl")
+
+        # Keystrokes of a user typing a name
+        keystrokes = ("b", "be", "ben", "benc", "bench", "bengt bench")
+        limit = current.deployment_settings.get_search_max_results() + 1
+
+        def like(value):
+            query = (ptable.deleted != True)
+            for term in value.split(" "):
+                query &= (ptable.first_name.lower().like(term + "%")) | \
+                         (ptable.last_name.lower().like(term + "%"))
+            return db(query).select(ptable.id,
+                                    orderby=ptable.first_name,
+                                    limitby=(0, limit))
+
+        search = pr_PersonNameIndex.search
+        try:
+            size = 0
+            for total in (1000, 10000, 50000):
+                persons = []
+                for i in xrange(size, total):
+                    persons.append({"first_name": "%s%s" % (first_names[i % 6], i),
+                                    "last_name": last_names[i % 4],
+                                    })
+                ptable.bulk_insert(persons)
+                size = total
+                pr_PersonNameIndex.rebuild()
+
+                for label, method in (("LIKE", like),
+                                      ("index", lambda v: search(v, limit=limit)),
+                                      ):
+                    x = lambda: [method(value) for value in keystrokes]
+                    mlt = timeit.Timer(x).timeit(number=3) * 1000 / (3 * len(keystrokes))
+                    print "pr_search_ac (%s, +%s persons) = %s ms/keystroke" % (label, total, mlt)
+        finally:
+            db.rollback()
+            current.auth.override = False
+
 # =============================================================================
 def run_suite(*test_classes):
     """ Run the test suite """
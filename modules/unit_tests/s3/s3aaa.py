@@ -2029,6 +2029,127 @@ class HasPermissionTests(unittest.TestCase):
         # Should return None if the table doesn't exist
         self.assertEqual(permitted, None)
 
+    # -------------------------------------------------------------------------
+    def testACLCache(self):
+        """ Test caching of ACL decisions """
+
+        auth = current.auth
+        settings = current.deployment_settings
+
+        acl_cache = settings.security.get("acl_cache")
+
+        settings.security.policy = 5
+        settings.security.acl_cache = "ram"
+        auth.permission = S3Permission(auth)
+
+        has_permission = auth.s3_has_permission
+        c = "org"
+        f = "permission_test"
+        tablename = "org_permission_test"
+
+        assertEqual = self.assertEqual
+        assertTrue = self.assertTrue
+        assertFalse = self.assertFalse
+
+        try:
+            auth.s3_impersonate("normaluser@example.com")
+            auth.s3_assign_role(auth.user.id, self.reader)
+
+            permission = auth.permission
+            counters = permission.counters
+
+            # First check looks up the ACLs
+            permitted = has_permission("read", c=c, f=f, table=tablename)
+            assertTrue(permitted)
+            lookups = counters.acl_queries
+            assertTrue(lookups > 0)
+
+            # Same check with a fresh permission cache uses the ACL cache
+            permission.permission_cache = {}
+            permitted = has_permission("read", c=c, f=f, table=tablename)
+            assertTrue(permitted)
+            assertEqual(counters.acl_queries, lookups)
+
+            # Shared cache is used by the next request
+            auth.permission = S3Permission(auth)
+            permitted = has_permission("read", c=c, f=f, table=tablename)
+            assertTrue(permitted)
+            assertEqual(auth.permission.counters.acl_queries, 0)
+
+            # Expiry takes effect in other processes
+            other = S3Permission(auth)
+            version = other.get_acl_version()
+            auth.permission.expire_acl_cache()
+            other.clear_cache()
+            self.assertNotEqual(other.get_acl_version(), version)
+
+            # Changing the ACL invalidates the cache
+            acl = auth.permission
+            acl.update_acl("TESTREADER", c=c, f=f,
+                           uacl=acl.NONE,
+                           oacl=acl.NONE)
+            auth.permission = S3Permission(auth)
+            permitted = has_permission("read", c=c, f=f, table=tablename)
+            assertFalse(permitted)
+
+            # Withdrawing the role invalidates the cache
+            auth.permission.update_acl("TESTREADER", c=c, f=f,
+                                       uacl=acl.READ|acl.CREATE,
+                                       oacl=acl.UPDATE)
+            auth.s3_withdraw_role(auth.user.id, self.reader)
+            permitted = has_permission("read", c=c, f=f, table=tablename)
+            assertFalse(permitted)
+
+        finally:
+            settings.security.acl_cache = acl_cache
+            auth.permission.expire_acl_cache()
+
+    # -------------------------------------------------------------------------
+    def testACLCacheDeleteRole(self):
+        """ Test that deleting a role invalidates cached ACL decisions """
+
+        auth = current.auth
+        settings = current.deployment_settings
+
+        acl_cache = settings.security.get("acl_cache")
+
+        settings.security.policy = 5
+        settings.security.acl_cache = "ram"
+        auth.permission = S3Permission(auth)
+
+        has_permission = auth.s3_has_permission
+        c = "org"
+        f = "permission_test"
+        tablename = "org_permission_test"
+
+        acl = auth.permission
+        role_id = auth.s3_create_role("TESTREVOKE", None,
+                                      dict(c=c, f=f,
+                                           uacl=acl.READ, oacl=acl.READ),
+                                      dict(t=tablename,
+                                           uacl=acl.READ, oacl=acl.READ),
+                                      uid="TESTREVOKE")
+        try:
+            auth.s3_impersonate("normaluser@example.com")
+            auth.s3_assign_role(auth.user.id, role_id)
+
+            # Decision gets cached
+            permitted = has_permission("read", c=c, f=f, table=tablename)
+            self.assertTrue(permitted)
+
+            # Revoke the ACLs by deleting the role
+            auth.s3_delete_role("TESTREVOKE")
+
+            # Next request within the same cache window must not use
+            # the cached decision
+            auth.permission = S3Permission(auth)
+            permitted = has_permission("read", c=c, f=f, table=tablename)
+            self.assertFalse(permitted)
+
+        finally:
+            settings.security.acl_cache = acl_cache
+            auth.permission.expire_acl_cache()
+
     ## -------------------------------------------------------------------------
     #def testPerformance(self):
         #""" Test has_permission performance """
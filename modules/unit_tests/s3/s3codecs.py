@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+#
+# S3 Codecs Unit Tests
+#
+# To run this script use:
+# python web2py.py -S eden -M -R applications/eden/modules/unit_tests/s3/s3codecs.py
+#
+import unittest
+import datetime
+from gluon import *
+from gluon.storage import Storage
+from s3 import *
+from s3.s3codecs import S3XLSX
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+try:
+    import xlrd
+except ImportError:
+    xlrd = None
+
+# =============================================================================
+@unittest.skipIf(xlsxwriter is None or xlrd is None,
+                 "xlsxwriter and xlrd required for XLSX tests")
+class S3XLSXTests(unittest.TestCase):
+    """ Tests for the XLSX encoder (S3XLSX) """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        current.auth.override = True
+
+        # Export without title row
+        settings = current.deployment_settings
+        self.title_row = settings.get_xls_title_row()
+        settings.base.xls_title_row = False
+
+        # Export without UTC offset
+        s3 = current.session.s3
+        self.utc_offset = s3.utc_offset
+        s3.utc_offset = None
+
+        self.headers = current.response.headers
+        current.response.headers = Storage()
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        current.deployment_settings.base.xls_title_row = self.title_row
+        current.session.s3.utc_offset = self.utc_offset
+        current.response.headers = self.headers
+
+        current.db.rollback()
+        current.auth.override = False
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def read(output):
+        """
+            Read the spreadsheet produced by the encoder
+
+            @param output: the encoder output (stream)
+            @return: the xlrd Book
+        """
+
+        if hasattr(output, "read"):
+            contents = output.read()
+        else:
+            contents = "".join(output)
+        return xlrd.open_workbook(file_contents=contents)
+
+    # -------------------------------------------------------------------------
+    def testTypedCells(self):
+        """ Test writing of dates, times and numbers as typed cells """
+
+        assertEqual = self.assertEqual
+
+        date = datetime.date(2015, 1, 9)
+        dtime = datetime.datetime(2015, 1, 9, 14, 30, 0)
+        data = {"columns": ["date", "datetime", "integer", "double",
+                            "option", "string",
+                            ],
+                "types": {"date": "date",
+                          "datetime": "datetime",
+                          "integer": "integer",
+                          "double": "double",
+                          "option": "integer",
+                          "string": "string",
+                          },
+                "rows": [{"date": "2015-01-09",
+                          "datetime": "2015-01-09 14:30",
+                          "integer": "12",
+                          "double": "3.75",
+                          "option": "Large",
+                          "string": "Text",
+                          "_row": {"date": date,
+                                   "datetime": dtime,
+                                   "integer": 12,
+                                   "double": 3.75,
+                                   "option": 3,
+                                   "string": "Text",
+                                   },
+                          },
+                         ],
+                }
+
+        output = S3XLSX().encode(data, title="Typed Cells")
+        book = self.read(output)
+        sheet = book.sheet_by_index(0)
+
+        # Header row
+        assertEqual(sheet.row_values(0), data["columns"])
+
+        # Typed cells
+        cell = sheet.cell(1, 0)
+        assertEqual(cell.ctype, xlrd.XL_CELL_DATE)
+        assertEqual(xlrd.xldate_as_tuple(cell.value, book.datemode)[:3],
+                    (2015, 1, 9))
+
+        cell = sheet.cell(1, 1)
+        assertEqual(cell.ctype, xlrd.XL_CELL_DATE)
+        assertEqual(xlrd.xldate_as_tuple(cell.value, book.datemode),
+                    (2015, 1, 9, 14, 30, 0))
+
+        cell = sheet.cell(1, 2)
+        assertEqual(cell.ctype, xlrd.XL_CELL_NUMBER)
+        assertEqual(cell.value, 12)
+
+        cell = sheet.cell(1, 3)
+        assertEqual(cell.ctype, xlrd.XL_CELL_NUMBER)
+        assertEqual(cell.value, 3.75)
+
+        # Option labels remain text
+        cell = sheet.cell(1, 4)
+        assertEqual(cell.ctype, xlrd.XL_CELL_TEXT)
+        assertEqual(cell.value, "Large")
+
+        cell = sheet.cell(1, 5)
+        assertEqual(cell.ctype, xlrd.XL_CELL_TEXT)
+        assertEqual(cell.value, "Text")
+
+    # -------------------------------------------------------------------------
+    def testSheetSplit(self):
+        """ Test continuation on another sheet when reaching the row limit """
+
+        assertEqual = self.assertEqual
+
+        data = {"columns": ["name"],
+                "headers": {"name": "Name"},
+                "types": {"name": "string"},
+                "rows": [{"name": "Row %s" % i} for i in xrange(10)],
+                }
+
+        codec = S3XLSX()
+        # 1 header row + 4 data rows per sheet
+        codec.MAX_ROWS = 5
+
+        output = codec.encode(data, title="Sheet Split")
+        book = self.read(output)
+
+        assertEqual(book.nsheets, 3)
+        names = []
+        for index in xrange(book.nsheets):
+            sheet = book.sheet_by_index(index)
+            # Header repeated on each sheet
+            assertEqual(sheet.cell_value(0, 0), "Name")
+            self.assertTrue(sheet.nrows <= 5)
+            names.extend(sheet.col_values(0, start_rowx=1))
+        assertEqual(names, ["Row %s" % i for i in xrange(10)])
+
+    # -------------------------------------------------------------------------
+    def testRoundTrip(self):
+        """ Test export of a resource """
+
+        assertEqual = self.assertEqual
+
+        s3db = current.s3db
+
+        otable = s3db.org_organisation
+        names = ["XLSX Test Organisation %s" % i for i in xrange(3)]
+        for name in names:
+            otable.insert(name=name, acronym="XLSXTO")
+
+        resource = s3db.resource("org_organisation",
+                                 filter = (FS("acronym") == "XLSXTO"),
+                                 )
+
+        vars = current.request.vars
+        current.request.vars = Storage()
+        try:
+            output = S3XLSX().encode(resource,
+                                     list_fields = ["id", "name", "acronym"],
+                                     )
+        finally:
+            current.request.vars = vars
+
+        book = self.read(output)
+        assertEqual(book.nsheets, 1)
+
+        sheet = book.sheet_by_index(0)
+        assertEqual(sheet.nrows, 4)
+
+        # ID column is skipped
+        labels = sheet.row_values(0)
+        assertEqual(len(labels), 2)
+        assertEqual(labels[0], s3_unicode(otable.name.label))
+
+        rows = [sheet.row_values(i) for i in xrange(1, sheet.nrows)]
+        assertEqual(sorted(row[0] for row in rows), names)
+        for row in rows:
+            assertEqual(row[1], "XLSXTO")
+
+        # Response headers
+        self.assertTrue(".xlsx" in current.response.headers["Content-disposition"])
+
+# =============================================================================
+def run_suite(*test_classes):
+    """ Run the test suite """
+
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    for test_class in test_classes:
+        tests = loader.loadTestsFromTestCase(test_class)
+        suite.addTests(tests)
+    if suite is not None:
+        unittest.TextTestRunner(verbosity=2).run(suite)
+    return
+
+if __name__ == "__main__":
+
+    run_suite(
+        S3XLSXTests,
+    )
+
+# END ========================================================================
@@ -5,6 +5,7 @@
 # To run this script use:
 # python web2py.py -S eden -M -R applications/eden/modules/unit_tests/s3/s3datatable.py
 #
+import json
 import unittest
 import datetime
 from gluon import *
@@ -88,6 +89,27 @@ class S3DataTableTests(unittest.TestCase):
         actual = dt.orderby
         self.assertEqual(expected, actual)
 
+    # -------------------------------------------------------------------------
+    def testDataTableEstimated(self):
+        """ Test that the initial page carries the estimate flag """
+
+        dt = S3DataTable(self.rfields, self.data)
+        dt.estimated = True
+
+        html = dt.html(5000, 5000, id="estimated", dt_pagination="true")
+        cache = html.element("input", _id="estimated_dataTable_cache")
+        self.assertNotEqual(cache, None)
+
+        cache = json.loads(cache["_value"])
+        self.assertTrue(cache["cacheLastJson"]["recordsEstimated"])
+
+        # Not flagged if exact
+        dt.estimated = False
+        html = dt.html(5000, 5000, id="exact", dt_pagination="true")
+        cache = html.element("input", _id="exact_dataTable_cache")
+        cache = json.loads(cache["_value"])
+        self.assertFalse("recordsEstimated" in cache["cacheLastJson"])
+
     # -------------------------------------------------------------------------
     def tearDown(cls):
 
@@ -1780,6 +1780,84 @@ class S3DateTimeParserTests(unittest.TestCase):
                 result = parser.parse(string)
                 assertEqual(result, timetuple)
 
+# =============================================================================
+class S3GregorianFormatTests(unittest.TestCase):
+    """ Tests for compiled Gregorian date/time formats """
+
+    # -------------------------------------------------------------------------
+    def testParsing(self):
+        """ Test that compiled formats parse like strptime """
+
+        import time
+        from s3.s3datetime import S3GregorianFormat
+
+        assertEqual = self.assertEqual
+
+        test_dates = (("%Y-%m-%d", "2015-06-21"),
+                      ("%Y-%m-%d", "2015-6-1"),
+                      ("%Y-%m-%d", "2015-02-30"),
+                      ("%Y-%m-%d", "2015-06-21x"),
+                      ("%d/%m/%Y", "21/06/1899"),
+                      ("%d.%m.%y", "21.06.68"),
+                      ("%d.%m.%y", "21.06.69"),
+                      ("%Y-%m-%dT%H:%M:%S", "2015-06-21T23:59:59"),
+                      ("%Y-%m-%d %H:%M", "2015-06-21   8:05"),
+                      ("%Y%m%d", "20150621"),
+                      )
+
+        for dtfmt, dtstr in test_dates:
+            try:
+                expected = tuple(time.strptime(dtstr, dtfmt)[:6])
+            except ValueError:
+                expected = "ValueError"
+            try:
+                result = S3GregorianFormat.get(dtfmt).parse(dtstr)
+            except ValueError:
+                result = "ValueError"
+            if result is not None:
+                assertEqual(result, expected)
+
+        # Not supported => fall back to strptime
+        self.assertEqual(S3GregorianFormat.get("%d %b %Y").parse("21 Jun 2015"), None)
+
+    # -------------------------------------------------------------------------
+    def testFormatting(self):
+        """ Test that compiled formats format like strftime """
+
+        from s3.s3datetime import S3GregorianFormat
+
+        assertEqual = self.assertEqual
+
+        dt = datetime.datetime(2015, 6, 21, 8, 5, 3)
+        assertEqual(S3GregorianFormat.get("%Y-%m-%d").format(dt), "2015-06-21")
+        assertEqual(S3GregorianFormat.get(ISOFORMAT).format(dt), "2015-06-21T08:05:03")
+
+        dt = datetime.date(1899, 6, 21)
+        assertEqual(S3GregorianFormat.get("%Y-%m-%d").format(dt), "1899-06-21")
+
+        # Not supported => fall back to strftime
+        assertEqual(S3GregorianFormat.get("%d/%m/%Y").format(dt), None)
+        assertEqual(S3GregorianFormat.get(ISOFORMAT).format(dt), None)
+
+    # -------------------------------------------------------------------------
+    def testBatch(self):
+        """ Test batch parsing/formatting """
+
+        assertEqual = self.assertEqual
+
+        for name in ("Gregorian", "Persian"):
+            c = S3Calendar(name)
+            dates = [datetime.date(2015, 6, 21),
+                     datetime.date(1979, 2, 11),
+                     datetime.date(2015, 6, 21),
+                     None,
+                     ]
+            strings = c.format_dates(dates)
+            assertEqual(strings, [c.format_date(dt) for dt in dates])
+
+            parsed = c.parse_dates(strings[:3])
+            assertEqual(parsed, dates[:3])
+
 # =============================================================================
 def run_suite(*test_classes):
     """ Run the test suite """
@@ -1804,6 +1882,7 @@ if __name__ == "__main__":
         S3PersianCalendarTests,
         S3NepaliCalendarTests,
         S3DateTimeParserTests,
+        S3GregorianFormatTests,
     )
 
 # END ========================================================================
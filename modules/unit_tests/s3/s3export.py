@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+#
+# S3Export Unit Tests
+#
+# To run this script use:
+# python web2py.py -S eden -M -R applications/eden/modules/unit_tests/s3/s3export.py
+#
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from gluon import *
+
+from s3 import S3Request
+from s3.s3export import S3ExportJob
+
+# =============================================================================
+class S3ExportJobTests(unittest.TestCase):
+    """ Tests for asynchronous export jobs """
+
+    def setUp(self):
+
+        settings = current.deployment_settings
+        ui = settings.ui
+
+        self.settings = dict((key, ui.get(key))
+                             for key in ("export_async_folder",
+                                         "export_async_expire",
+                                         "export_async_quota",
+                                         ))
+
+        self.folder = tempfile.mkdtemp()
+        ui.export_async_folder = self.folder
+
+    def tearDown(self):
+
+        current.deployment_settings.ui.update(self.settings)
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+        current.db.rollback()
+
+    # -------------------------------------------------------------------------
+    def create_job(self, name, size, age):
+        """
+            Create a completed export job with a file
+
+            @param name: the file name
+            @param size: the file size (bytes)
+            @param age: the age of the job (seconds)
+        """
+
+        with open(os.path.join(self.folder, name), "wb") as f:
+            f.write("x" * size)
+
+        created_on = current.request.utcnow - datetime.timedelta(seconds=age)
+        return current.s3db.s3_export_job.insert(tablename = "org_organisation",
+                                                 format = "xls",
+                                                 status = "COMPLETED",
+                                                 file = name,
+                                                 size = size,
+                                                 created_on = created_on,
+                                                 )
+
+    # -------------------------------------------------------------------------
+    def testCleanupExpired(self):
+        """ Test removal of expired export jobs """
+
+        current.deployment_settings.ui.export_async_expire = 3600
+
+        old = self.create_job("old.xls", 10, 7200)
+        new = self.create_job("new.xls", 10, 60)
+
+        S3ExportJob.cleanup()
+
+        table = current.s3db.s3_export_job
+        self.assertEqual(current.db(table.id == old).count(), 0)
+        self.assertEqual(current.db(table.id == new).count(), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.folder, "old.xls")))
+        self.assertTrue(os.path.exists(os.path.join(self.folder, "new.xls")))
+
+    # -------------------------------------------------------------------------
+    def testCleanupQuota(self):
+        """ Test removal of the oldest export jobs in excess of the quota """
+
+        ui = current.deployment_settings.ui
+        ui.export_async_expire = 3600
+        ui.export_async_quota = 1
+
+        older = self.create_job("older.xls", 700000, 300)
+        newer = self.create_job("newer.xls", 700000, 60)
+
+        S3ExportJob.cleanup()
+
+        table = current.s3db.s3_export_job
+        self.assertEqual(current.db(table.id == older).count(), 0)
+        self.assertEqual(current.db(table.id == newer).count(), 1)
+
+    # -------------------------------------------------------------------------
+    def testRealmKey(self):
+        """ Test that the realm key depends on the user realms """
+
+        auth = current.auth
+
+        auth.s3_impersonate(None)
+        anonymous = S3ExportJob.realm_key()
+
+        auth.s3_impersonate("admin@example.com")
+        admin = S3ExportJob.realm_key()
+        self.assertNotEqual(admin, anonymous)
+        self.assertEqual(S3ExportJob.realm_key(), admin)
+
+        auth.s3_impersonate(None)
+
+    # -------------------------------------------------------------------------
+    def testRealmKeyOwnership(self):
+        """ Test that the realm key is per user if ownership is required """
+
+        auth = current.auth
+        permission = auth.permission
+
+        policy = permission.policy
+        use_cacls = permission.use_cacls
+
+        auth.s3_impersonate("admin@example.com")
+        r = S3Request(prefix = "org",
+                      name = "organisation",
+                      )
+        try:
+            # Ownership not required => shared key
+            permission.use_cacls = False
+            permission.policy = 1
+            self.assertEqual(S3ExportJob.realm_key(r), S3ExportJob.realm_key())
+
+            # Ownership required => key for the user
+            permission.policy = 3
+            self.assertNotEqual(S3ExportJob.realm_key(r), S3ExportJob.realm_key())
+        finally:
+            permission.policy = policy
+            permission.use_cacls = use_cacls
+            auth.s3_impersonate(None)
+
+    # -------------------------------------------------------------------------
+    def testVersion(self):
+        """ Test the version stamp of the exported data """
+
+        assertEqual = self.assertEqual
+        assertNotEqual = self.assertNotEqual
+
+        auth = current.auth
+        auth.override = True
+
+        db = current.db
+        s3db = current.s3db
+        list_fields = s3db.get_config(s3db.org_office, "list_fields")
+        try:
+            org_id = s3db.org_organisation.insert(name="ExportJobVersionTest")
+
+            s3db.configure("org_office",
+                           list_fields = ["name", "organisation_id"],
+                           )
+            resource = s3db.resource("org_office")
+
+            version = S3ExportJob.version
+            current.response.s3.table_versions = None
+            before = version(resource)
+
+            # Unchanged data => same stamp
+            current.response.s3.table_versions = None
+            assertEqual(version(resource), before)
+
+            # Renaming a referenced organisation changes the stamp
+            otable = s3db.org_organisation
+            db(otable.id == org_id).update(name="ExportJobVersionTest2")
+            current.response.s3.table_versions = None
+            after = version(resource)
+            assertNotEqual(after, before)
+
+            # Changes in unrelated tables do not
+            s3db.pr_person.insert(first_name="ExportJobVersionTest")
+            current.response.s3.table_versions = None
+            assertEqual(version(resource), after)
+        finally:
+            s3db.configure("org_office", list_fields=list_fields)
+            current.response.s3.table_versions = None
+            auth.override = False
+
+    # -------------------------------------------------------------------------
+    def testFilters(self):
+        """ Test that the filters of the request are re-applied in the task """
+
+        auth = current.auth
+        auth.override = True
+
+        s3db = current.s3db
+        table = s3db.org_organisation
+        try:
+            record_ids = [table.insert(name="ExportJobFilterTest%s" % i)
+                          for i in xrange(3)]
+
+            # Filters as set by controller and prep
+            resource = s3db.resource("org_organisation",
+                                     filter = (table.id.belongs(record_ids[:2])),
+                                     vars = {"organisation.name__like": "ExportJobFilterTest*"},
+                                     )
+            resource.add_filter(table.id != record_ids[0])
+            expected = [row["org_organisation.id"]
+                        for row in resource.select(["id"], limit=None).rows]
+            self.assertEqual(expected, [record_ids[1]])
+
+            query, vfilter = S3ExportJob.filters(resource)
+
+            # Unfiltered resource in the task
+            resource = s3db.resource("org_organisation")
+            resource.add_filter(table.id.belongs(query))
+            output = [row["org_organisation.id"]
+                      for row in resource.select(["id"], limit=None).rows]
+            self.assertEqual(output, expected)
+        finally:
+            auth.override = False
+
+# =============================================================================
+def run_suite(*test_classes):
+    """ Run the test suite """
+
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    for test_class in test_classes:
+        tests = loader.loadTestsFromTestCase(test_class)
+        suite.addTests(tests)
+    if suite is not None:
+        unittest.TextTestRunner(verbosity=2).run(suite)
+    return
+
+if __name__ == "__main__":
+
+    run_suite(
+        S3ExportJobTests,
+    )
+
+# END ========================================================================
@@ -295,6 +295,54 @@ class S3RepresentTests(unittest.TestCase):
         # All that should have taken exactly 2 queries!
         self.assertEqual(r.queries, 2)
 
+    # -------------------------------------------------------------------------
+    def testCache(self):
+        """ Test second-level cache for foreign key representations """
+
+        assertEqual = self.assertEqual
+
+        settings = current.deployment_settings
+        setting = settings.ui.get("represent_cache")
+        settings.ui.represent_cache = True
+        current.cache.ram("s3_represent_cache", None)
+
+        try:
+            cache = S3RepresentCache.instance()
+            self.assertNotEqual(cache, None)
+
+            # First lookup: miss
+            r = S3Represent(lookup="org_organisation")
+            assertEqual(r(self.id1), self.name1)
+            assertEqual(r.queries, 1)
+            assertEqual(cache.stats()["hits"], 0)
+
+            # Another instance with the same configuration: hit
+            r = S3Represent(lookup="org_organisation")
+            assertEqual(r.bulk([self.id1])[self.id1], self.name1)
+            assertEqual(r.queries, 0)
+            assertEqual(cache.stats()["hits"], 1)
+
+            # Different configuration: not shared
+            r = S3Represent(lookup="org_organisation", fields=["name", "acronym"])
+            assertEqual(r(self.id1), self.name1)
+            assertEqual(r.queries, 1)
+
+            # Expire the record: lookup again
+            S3RepresentCache.expire_records("org_organisation", [self.id1])
+            r = S3Represent(lookup="org_organisation")
+            assertEqual(r(self.id1), self.name1)
+            assertEqual(r.queries, 1)
+
+            # Size limit
+            cache.size = 1
+            r = S3Represent(lookup="org_organisation")
+            r.bulk([self.id1, self.id2])
+            assertEqual(cache.stats()["size"], 1)
+
+        finally:
+            settings.ui.represent_cache = setting
+            current.cache.ram("s3_represent_cache", None)
+
     # -------------------------------------------------------------------------
     def tearDown(self):
 
@@ -6,7 +6,9 @@
 import unittest
 
 from gluon import *
+from s3 import S3Represent, s3_table_version, s3_unicode
 from s3.s3filter import *
+from s3.s3filter import S3FilterOptionsCache
 
 # =============================================================================
 class S3FilterWidgetTests(unittest.TestCase):
@@ -126,6 +128,120 @@ class S3FilterWidgetTests(unittest.TestCase):
         self.assertTrue("2" in values)
         self.assertTrue("3" in values)
 
+# =============================================================================
+class S3FilterOptionsCacheTests(unittest.TestCase):
+    """ Tests for the filter options cache """
+
+    def setUp(self):
+
+        settings = current.deployment_settings
+        self.filter_options_cache = settings.search.get("filter_options_cache")
+        settings.search.filter_options_cache = 300
+
+        # Start with a new request
+        current.response.s3.table_versions = None
+
+        self.calls = 0
+
+    def tearDown(self):
+
+        settings = current.deployment_settings
+        settings.search.filter_options_cache = self.filter_options_cache
+
+        current.db.rollback()
+
+    def lookup(self):
+        """ Dummy lookup function, counting the calls """
+
+        self.calls += 1
+        return self.calls
+
+    def testCache(self):
+        """ Test caching and invalidation of filter options """
+
+        get = S3FilterOptionsCache.get
+        key = ["name", str(self)]
+        tablenames = ["org_organisation"]
+
+        # First lookup is performed, second comes from the cache
+        self.assertEqual(get(key, tablenames, self.lookup), 1)
+        self.assertEqual(get(key, tablenames, self.lookup), 1)
+        self.assertEqual(self.calls, 1)
+
+        # Different key => separate lookup
+        self.assertEqual(get(key + ["other"], tablenames, self.lookup), 2)
+
+        # Modifying the table invalidates the cache (in the next request)
+        current.s3db.org_organisation.insert(name="FilterOptionsCacheTest")
+        current.response.s3.table_versions = None
+        self.assertEqual(get(key, tablenames, self.lookup), 3)
+        self.assertEqual(get(key, tablenames, self.lookup), 3)
+
+    def testLocationUpdate(self):
+        """ Test invalidation by updates which do not change the row count """
+
+        get = S3FilterOptionsCache.get
+        key = ["L1", str(self)]
+        tablenames = ["gis_location"]
+
+        db = current.db
+        table = current.s3db.gis_location
+        location_id = table.insert(name="FilterOptionsCacheTestL1", level="L1")
+
+        current.response.s3.table_versions = None
+        self.assertEqual(get(key, tablenames, self.lookup), 1)
+
+        # Rename the location (same second, same number of rows)
+        db(table.id == location_id).update(name="FilterOptionsCacheTestL1R")
+        current.response.s3.table_versions = None
+        self.assertEqual(get(key, tablenames, self.lookup), 2)
+
+    def testStamps(self):
+        """ Test sharing of table stamps within a request """
+
+        before = s3_table_version("org_organisation")
+        current.s3db.org_organisation.insert(name="FilterOptionsCacheTest")
+        self.assertEqual(s3_table_version("org_organisation"), before)
+
+        # In the next request, the stamp is looked up again
+        current.response.s3.table_versions = None
+        self.assertNotEqual(s3_table_version("org_organisation"), before)
+
+    def testRepresentKey(self):
+        """ Test cache keys for option representations """
+
+        represent_key = S3FilterOptionsCache.represent_key
+        assertEqual = self.assertEqual
+        assertNotEqual = self.assertNotEqual
+
+        # Same options => same key, even if different instances
+        assertEqual(represent_key(S3Represent(lookup="org_organisation")),
+                    represent_key(S3Represent(lookup="org_organisation")))
+
+        # Different options => different keys
+        assertNotEqual(represent_key(S3Represent(lookup="org_organisation")),
+                       represent_key(S3Represent(lookup="org_organisation",
+                                                 fields=["acronym"])))
+        assertNotEqual(represent_key(S3Represent(lookup="org_organisation")),
+                       represent_key(S3Represent(lookup="org_organisation",
+                                                 translate=True)))
+        assertNotEqual(represent_key(None), represent_key("%(name)s"))
+
+        # Functions
+        assertEqual(represent_key(s3_unicode), represent_key(s3_unicode))
+        assertNotEqual(represent_key(s3_unicode), represent_key(None))
+
+    def testDisabled(self):
+        """ Test that lookups are not cached if disabled """
+
+        current.deployment_settings.search.filter_options_cache = 0
+
+        get = S3FilterOptionsCache.get
+        key = ["name", str(self)]
+
+        self.assertEqual(get(key, ["org_organisation"], self.lookup), 1)
+        self.assertEqual(get(key, ["org_organisation"], self.lookup), 2)
+
 # =============================================================================
 def run_suite(*test_classes):
     """ Run the test suite """
@@ -143,6 +259,7 @@ if __name__ == "__main__":
 
     run_suite(
         S3FilterWidgetTests,
+        S3FilterOptionsCacheTests,
     )
 
 # END ========================================================================
@@ -8,6 +8,8 @@
 import unittest
 import datetime
 from gluon import *
+from gluon.contrib import simplejson as json
+from gluon.http import HTTP
 from gluon.storage import Storage
 from s3 import *
 
@@ -306,6 +308,105 @@ class S3LocationTreeTests(unittest.TestCase):
         # Did we get the recursion error?
         self.assertNotIn("too much recursion", log_messages)
 
+    # -------------------------------------------------------------------------
+    def testULT3_update_location_tree_bulk(self):
+        """ Test that the bulk update of all locations updates locations """
+
+        table = self.table
+        db = current.db
+
+        # Insert a country
+        L0_lat = 20.0
+        L0_lon = -20.0
+        L0_id = table.insert(level = "L0",
+                             name = "s3gis.testULT3b.L0",
+                             lat = L0_lat,
+                             lon = L0_lon,
+                             )
+        # Insert a child location
+        L1_id = table.insert(level = "L1",
+                             name = "s3gis.testULT3b.L1",
+                             parent = L0_id,
+                             )
+        # And a child of that child, skipping over L2 to L3
+        L3_id = table.insert(level = "L3",
+                             name = "s3gis.testULT3b.L3",
+                             parent = L1_id,
+                             lat = 21.0,
+                             lon = -21.0,
+                             )
+        # A specific location with a specific parent which comes later
+        specific_id = table.insert(
+                             name = "s3gis.testULT3b.specific",
+                             parent = L3_id,
+                             )
+        specific_child_id = table.insert(
+                             name = "s3gis.testULT3b.specific.child",
+                             )
+        db(table.id == specific_id).update(parent = specific_child_id)
+        db(table.id == specific_child_id).update(parent = L3_id)
+
+        current.gis.update_location_tree_bulk()
+
+        L1_record = db(table.id == L1_id).select(*self.fields,
+                                                 limitby=(0, 1)
+                                                 ).first()
+        self.assertEqual(L1_record.inherited, True)
+        self.assertEqual(L1_record.path, "%s/%s" % (L0_id, L1_id))
+        self.assertEqual(L1_record.L0, "s3gis.testULT3b.L0")
+        self.assertEqual(L1_record.L1, "s3gis.testULT3b.L1")
+        self.assertEqual(L1_record.lat, L0_lat)
+        self.assertEqual(L1_record.lon, L0_lon)
+
+        L3_record = db(table.id == L3_id).select(*self.fields,
+                                                 limitby=(0, 1)
+                                                 ).first()
+        self.assertEqual(L3_record.inherited, False)
+        self.assertEqual(L3_record.path, "%s/%s/%s" % (L0_id, L1_id, L3_id))
+        self.assertEqual(L3_record.L1, "s3gis.testULT3b.L1")
+        self.assertEqual(L3_record.L2, None)
+        self.assertEqual(L3_record.L3, "s3gis.testULT3b.L3")
+        self.assertEqual(L3_record.wkt, "POINT(-21.0 21.0)")
+
+        specific_record = db(table.id == specific_id).select(*self.fields,
+                                                             limitby=(0, 1)
+                                                             ).first()
+        self.assertEqual(specific_record.inherited, True)
+        self.assertEqual(specific_record.path, "%s/%s/%s/%s/%s" % \
+                         (L0_id, L1_id, L3_id, specific_child_id, specific_id))
+        self.assertEqual(specific_record.L3, "s3gis.testULT3b.L3")
+        self.assertEqual(specific_record.lat, 21.0)
+        self.assertEqual(specific_record.lon, -21.0)
+
+    # -------------------------------------------------------------------------
+    def testULT3_update_location_tree_bulk_paths(self):
+        """ Test that the bulk update writes all paths of a batch """
+
+        table = self.table
+        db = current.db
+
+        L0_id = table.insert(level = "L0",
+                             name = "s3gis.testULT3c.L0",
+                             )
+        # More children than paths per batch
+        L1_ids = [table.insert(level = "L1",
+                               name = "s3gis.testULT3c.L1.%s" % i,
+                               parent = L0_id,
+                               )
+                  for i in xrange(250)]
+
+        current.gis.update_location_tree_bulk()
+
+        rows = db(table.id.belongs(L1_ids)).select(table.id, table.path)
+        self.assertEqual(len(rows), len(L1_ids))
+        for row in rows:
+            self.assertEqual(row.path, "%s/%s" % (L0_id, row.id))
+
+        row = db(table.id == L0_id).select(table.path,
+                                           limitby=(0, 1)
+                                           ).first()
+        self.assertEqual(row.path, str(L0_id))
+
     # -------------------------------------------------------------------------
     def testULT4_get_parents(self):
         """ Test get_parents in a case that causes it to call update_location_tree. """
@@ -771,6 +872,322 @@ class S3LocationTreeTests(unittest.TestCase):
         current.auth.override = False
         current.db.rollback()
 
+# =============================================================================
+class S3FeatureTilesTests(unittest.TestCase):
+    """ Tests for tile computations of S3FeatureTiles """
+
+    # -------------------------------------------------------------------------
+    def testTileBounds(self):
+        """ Test the bounds of tiles """
+
+        bounds = S3FeatureTiles.tile_bounds
+        assertAlmostEqual = self.assertAlmostEqual
+
+        # The world
+        lon_min, lat_min, lon_max, lat_max = bounds(0, 0, 0)
+        assertAlmostEqual(lon_min, -180.0)
+        assertAlmostEqual(lon_max, 180.0)
+        assertAlmostEqual(lat_min, -85.0511, 4)
+        assertAlmostEqual(lat_max, 85.0511, 4)
+
+        # North-east quarter
+        lon_min, lat_min, lon_max, lat_max = bounds(1, 1, 0)
+        assertAlmostEqual(lon_min, 0.0)
+        assertAlmostEqual(lon_max, 180.0)
+        assertAlmostEqual(lat_min, 0.0)
+        assertAlmostEqual(lat_max, 85.0511, 4)
+
+    # -------------------------------------------------------------------------
+    def testTileXY(self):
+        """ Test finding the tile which contains a point """
+
+        tile_xy = S3FeatureTiles.tile_xy
+        bounds = S3FeatureTiles.tile_bounds
+        assertEqual = self.assertEqual
+
+        assertEqual(tile_xy(0, 12.5, 55.7), (0, 0))
+        assertEqual(tile_xy(1, 12.5, 55.7), (1, 0))
+        assertEqual(tile_xy(1, -12.5, -55.7), (0, 1))
+
+        # Points beyond the limits are in the outermost tiles
+        assertEqual(tile_xy(2, 180.0, -90.0), (3, 3))
+        assertEqual(tile_xy(2, -200.0, 90.0), (0, 0))
+
+        # The point is within the bounds of the tile
+        for zoom in (3, 10, 17):
+            x, y = tile_xy(zoom, 12.5, 55.7)
+            lon_min, lat_min, lon_max, lat_max = bounds(zoom, x, y)
+            self.assertTrue(lon_min <= 12.5 < lon_max)
+            self.assertTrue(lat_min <= 55.7 < lat_max)
+
+    # -------------------------------------------------------------------------
+    def testBBoxTiles(self):
+        """ Test the tiles covering a bounding box """
+
+        bbox_tiles = S3FeatureTiles.bbox_tiles
+        assertEqual = self.assertEqual
+
+        zoom, tiles = bbox_tiles(-10.0, -10.0, 10.0, 10.0, 1)
+        assertEqual(zoom, 1)
+        assertEqual(set(tiles), set([(0, 0), (0, 1), (1, 0), (1, 1)]))
+
+        # Too many tiles => lower zoom level
+        zoom, tiles = bbox_tiles(-170.0, -80.0, 170.0, 80.0, 10)
+        self.assertTrue(len(tiles) <= S3FeatureTiles.MAX_TILES)
+        self.assertTrue(zoom < 10)
+
+# =============================================================================
+class S3FeatureTilesOutputTests(unittest.TestCase):
+    """ Tests for the tiled GeoJSON output of S3FeatureTiles """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        current.auth.override = True
+
+        s3db = current.s3db
+
+        org_id = s3db.org_organisation.insert(name="TileTestOrganisation")
+        self.org_id = org_id
+
+        ltable = s3db.gis_location
+        otable = s3db.org_office
+        for i in xrange(5):
+            location_id = ltable.insert(name = "TileTestLocation%s" % i,
+                                        lat = 50.1 + i * 0.1,
+                                        lon = 10.1 + i * 0.1,
+                                        )
+            otable.insert(name = "TileTestOffice%s" % i,
+                          organisation_id = org_id,
+                          location_id = location_id,
+                          )
+
+        # Remember the settings
+        settings = current.deployment_settings
+        self.settings = (settings.get_gis_tiles_cluster_zoom(),
+                         settings.get_gis_tiles_cluster_threshold(),
+                         settings.get_gis_max_features(),
+                         )
+
+        # Forget cached tiles and table versions
+        current.cache.ram.clear(regex="gis_tile/.*")
+        current.response.s3.table_versions = None
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        settings = current.deployment_settings
+        settings.gis.tiles_cluster_zoom, \
+        settings.gis.tiles_cluster_threshold, \
+        settings.gis.max_features = self.settings
+
+        current.db.rollback()
+        current.auth.override = False
+
+    # -------------------------------------------------------------------------
+    def get_tile(self, zoom, representation="geojson"):
+        """
+            Request the tile with the test locations
+
+            @param zoom: the zoom level
+            @param representation: the request format
+
+            @return: the features in the tile (list of dicts)
+        """
+
+        x, y = S3FeatureTiles.tile_xy(zoom, 10.3, 50.3)
+        r = S3Request(prefix = "org",
+                      name = "office",
+                      args = ["tiles"],
+                      extension = representation,
+                      get_vars = {"z": str(zoom),
+                                  "x": str(x),
+                                  "y": str(y),
+                                  "~.organisation_id": str(self.org_id),
+                                  },
+                      )
+        output = S3FeatureTiles().apply_method(r)
+        return json.loads(output)["features"]
+
+    # -------------------------------------------------------------------------
+    def testApplyMethod(self):
+        """ Test the tiles method with individual features """
+
+        settings = current.deployment_settings
+        settings.gis.tiles_cluster_threshold = 100
+
+        features = self.get_tile(3)
+        self.assertEqual(len(features), 5)
+        for feature in features:
+            self.assertEqual(feature["type"], "Feature")
+            self.assertFalse("cluster" in feature["properties"])
+
+        # Only GeoJSON is supported
+        with self.assertRaises(HTTP):
+            self.get_tile(3, representation="html")
+
+    # -------------------------------------------------------------------------
+    def testClustering(self):
+        """ Test grid-clustering of tiles """
+
+        settings = current.deployment_settings
+        settings.gis.tiles_cluster_zoom = 14
+        settings.gis.tiles_cluster_threshold = 2
+
+        features = self.get_tile(3)
+        self.assertTrue(0 < len(features) < 5)
+
+        count = 0
+        for feature in features:
+            properties = feature["properties"]
+            self.assertEqual(properties["cluster"], 1)
+            self.assertEqual(feature["geometry"]["type"], "Point")
+            lon, lat = feature["geometry"]["coordinates"]
+            self.assertTrue(10.1 <= lon <= 10.5)
+            self.assertTrue(50.1 <= lat <= 50.5)
+            count += properties["count"]
+        self.assertEqual(count, 5)
+
+    # -------------------------------------------------------------------------
+    def testMaxFeatures(self):
+        """
+            Test fallback to clustering above the cluster zoom level if
+            a tile contains more than max_features
+        """
+
+        settings = current.deployment_settings
+        settings.gis.tiles_cluster_zoom = 2
+        settings.gis.tiles_cluster_threshold = 2
+
+        # Below max_features => individual features
+        settings.gis.max_features = 100
+        features = self.get_tile(3)
+        self.assertEqual(len(features), 5)
+
+        # Above max_features => clusters
+        current.cache.ram.clear(regex="gis_tile/.*")
+        settings.gis.max_features = 3
+        features = self.get_tile(3)
+        self.assertTrue(all(f["properties"].get("cluster") for f in features))
+        self.assertEqual(sum(f["properties"]["count"] for f in features), 5)
+
+    # -------------------------------------------------------------------------
+    def testCacheInvalidation(self):
+        """ Test that cached tiles get invalidated by changes to the table """
+
+        settings = current.deployment_settings
+        settings.gis.tiles_cluster_threshold = 100
+
+        tablename = "org_office"
+        version = s3_table_version(tablename)
+
+        features = self.get_tile(3)
+        self.assertEqual(len(features), 5)
+
+        # Add another office in the same tile
+        s3db = current.s3db
+        location_id = s3db.gis_location.insert(name = "TileTestLocation5",
+                                               lat = 50.35,
+                                               lon = 10.35,
+                                               )
+        s3db.org_office.insert(name = "TileTestOffice5",
+                               organisation_id = self.org_id,
+                               location_id = location_id,
+                               )
+
+        # Same request => cached tile
+        self.assertEqual(s3_table_version(tablename), version)
+        features = self.get_tile(3)
+        self.assertEqual(len(features), 5)
+
+        # Next request => new table version, tile gets re-built
+        current.response.s3.table_versions = None
+        self.assertNotEqual(s3_table_version(tablename), version)
+        features = self.get_tile(3)
+        self.assertEqual(len(features), 6)
+
+# =============================================================================
+class S3SimplifiedLocationTests(unittest.TestCase):
+    """ Tests for precomputed simplifications of location geometries """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        current.auth.override = True
+
+        settings = current.deployment_settings
+        self.levels = settings.gis.get("simplify_levels")
+        settings.gis.simplify_levels = (0.1, 0.01)
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        settings = current.deployment_settings
+        if self.levels is None:
+            settings.gis.pop("simplify_levels", None)
+        else:
+            settings.gis.simplify_levels = self.levels
+
+        current.db.rollback()
+        current.auth.override = False
+
+    # -------------------------------------------------------------------------
+    def testGetTolerance(self):
+        """ Test the choice of the tolerance for a map resolution """
+
+        get_tolerance = GIS.get_simplify_tolerance
+        assertEqual = self.assertEqual
+
+        # Coarse resolution => coarsest level
+        assertEqual(get_tolerance(zoom=0), 0.1)
+        assertEqual(get_tolerance(bbox=(-180, -90, 180, 90)), 0.1)
+
+        # In between => the next finer level
+        assertEqual(get_tolerance(zoom=6), 0.01)
+        assertEqual(get_tolerance(bbox="0,0,50,50"), 0.01)
+
+        # Finer than all levels => the resolution itself
+        self.assertTrue(get_tolerance(zoom=12) < 0.01)
+
+    # -------------------------------------------------------------------------
+    def testUpdateSimplified(self):
+        """ Test precomputing and looking up simplified geometries """
+
+        db = current.db
+        s3db = current.s3db
+
+        gtable = s3db.gis_location
+        stable = s3db.gis_location_simplified
+
+        # A polygon with a small indentation
+        wkt = "POLYGON((0 0,10 0,10 5,5 5.05,0 5,0 0))"
+        location_id = gtable.insert(name = "SimplifyTest",
+                                    gis_feature_type = 3,
+                                    wkt = wkt,
+                                    )
+
+        # One simplification per level
+        self.assertEqual(GIS.update_simplified(location_id), 1)
+        rows = db(stable.location_id == location_id).select(stable.tolerance)
+        self.assertEqual(set(row.tolerance for row in rows), set([0.1, 0.01]))
+
+        # Unchanged geometry is skipped
+        self.assertEqual(GIS.update_simplified(location_id), 0)
+
+        # Changed geometry is updated
+        db(gtable.id == location_id).update(wkt="POLYGON((0 0,20 0,20 5,0 5,0 0))")
+        self.assertEqual(GIS.update_simplified(location_id), 1)
+        self.assertEqual(db(stable.location_id == location_id).count(), 2)
+
+        # Lookup of a precomputed level
+        geojson = GIS.get_simplified_geojson([location_id], tolerance=0.1)
+        self.assertTrue(location_id in geojson)
+        self.assertTrue("20" in geojson[location_id])
+
+        # Lookup of another tolerance falls back to simplifying on-the-fly
+        geojson = GIS.get_simplified_geojson([location_id], tolerance=0.5)
+        self.assertTrue(location_id in geojson)
+
 # =============================================================================
 def run_suite(*test_classes):
     """ Run the test suite """
@@ -788,6 +1205,9 @@ if __name__ == "__main__":
 
     run_suite(
         S3LocationTreeTests,
+        S3FeatureTilesTests,
+        S3FeatureTilesOutputTests,
+        S3SimplifiedLocationTests,
     )
 
 # END ========================================================================
@@ -191,6 +191,123 @@ class S3HierarchyTests(unittest.TestCase):
         self.assertFalse(field.readable)
         self.assertFalse(field.writable)
 
+    # -------------------------------------------------------------------------
+    def testIncrementalUpdate(self):
+        """ Test in-place update of nodes after record changes """
+
+        db = current.db
+        s3db = current.s3db
+
+        assertEqual = self.assertEqual
+        assertTrue = self.assertTrue
+        assertFalse = self.assertFalse
+
+        uids = self.uids
+        table = db.test_hierarchy
+        ntable = s3db.s3_hierarchy_node
+
+        def stored(node_id):
+            query = (ntable.tablename == "test_hierarchy") & \
+                    (ntable.node_id == node_id)
+            return db(query).select(ntable.parent_id,
+                                    ntable.category,
+                                    limitby = (0, 1),
+                                    ).first()
+
+        try:
+            # Load the hierarchy (rebuilds and saves it if dirty)
+            h = S3Hierarchy("test_hierarchy")
+            assertTrue(uids["HIERARCHY1"] in h.theset)
+
+            # Add a node
+            parent_id = uids["HIERARCHY1-1"]
+            record_id = table.insert(name = "Type 1-1-3",
+                                     category = "Cat 2",
+                                     parent = parent_id,
+                                     )
+            S3Hierarchy.dirty("test_hierarchy", record_ids=[record_id])
+
+            h = S3Hierarchy("test_hierarchy")
+            assertFalse(h.flags.get("dirty"))
+            assertEqual(h.parent(record_id), parent_id)
+            assertTrue(record_id in h.children(parent_id))
+
+            row = stored(record_id)
+            assertEqual(row.parent_id, parent_id)
+            assertEqual(row.category, "Cat 2")
+
+            # Re-parent the node
+            new_parent_id = uids["HIERARCHY2"]
+            db(table.id == record_id).update(parent = new_parent_id)
+            S3Hierarchy.dirty("test_hierarchy", record_ids=[record_id])
+
+            h = S3Hierarchy("test_hierarchy")
+            assertFalse(h.flags.get("dirty"))
+            assertEqual(h.parent(record_id), new_parent_id)
+            assertTrue(record_id in h.children(new_parent_id))
+            assertFalse(record_id in h.children(parent_id))
+            assertEqual(stored(record_id).parent_id, new_parent_id)
+
+            # Delete the node
+            db(table.id == record_id).update(deleted = True, parent = None)
+            S3Hierarchy.dirty("test_hierarchy", record_ids=[record_id])
+
+            h = S3Hierarchy("test_hierarchy")
+            assertFalse(h.flags.get("dirty"))
+            assertFalse(record_id in h.theset)
+            assertFalse(record_id in h.children(new_parent_id))
+            assertEqual(stored(record_id), None)
+
+            # Create a cycle => inconsistent, must rebuild
+            node_id = uids["HIERARCHY1"]
+            db(table.id == node_id).update(parent = uids["HIERARCHY1-1-1"])
+            S3Hierarchy.dirty("test_hierarchy", record_ids=[node_id])
+
+            flags = current.model.hierarchies["test_hierarchy"]["flags"]
+            assertTrue(flags.get("dirty"))
+
+        finally:
+            db.rollback()
+            S3Hierarchy.dirty("test_hierarchy")
+
+    # -------------------------------------------------------------------------
+    def testLoadLegacyFormat(self):
+        """ Test loading a hierarchy stored in the legacy format (JSON) """
+
+        db = current.db
+        s3db = current.s3db
+
+        uids = self.uids
+        htable = s3db.s3_hierarchy
+        ntable = s3db.s3_hierarchy_node
+
+        try:
+            # Make sure the hierarchy is stored
+            h = S3Hierarchy("test_hierarchy")
+            self.assertEqual(len(h.nodes), len(uids))
+
+            # Simulate the legacy format: clean, JSON, but no node rows
+            db(ntable.tablename == "test_hierarchy").delete()
+            db(htable.tablename == "test_hierarchy").update(
+                dirty = False,
+                hierarchy = {"nodes": {}},
+                )
+            current.model.hierarchies.pop("test_hierarchy", None)
+
+            # Loading must rebuild the hierarchy rather than
+            # produce an empty tree
+            h = S3Hierarchy("test_hierarchy")
+            self.assertEqual(len(h.nodes), len(uids))
+            self.assertFalse(h.flags.get("dirty"))
+
+            # ...and write the node rows
+            query = (ntable.tablename == "test_hierarchy")
+            self.assertEqual(db(query).count(), len(uids))
+
+        finally:
+            db.rollback()
+            S3Hierarchy.dirty("test_hierarchy")
+
     # -------------------------------------------------------------------------
     def testDeleteBranch(self):
         """ Test recursive deletion of a hierarchy branch """
@@ -6,6 +6,7 @@
 # python web2py.py -S eden -M -R applications/eden/modules/unit_tests/s3/s3import.py
 #
 import datetime
+import os
 import unittest
 
 from gluon import *
@@ -19,7 +20,7 @@ except ImportError:
     except:
         import gluon.contrib.simplejson as json # fallback to pure-Python module
 
-from s3 import S3Duplicate, S3ImportItem, S3ImportJob, s3_meta_fields
+from s3 import S3BulkImporter, S3BulkImportSnapshot, S3Duplicate, S3ImportItem, S3ImportJob, s3_meta_fields
 
 # =============================================================================
 class ListStringImportTests(unittest.TestCase):
@@ -541,6 +542,73 @@ class DuplicateDetectionTests(unittest.TestCase):
         assertEqual(item.id, None)
         assertEqual(item.method, item.METHOD.CREATE)
 
+    # -------------------------------------------------------------------------
+    def testBulk(self):
+        """ Test batch deduplication """
+
+        assertEqual = self.assertEqual
+        assertNotEqual = self.assertNotEqual
+
+        deduplicate = S3Duplicate(primary=("name",),
+                                  secondary=("secondary",),
+                                  )
+
+        table = current.db.dedup_test
+        ids = self.ids
+
+        samples = (
+            # Primary match
+            (Storage(name="test0"), ids["TEST0"]),
+            # Primary match + secondary match
+            (Storage(name="Test2", secondary="secondaryX"), ids["TEST2"]),
+            # Primary match + secondary mismatch
+            (Storage(name="test4", secondary="secondaryX"), None),
+            # Primary mismatch
+            (Storage(name="Test"), None),
+            # Same primary key twice (can't be batched)
+            (Storage(name="Test3"), ids["TEST3"]),
+            (Storage(name="test3"), ids["TEST3"]),
+        )
+
+        items = []
+        for data, expected in samples:
+            item = S3ImportItem(self.job)
+            item.table = table
+            item.method = item.METHOD.CREATE
+            item.data = data
+            items.append(item)
+
+        deduplicate.bulk(items)
+
+        # Check the batch results
+        for index, item in enumerate(items[:4]):
+            assertNotEqual(item.prematch, None)
+            duplicate = item.prematch[1]
+            record_id = duplicate.id if duplicate else None
+            assertEqual(record_id, samples[index][1])
+        for item in items[4:]:
+            assertEqual(item.prematch, None)
+
+        # Check that per-item deduplication produces the same results
+        for index, item in enumerate(items):
+            deduplicate(item)
+            expected = samples[index][1]
+            assertEqual(item.id, expected)
+            if expected:
+                assertEqual(item.method, item.METHOD.UPDATE)
+            else:
+                assertEqual(item.method, item.METHOD.CREATE)
+
+        # Changed data must not use the batch result
+        item = items[0]
+        item.id = None
+        item.method = item.METHOD.CREATE
+        item.data = Storage(name="Test1")
+
+        deduplicate(item)
+        assertEqual(item.id, ids["TEST1"])
+        assertEqual(item.method, item.METHOD.UPDATE)
+
     # -------------------------------------------------------------------------
     def testExceptions(self):
         """ Test S3Duplicate exceptions for nonexistent fields """
@@ -631,6 +699,134 @@ class MtimeImportTests(unittest.TestCase):
         row = resource.select(["id", "modified_on"], as_rows=True)[0]
         assertEqual(row.modified_on, mtime)
 
+# =============================================================================
+class BulkImportDependencyTests(unittest.TestCase):
+    """ Tests for the dependency inference of prepopulate tasks """
+
+    # -------------------------------------------------------------------------
+    def testFootprint(self):
+        """ Test the footprint of an import task """
+
+        importer = S3BulkImporter()
+
+        task = [1, "org", "office", "office.csv", "office.xsl", None]
+        footprint = importer.task_footprint(task)
+
+        # Target table, super-entities and referenced tables
+        self.assertTrue("org_office" in footprint)
+        self.assertTrue("org_site" in footprint)
+        self.assertTrue("org_organisation" in footprint)
+        self.assertTrue("gis_location" in footprint)
+
+        # Special tasks have no footprint
+        task = (2, "import_role", "auth_roles.csv", None)
+        self.assertEqual(importer.task_footprint(task), None)
+
+    # -------------------------------------------------------------------------
+    def testDependencies(self):
+        """ Test the dependencies between import tasks """
+
+        importer = S3BulkImporter()
+
+        tasks = [[1, "org", "organisation", "organisation.csv", "organisation.xsl", None],
+                 [1, "supply", "catalog", "catalog.csv", "catalog.xsl", None],
+                 [1, "org", "office", "office.csv", "office.xsl", None],
+                 (2, "import_role", "auth_roles.csv", None),
+                 [1, "supply", "item_category", "item_category.csv", "item_category.xsl", None],
+                 ]
+        dependencies = importer.task_dependencies(tasks)
+
+        assertEqual = self.assertEqual
+
+        assertEqual(dependencies[0], set())
+        # Offices depend on organisations, but not on catalogs
+        self.assertTrue(0 in dependencies[2])
+        # Special tasks depend on all previous tasks
+        assertEqual(dependencies[3], set([0, 1, 2]))
+        # ...and all subsequent tasks depend on special tasks
+        self.assertTrue(3 in dependencies[4])
+
+# =============================================================================
+class BulkImportSnapshotTests(unittest.TestCase):
+    """ Tests for prepopulate snapshots """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        import tempfile
+        self.folder = tempfile.mkdtemp()
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        import shutil
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    # -------------------------------------------------------------------------
+    def testStylesheets(self):
+        """ Test lookup of included and imported stylesheets """
+
+        folder = self.folder
+        os.mkdir(os.path.join(folder, "sub"))
+
+        XSL = """<?xml version="1.0"?>
+<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+%s
+</xsl:stylesheet>"""
+        files = {"main.xsl": """<xsl:import href="sub/common.xsl"/>
+<xsl:include href="sub/other.xsl"/>""",
+                 "sub/common.xsl": """<xsl:include href="../base.xsl"/>""",
+                 "sub/other.xsl": """<xsl:include href="../base.xsl"/>""",
+                 "base.xsl": "",
+                 }
+        for name, content in files.items():
+            with open(os.path.join(folder, name), "w") as f:
+                f.write(XSL % content)
+
+        stylesheets = S3BulkImportSnapshot.stylesheets(os.path.join(folder,
+                                                                    "main.xsl"))
+        names = [os.path.relpath(os.path.abspath(name), folder)
+                 for name in stylesheets]
+
+        # Each stylesheet included once, including transitive includes
+        self.assertEqual(names[0], "main.xsl")
+        self.assertEqual(sorted(names), sorted(os.path.normpath(name)
+                                               for name in files))
+
+    # -------------------------------------------------------------------------
+    def testUploads(self):
+        """ Test saving and restoring of uploaded files """
+
+        uploads = os.path.join(current.request.folder, "uploads")
+        subfolder = os.path.join(uploads, "snapshottest")
+        if not os.path.exists(subfolder):
+            os.makedirs(subfolder)
+        try:
+            snapshot = S3BulkImportSnapshot([])
+
+            # File written during prepopulate
+            filename = os.path.join(subfolder, "snapshottest.txt")
+            with open(filename, "w") as f:
+                f.write("Snapshot Test")
+
+            archive = os.path.join(self.folder, "uploads.zip")
+            snapshot._save_uploads(archive)
+
+            import zipfile
+            names = zipfile.ZipFile(archive).namelist()
+            self.assertEqual(names, [os.path.join("snapshottest",
+                                                  "snapshottest.txt")])
+
+            # Restore
+            os.remove(filename)
+            snapshot._restore_uploads(archive)
+            self.assertTrue(os.path.isfile(filename))
+            with open(filename, "r") as f:
+                self.assertEqual(f.read(), "Snapshot Test")
+        finally:
+            import shutil
+            shutil.rmtree(subfolder, ignore_errors=True)
+
 # =============================================================================
 def run_suite(*test_classes):
     """ Run the test suite """
@@ -654,6 +850,8 @@ if __name__ == "__main__":
         FailedReferenceTests,
         DuplicateDetectionTests,
         MtimeImportTests,
+        BulkImportDependencyTests,
+        BulkImportSnapshotTests,
     )
 
 # END ========================================================================
@@ -13,7 +13,44 @@ from s3.s3fields import s3_meta_fields
 # =============================================================================
 class S3ModelTests(unittest.TestCase):
 
-    pass
+    # -------------------------------------------------------------------------
+    def testIndex(self):
+        """ Test the model module index """
+
+        s3db = current.s3db
+
+        index = s3db.index("org")
+        self.assertNotEqual(index, None)
+
+        # Index is re-used
+        self.assertTrue(s3db.index("org") is index)
+
+        # Table names map to the defining class
+        self.assertEqual(index.names.get("org_organisation"),
+                         "S3OrganisationModel")
+        self.assertEqual(index.types.get("org_organisation"),
+                         "S3OrganisationModel")
+
+        # Module globals are indexed
+        self.assertTrue("org_root_organisation" in index.globals)
+
+        # Non-existent module
+        self.assertEqual(s3db.index("nonexistent"), None)
+
+    # -------------------------------------------------------------------------
+    def testTable(self):
+        """ Test loading tables and globals through the index """
+
+        s3db = current.s3db
+
+        table = s3db.table("org_organisation")
+        self.assertNotEqual(table, None)
+        self.assertEqual(table._tablename, "org_organisation")
+
+        self.assertEqual(s3db.table("org_nonexistent"), None)
+
+        represent = s3db.get("org_organisation_represent")
+        self.assertTrue(callable(represent))
 
 # =============================================================================
 class S3SuperEntityTests(unittest.TestCase):
@@ -242,7 +279,7 @@ def run_suite(*test_classes):
 if __name__ == "__main__":
 
     run_suite(
-        #S3ModelTests,
+        S3ModelTests,
         S3SuperEntityTests,
     )
 
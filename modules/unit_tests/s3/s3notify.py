@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+#
+# Notifications Unit Tests
+#
+# To run this script use:
+# python web2py.py -S eden -M -R applications/eden/modules/unit_tests/s3/s3notify.py
+#
+import unittest
+import datetime
+from gluon import *
+from gluon.storage import Storage
+from s3 import *
+
+# =============================================================================
+class TestNotifications(S3Notifications):
+    """ S3Notifications recording (rather than sending) the messages """
+
+    deliveries = []
+    fallbacks = []
+    groups = []
+
+    # Raise an exception after this number of deliveries (None for never)
+    fail_after = None
+
+    @classmethod
+    def reset(cls):
+
+        cls.deliveries = []
+        cls.fallbacks = []
+        cls.groups = []
+        cls.fail_after = None
+
+    @classmethod
+    def _notify_group(cls, rows, delivered):
+
+        cls.groups.append([row.pr_subscription_resource.id for row in rows])
+        return super(TestNotifications, cls)._notify_group(rows, delivered)
+
+    @classmethod
+    def _deliver(cls, pe_ids, subject, messages):
+
+        if cls.fail_after is not None and \
+           len(cls.deliveries) >= cls.fail_after:
+            raise RuntimeError("Delivery failed")
+        pe_ids = pe_ids if type(pe_ids) is list else [pe_ids]
+        cls.deliveries.append(pe_ids)
+        return True, []
+
+    @classmethod
+    def notify(cls, resource_id):
+
+        cls.fallbacks.append(resource_id)
+        return "Fallback"
+
+# =============================================================================
+class NotifyBatchTests(unittest.TestCase):
+    """ Tests for S3Notifications.notify_batch """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        auth = current.auth
+        s3db = current.s3db
+
+        auth.override = True
+
+        # A new record to notify about
+        otable = s3db.org_organisation
+        self.org_id = otable.insert(name="NotifyBatchTestOrg")
+
+        # Subscribers
+        self.pe_ids = []
+        for email in ("admin@example.com", "normaluser@example.com"):
+            user_id = auth.s3_get_user_id(email)
+            self.pe_ids.append(auth.s3_user_pe_id(user_id))
+
+        self.subscriptions = []
+        self.filters = []
+        self.last_check_time = current.request.utcnow - \
+                               datetime.timedelta(hours=1)
+
+        TestNotifications.reset()
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        db = current.db
+        s3db = current.s3db
+
+        TestNotifications.reset()
+
+        # notify_batch commits, so need to remove the test records explicitly
+        rtable = s3db.pr_subscription_resource
+        stable = s3db.pr_subscription
+        ftable = s3db.pr_filter
+        otable = s3db.org_organisation
+        db(rtable.subscription_id.belongs(self.subscriptions)).delete()
+        db(stable.id.belongs(self.subscriptions)).delete()
+        db(ftable.id.belongs(self.filters)).delete()
+        db(otable.id == self.org_id).delete()
+        db.commit()
+
+        current.auth.override = False
+
+    # -------------------------------------------------------------------------
+    def subscribe(self,
+                  pe_id,
+                  email_format="text",
+                  last_check_time=None,
+                  filter_query=None):
+        """
+            Helper to create a subscription
+
+            @param pe_id: the subscriber pe_id
+            @param email_format: the email format
+            @param last_check_time: the last check time
+            @param filter_query: the filter query (JSON)
+
+            @return: the pr_subscription_resource record ID
+        """
+
+        s3db = current.s3db
+
+        if filter_query:
+            filter_id = s3db.pr_filter.insert(pe_id = pe_id,
+                                              title = "NotifyBatchTest",
+                                              query = filter_query,
+                                              )
+            self.filters.append(filter_id)
+        else:
+            filter_id = None
+
+        subscription_id = s3db.pr_subscription.insert(pe_id = pe_id,
+                                                      filter_id = filter_id,
+                                                      notify_on = ["new", "upd"],
+                                                      frequency = "daily",
+                                                      method = ["EMAIL"],
+                                                      email_format = email_format,
+                                                      )
+        self.subscriptions.append(subscription_id)
+
+        if last_check_time is None:
+            last_check_time = self.last_check_time
+        rtable = s3db.pr_subscription_resource
+        return rtable.insert(subscription_id = subscription_id,
+                             resource = "org_organisation",
+                             url = "org/organisation",
+                             locked = True,
+                             last_check_time = last_check_time,
+                             )
+
+    # -------------------------------------------------------------------------
+    def assertNotified(self, resource_id, notified=True):
+        """
+            Assert that a subscription has (or has not) been updated
+
+            @param resource_id: the pr_subscription_resource record ID
+            @param notified: whether the subscription should be updated
+        """
+
+        rtable = current.s3db.pr_subscription_resource
+        row = current.db(rtable.id == resource_id).select(rtable.locked,
+                                                          rtable.last_check_time,
+                                                          limitby = (0, 1),
+                                                          ).first()
+        self.assertFalse(row.locked)
+        if notified:
+            self.assertTrue(row.last_check_time > self.last_check_time)
+        else:
+            self.assertEqual(row.last_check_time, self.last_check_time)
+
+    # -------------------------------------------------------------------------
+    def testGrouping(self):
+        """ Test grouping of subscriptions by resource and filter """
+
+        assertEqual = self.assertEqual
+
+        pe_ids = self.pe_ids
+
+        # Same resource and filter => same group
+        r1 = self.subscribe(pe_ids[0])
+        r2 = self.subscribe(pe_ids[1])
+
+        # Different filter => separate group
+        r3 = self.subscribe(pe_ids[0],
+                            filter_query = '[["~.name__like", "NotifyBatch*"]]',
+                            )
+
+        # Different last check time => separate group
+        last_check_time = self.last_check_time - datetime.timedelta(hours=1)
+        r4 = self.subscribe(pe_ids[1], last_check_time=last_check_time)
+
+        TestNotifications.notify_batch([r1, r2, r3, r4])
+
+        groups = sorted(sorted(group) for group in TestNotifications.groups)
+        assertEqual(groups, sorted([sorted([r1, r2]), [r3], [r4]]))
+
+        assertEqual(TestNotifications.fallbacks, [])
+
+    # -------------------------------------------------------------------------
+    def testDeliverOnce(self):
+        """ Test that every subscriber receives exactly one message """
+
+        assertEqual = self.assertEqual
+
+        pe_ids = self.pe_ids
+
+        r1 = self.subscribe(pe_ids[0])
+        r2 = self.subscribe(pe_ids[1])
+
+        TestNotifications.notify_batch([r1, r2])
+
+        # One delivery to both subscribers
+        deliveries = TestNotifications.deliveries
+        assertEqual(len(deliveries), 1)
+        assertEqual(sorted(deliveries[0]), sorted(pe_ids))
+
+        assertEqual(TestNotifications.fallbacks, [])
+
+        # Both subscriptions updated and unlocked
+        self.assertNotified(r1)
+        self.assertNotified(r2)
+
+    # -------------------------------------------------------------------------
+    def testFallback(self):
+        """ Test fallback to notify() for subscriptions not yet notified """
+
+        assertEqual = self.assertEqual
+
+        pe_ids = self.pe_ids
+
+        # Different email formats => two deliveries in the same group
+        r1 = self.subscribe(pe_ids[0], email_format="text")
+        r2 = self.subscribe(pe_ids[1], email_format="html")
+
+        # Fail at the second delivery
+        TestNotifications.fail_after = 1
+        TestNotifications.notify_batch([r1, r2])
+
+        assertEqual(len(TestNotifications.groups), 1)
+
+        # One subscriber has been notified in-process...
+        deliveries = TestNotifications.deliveries
+        assertEqual(len(deliveries), 1)
+        assertEqual(len(deliveries[0]), 1)
+        delivered = r1 if deliveries[0][0] == pe_ids[0] else r2
+        self.assertNotified(delivered)
+
+        # ...and only the other one falls back to notify()
+        fallbacks = TestNotifications.fallbacks
+        assertEqual(len(fallbacks), 1)
+        self.assertNotEqual(fallbacks[0], delivered)
+        self.assertTrue(fallbacks[0] in (r1, r2))
+
+    # -------------------------------------------------------------------------
+    def testFallbackAll(self):
+        """ Test fallback to notify() for a group that fails entirely """
+
+        assertEqual = self.assertEqual
+
+        r1 = self.subscribe(self.pe_ids[0])
+
+        # Fail at the first delivery
+        TestNotifications.fail_after = 0
+        TestNotifications.notify_batch([r1])
+
+        assertEqual(TestNotifications.deliveries, [])
+        assertEqual(TestNotifications.fallbacks, [r1])
+
+# =============================================================================
+def run_suite(*test_classes):
+    """ Run the test suite """
+
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    for test_class in test_classes:
+        tests = loader.loadTestsFromTestCase(test_class)
+        suite.addTests(tests)
+    if suite is not None:
+        unittest.TextTestRunner(verbosity=2).run(suite)
+    return
+
+if __name__ == "__main__":
+
+    run_suite(
+        NotifyBatchTests,
+    )
+
+# END ========================================================================
@@ -2592,6 +2592,89 @@ class URLQueryParserTests(unittest.TestCase):
                                   (i, v, k, actual),
                             )
 
+# =============================================================================
+class URLFilterCacheTests(unittest.TestCase):
+    """ Tests for the caching of parsed filter expressions and field paths """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        current.response.s3.field_path_cache = None
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        current.response.s3.field_path_cache = None
+
+    # -------------------------------------------------------------------------
+    def testGrammarShared(self):
+        """ Test that the grammar is built only once """
+
+        if not PYPARSING:
+            return
+
+        p1 = S3URLQueryParser()
+        p2 = S3URLQueryParser()
+        self.assertTrue(p1.parser is p2.parser)
+
+    # -------------------------------------------------------------------------
+    def testExpressionCache(self):
+        """ Test that cached filter expressions are returned as copies """
+
+        if not PYPARSING:
+            return
+
+        p = S3URLQueryParser()
+
+        expr = "~.name like \"Test*\" and ~.organisation_id$name eq \"Org\""
+        first = p.parse(expr)
+        second = p.parse(expr)
+
+        self.assertTrue(None in second)
+        self.assertFalse(first[None] is second[None])
+        self.assertEqual(first[None].serialize_url(),
+                         second[None].serialize_url())
+
+    # -------------------------------------------------------------------------
+    def testLRU(self):
+        """ Test LRU eviction """
+
+        from s3.s3query import S3FilterCache
+
+        assertEqual = self.assertEqual
+
+        cache = S3FilterCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+
+        # Access "a" => "b" is the least recently used entry
+        assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+
+        assertEqual(cache.get("b"), None)
+        assertEqual(cache.get("a"), 1)
+        assertEqual(cache.get("c"), 3)
+
+    # -------------------------------------------------------------------------
+    def testFieldPathCache(self):
+        """ Test caching of resolved field paths """
+
+        from s3.s3query import S3FieldPath
+
+        resource = current.s3db.resource("pr_person")
+
+        # Plain foreign key paths are cached
+        first = S3FieldPath.resolve(resource, "pe_id$pe_type")
+        second = S3FieldPath.resolve(resource, "pe_id$pe_type")
+        self.assertFalse(first.bound)
+        self.assertFalse(first is second)
+        self.assertEqual(first.colname, second.colname)
+        self.assertEqual(first.joins.keys(), second.joins.keys())
+
+        # Component paths depend on the resource
+        path = S3FieldPath.resolve(resource, "contact.value")
+        self.assertTrue(path.bound)
+
 # =============================================================================
 class AIRegexTests(unittest.TestCase):
     """ Tests for accent-insensitive LIKE """
@@ -2748,6 +2831,7 @@ if __name__ == "__main__":
 
         URLQueryTests,
         URLQueryParserTests,
+        URLFilterCacheTests,
 
         URLQuerySerializerTests,
         URLFilterSerializerTests,
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+#
+# S3PivotTable Unit Tests
+#
+# To run this script use:
+# python web2py.py -S eden -M -R applications/eden/modules/unit_tests/s3/s3report.py
+#
+import unittest
+
+from gluon import *
+from s3 import s3_meta_fields, S3PivotTable, S3PivotTableFact
+
+# =============================================================================
+class S3PivotTableAggregationTests(unittest.TestCase):
+    """ Tests for the database aggregation of S3PivotTable """
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def setUpClass(cls):
+
+        s3db = current.s3db
+
+        s3db.define_table("test_report_type",
+                          Field("name"),
+                          *s3_meta_fields())
+
+        s3db.define_table("test_report",
+                          Field("category"),
+                          Field("type_id", "reference test_report_type"),
+                          Field("tags", "list:string"),
+                          Field("value", "integer"),
+                          Field("amount", "double"),
+                          *s3_meta_fields())
+
+        db = current.db
+        current.auth.override = True
+
+        ttable = db.test_report_type
+        type_a = ttable.insert(name="Type A")
+        type_b = ttable.insert(name="Type B")
+
+        table = db.test_report
+        data = (("Cat 1", type_a, ["x"], 3, 1.5),
+                ("Cat 1", type_b, ["x", "y"], 7, None),
+                ("Cat 2", type_a, ["y"], None, 2.0),
+                ("Cat 2", type_a, [], 5, 4.5),
+                ("Cat 3", None, ["z"], 1, 0.5),
+                )
+        for category, type_id, tags, value, amount in data:
+            table.insert(category = category,
+                         type_id = type_id,
+                         tags = tags,
+                         value = value,
+                         amount = amount,
+                         )
+        current.db.commit()
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def tearDownClass(cls):
+
+        db = current.db
+        db.test_report.drop()
+        db.test_report_type.drop()
+        db.commit()
+
+        current.auth.override = False
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.setting = current.deployment_settings.ui.get("report_db_aggregation")
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        current.deployment_settings.ui.report_db_aggregation = self.setting
+
+    # -------------------------------------------------------------------------
+    def pivottable(self, rows, cols, fact, aggregate=True):
+        """ Generate a pivot table for the test resource """
+
+        current.deployment_settings.ui.report_db_aggregation = aggregate
+
+        resource = current.s3db.resource("test_report")
+        facts = S3PivotTableFact.parse(fact)
+        return S3PivotTable(resource, rows, cols, facts)
+
+    # -------------------------------------------------------------------------
+    def assertSameResult(self, rows, cols, fact):
+        """ Assert that DB aggregation gives the same JSON as Python pivoting """
+
+        expected = self.pivottable(rows, cols, fact, aggregate=False)
+        pivottable = self.pivottable(rows, cols, fact)
+
+        self.assertEqual(len(pivottable), len(expected))
+        self.assertEqual(self.normalize(pivottable.json()),
+                         self.normalize(expected.json()))
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def normalize(data):
+        """
+            Strip the internal row/column indices and lookup keys from
+            the JSON data (these depend on the order of extraction)
+        """
+
+        lookups = data["lookups"]
+        facts = data["facts"]
+
+        rows = [item[1:] for item in data["rows"]]
+        cols = [item[1:] for item in data["cols"]]
+
+        cells = []
+        for orow in data["cells"]:
+            for ocell in orow:
+                keys = []
+                for index, layer_keys in enumerate(ocell["keys"]):
+                    if layer_keys is None:
+                        keys.append(None)
+                    else:
+                        lookup = lookups[facts[index][0]]
+                        keys.append(sorted(lookup[k] for k in layer_keys))
+                cells.append((ocell["values"], ocell["items"], keys))
+
+        return rows, cols, cells, data["total"], data["labels"]
+
+    # -------------------------------------------------------------------------
+    def testCanAggregate(self):
+        """ Test detection of dimensions and facts for DB aggregation """
+
+        assertTrue = self.assertTrue
+        assertFalse = self.assertFalse
+
+        pt = self.pivottable("category", "type_id", "sum(value)")
+        assertTrue(pt._can_aggregate())
+
+        # Foreign key chains are single-valued
+        pt = self.pivottable("type_id$name", None, "avg(amount)")
+        assertTrue(pt._can_aggregate())
+
+        # List-type dimensions are not
+        pt = self.pivottable("tags", None, "count(id)")
+        assertFalse(pt._can_aggregate())
+
+        # List method is not available as SQL aggregate
+        pt = self.pivottable("category", None, "list(value)")
+        assertFalse(pt._can_aggregate())
+
+        # Sum of non-numeric fields can not be aggregated in the DB
+        pt = self.pivottable("category", None, "sum(category)")
+        assertFalse(pt._can_aggregate())
+
+        # Respect the deployment setting
+        pt = self.pivottable("category", None, "count(id)", aggregate=False)
+        assertFalse(pt._can_aggregate())
+
+    # -------------------------------------------------------------------------
+    def testAggregation(self):
+        """ Test that DB aggregation produces the same results """
+
+        check = self.assertSameResult
+
+        check("category", None, "count(id)")
+        check("category", "type_id", "count(id)")
+        check("type_id$name", "category", "sum(value)")
+        check("category", "type_id", "avg(amount)")
+        check(None, "category", "min(value),max(amount)")
+        check("category", "type_id", "count(value),sum(amount)")
+
+    # -------------------------------------------------------------------------
+    def testTotals(self):
+        """ Test row, column and grand totals of DB aggregation """
+
+        assertEqual = self.assertEqual
+
+        pt = self.pivottable("category", None, "sum(value)")
+        layer = ("test_report.value", "sum")
+
+        assertEqual(pt.numrows, 3)
+        assertEqual(pt.numcols, 1)
+        assertEqual(len(pt), 5)
+
+        totals = dict((row.value, row[layer]) for row in pt.row)
+        assertEqual(totals, {"Cat 1": 10, "Cat 2": 5, "Cat 3": 1})
+        assertEqual(pt.totals[layer], 16)
+
+# =============================================================================
+def run_suite(*test_classes):
+    """ Run the test suite """
+
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    for test_class in test_classes:
+        tests = loader.loadTestsFromTestCase(test_class)
+        suite.addTests(tests)
+    if suite is not None:
+        unittest.TextTestRunner(verbosity=2).run(suite)
+    return
+
+if __name__ == "__main__":
+
+    run_suite(
+        S3PivotTableAggregationTests,
+    )
+
+# END ========================================================================
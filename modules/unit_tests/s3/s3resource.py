@@ -7,6 +7,7 @@
 #
 import unittest
 import datetime
+import json
 from lxml import etree
 from gluon import *
 from gluon.storage import Storage
@@ -387,6 +388,134 @@ class ResourceExportTests(unittest.TestCase):
             current.db.rollback()
             auth.override = False
 
+    # -------------------------------------------------------------------------
+    def testExportStream(self):
+        """ Test incremental export of a resource """
+
+        assertEqual = self.assertEqual
+        assertTrue = self.assertTrue
+
+        auth = current.auth
+        auth.override = True
+
+        xmlstr = """
+<s3xml>
+    <resource name="org_organisation" uuid="ESORG1">
+        <data field="name">TestExportStreamOrganisation1</data>
+    </resource>
+    <resource name="org_office" uuid="ESO1">
+        <data field="name">TestExportStreamOffice1</data>
+        <reference field="organisation_id" resource="org_organisation" uuid="ESORG1"/>
+    </resource>
+    <resource name="org_office" uuid="ESO2">
+        <data field="name">TestExportStreamOffice2</data>
+        <reference field="organisation_id" resource="org_organisation" uuid="ESORG1"/>
+    </resource>
+    <resource name="org_office" uuid="ESO3">
+        <data field="name">TestExportStreamOffice3</data>
+        <reference field="organisation_id" resource="org_organisation" uuid="ESORG1"/>
+    </resource>
+</s3xml>"""
+
+        try:
+            xmltree = etree.ElementTree(etree.fromstring(xmlstr))
+            resource = current.s3db.resource("org_office")
+            resource.import_xml(xmltree)
+
+            uids = ["ESO1", "ESO2", "ESO3"]
+
+            # Strip the domain prefix from exported UIDs
+            uid = lambda value: value.rsplit("/", 1)[-1]
+
+            # XML, one record per chunk
+            resource = current.s3db.resource("org_office", uid=uids)
+            output = resource.export_stream(chunk_size=1, mcomponents=None)
+            root = etree.fromstring("".join(output))
+
+            attrib = root.attrib
+            assertEqual(attrib["success"], "true")
+            assertEqual(attrib["results"], "3")
+
+            offices = root.xpath("resource[@name='org_office']")
+            assertEqual(sorted(uid(e.get("uuid")) for e in offices), uids)
+
+            # Referenced organisation exported only once
+            organisations = root.xpath("resource[@name='org_organisation']")
+            assertEqual(len(organisations), 1)
+            assertEqual(organisations[0].get("ref"), "True")
+
+            # JSON
+            resource = current.s3db.resource("org_office", uid=uids)
+            output = resource.export_stream(chunk_size=2,
+                                            mcomponents=None,
+                                            as_json=True,
+                                            )
+            data = json.loads("".join(output))
+            assertEqual(data["@results"], "3")
+            assertEqual(sorted(uid(item["@uuid"]) for item in data["$_org_office"]),
+                        uids)
+            assertEqual(len(data["$_org_organisation"]), 1)
+
+            # Same as the standard export
+            resource = current.s3db.resource("org_office", uid=uids)
+            expected = json.loads(resource.export_xml(mcomponents=None,
+                                                      as_json=True,
+                                                      ))
+            assertTrue(all(k in data for k in expected))
+
+        finally:
+            current.db.rollback()
+            auth.override = False
+
+    # -------------------------------------------------------------------------
+    def testExportStreamReferencedMaster(self):
+        """ Test incremental export of master records referenced from a previous chunk """
+
+        assertEqual = self.assertEqual
+
+        auth = current.auth
+        auth.override = True
+
+        s3db = current.s3db
+
+        try:
+            # Child location exported before the parent it references
+            ltable = s3db.gis_location
+            child_id = ltable.insert(name="ExportStreamChild", uuid="ESLC")
+            parent_id = ltable.insert(name="ExportStreamParent", uuid="ESLP")
+            current.db(ltable.id == child_id).update(parent=parent_id)
+
+            # Tag of the parent
+            s3db.gis_location_tag.insert(location_id = parent_id,
+                                         tag = "ESTAG",
+                                         value = "ESVALUE",
+                                         )
+
+            resource = s3db.resource("gis_location", id=[child_id, parent_id])
+            output = resource.export_stream(chunk_size=1)
+            root = etree.fromstring("".join(output))
+
+            assertEqual(root.get("results"), "2")
+
+            # Strip the domain prefix from exported UIDs
+            uid = lambda value: value.rsplit("/", 1)[-1]
+
+            parents = [e for e in root.xpath("resource[@name='gis_location']")
+                       if uid(e.get("uuid")) == "ESLP"]
+
+            # Exported as reference by the first chunk, and in full by the
+            # second chunk (including components)
+            assertEqual(len(parents), 2)
+            assertEqual(parents[0].get("ref"), "True")
+            assertEqual(parents[0].xpath("resource[@name='gis_location_tag']"), [])
+            self.assertNotEqual(parents[1].get("ref"), "True")
+            tags = parents[1].xpath("resource[@name='gis_location_tag']")
+            assertEqual(len(tags), 1)
+
+        finally:
+            current.db.rollback()
+            auth.override = False
+
     # -------------------------------------------------------------------------
     @unittest.skipIf(current.deployment_settings.get_database_type() == "postgres", "not working for postgres")
     def testExportTreeWithMSince(self):
@@ -849,6 +978,116 @@ class ResourceDataObjectAPITests (unittest.TestCase):
             auth.override = False
             current.db.rollback()
 
+    # -------------------------------------------------------------------------
+    def testKeysetPagination(self):
+        """ Test keyset pagination and iterselect """
+
+        assertEqual = self.assertEqual
+
+        s3db = current.s3db
+        auth = current.auth
+        auth.override = True
+
+        otable = s3db.org_organisation
+        acronyms = ("KTB", None, "KTA", "KTB", None, "KTC", "KTA")
+        try:
+            record_ids = []
+            for i, acronym in enumerate(acronyms):
+                record_ids.append(otable.insert(name="KeysetTest%s" % i,
+                                                acronym=acronym))
+
+            # Expected order: acronym (NULLs last), then ID
+            expected = sorted(zip(acronyms, record_ids),
+                              key=lambda item: (item[0] is None, item[0], item[1]))
+            expected = [record_id for acronym, record_id in expected]
+
+            query = (FS("name").like("KeysetTest%"))
+            fields = ["id", "name", "acronym"]
+            orderby = "org_organisation.acronym"
+
+            # Page through with keyset pagination
+            resource = s3db.resource("org_organisation", filter=query)
+            result = []
+            after = None
+            while True:
+                data = resource.select(fields,
+                                       limit=3,
+                                       orderby=orderby,
+                                       count=True,
+                                       keyset=True,
+                                       after=after)
+                assertEqual(data.numrows, len(acronyms))
+                result.extend(row["org_organisation.id"] for row in data.rows)
+                if len(data.rows) < 3:
+                    break
+                after = data.next_key
+            assertEqual(result, expected)
+
+            # Iterate over all records
+            resource = s3db.resource("org_organisation", filter=query)
+            rows = resource.iterselect(fields, orderby=orderby, chunk_size=2)
+            assertEqual([row["org_organisation.id"] for row in rows], expected)
+
+            # Descending order
+            resource = s3db.resource("org_organisation", filter=query)
+            rows = resource.iterselect(fields,
+                                       orderby="org_organisation.acronym desc",
+                                       chunk_size=3)
+            result = [row["org_organisation.acronym"] for row in rows]
+            assertEqual(result, ["KTC", "KTB", "KTB", "KTA", "KTA", None, None])
+
+        finally:
+            auth.override = False
+            current.db.rollback()
+
+    # -------------------------------------------------------------------------
+    def testCountStrategy(self):
+        """ Test count strategies """
+
+        assertEqual = self.assertEqual
+
+        s3db = current.s3db
+        auth = current.auth
+        auth.override = True
+
+        settings = current.deployment_settings
+        strategy = settings.database.get("count_strategy")
+
+        otable = s3db.org_organisation
+        query = (FS("name").like("CountTest%"))
+        try:
+            otable.insert(name="CountTest1")
+
+            # Cached count
+            settings.database.count_strategy = "cached"
+            resource = s3db.resource("org_organisation", filter=query)
+            assertEqual(resource.count(), 1)
+            assertEqual(resource.count_estimated, False)
+
+            otable.insert(name="CountTest2")
+            resource = s3db.resource("org_organisation", filter=query)
+            assertEqual(resource.count(), 1)
+
+            # Select with count uses the same strategy
+            data = resource.select(["id"], limit=1, count=True)
+            assertEqual(data.numrows, 1)
+
+            # Exact count
+            settings.database.count_strategy = "exact"
+            resource = s3db.resource("org_organisation", filter=query)
+            assertEqual(resource.count(), 2)
+
+            # Estimate falls back to exact count below threshold
+            settings.database.count_strategy = "estimate"
+            resource = s3db.resource("org_organisation", filter=query)
+            assertEqual(resource.count(), 2)
+            assertEqual(resource.count_estimated, False)
+
+        finally:
+            settings.database.count_strategy = strategy
+            auth.override = False
+            current.db.rollback()
+
 # =============================================================================
 class MergeOrganisationsTests(unittest.TestCase):
     """ Test merging org_organisation records """
@@ -437,6 +437,149 @@ class ImportMergeWithoutExistingRecords(unittest.TestCase):
         current.auth.override = False
         current.db.rollback()
 
+# =============================================================================
+class PagedSyncTests(unittest.TestCase):
+    """ Tests for paged synchronization """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        from gluon.storage import Storage
+        from s3.s3sync import S3SyncRepository
+
+        repository = S3SyncRepository(Storage(id = None,
+                                               name = "PagedSyncTest",
+                                               apitype = "eden",
+                                               ))
+        self.adapter = repository.adapter
+
+    # -------------------------------------------------------------------------
+    def testToken(self):
+        """ Test encoding/decoding of continuation tokens """
+
+        import datetime
+
+        adapter = self.adapter
+        assertEqual = self.assertEqual
+
+        mtime = datetime.datetime(2015, 3, 12, 8, 30, 15, 120000)
+        uid = "urn:uuid:0b8c2c56-a9e4-4b80-9c5f-3c1dd5ba5f6e"
+
+        token = adapter.encode_token(mtime, uid)
+        assertEqual(adapter.decode_token(token), (mtime, uid))
+
+        mtime = mtime.replace(microsecond=0)
+        token = adapter.encode_token(mtime, uid)
+        assertEqual(adapter.decode_token(token), (mtime, uid))
+
+        assertEqual(adapter.decode_token(""), (None, None))
+        assertEqual(adapter.decode_token("invalid"), (None, None))
+
+    # -------------------------------------------------------------------------
+    def testExportPages(self):
+        """ Test paged export in (modified_on, uuid) order """
+
+        import datetime
+
+        db = current.db
+        s3db = current.s3db
+
+        auth = current.auth
+        auth.override = True
+
+        adapter = self.adapter
+
+        table = s3db.org_organisation
+        mtime = datetime.datetime(2015, 1, 1, 12, 0, 0)
+        uids = []
+        try:
+            # Records with identical modified_on
+            for i in xrange(5):
+                uid = "PAGEDSYNCTEST%s" % i
+                table.insert(name = "PagedSyncTest%s" % i,
+                             uuid = uid,
+                             modified_on = mtime,
+                             )
+                uids.append(uid)
+
+            exported = []
+            token = ""
+            pages = 0
+            while token is not None:
+                resource = s3db.resource("org_organisation",
+                                         filter = table.uuid.belongs(uids),
+                                         include_deleted = True,
+                                         )
+                output, count, muntil, token = \
+                    adapter._export_page(resource, token, 2)
+                tree = etree.XML(output)
+                exported.extend(tree.xpath("resource[@name='org_organisation']/@uuid"))
+                pages += 1
+                self.assertTrue(pages <= 3)
+
+            # All records exported, each only once, in uuid order
+            self.assertEqual(exported, uids)
+
+        finally:
+            db.rollback()
+            auth.override = False
+
+    # -------------------------------------------------------------------------
+    def testTaskGroups(self):
+        """ Test grouping of sync tasks by references """
+
+        from gluon.storage import Storage
+        from s3.s3sync import S3Sync
+
+        tasks = [Storage(id=1, resource_name="org_organisation"),
+                 Storage(id=2, resource_name="pr_person"),
+                 Storage(id=3, resource_name="org_office"),
+                 Storage(id=4, resource_name="supply_item_category"),
+                 ]
+
+        groups = S3Sync.task_groups(tasks)
+        # Organisations, persons and offices are all person entities
+        self.assertTrue([1, 2, 3] in groups)
+        self.assertTrue([4] in groups)
+
+        # Links through super-entities (pe_id)
+        tasks = [Storage(id=1, resource_name="pr_person"),
+                 Storage(id=2, resource_name="supply_item_category"),
+                 Storage(id=3, resource_name="pr_contact"),
+                 ]
+        groups = S3Sync.task_groups(tasks)
+        self.assertEqual(groups, [[1, 3], [2]])
+
+        # Links through super-entities (site_id)
+        tasks = [Storage(id=1, resource_name="hrm_human_resource"),
+                 Storage(id=2, resource_name="supply_item_category"),
+                 Storage(id=3, resource_name="org_facility"),
+                 ]
+        groups = S3Sync.task_groups(tasks)
+        self.assertEqual(groups, [[1, 3], [2]])
+
+    # -------------------------------------------------------------------------
+    def testTaskGroupDone(self):
+        """ Test that sync remains running until all task groups are done """
+
+        from s3.s3sync import S3Sync
+
+        sync = S3Sync()
+        try:
+            sync.set_status(running=True, pending=2)
+
+            sync.task_group_done()
+            status = sync.get_status()
+            self.assertTrue(status.running)
+            self.assertEqual(status.pending, 1)
+
+            sync.task_group_done()
+            status = sync.get_status()
+            self.assertFalse(status.running)
+            self.assertEqual(status.pending, 0)
+        finally:
+            current.db.rollback()
+
 # =============================================================================
 def run_suite(*test_classes):
     """ Run the test suite """
@@ -458,7 +601,8 @@ if __name__ == "__main__":
         ImportMergeWithExistingRecords,
         ImportMergeWithExistingOriginal,
         ImportMergeWithExistingDuplicate,
-        ImportMergeWithoutExistingRecords
+        ImportMergeWithoutExistingRecords,
+        PagedSyncTests,
     )
 
 # END ========================================================================
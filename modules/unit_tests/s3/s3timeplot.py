@@ -6,6 +6,7 @@
 # python web2py.py -S eden -M -R applications/eden/modules/unit_tests/s3/s3timeplot.py
 #
 import datetime
+import math
 import random
 import unittest
 import dateutil.tz
@@ -1126,6 +1127,92 @@ class EventFrameTests(unittest.TestCase):
                                        ])
             assertEqual(result, expected_result)
 
+    # -------------------------------------------------------------------------
+    def testAggregate(self):
+        """ Test aggregation of all periods at once """
+
+        assertEqual = self.assertEqual
+
+        facts = [S3TimeSeriesFact("count", "test"),
+                 S3TimeSeriesFact("sum", "test"),
+                 S3TimeSeriesFact("avg", "test"),
+                 S3TimeSeriesFact("cumulate",
+                                  "test",
+                                  slope="test",
+                                  interval="months",
+                                  ),
+                 ]
+
+        # Create event frame and add events (with series keys)
+        events = []
+        for event in self.events:
+            events.append(S3TimeSeriesEvent(event.event_id,
+                                            start = event.start,
+                                            end = event.end,
+                                            values = event.values,
+                                            row = event.event_id % 2,
+                                            col = "A" if event.event_id < 5 else "B",
+                                            ))
+        ef = S3TimeSeriesEventFrame(tp_datetime(2012,1,1),
+                                    tp_datetime(2012,12,15),
+                                    slots="months")
+        ef.extend(events)
+
+        # Aggregate all periods at once
+        self.assertTrue(ef.aggregate(facts))
+        results = [(period.totals, period.rows, period.cols, period.matrix)
+                   for period in ef]
+
+        # Compare with per-period aggregation
+        for i, period in enumerate(ef):
+            totals = period.aggregate(facts)
+            assertEqual(results[i], (totals,
+                                     period.rows,
+                                     period.cols,
+                                     period.matrix,
+                                     ))
+
+        # Methods without single-sweep aggregation fall back to per-period
+        self.assertFalse(ef.aggregate([S3TimeSeriesFact("max", "test")]))
+        for period in ef:
+            self.assertEqual(period.totals, None)
+
+    # -------------------------------------------------------------------------
+    def testAggregateFloats(self):
+        """ Test aggregation of float values in the single sweep """
+
+        assertEqual = self.assertEqual
+
+        # Events with float values, ending in different periods
+        events = []
+        expected = [[] for i in xrange(12)]
+        for i in xrange(60):
+            value = 0.1 * (i % 7) + 1e-3 * i
+            start = i % 12 + 1
+            end = min(start + i % 5, 12)
+            events.append(S3TimeSeriesEvent(i + 1,
+                                            start = tp_datetime(2012, start, 1),
+                                            end = tp_datetime(2012, end, 15),
+                                            values = {"test": value},
+                                            ))
+            for month in xrange(start - 1, end):
+                expected[month].append(value)
+
+        ef = S3TimeSeriesEventFrame(tp_datetime(2012,1,1),
+                                    tp_datetime(2013,1,1),
+                                    slots="months")
+        ef.extend(events)
+
+        facts = [S3TimeSeriesFact("sum", "test"),
+                 S3TimeSeriesFact("avg", "test"),
+                 ]
+        self.assertTrue(ef.aggregate(facts))
+
+        # Correctly rounded sums per period, no residue of the differences
+        for period, values in zip(ef, expected):
+            total = math.fsum(values)
+            assertEqual(period.totals, [total, total / len(values)])
+
     # -------------------------------------------------------------------------
     def testPeriodsDays(self):
         """ Test iteration over periods (days) """
@@ -175,6 +175,81 @@ class S3FKWrappersTests(unittest.TestCase):
         #self.assertEqual(key, None)
         #self.assertEqual(multiple, None)
 
+# =============================================================================
+class S3TableVersionTests(unittest.TestCase):
+    """ Tests for s3_table_version """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        current.auth.override = True
+
+        # Start with a new request
+        current.response.s3.table_versions = None
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        current.db.rollback()
+        current.response.s3.table_versions = None
+        current.auth.override = False
+
+    # -------------------------------------------------------------------------
+    def version(self, tablename):
+        """
+            Helper to look up the table version as in a new request
+
+            @param tablename: the table name
+        """
+
+        return s3_table_version(tablename, cached=False)
+
+    # -------------------------------------------------------------------------
+    def testWrites(self):
+        """ Test that every write changes the table version """
+
+        assertNotEqual = self.assertNotEqual
+
+        db = current.db
+        table = current.s3db.org_organisation
+
+        # Insert
+        version = self.version("org_organisation")
+        record_id = table.insert(name="TableVersionTestOrg")
+        assertNotEqual(self.version("org_organisation"), version)
+
+        # Update in the same second, same number of rows
+        version = self.version("org_organisation")
+        db(table.id == record_id).update(name="TableVersionTestOrg2")
+        assertNotEqual(self.version("org_organisation"), version)
+
+        # Delete
+        version = self.version("org_organisation")
+        db(table.id == record_id).delete()
+        assertNotEqual(self.version("org_organisation"), version)
+
+    # -------------------------------------------------------------------------
+    def testTables(self):
+        """ Test that versions are separate per table """
+
+        assertEqual = self.assertEqual
+
+        version = self.version("org_office")
+        current.s3db.org_organisation.insert(name="TableVersionTestOrg")
+        assertEqual(self.version("org_office"), version)
+
+        # Undefined table
+        assertEqual(s3_table_version("org_undefined_table"), None)
+
+    # -------------------------------------------------------------------------
+    def testCached(self):
+        """ Test re-use of the version within the same request """
+
+        version = s3_table_version("org_organisation")
+        current.s3db.org_organisation.insert(name="TableVersionTestOrg")
+        self.assertEqual(s3_table_version("org_organisation"), version)
+        self.assertNotEqual(self.version("org_organisation"), version)
+
 # =============================================================================
 def run_suite(*test_classes):
     """ Run the test suite """
@@ -193,6 +268,7 @@ if __name__ == "__main__":
     run_suite(
         S3TypeConverterTests,
         S3FKWrappersTests,
+        S3TableVersionTests,
     )
 
 # END ========================================================================
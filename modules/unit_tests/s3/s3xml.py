@@ -6,6 +6,8 @@
 # python web2py.py -S eden -M -R applications/eden/modules/unit_tests/s3/s3xml.py
 #
 import unittest
+from copy import deepcopy
+
 from gluon import *
 from gluon.contrib import simplejson as json
 
@@ -177,6 +179,98 @@ class JSONMessageTests(unittest.TestCase):
         self.assertEqual(len(tree), 1)
         self.assertEqual(tree["test"], "value")
 
+# =============================================================================
+class JSONStreamTests(unittest.TestCase):
+    """ Test streamed JSON conversion of S3XML trees """
+
+    xmlstr = """
+<s3xml success="true" results="3" start="0" domain="test">
+    <resource name="org_office" uuid="JSO1">
+        <data field="name">TestJSONStreamOffice1</data>
+        <reference field="organisation_id" resource="org_organisation" uuid="JSORG1"/>
+    </resource>
+    <resource name="org_organisation" uuid="JSORG1">
+        <data field="name">TestJSONStreamOrganisation1</data>
+        <data field="acronym" value="&quot;JSO&quot;">JSO</data>
+    </resource>
+    <resource name="org_office" uuid="JSO2">
+        <data field="name">TestJSONStreamOffice2</data>
+        <resource name="org_office_type" uuid="JSOT1">
+            <data field="name">TestJSONStreamOfficeType1</data>
+        </resource>
+    </resource>
+    <resource name="gis_location" uuid="JSL1">
+        <data field="name">TestJSONStreamLocation1</data>
+    </resource>
+</s3xml>"""
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tree = etree.ElementTree(etree.fromstring(self.xmlstr))
+
+    # -------------------------------------------------------------------------
+    def stream(self, pretty_print=False):
+        """ Convert the tree with tree2json_stream """
+
+        xml = current.xml
+
+        root = self.tree.getroot()
+        elements = [deepcopy(element) for element in root]
+        root = etree.Element(root.tag, dict(root.attrib))
+
+        return "".join(xml.tree2json_stream(root,
+                                            elements,
+                                            pretty_print=pretty_print,
+                                            ))
+
+    # -------------------------------------------------------------------------
+    def testStreamedOutput(self):
+        """ Test that streamed and non-streamed JSON are identical """
+
+        xml = current.xml
+        assertEqual = self.assertEqual
+
+        expected = json.loads(xml.tree2json(self.tree))
+        output = json.loads(self.stream())
+        assertEqual(output, expected)
+
+        # Root attributes
+        assertEqual(output["@success"], "true")
+        assertEqual(output["@results"], "3")
+
+        # Records grouped by table, in order
+        offices = output["$_org_office"]
+        assertEqual([item["@uuid"] for item in offices], ["JSO1", "JSO2"])
+        assertEqual(len(output["$_org_organisation"]), 1)
+        assertEqual(len(output["$_gis_location"]), 1)
+
+    # -------------------------------------------------------------------------
+    def testStreamedOutputPrettyPrint(self):
+        """ Test that pretty-printed streamed output is identical """
+
+        xml = current.xml
+
+        expected = json.loads(xml.tree2json(self.tree, pretty_print=True))
+        output = self.stream(pretty_print=True)
+        self.assertEqual(json.loads(output), expected)
+
+        # No trailing whitespace, same as tree2json
+        self.assertTrue(all(l == l.rstrip() for l in output.splitlines()))
+
+    # -------------------------------------------------------------------------
+    def testEmptyStream(self):
+        """ Test streaming without any elements """
+
+        xml = current.xml
+
+        tree = xml.tree(None)
+        root = tree.getroot()
+
+        expected = json.loads(xml.tree2json(tree))
+        output = json.loads("".join(xml.tree2json_stream(root, [])))
+        self.assertEqual(output, expected)
+
 # =============================================================================
 class XMLFormatTests(unittest.TestCase):
     """ Test S3XMLFormat helper class """
@@ -875,6 +969,7 @@ if __name__ == "__main__":
     run_suite(
         TreeBuilderTests,
         JSONMessageTests,
+        JSONStreamTests,
         XMLFormatTests,
         GetFieldOptionsTests,
     )
@@ -1,3 +1,4 @@
 from pr import *
 from org import *
+from survey import *
 from vulnerability import *
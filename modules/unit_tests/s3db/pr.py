@@ -599,6 +599,224 @@ class ContactValidationTests(unittest.TestCase):
         self.assertNotEqual(row, None)
         self.assertEqual(row.value, "+46733847589")
 
+# =============================================================================
+class PersonNameIndexTests(unittest.TestCase):
+    """ Test the person name index (pr_PersonNameIndex) """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        current.auth.override = True
+
+        s3db = current.s3db
+
+        ptable = s3db.pr_person
+        self.person_ids = []
+        for first_name, last_name in (("Hildegard", "Namesearchtest"),
+                                      ("Hilde", "Namesearchtest"),
+                                      ("Arvid", "Namesearchtester"),
+                                      ):
+            person = Storage(first_name=first_name, last_name=last_name)
+            person_id = ptable.insert(**person)
+            person.update(id=person_id)
+            s3db.update_super(ptable, person)
+            self.person_ids.append(person_id)
+
+        from s3db.pr import pr_PersonNameIndex
+        pr_PersonNameIndex.update(self.person_ids)
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        current.db.rollback()
+        current.auth.override = False
+
+    # -------------------------------------------------------------------------
+    def testTokenize(self):
+        """ Test tokenizing of names """
+
+        from s3db.pr import pr_PersonNameIndex
+        tokenize = pr_PersonNameIndex.tokenize
+
+        self.assertEqual(tokenize("Mary-Ann  O'Brien"), ["mary", "ann", "o", "brien"])
+        self.assertEqual(tokenize("ann ANN"), ["ann"])
+        self.assertEqual(tokenize(None), [])
+
+    # -------------------------------------------------------------------------
+    def testSearch(self):
+        """ Test ranking of search results """
+
+        from s3db.pr import pr_PersonNameIndex
+        search = pr_PersonNameIndex.search
+
+        hildegard, hilde, arvid = self.person_ids
+        ptable = current.s3db.pr_person
+        query = ptable.id.belongs(self.person_ids)
+
+        # Exact matches rank before prefix matches
+        self.assertEqual(search("hilde", query=query), [hilde, hildegard])
+
+        # Matching more terms ranks first
+        result = search("namesearchtest hilde", query=query)
+        self.assertEqual(result[:2], [hilde, hildegard])
+        self.assertEqual(result[2], arvid)
+
+        # Misspelled names are found by trigrams
+        self.assertEqual(search("hildgard", query=query)[0], hildegard)
+
+        # Index entries are removed with the person
+        current.db(ptable.id == arvid).update(deleted=True)
+        pr_PersonNameIndex.update(arvid)
+        self.assertEqual(search("arvid", query=query), [])
+
+    # -------------------------------------------------------------------------
+    def testEntityAutocomplete(self):
+        """ Test the name index in the pe_id autocomplete """
+
+        from gluon.contrib import simplejson as json
+        from s3db.pr import S3PersonEntity
+
+        s3db = current.s3db
+        request = current.request
+        response = current.response
+        settings = current.deployment_settings
+
+        hildegard, hilde, arvid = self.person_ids
+        ptable = s3db.pr_person
+        rows = current.db(ptable.id.belongs(self.person_ids)).select(ptable.id,
+                                                                    ptable.pe_id,
+                                                                    )
+        pe_ids = dict((row.id, row.pe_id) for row in rows)
+
+        name_index = settings.get_pr_name_index()
+        get_vars = request.get_vars
+        s3filter = response.s3.filter
+        try:
+            settings.pr.name_index = True
+            request.get_vars = Storage(term="namesearchtest",
+                                       types="pr_person",
+                                       limit="2",
+                                       )
+
+            # Filter out Hilde => limit applies to the filtered results
+            table = s3db.pr_pentity
+            response.s3.filter = (table.pe_id.belongs(pe_ids.values())) & \
+                                 (table.pe_id != pe_ids[hilde])
+            r = Storage(resource=s3db.resource("pr_pentity"))
+            output = json.loads(S3PersonEntity.pe_search_ac(r))
+            self.assertEqual([item["id"] for item in output],
+                             [pe_ids[hildegard], pe_ids[arvid]])
+
+            # Results are ranked
+            request.get_vars.term = "hilde"
+            response.s3.filter = (table.pe_id.belongs(pe_ids.values()))
+            r = Storage(resource=s3db.resource("pr_pentity"))
+            output = json.loads(S3PersonEntity.pe_search_ac(r))
+            self.assertEqual([item["id"] for item in output],
+                             [pe_ids[hilde], pe_ids[hildegard]])
+        finally:
+            settings.pr.name_index = name_index
+            request.get_vars = get_vars
+            response.s3.filter = s3filter
+
+# =============================================================================
+class OUClosureTests(unittest.TestCase):
+    """ Test the OU closure (pr_ou_closure) """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        current.auth.override = True
+
+        settings = current.deployment_settings
+        self.ou_closure = settings.get_pr_ou_closure()
+        settings.pr.ou_closure = True
+
+        s3db = current.s3db
+
+        # Create test organisations
+        otable = s3db.org_organisation
+        self.pe_ids = []
+        for i in xrange(4):
+            org = Storage(name="Test OU Closure Organisation %s" % i)
+            org_id = otable.insert(**org)
+            org.update(id=org_id)
+            s3db.update_super(otable, org)
+            self.pe_ids.append(s3db.pr_get_pe_id(otable, org_id))
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        current.db.rollback()
+        current.deployment_settings.pr.ou_closure = self.ou_closure
+        current.auth.override = False
+
+    # -------------------------------------------------------------------------
+    def assertIDs(self, result, expected):
+        """ Compare lists of PE-IDs """
+
+        self.assertEqual(sorted(int(i) for i in result),
+                         sorted(int(i) for i in expected))
+
+    # -------------------------------------------------------------------------
+    def testUpdate(self):
+        """ Test incremental update of the closure """
+
+        s3db = current.s3db
+        org0, org1, org2, org3 = self.pe_ids
+
+        # Chain org0 => org1 => org2
+        s3db.pr_add_affiliation(org1, org2, role="TestOrgUnit")
+        s3db.pr_add_affiliation(org0, org1, role="TestOrgUnit")
+
+        self.assertIDs(s3db.pr_get_ancestors(org2), [org0, org1])
+        self.assertIDs(s3db.pr_get_descendants(org0), [org1, org2])
+        self.assertIDs(s3db.pr_descendants([org0])[org0], [org1, org2])
+
+        # Second parent for org2
+        s3db.pr_add_affiliation(org3, org2, role="TestOrgUnit")
+        self.assertIDs(s3db.pr_get_ancestors(org2), [org0, org1, org3])
+
+        # Non-OU roles are not part of the hierarchy
+        s3db.pr_add_affiliation(org3, org0, role="TestPartners", role_type=9)
+        self.assertIDs(s3db.pr_get_ancestors(org0), [])
+
+        # Remove org1 from org0
+        s3db.pr_remove_affiliation(org0, org1, role="TestOrgUnit")
+        self.assertIDs(s3db.pr_get_ancestors(org2), [org1, org3])
+        self.assertIDs(s3db.pr_get_descendants(org0), [])
+
+        # Cycles are allowed
+        s3db.pr_add_affiliation(org2, org1, role="TestOrgUnit")
+        self.assertIDs(s3db.pr_get_ancestors(org1), [org2, org3])
+        self.assertIDs(s3db.pr_get_ancestors(org2), [org1, org3])
+
+    # -------------------------------------------------------------------------
+    def testRebuild(self):
+        """ Test that a rebuild produces the same closure """
+
+        db = current.db
+        s3db = current.s3db
+        org0, org1, org2, org3 = self.pe_ids
+
+        s3db.pr_add_affiliation(org0, org1, role="TestOrgUnit")
+        s3db.pr_add_affiliation(org1, org2, role="TestOrgUnit")
+        s3db.pr_add_affiliation(org0, org3, role="TestOrgUnit")
+
+        ctable = s3db.pr_ou_closure
+        query = (ctable.descendant_id.belongs(self.pe_ids))
+        pairs = lambda: sorted((row.ancestor_id, row.descendant_id)
+                               for row in db(query).select(ctable.ancestor_id,
+                                                           ctable.descendant_id))
+        before = pairs()
+        s3db.pr_rebuild_closure()
+        self.assertEqual(pairs(), before)
+
+        self.assertIDs(s3db.pr_get_descendants(org0), [org1, org2, org3])
+        self.assertIDs(s3db.pr_get_descendants(org0,
+                                               entity_types="org_organisation"),
+                       [org1, org2, org3])
+
 # =============================================================================
 def run_suite(*test_classes):
     """ Run the test suite """
@@ -618,6 +836,8 @@ if __name__ == "__main__":
         PRTests,
         PersonDeduplicateTests,
         ContactValidationTests,
+        PersonNameIndexTests,
+        OUClosureTests,
     )
 
 # END ========================================================================
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+#
+# Survey Unit Tests
+#
+# To run this script use:
+# python web2py.py -S eden -M -R applications/eden/modules/unit_tests/s3db/survey.py
+#
+import unittest
+
+from gluon import *
+from gluon.storage import Storage
+
+# =============================================================================
+@unittest.skipIf(not current.deployment_settings.has_module("survey"),
+                 "survey module disabled")
+class AnswerMatrixTests(unittest.TestCase):
+    """ Tests for the survey answer matrix (survey_AnswerMatrix) """
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        current.auth.override = True
+
+        s3db = current.s3db
+
+        template_id = s3db.survey_template.insert(name="Answer Matrix Test")
+
+        qtable = s3db.survey_question
+        self.question_ids = []
+        for code, qtype in (("AMT-1", "String"),
+                            ("AMT-2", "String"),
+                            ("AMT-3", "Numeric"),
+                            ):
+            question_id = qtable.insert(name="Question %s" % code,
+                                        code=code,
+                                        type=qtype,
+                                        )
+            self.question_ids.append(question_id)
+
+        self.series_id = s3db.survey_series.insert(name="Answer Matrix Test",
+                                                   template_id=template_id,
+                                                   )
+
+        # Three responses, the last one leaving the second question blank
+        ctable = s3db.survey_complete
+        atable = s3db.survey_answer
+        q1, q2, q3 = self.question_ids
+        self.complete_ids = []
+        self.answer_ids = {}
+        for answers in (((q1, "Alpha"), (q2, "One"), (q3, "5")),
+                        ((q1, "Beta"), (q2, "Two"), (q3, "7")),
+                        ((q1, "Gamma"), (q3, "11")),
+                        ):
+            complete_id = ctable.insert(series_id=self.series_id)
+            self.complete_ids.append(complete_id)
+            for question_id, value in answers:
+                answer_id = atable.insert(complete_id=complete_id,
+                                          question_id=question_id,
+                                          value=value,
+                                          )
+                self.answer_ids[(complete_id, question_id)] = answer_id
+
+        current.response.s3.survey_answer_matrix = None
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        current.db.rollback()
+        current.response.s3.survey_answer_matrix = None
+        current.auth.override = False
+
+    # -------------------------------------------------------------------------
+    def testBuildOnDemand(self):
+        """ Test building of missing matrix rows on demand """
+
+        assertEqual = self.assertEqual
+
+        s3db = current.s3db
+        mtable = s3db.survey_answer_matrix
+
+        complete_ids = self.complete_ids
+        query = (mtable.complete_id.belongs(complete_ids))
+        assertEqual(current.db(query).count(), 0)
+
+        from s3db.survey import survey_getAllAnswersForQuestionInSeries
+        q1, q2, q3 = self.question_ids
+
+        answers = survey_getAllAnswersForQuestionInSeries(q2, self.series_id)
+        assertEqual(answers, [{"complete_id": complete_ids[0], "value": "One"},
+                              {"complete_id": complete_ids[1], "value": "Two"},
+                              ])
+
+        # Matrix rows have been built for all responses
+        rows = current.db(query).select(mtable.complete_id, mtable.answers)
+        assertEqual(len(rows), 3)
+        matrix = dict((row.complete_id, row.answers) for row in rows)
+        assertEqual(matrix[complete_ids[2]], {str(q1): "Gamma",
+                                              str(q3): "11",
+                                              })
+
+    # -------------------------------------------------------------------------
+    def testSetAnswer(self):
+        """ Test update of the matrix when an answer is saved """
+
+        assertEqual = self.assertEqual
+
+        s3db = current.s3db
+
+        from s3db.survey import S3SurveyCompleteModel, \
+                                survey_getAllAnswersForQuestionInSeries
+        q1, q2, q3 = self.question_ids
+        complete_ids = self.complete_ids
+
+        # Build the matrix
+        answers = survey_getAllAnswersForQuestionInSeries(q1, self.series_id)
+        assertEqual(answers[1]["value"], "Beta")
+
+        # Update an answer
+        complete_id = complete_ids[1]
+        atable = s3db.survey_answer
+        answer_id = self.answer_ids[(complete_id, q1)]
+        current.db(atable.id == answer_id).update(value="Delta")
+        form = Storage(vars=Storage(id=answer_id,
+                                    complete_id=complete_id,
+                                    question_id=q1,
+                                    value="Delta",
+                                    ))
+        S3SurveyCompleteModel.answer_onaccept(form)
+
+        answers = survey_getAllAnswersForQuestionInSeries(q1, self.series_id)
+        assertEqual([answer["value"] for answer in answers],
+                    ["Alpha", "Delta", "Gamma"])
+
+        # Only the updated slot has changed
+        mtable = s3db.survey_answer_matrix
+        row = current.db(mtable.complete_id == complete_id).select(
+                                                mtable.answers,
+                                                limitby = (0, 1),
+                                                ).first()
+        assertEqual(row.answers, {str(q1): "Delta",
+                                  str(q2): "Two",
+                                  str(q3): "7",
+                                  })
+
+    # -------------------------------------------------------------------------
+    def testDeleteInvalidation(self):
+        """ Test invalidation of the matrix when an answer is deleted """
+
+        assertEqual = self.assertEqual
+
+        s3db = current.s3db
+
+        from s3db.survey import survey_getAllAnswersForQuestionInSeries
+        q1, q2, q3 = self.question_ids
+        complete_ids = self.complete_ids
+
+        # Build the matrix
+        answers = survey_getAllAnswersForQuestionInSeries(q2, self.series_id)
+        assertEqual(len(answers), 2)
+
+        # Delete an answer
+        complete_id = complete_ids[0]
+        answer_id = self.answer_ids[(complete_id, q2)]
+        resource = s3db.resource("survey_answer", id=answer_id)
+        assertEqual(resource.delete(), 1)
+
+        # Matrix row of the response has been removed
+        mtable = s3db.survey_answer_matrix
+        query = (mtable.complete_id == complete_id)
+        assertEqual(current.db(query).count(), 0)
+
+        # ...and is rebuilt without the deleted answer
+        answers = survey_getAllAnswersForQuestionInSeries(q2, self.series_id)
+        assertEqual(answers, [{"complete_id": complete_ids[1], "value": "Two"},
+                              ])
+        assertEqual(current.db(query).count(), 1)
+
+    # -------------------------------------------------------------------------
+    def testCompletedList(self):
+        """ Test buildCompletedList against the per-question lookup """
+
+        from s3db.survey import buildCompletedList, \
+                                survey_getWidgetFromQuestion
+
+        series_id = self.series_id
+        q1, q2, q3 = question_ids = self.question_ids
+
+        # Per-question lookup from survey_answer
+        db = current.db
+        s3db = current.s3db
+        qtable = s3db.survey_question
+        ctable = s3db.survey_complete
+        atable = s3db.survey_answer
+
+        headers = []
+        types = []
+        items = []
+        complete_lookup = {}
+        for position, question_id in enumerate(question_ids):
+            query = (atable.question_id == question_id) & \
+                    (atable.complete_id == ctable.id) & \
+                    (ctable.series_id == series_id)
+            rows = db(query).select(atable.value,
+                                    atable.complete_id,
+                                    orderby = atable.complete_id,
+                                    )
+            widget_obj = survey_getWidgetFromQuestion(question_id)
+            question = db(qtable.id == question_id).select(qtable.name,
+                                                           limitby=(0, 1)
+                                                           ).first()
+            headers.append(question.name)
+            types.append(widget_obj.db_type())
+            for row in rows:
+                complete_id = row.complete_id
+                if complete_id in complete_lookup:
+                    index = complete_lookup[complete_id]
+                else:
+                    index = complete_lookup[complete_id] = len(items)
+                    items.append([""] * len(question_ids))
+                items[index][position] = widget_obj.repr(row.value)
+        expected = [headers] + [types] + items
+
+        self.assertEqual(buildCompletedList(series_id, question_ids),
+                         expected)
+
+        # Responses without answers to the selected questions are skipped
+        self.assertEqual(buildCompletedList(series_id, [q2]),
+                         [["Question AMT-2"], [types[1]], ["One"], ["Two"]])
+
+# =============================================================================
+def run_suite(*test_classes):
+    """ Run the test suite """
+
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    for test_class in test_classes:
+        tests = loader.loadTestsFromTestCase(test_class)
+        suite.addTests(tests)
+    if suite is not None:
+        unittest.TextTestRunner(verbosity=2).run(suite)
+    return
+
+if __name__ == "__main__":
+
+    run_suite(
+        AnswerMatrixTests,
+    )
+
+# END ========================================================================
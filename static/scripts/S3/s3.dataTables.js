@@ -829,6 +829,8 @@
                             json.data.splice(requestLength, json.data.length);
                         }
 
+                        // Expose the JSON to callbacks (e.g. infoCallback)
+                        settings.json = json;
                         drawCallback(json);
                     }
                 });
@@ -847,6 +849,10 @@
                     // the end of the current page
                     json.data.splice(requestLength, json.data.length);
                 }
+
+                // Expose the JSON to callbacks (e.g. infoCallback), also
+                // for the initial page from the cache passed in by the server
+                settings.json = json;
                 drawCallback(json);
             }
         }
@@ -1062,6 +1068,20 @@
                 'zeroRecords': i18n.zeroRecords // formerly sZeroRecords
             },
 
+            'infoCallback': function(settings, start, end, max, total, pre) {
+                // Show "about N" if the number of records is an estimate
+                var json = settings.json;
+                if (json && json.recordsEstimated && i18n.infoEstimated) {
+                    var formatNumber = function(number) {
+                        return settings.fnFormatNumber.call(settings.oInstance, number);
+                    };
+                    return i18n.infoEstimated.replace('_START_', formatNumber(start))
+                                             .replace('_END_', formatNumber(end))
+                                             .replace('_TOTAL_', formatNumber(total));
+                }
+                return pre;
+            },
+
             'headerCallback': function (nHead, aasData, iStart, iEnd, aiDisplay) {
                 $('#modeSelectionAll').unbind('click.selectAll')
                                       .on('click.selectAll', function(event) {
@@ -209,12 +209,12 @@ y,A,C,V,L[g],!0);V++;F=H}ha+=1;(A||C)&&J.hide()}for(;D.length>M;)F=D[M][1],ea(p,
 pages:2,data:null,method:"GET"},g);g=p.cache;var q=void 0!=g.cacheLower?g.cacheLower:-1,v=g.cacheUpper||null,x=g.cacheLastRequest||null,u=g.cacheLastJson||null;return function(g,t,C){if(this.hasOwnProperty("nTable")){if(g=C.sAjaxSource)d[C.nTable.id]=g,C.sAjaxSource=null;x=u=null;q=-1;v=null;t({})}else{var y=!1,H=g.start,N=g.start,L=g.length,S=C.nTable.id,F=va("#"+S);u&&u.hasOwnProperty("recordsTotal")?J[F]=u.recordsTotal:J[F]=g.recordsTotal;if(-1==L){var R=J[F];"undefined"!=typeof R?L=R:y=!0}y||
 (R=H+L,u&&u.hasOwnProperty("recordsFiltered")&&u.recordsFiltered<R&&(R=u.recordsFiltered),C.clearCache?(y=!0,C.clearCache=!1):0>q||H<q||R>v?y=!0:!x||JSON.stringify(g.order)===JSON.stringify(x.order)&&JSON.stringify(g.columns)===JSON.stringify(x.columns)&&JSON.stringify(g.search)===JSON.stringify(x.search)||(y=!0));x=$.extend(!0,{},g);if(y){H<q&&(H-=L*(p.pages-1),0>H&&(H=0));q=H;v=-1!=g.length?H+L*p.pages:L;g.start=H;g.length=L*p.pages;$.isFunction(p.data)?(y=p.data(g))&&$.extend(g,y):$.isPlainObject(p.data)&&
 $.extend(g,p.data);limit=-1==L?"none":g.length;y=[{name:"draw",value:g.draw},{name:"limit",value:limit}];0!=H&&y.push({name:"start",value:H});g.search&&g.search.value&&(y.push({name:"sSearch",value:g.search.value}),y.push({name:"iColumns",value:g.columns.length}));if(H=g.order.length){y.push({name:"iSortingCols",value:H});for(var R=A[F],V,F=0;F<R.length;F++)(V=R[F])&&!V.bSortable&&y.push({name:"bSortable_"+F,value:"false"});for(F=0;F<H;F++)R=g.order[F],y.push({name:"iSortCol_"+F,value:R.column}),
-y.push({name:"sSortDir_"+F,value:R.dir})}g=$.ajaxS3;void 0!==$.searchS3&&(g=$.searchS3);C.jqXHR=g({type:p.method,url:d[S],data:y,dataType:"json",cache:!1,success:function(d){u=$.extend(!0,{},d);v=q+d.data.length;q!=N&&d.data.splice(0,N-q);-1!=L&&d.data.splice(L,d.data.length);t(d)}})}else C=$.extend(!0,{},u),C.draw=g.draw,C.data.splice(0,H-q),-1!=L&&C.data.splice(L,C.data.length),t(C)}}};$.fn.dataTable.Api.register("clearPipeline()",function(){return this.iterator("table",function(d){d.clearCache=
+y.push({name:"sSortDir_"+F,value:R.dir})}g=$.ajaxS3;void 0!==$.searchS3&&(g=$.searchS3);C.jqXHR=g({type:p.method,url:d[S],data:y,dataType:"json",cache:!1,success:function(d){u=$.extend(!0,{},d);v=q+d.data.length;q!=N&&d.data.splice(0,N-q);-1!=L&&d.data.splice(L,d.data.length);C.json=d;t(d)}})}else{var qj=$.extend(!0,{},u);qj.draw=g.draw;qj.data.splice(0,H-q);-1!=L&&qj.data.splice(L,qj.data.length);C.json=qj;t(qj)}}}};$.fn.dataTable.Api.register("clearPipeline()",function(){return this.iterator("table",function(d){d.clearCache=
 !0})});var xa=function(t,u,J){var Z=$(t+"_configurations");if(0<Z.length){var x=$.parseJSON(Z.val()),Z=[];N[u]=x;A[u]=Z;0<x.groupTitles.length&&Ia(u,x,Z);fnActionCallBacks=[];for(var Q=$(t).find("thead tr").first().children().length,D=0;D<Q;D++)Z[D]=null;var ea=!1;1>x.rowActions.length?x.rowActions=S3.dataTables.Actions?S3.dataTables.Actions:[]:ea=!0;0<x.rowActions.length&&(Z[x.actionCol]={sTitle:" ",bSortable:!1});x.bulkActions&&(Z[x.bulkCol]={sTitle:'<div id="bulk_select_options"><input id="modeSelectionAll" type="checkbox">'+
 i18n.selectAll+"</input></div>",bSortable:!1});C[u]=[x.textMaxLength,x.textShrinkLength];if(0<x.group.length){for(var Q=x.group,D=[],I=0;I<Q.length;I++)D.push(Q[I][0]);H[u]={bVisible:!1,aTargets:D}}else H[u]={bVisible:!1,aTargets:[]};if(x.bulkActions){Q="";D=0;for(I=x.bulkActions.length;D<I;D++){var na=x.bulkActions[D],oa,fa,L="";na instanceof Array?(fa=na[0],oa=na[1],3==na.length&&(L=na[2])):oa=fa=na;Q+='<input type="submit" id="'+oa+'-selected-action" class="'+L+' selected-action" name="'+oa+'" value="'+
 fa+'">&nbsp;'}v='<div class="dataTable-action">'+Q+"</div>";y=$.parseJSON($(t+"_dataTable_bulkSelection").val());null===y&&(y=[]);p[u]=y;q[u]="Inclusive";$(t+"_dataTable_bulkSelectAll").val()&&(q[u]="Exclusive");g[u]=[t+"_dataTable_bulkMode",t+"_dataTable_bulkSelection"]}"true"==x.pagination?(D=Q=!0,I=x.pageLength,d[t.slice(1)]=x.ajaxUrl,na=0<$(t+"_dataTable_cache").length?$.parseJSON($(t+"_dataTable_cache").val()):{},W[u]=$.fn.dataTable.pipeline({cache:na})):(D=Q=!1,I=x.pageLength,W[u]=null);var S;
 S=$(t).dataTable({ajax:W[u],autoWidth:!1,columnDefs:[H[u]],columns:Z,deferRender:!0,destroy:J,dom:x.dom,lengthMenu:x.lengthMenu,order:x.order,orderFixed:x.group,ordering:!0,pageLength:I,pagingType:x.pagingType,processing:D,searchDelay:450,searching:"true"==x.searching,serverSide:Q,search:{smart:Q},language:{aria:{sortAscending:": "+i18n.sortAscending,sortDescending:": "+i18n.sortDescending},paginate:{first:i18n.first,last:i18n.last,next:i18n.next,previous:i18n.previous},emptyTable:i18n.emptyTable,
-info:i18n.info,infoEmpty:i18n.infoEmpty,infoFiltered:i18n.infoFiltered,infoThousands:i18n.infoThousands,lengthMenu:i18n.lengthMenu,loadingRecords:i18n.loadingRecords+"...",processing:i18n.processing+"...",search:i18n.search+":",zeroRecords:i18n.zeroRecords},headerCallback:function(d,g,t,v,x){$("#modeSelectionAll").unbind("click.selectAll").on("click.selectAll",function(d){p[u]=[];$(this).prop("checked")?q[u]="Exclusive":q[u]="Inclusive";S.api().draw(!1)});$(".ui-icon-zoomin, .ui-icon-zoomout").unbind("click.dtToggleCell")},
+info:i18n.info,infoEmpty:i18n.infoEmpty,infoFiltered:i18n.infoFiltered,infoThousands:i18n.infoThousands,lengthMenu:i18n.lengthMenu,loadingRecords:i18n.loadingRecords+"...",processing:i18n.processing+"...",search:i18n.search+":",zeroRecords:i18n.zeroRecords},infoCallback:function(d,g,t,v,x,z){var y=d.json;if(y&&y.recordsEstimated&&i18n.infoEstimated){var w=function(g){return d.fnFormatNumber.call(d.oInstance,g)};return i18n.infoEstimated.replace("_START_",w(g)).replace("_END_",w(t)).replace("_TOTAL_",w(x))}return z},headerCallback:function(d,g,t,v,x){$("#modeSelectionAll").unbind("click.selectAll").on("click.selectAll",function(d){p[u]=[];$(this).prop("checked")?q[u]="Exclusive":q[u]="Inclusive";S.api().draw(!1)});$(".ui-icon-zoomin, .ui-icon-zoomout").unbind("click.dtToggleCell")},
 rowCallback:function(d,g,q){var t=x.actionCol,v=/>(.*)</i;q=v.exec(g[t]);q=null===q?g[t]:q[1];if(x.rowActions.length||x.bulkActions){var A="";if(x.rowActions.length)for(var D=x.rowActions,y,H=0;H<D.length;H++)if(y=D[H],!("restrict"in y&&-1==X(q,y.restrict))){var I=y._class,J=y.label;ea||(J=S3.Utf8.decode(y.label));var L=J,v=/%5Bid%5D/g;y.icon?J='<i class="'+y.icon+'" alt="'+J+'"> </i>':y.img&&(J='<img src="'+y.icon+'" alt="'+J+'"></img>');y._onclick?(L=D[H]._onclick.replace(v,q),A=A+'<a class="'+
 I+'" onclick="'+L+'">'+J+"</a>&nbsp;"):y._jqclick?(A=A+'<span class="'+I+'" id="'+q+'">'+J+"</span>&nbsp;","undefined"!=typeof S3ActionCallBack&&fnActionCallBacks.push([q,S3ActionCallBack])):y.url?(v=y.url.replace(v,q),y=(y=y._target)?' target="'+y+'"':"",A=A+'<a db_id="'+q+'" class="'+I+'" href="'+v+'" title="'+L+'"'+y+">"+J+"</a>&nbsp;"):(y=(y=y._ajaxurl)?' data-url="'+y+'"':"",A=A+'<a db_id="'+q+'" class="'+I+'" title="'+L+'"'+y+">"+J+"</a>&nbsp;")}0<x.group.length&&x.group[0][0]<t&&--t;$("td:eq("+
 t+")",d).addClass("actions").html(A)}x.bulkActions&&Aa(u,d,X(q,p[u]));t=x.rowStyles;if(t.length){var A=$(d),N;for(N in t)-1<X(q,t[N])&&A.addClass(N)}N=0;q=[];if(x.group.length)for(t=x.group,A=0;A<t.length;A++)q.push(t[A][0]);for(t=0;t<g.length;t++)-1==$.inArray(t,q)&&(!g[t].match(/<.*>/)&&g[t].length>C[u][0]&&(A='<div class="dt-truncate"><span class="ui-icon ui-icon-zoomin" style="float:right"></span>'+g[t].substr(0,C[u][1])+"&hellip;</div>",D='<div  style="display:none" class="dt-truncate"><span class="ui-icon ui-icon-zoomout" style="float:right"></span>'+
@@ -2055,16 +2055,29 @@ OpenLayers.ProxyHost = S3.Ap.concat('/gis/proxy?url=');
         var marker_url = response[1];
 
         // Strategies
-        var strategies = [
-            // Need to be uniquely instantiated
-            new OpenLayers.Strategy.ZoomBBOX({
-            //new OpenLayers.Strategy.BBOX({
-                // load features for a wider area than the visible extent to reduce calls
-                ratio: 1.5
-                // don't fetch features after every resolution change
-                //resFactor: 1
-            })
-        ]
+        if (layer.tiled) {
+            // Server-side clustered tiles
+            // - tiles are cached server-side, so no need to fetch a wider area
+            // - re-fetch after every resolution change to get the clusters
+            //   for the new zoom level
+            var strategies = [
+                new OpenLayers.Strategy.BBOX({
+                    ratio: 1,
+                    resFactor: 1
+                })
+            ]
+        } else {
+            var strategies = [
+                // Need to be uniquely instantiated
+                new OpenLayers.Strategy.ZoomBBOX({
+                //new OpenLayers.Strategy.BBOX({
+                    // load features for a wider area than the visible extent to reduce calls
+                    ratio: 1.5
+                    // don't fetch features after every resolution change
+                    //resFactor: 1
+                })
+            ]
+        }
         if (refresh) {
             strategies.push(new OpenLayers.Strategy.Refresh({
                 force: true,
@@ -2081,7 +2094,9 @@ OpenLayers.ProxyHost = S3.Ap.concat('/gis/proxy?url=');
                 //}
             }));
         }
-        if (cluster_threshold || layer.cluster) {
+        if (layer.tiled) {
+            // Clustered server-side
+        } else if (cluster_threshold || layer.cluster) {
             // Common Cluster Strategy for all layers
             //s3.common_cluster_strategy
             strategies.push(new OpenLayers.Strategy.AttributeCluster({
@@ -2098,7 +2113,8 @@ OpenLayers.ProxyHost = S3.Ap.concat('/gis/proxy?url=');
                 projection: projection,
                 protocol: new OpenLayers.Protocol.HTTP({
                     url: url,
-                    format: format_geojson
+                    format: format_geojson,
+                    params: {}
                 }),
                 // This gets picked up after mapPanel instantiates & copied to it's layerRecords
                 legendURL: marker_url,
@@ -2129,11 +2145,42 @@ OpenLayers.ProxyHost = S3.Ap.concat('/gis/proxy?url=');
             'loadend': layer_loadend,
             'visibilitychanged': layer_visibilitychanged
         });
+        if (layer.tiled) {
+            geojsonLayer.events.on({
+                'loadstart': tiled_loadstart,
+                'beforefeaturesadded': tiled_beforefeaturesadded
+            });
+        }
         map.addLayer(geojsonLayer);
         // Ensure marker layers are rendered over other layers
         //map.setLayerIndex(geojsonLayer, 99);
     };
 
+    /**
+     * Callback for tiled Feature Layers on 'loadstart'
+     * - request the tiles for the current zoom level
+     */
+    var tiled_loadstart = function(event) {
+        var layer = event.object;
+        layer.protocol.options.params.z = layer.map.getZoom();
+    };
+
+    /**
+     * Callback for tiled Feature Layers on 'beforefeaturesadded'
+     * - mark server-side clusters as clusters, so that they get styled
+     *   like client-side clusters
+     */
+    var tiled_beforefeaturesadded = function(event) {
+        var feature,
+            features = event.features;
+        for (var i=0, len=features.length; i < len; i++) {
+            feature = features[i];
+            if (feature.attributes.cluster) {
+                feature.cluster = [feature];
+            }
+        }
+    };
+
     // Google
     var addGoogleLayers = function(map) {
         var google = map.s3.options.Google;
@@ -3560,7 +3607,11 @@ OpenLayers.ProxyHost = S3.Ap.concat('/gis/proxy?url=');
             var titleField = 'name';
         }
         var contents, data_link, name, popup_url;
-        if (feature.cluster) {
+        if (feature.cluster && feature.attributes.cluster) {
+            // Server-side cluster: zoom in to see the individual features
+            map.setCenter(centerPoint, map.getZoom() + 2);
+            return;
+        } else if (feature.cluster) {
             // Cluster
             var cluster = feature.cluster;
             contents = i18n.gis_cluster_multiple + ':<ul>';
@@ -36,8 +36,8 @@ s3_layer_type:"arcrest"});c.setVisibility(f);b.addLayer(c);a._base&&b.setBaseLay
 type:"AerialWithLabels",name:a.Hybrid.name,s3_layer_id:a.Hybrid.id,s3_layer_type:"bing"}),b.addLayer(d),"hybrid"==a.Base&&b.setBaseLayer(d))},Aa=function(b){var a=b.s3.options.CoordinateGrid,a=new OpenLayers.Control.Graticule({layerName:a.name,visible:a.visibility});b.addControl(a)},Ea=function(b){var a,c,d=b.s3.options;d.draw_feature&&(a=d.marker_default);d.draft_style&&(c=d.draft_style);a=G(b,{marker:a,style:c,opacity:.9});a=new OpenLayers.Layer.Vector(i18n.gis_draft_layer,{displayInLayerSwitcher:!1,
 legendURL:a[1],styleMap:a[0]});a.setVisibility(!0);b.addLayer(a);return b.s3.draftLayer=a},E=function(b,a){var c=b.s3,d=a.name;a.no_popups&&c.layers_nopopups.push(d);var e=a.url,g=void 0!=a.refresh?a.refresh:900;if(void 0!=a.dir){var f=a.dir;-1==$.inArray(f,c.dirs)&&c.dirs.push(f)}else f="";var c=void 0!=a.visibility?a.visibility:!0,h=void 0!=a.cluster_attribute?a.cluster_attribute:"colour",l=void 0!=a.cluster_distance?a.cluster_distance:20,k=void 0!=a.cluster_threshold?a.cluster_threshold:2,p=void 0!=
 a.projection?a.projection:4326,p=4326==p?v:new OpenLayers.Projection("EPSG:"+p),u=void 0!=a.type?a.type:"feature",n='<div class="gis_layer_legend"><div class="gis_legend_title">'+d+"</div>";void 0!=a.desc&&(n+='<div class="gis_legend_desc">'+a.desc+"</div>");if(void 0!=a.src||void 0!=a.src_url){var m='<div class="gis_legend_src">';void 0!=a.src_url?(m+='<a href="'+a.src_url+'" target="_blank">',m=void 0!=a.src?m+a.src:m+a.src_url,m+="</a>"):m+=a.src;n+=m+"</div>"}var n=n+"</div>",r=G(b,a),m=r[0],
-r=r[1],w=[new OpenLayers.Strategy.ZoomBBOX({ratio:1.5})];g&&w.push(new OpenLayers.Strategy.Refresh({force:!0,interval:1E3*g}));(k||a.cluster)&&w.push(new OpenLayers.Strategy.AttributeCluster({attribute:h,distance:l,threshold:k}));d=new OpenLayers.Layer.Vector(d,{dir:f,projection:p,protocol:new OpenLayers.Protocol.HTTP({url:e,format:H}),legendURL:r,strategies:w,styleMap:m,s3_layer_id:a.id,s3_layer_type:u,s3_style:a.style,s3_url_format:a.url_format});d.legendTitle=n;void 0!=a.popup_format&&(d.s3_popup_format=
-a.popup_format);d.setVisibility(c);d.events.on({loadstart:A,loadend:B,visibilitychanged:D});b.addLayer(d)},ta=function(b){var a=b.s3.options.Google,c;a.MapMaker||a.MapMakerHybrid?(a.Satellite&&(c=new OpenLayers.Layer.Google(a.Satellite.name,{type:G_SATELLITE_MAP,sphericalMercator:!0,s3_layer_id:a.Satellite.id,s3_layer_type:"google"}),b.addLayer(c),"satellite"==a.Base&&b.setBaseLayer(c)),a.Maps&&(c=new OpenLayers.Layer.Google(a.Maps.name,{type:G_NORMAL_MAP,sphericalMercator:!0,s3_layer_id:a.Maps.id,
+r=r[1],w=a.tiled?[new OpenLayers.Strategy.BBOX({ratio:1,resFactor:1})]:[new OpenLayers.Strategy.ZoomBBOX({ratio:1.5})];g&&w.push(new OpenLayers.Strategy.Refresh({force:!0,interval:1E3*g}));!a.tiled&&(k||a.cluster)&&w.push(new OpenLayers.Strategy.AttributeCluster({attribute:h,distance:l,threshold:k}));d=new OpenLayers.Layer.Vector(d,{dir:f,projection:p,protocol:new OpenLayers.Protocol.HTTP({url:e,format:H,params:{}}),legendURL:r,strategies:w,styleMap:m,s3_layer_id:a.id,s3_layer_type:u,s3_style:a.style,s3_url_format:a.url_format});d.legendTitle=n;void 0!=a.popup_format&&(d.s3_popup_format=
+a.popup_format);d.setVisibility(c);d.events.on({loadstart:A,loadend:B,visibilitychanged:D});a.tiled&&d.events.on({loadstart:Ub,beforefeaturesadded:Vb});b.addLayer(d)},Ub=function(b){b=b.object;b.protocol.options.params.z=b.map.getZoom()},Vb=function(b){b=b.features;for(var a,c=0,d=b.length;c<d;c++)a=b[c],a.attributes.cluster&&(a.cluster=[a])},ta=function(b){var a=b.s3.options.Google,c;a.MapMaker||a.MapMakerHybrid?(a.Satellite&&(c=new OpenLayers.Layer.Google(a.Satellite.name,{type:G_SATELLITE_MAP,sphericalMercator:!0,s3_layer_id:a.Satellite.id,s3_layer_type:"google"}),b.addLayer(c),"satellite"==a.Base&&b.setBaseLayer(c)),a.Maps&&(c=new OpenLayers.Layer.Google(a.Maps.name,{type:G_NORMAL_MAP,sphericalMercator:!0,s3_layer_id:a.Maps.id,
 s3_layer_type:"google"}),b.addLayer(c),"maps"==a.Base&&b.setBaseLayer(c)),a.Hybrid&&(c=new OpenLayers.Layer.Google(a.Hybrid.name,{type:G_HYBRID_MAP,sphericalMercator:!0,s3_layer_id:a.Hybrid.id,s3_layer_type:"google"}),b.addLayer(c),"maps"==a.Base&&b.setBaseLayer(c)),a.Terrain&&(c=new OpenLayers.Layer.Google(a.Terrain.name,{type:G_PHYSICAL_MAP,sphericalMercator:!0,s3_layer_id:a.Terrain.id,s3_layer_type:"google"}),b.addLayer(c),"terrain"==a.Base&&b.setBaseLayer(c)),a.MapMaker&&(c=new OpenLayers.Layer.Google(a.MapMaker.name,
 {type:G_MAPMAKER_NORMAL_MAP,sphericalMercator:!0,s3_layer_id:c.id,s3_layer_type:"google"}),b.addLayer(c),"mapmaker"==a.Base&&b.setBaseLayer(c)),a.MapMakerHybrid&&(c=new OpenLayers.Layer.Google(a.MapMakerHybrid.name,{type:G_MAPMAKER_HYBRID_MAP,sphericalMercator:!0,s3_layer_id:c.id,s3_layer_type:"google"}),b.addLayer(c),"mapmakerhybrid"==a.Base&&b.setBaseLayer(c))):(a.Satellite&&(c=new OpenLayers.Layer.Google(a.Satellite.name,{type:"satellite",numZoomLevels:22,s3_layer_id:a.Satellite.id,s3_layer_type:"google"}),
 b.addLayer(c),"satellite"==a.Base&&b.setBaseLayer(c)),a.Maps&&(c=new OpenLayers.Layer.Google(a.Maps.name,{numZoomLevels:20,s3_layer_id:a.Maps.id,s3_layer_type:"google"}),b.addLayer(c),"maps"==a.Base&&b.setBaseLayer(c)),a.Hybrid&&(c=new OpenLayers.Layer.Google(a.Hybrid.name,{type:"hybrid",numZoomLevels:20,s3_layer_id:a.Hybrid.id,s3_layer_type:"google"}),b.addLayer(c),"hybrid"==a.Base&&b.setBaseLayer(c)),a.Terrain&&(c=new OpenLayers.Layer.Google(a.Terrain.name,{type:"terrain",s3_layer_id:a.Terrain.id,
@@ -67,7 +67,7 @@ void 0==c&&(c=i18n.gis_loading+'...<div class="throbber"></div>');var g=b.geomet
 a[c],e=d.popups,g=0,f=e.length;g<f;g++)d=e[g],d.id==b&&d.updateSize(!0)};var Z=function(b,a,c){0===b.indexOf("http://")&&(b=OpenLayers.ProxyHost+encodeURIComponent(b));$.ajaxS3({url:b,dataType:"html",success:function(b){try{$("#"+a).html(b),c.updateSize(),$("#"+a+" a.btn.iframe").click(function(){var b=$(this).attr("href");0===b.indexOf("http://")&&(b=OpenLayers.ProxyHost+encodeURIComponent(b));var c=a.slice(0,-11),b='<iframe src="'+b+'" onload="S3.gis.popupLoaded(\''+c+'\')" class="loading" marginWidth="0" marginHeight="0" frameBorder="0"></iframe>';
 $("#"+a).html(b);return!1})}catch(e){}},error:function(b,e,g){msg="UNAUTHORIZED"==g?i18n.gis_requires_login:b.responseText;$("#"+a+"_contentDiv").html(msg);c.updateSize()}})},Ia=function(b){var a=b.feature,c=a.layer,d=c.map,e=d.s3;if(-1==["OpenLayers.Handler.PointS3","OpenLayers.Handler.Path","OpenLayers.Handler.Polygon","OpenLayers.Handler.RegularPolygon"].indexOf(c.name)&&-1==e.layers_nopopups.indexOf(c.name))if("openweathermap"==c.s3_layer_type){var g=c.options.getPopupHtml(a.attributes.station),
 f=new OpenLayers.Popup("Popup",a.geometry.getBounds().getCenterLonLat(),new OpenLayers.Size(c.options.popupX,c.options.popupY),g,"Station",!1);a.popup=f;f.feature=a;d.addPopup(f,!0)}else{var h=a.geometry;if("OpenLayers.Geometry.Point"!=h.CLASS_NAME)for(var d=0,l=e.clicking.length;d<l;++d)if("OpenLayers.Geometry.Point"==e.clicking[d].geometry.CLASS_NAME)return;Y(b);a.renderIntent="select";c.drawFeature(a);d=c.s3_layer_type;h=h.getBounds().getCenterLonLat();l=a.id+"_popup";b=void 0!=c.title?c.title:
-"name";var k;if(a.cluster){var p=a.cluster;k=i18n.gis_cluster_multiple+":<ul>";for(var u=p.length,n=e.id,d=0;d<u;d++){var m=p[d].attributes;if(void 0!=c.s3_popup_format){_.templateSettings={interpolate:/\{(.+?)\}/g};for(var e=c.s3_popup_format,f=_.template(e),r={},w,t=e.split("{"),e=0;e<t.length;e++)w=t[e].split("}")[0],r[w]="";_.defaults(m,r);e=f(m).split("<br/>",1)[0]}else e=void 0!=m.popup?m.popup.split("<br/>",1)[0]:m[b];void 0!=m.url?k+="<li><a href='javascript:S3.gis.loadClusterPopup(\""+n+
+"name";var k;if(a.cluster&&a.attributes.cluster){c.map.setCenter(h,c.map.getZoom()+2);return}if(a.cluster){var p=a.cluster;k=i18n.gis_cluster_multiple+":<ul>";for(var u=p.length,n=e.id,d=0;d<u;d++){var m=p[d].attributes;if(void 0!=c.s3_popup_format){_.templateSettings={interpolate:/\{(.+?)\}/g};for(var e=c.s3_popup_format,f=_.template(e),r={},w,t=e.split("{"),e=0;e<t.length;e++)w=t[e].split("}")[0],r[w]="";_.defaults(m,r);e=f(m).split("<br/>",1)[0]}else e=void 0!=m.popup?m.popup.split("<br/>",1)[0]:m[b];void 0!=m.url?k+="<li><a href='javascript:S3.gis.loadClusterPopup(\""+n+
 '", "'+m.url+'", "'+l+"\")'>"+e+"</a></li>":void 0!=c.s3_url_format?(_.templateSettings={interpolate:/\{(.+?)\}/g},f=_.template(c.s3_url_format),f=f(m),k+="<li><a href='javascript:S3.gis.loadClusterPopup(\""+n+'", "'+f+'", "'+l+"\")'>"+e+"</a></li>"):k+="<li>"+e+"</li>"}f=null;k+="</ul>";k+="<div align='center'><a href='javascript:S3.gis.zoomToSelectedFeature(\""+n+'", '+h.lon+","+h.lat+", 3)'>"+i18n.gis_zoomin+"</a></div>"}else if("kml"==d){m=a.attributes;if(void 0!=a.style.balloonStyle)k=a.style.balloonStyle.replace(/{([^{}]*)}/g,
 function(a,b){var c=m[b];return"string"===typeof c||"number"===typeof c?c:a});else{d=typeof m[b];d="object"==d?m[b].value:m[b];k="<h3>"+d+"</h3>";for(var c=c.body.split(" "),v,e=0;e<c.length;e++)d=typeof m[c[e]],"object"==d?(d=m[c[e]].displayName,""===d&&(d=c[e]),b=m[c[e]].value,v='<div class="gis_popup_row"><div class="gis_popup_label">'+d+':</div><div class="gis_popup_cell">'+b+"</div></div>"):v=void 0!=m[c[e]]?'<div class="gis_popup_row">'+m[c[e]]+"</div>":"",k+=v}-1!=k.search("<script")&&(k="Content contained Javascript! Escaped content below.<br />"+
 k.replace(/</g,"<"))}else if("gpx"!=d)if("shapefile"==d||"geojson"==d)m=a.attributes,k="<div>",$.each(m,function(a,b){"id_orig"==a&&(a="id");v='<div class="gis_popup_row"><div class="gis_popup_label">'+a+':</div><div class="gis_popup_cell">'+b+"</div></div>";k+=v}),k+="</div>";else if("wfs"==d)m=a.attributes,d=m[b],k="<h3>"+d+"</h3>",$.each(m,function(a,b){v='<div class="gis_popup_row"><div class="gis_popup_label">'+a+':</div><div class="gis_popup_val">'+b+"</div></div>";k+=v});else if(void 0!=a.attributes.url)f=
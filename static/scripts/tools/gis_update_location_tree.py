@@ -6,5 +6,5 @@
 # python web2py.py -S eden -M -R applications/eden/static/scripts/tools/gis_update_location_tree.py
 
 s3db.gis_location
-gis.update_location_tree()
+gis.update_location_tree_bulk()
 db.commit()
@@ -37,3 +37,22 @@ try:
 except:
     # Index already present
     pass
+
+tablename = "s3_hierarchy_node"
+for field in ("tablename", "node_id", "parent_id"):
+    try:
+        db.executesql("CREATE INDEX %s_%s__idx on %s(%s);" % (tablename, field, tablename, field))
+    except:
+        # Index already present
+        pass
+
+tablename = "s3_table_version"
+field = "tablename"
+try:
+    db.executesql("CREATE INDEX %s_%s__idx on %s(%s);" % (tablename, field, tablename, field))
+except:
+    # Index already present
+    pass
+
+# Person Name Index
+s3db.pr_PersonNameIndex.create_indexes()
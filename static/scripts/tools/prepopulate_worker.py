@@ -0,0 +1,10 @@
+#!/usr/bin/python
+
+# This is a worker process for parallel prepopulate, it is started by
+# S3BulkImporter.perform_tasks (settings.base.prepopulate_workers) and
+# reads the import tasks to run from stdin - not meant to be run manually
+
+# Needs to be run in the web2py environment
+# python web2py.py -S eden -M -R applications/eden/static/scripts/tools/prepopulate_worker.py
+
+s3base.S3BulkImporter.worker()
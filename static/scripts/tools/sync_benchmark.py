@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+#
+# Sync Benchmark: measure the throughput (records/second) of the paged
+# Sahana Eden synchronization protocol between two running instances
+#
+# - pulls a resource from the source instance page by page, and pushes
+#   each page to the target instance, exactly like a sync task would
+# - can seed the source instance with test records first
+# - requires admin accounts at both instances
+#
+# Use like:
+# python sync_benchmark.py --source http://localhost:8000/eden \
+#                          --target http://localhost:8001/eden \
+#                          --username admin@example.com --password testing \
+#                          --seed 10000 --page-size 1000
+#
+# (run the two instances with separate databases, e.g. by starting two
+#  web2py servers on different ports with different 000_config.py)
+
+import argparse
+import base64
+import gzip
+import sys
+import time
+import urllib
+import urllib2
+import uuid
+
+from cStringIO import StringIO
+from xml.etree import ElementTree
+
+CONTINUATION = "X-Sync-Continuation"
+
+# =============================================================================
+class Instance(object):
+    """ A Sahana Eden instance """
+
+    def __init__(self, url, username, password):
+
+        self.url = url.rstrip("/")
+        self.auth = "Basic %s" % base64.encodestring("%s:%s" % (username, password))[:-1]
+
+    # -------------------------------------------------------------------------
+    def request(self, path, vars=None, data=None, headers=None):
+        """
+            Send a request to the instance
+
+            @param path: the URL path (relative to the application)
+            @param vars: the URL query vars (dict)
+            @param data: the request body (POST)
+            @param headers: additional request headers
+
+            @return: the response (file-like object)
+        """
+
+        url = "%s/%s" % (self.url, path)
+        if vars:
+            url = "%s?%s" % (url, urllib.urlencode(vars))
+        req = urllib2.Request(url=url, data=data)
+        req.add_header("Authorization", self.auth)
+        if headers:
+            for k, v in headers.items():
+                req.add_header(k, v)
+        return urllib2.urlopen(req)
+
+# =============================================================================
+def seed(instance, tablename, number, chunk_size=500):
+    """
+        Create test records at the source instance
+
+        @param instance: the Instance
+        @param tablename: the table name
+        @param number: the number of records to create
+        @param chunk_size: the number of records per request
+    """
+
+    prefix, name = tablename.split("_", 1)
+    run = uuid.uuid4().hex[:8]
+
+    created = 0
+    start = time.time()
+    while created < number:
+        root = ElementTree.Element("s3xml")
+        for i in xrange(created, min(created + chunk_size, number)):
+            resource = ElementTree.SubElement(root, "resource",
+                                              name = tablename,
+                                              uuid = "SYNCBENCH-%s-%s" % (run, i),
+                                              )
+            data = ElementTree.SubElement(resource, "data", field="name")
+            data.text = "Sync Benchmark %s %s" % (run, i)
+        instance.request("%s/%s.xml" % (prefix, name),
+                         data = ElementTree.tostring(root),
+                         headers = {"Content-Type": "text/xml"},
+                         ).read()
+        created = min(created + chunk_size, number)
+    duration = time.time() - start
+    print "Seeded %s records in %.1fs" % (number, duration)
+
+# =============================================================================
+def synchronize(source, target, tablename, page_size, compress_push=False):
+    """
+        Pull a resource from the source instance page by page, and push
+        each page to the target instance
+
+        @param source: the source Instance
+        @param target: the target Instance
+        @param tablename: the table name
+        @param page_size: the page size
+        @param compress_push: gzip-compress pushed pages
+    """
+
+    repository = "SYNCBENCH-%s" % uuid.uuid4()
+
+    # Register at the target (so that it accepts pushes from us)
+    target.request("sync/repository/register.xml",
+                   vars = {"repository": repository},
+                   ).read()
+
+    pulled = pushed = 0
+    bytes_in = bytes_out = 0
+    time_pull = time_push = 0.0
+    pages = 0
+
+    token = ""
+    while token is not None:
+
+        # Pull a page from the source
+        start = time.time()
+        response = source.request("sync/sync.xml",
+                                  vars = {"resource": tablename,
+                                          "repository": repository,
+                                          "include_deleted": "True",
+                                          "page_size": page_size,
+                                          "after": token,
+                                          },
+                                  headers = {"Accept-Encoding": "gzip"},
+                                  )
+        data = response.read()
+        bytes_in += len(data)
+        if response.info().getheader("Content-Encoding") == "gzip":
+            data = gzip.GzipFile(fileobj=StringIO(data)).read()
+        token = response.info().getheader(CONTINUATION) or None
+        time_pull += time.time() - start
+
+        root = ElementTree.fromstring(data)
+        count = int(root.get("results") or 0)
+        if not count:
+            break
+        pulled += count
+        pages += 1
+
+        # Push it to the target
+        start = time.time()
+        headers = {"Content-Type": "text/xml"}
+        if compress_push:
+            stream = StringIO()
+            gz = gzip.GzipFile(fileobj=stream, mode="wb")
+            gz.write(data)
+            gz.close()
+            data = stream.getvalue()
+            headers["Content-Encoding"] = "gzip"
+        bytes_out += len(data)
+        target.request("sync/sync.xml",
+                       vars = {"resource": tablename,
+                               "repository": repository,
+                               },
+                       data = data,
+                       headers = headers,
+                       ).read()
+        time_push += time.time() - start
+        pushed += count
+
+        sys.stdout.write("\r%s pages, %s records" % (pages, pushed))
+        sys.stdout.flush()
+
+    print
+    rate = lambda n, t: n / t if t else 0
+    print "Pull: %s records in %.1fs (%.1f records/s, %s bytes received)" % \
+          (pulled, time_pull, rate(pulled, time_pull), bytes_in)
+    print "Push: %s records in %.1fs (%.1f records/s, %s bytes sent)" % \
+          (pushed, time_push, rate(pushed, time_push), bytes_out)
+    total = time_pull + time_push
+    print "Total: %.1f records/s" % rate(pushed, total)
+
+# =============================================================================
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Sahana Eden Sync Benchmark")
+    parser.add_argument("--source", required=True,
+                        help="URL of the source instance")
+    parser.add_argument("--target", required=True,
+                        help="URL of the target instance")
+    parser.add_argument("--username", required=True,
+                        help="admin username (both instances)")
+    parser.add_argument("--password", required=True,
+                        help="admin password (both instances)")
+    parser.add_argument("--resource", default="org_organisation",
+                        help="the resource to synchronize")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="number of test records to create at the source")
+    parser.add_argument("--page-size", type=int, default=1000,
+                        help="number of records per page")
+    parser.add_argument("--compress-push", action="store_true",
+                        help="gzip-compress pushed pages")
+    args = parser.parse_args()
+
+    source = Instance(args.source, args.username, args.password)
+    target = Instance(args.target, args.username, args.password)
+
+    if args.seed:
+        seed(source, args.resource, args.seed)
+    synchronize(source, target, args.resource, args.page_size,
+                compress_push=args.compress_push)
+
+# END =========================================================================